@@ -0,0 +1,217 @@
+# fleet aggregates:
+# the fleet numbers wanted after a scan (ipv6 adoption of name servers and mail exchangers, dnssec secure / bogus /
+# insecure rates, mail exchanger reachability) are counts, so they are kept up to date as each domain's states come
+# out of the scan instead of being computed by reading the whole output again. A FleetAggregate counts outcomes,
+# verdicts and hosts per check. Aggregates of separate workers (processes or machines) merge by adding them up, so
+# every BulkScanner keeps one in its 'aggregate' and ShardedScanner and ScanCoordinator merge those of their workers.
+# usage: python -m check_domain.bulk_scan domains.txt -o results.jsonl --summary summary.json
+
+import threading
+from collections import Counter
+from .deadline import DeadlineExceeded
+from .domain_state import DNSHostGroupState, IPV4ReachState, IPV6ReachState, DNSSECState, DNSSECValidatedState
+from .formatted_response import HostMappingAnswer, HostReachAnswer
+from .interning import SECURE, BOGUS, INSECURE
+
+OK, PARTIAL, ERROR, TIMED_OUT = range(4)
+OUTCOMES = ("ok", "partial", "error", "timed_out")  # outcome codes, by position
+ANSWERED = (OK, PARTIAL)
+VERDICTS = (None, SECURE, INSECURE, BOGUS, "valid", "invalid")  # verdict codes, by position
+HOST_OK, HOST_PINGABLE, HOST_CONNECTS = 1, 2, 4  # host flag bits. ok: has an address (exist) or was reached (reach)
+
+
+class CheckAggregate(object):
+    """Counters of one check. outcomes: outcome name -> states (or raised exceptions). verdicts: verdict -> answered
+    states that have one (see state_verdict()). For host group checks, over the answered states with at least one host:
+    how many there were, in how many every host / at least one host was ok, the hosts and ok hosts in total and a
+    histogram of missing hosts (hosts that were not ok -> states)."""
+
+    def __init__(self):
+        self.outcomes = Counter()
+        self.verdicts = Counter()
+        self.with_hosts = 0
+        self.all_hosts_ok = 0
+        self.any_host_ok = 0
+        self.hosts = 0
+        self.hosts_ok = 0
+        self.missing_hosts = Counter()
+
+    def add(self, state):
+        """Counts a state, or an exception raised in its place."""
+        outcome = state_outcome(state)
+        self.outcomes[OUTCOMES[outcome]] += 1
+        if outcome not in ANSWERED:
+            return
+        verdict = state_verdict(state)
+        if verdict is not None:
+            self.verdicts[verdict] += 1
+        if isinstance(state, DNSHostGroupState):
+            hosts, hosts_ok = 0, 0
+            for _, _, flags in host_rows(state):
+                hosts += 1
+                hosts_ok += flags & HOST_OK
+            if hosts > 0:
+                self.with_hosts += 1
+                self.all_hosts_ok += hosts_ok == hosts
+                self.any_host_ok += hosts_ok > 0
+                self.hosts += hosts
+                self.hosts_ok += hosts_ok
+                self.missing_hosts[hosts - hosts_ok] += 1
+
+    def merge(self, other):
+        self.outcomes.update(other.outcomes)
+        self.verdicts.update(other.verdicts)
+        self.with_hosts += other.with_hosts
+        self.all_hosts_ok += other.all_hosts_ok
+        self.any_host_ok += other.any_host_ok
+        self.hosts += other.hosts
+        self.hosts_ok += other.hosts_ok
+        self.missing_hosts.update(other.missing_hosts)
+
+    def as_dict(self):
+        return {'outcomes': dict(self.outcomes), 'verdicts': dict(self.verdicts), 'with_hosts': self.with_hosts,
+                'all_hosts_ok': self.all_hosts_ok, 'any_host_ok': self.any_host_ok, 'hosts': self.hosts,
+                'hosts_ok': self.hosts_ok,
+                'missing_hosts': {str(missing): count for missing, count in sorted(self.missing_hosts.items())}}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        aggregate = cls()
+        aggregate.outcomes.update(data['outcomes'])
+        aggregate.verdicts.update(data['verdicts'])
+        for name in ('with_hosts', 'all_hosts_ok', 'any_host_ok', 'hosts', 'hosts_ok'):
+            setattr(aggregate, name, data[name])
+        aggregate.missing_hosts.update({int(missing): count for missing, count in data['missing_hosts'].items()})
+        return aggregate
+
+    def summary(self):
+        """Returns the counters as shares: verdict_rates over the answered states, all_hosts_share and
+        any_host_share over the states with hosts and host_ok_share over all their hosts."""
+        summary = {'outcomes': dict(self.outcomes)}
+        answered = sum(self.outcomes[OUTCOMES[code]] for code in ANSWERED)
+        if len(self.verdicts) > 0:
+            summary['verdict_rates'] = {verdict: round(count / answered, 4) for verdict, count in self.verdicts.items()}
+        if self.with_hosts > 0:
+            summary['with_hosts'] = self.with_hosts
+            summary['all_hosts_share'] = round(self.all_hosts_ok / self.with_hosts, 4)
+            summary['any_host_share'] = round(self.any_host_ok / self.with_hosts, 4)
+            summary['host_ok_share'] = round(self.hosts_ok / self.hosts, 4)
+            summary['missing_hosts'] = self.as_dict()['missing_hosts']
+        return summary
+
+
+class FleetAggregate(object):
+    """Running CheckAggregates of every check of a scan, plus the number of domains counted and of domains whose
+    check_all() raised as a whole. Safe to add to from the threads of a scan. merge() adds up another FleetAggregate
+    or its as_dict(), which is how the aggregates of separate workers travel.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: ScanStats."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.domains = 0
+        self.failed = 0
+        self.checks = {}  # check name -> CheckAggregate
+
+    def add(self, domain: str, states: dict):
+        """Counts the states of one domain (check name -> state or raised exception)."""
+        with self.lock:
+            self.domains += 1
+            for check, state in states.items():
+                aggregate = self.checks.get(check)
+                if aggregate is None:
+                    aggregate = self.checks[check] = CheckAggregate()
+                aggregate.add(state)
+
+    def add_failed(self, domain: str):
+        """Counts a domain whose check_all() raised."""
+        with self.lock:
+            self.domains += 1
+            self.failed += 1
+
+    def merge(self, other):
+        """Adds another FleetAggregate, or the as_dict() of one, to this one. Returns self."""
+        if isinstance(other, dict):
+            other = FleetAggregate.from_dict(other)
+        with other.lock:
+            domains, failed = other.domains, other.failed
+            checks = {check: aggregate.as_dict() for check, aggregate in other.checks.items()}
+        with self.lock:
+            self.domains += domains
+            self.failed += failed
+            for check, data in checks.items():
+                aggregate = self.checks.get(check)
+                if aggregate is None:
+                    aggregate = self.checks[check] = CheckAggregate()
+                aggregate.merge(CheckAggregate.from_dict(data))
+        return self
+
+    def as_dict(self):
+        with self.lock:
+            return {'domains': self.domains, 'failed': self.failed,
+                    'checks': {check: aggregate.as_dict() for check, aggregate in self.checks.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        aggregate = cls()
+        aggregate.domains = data['domains']
+        aggregate.failed = data['failed']
+        aggregate.checks = {check: CheckAggregate.from_dict(counts) for check, counts in data['checks'].items()}
+        return aggregate
+
+    def summary(self):
+        """Returns the fleet summary: domain counts and each check's CheckAggregate.summary()."""
+        with self.lock:
+            return {'domains': self.domains, 'failed': self.failed,
+                    'checks': {check: aggregate.summary() for check, aggregate in self.checks.items()}}
+
+
+def state_outcome(state):
+    """The outcome code (see OUTCOMES) of a state, or of an exception raised in its place."""
+    if isinstance(state, DeadlineExceeded):
+        return TIMED_OUT
+    if isinstance(state, Exception):
+        return ERROR
+    return PARTIAL if state.is_partial() else OK
+
+
+def state_verdict(state):
+    """The verdict (see VERDICTS) of a state: the dnssec verdict of a dnssec check (the weakest one of its addresses),
+    'valid' or 'invalid' for the other domain authenticity checks, None otherwise."""
+    if isinstance(state, Exception) or isinstance(state, DNSHostGroupState):
+        return None
+    if isinstance(state, (DNSSECState, DNSSECValidatedState)):
+        answer = state.formatted_answer['answer']
+        verdicts = set((answer['validation'] if isinstance(state, DNSSECState) else answer or {}).values())
+        for verdict in (BOGUS, INSECURE, SECURE):
+            if verdict in verdicts:
+                return verdict
+        return None
+    if getattr(state, 'valid', None) is None:
+        return None
+    return "valid" if state.valid else "invalid"
+
+
+def host_rows(state: DNSHostGroupState):
+    """Yields (host name, address or None, flags) for every host of a host group state. Reads compact
+    answers directly instead of building their dictionaries."""
+    answer = state.formatted_answer.response
+    if isinstance(state, (IPV4ReachState, IPV6ReachState)):
+        if isinstance(answer, HostReachAnswer):
+            hosts = zip(answer.names or (), answer.results or ())
+        else:
+            hosts = ((name, [result[key] for key in HostReachAnswer.result_keys])
+                     for name, result in (state.formatted_answer['hosts'] or {}).items())
+        for name, (pingable, ip, _, can_connect) in hosts:
+            flags = (HOST_PINGABLE if pingable else 0) | (HOST_CONNECTS if can_connect else 0)
+            yield name, ip, flags | (HOST_OK if flags else 0)
+    else:
+        if isinstance(answer, HostMappingAnswer):
+            hosts = zip(answer.names or (), answer.addresses or ())
+        else:
+            hosts = (state.formatted_answer['answer'] or {}).items()
+        for name, address in hosts:
+            yield name, address, HOST_OK if address is not None else 0
+
+# end
@@ -0,0 +1,209 @@
+# top level service drivers for domain checking from asyncio code
+from .internet_fetch import *
+from .domain_state import *
+from .domain_checker import CHECKS, DomainChecker, _error_json, _host_names
+from .normalize import normalize_domain
+import asyncio
+import json
+
+
+class AsyncDomainChecker(object):
+    """Coroutine counterpart of DomainChecker for asyncio services: the same check methods, awaited on the caller's
+    event loop. dns queries go through AsyncResolver and reachability probes through AsyncReacher, so no check holds
+    a thread while it waits on the network.
+    The SPF, DMARC and DKIM checks evaluate TXT records with the synchronous SPFEvaluator, DMARCResolver and
+    DKIMSelectorDiscovery (shared with DomainChecker, caches included). They run on the loop's default executor.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: DomainChecker."""
+
+    def __init__(self, dns: AsyncResolver = None, hosts: AsyncReacher = None):
+        self.dns = dns if dns is not None else AsyncResolver()
+        self.hosts = hosts if hosts is not None else AsyncReacher()
+
+    def close(self):
+        self.dns.close()
+
+    async def dkim(self, domain: str, selector: str = None, as_json=False):
+        selectors = None if selector is None else [selector]  # no selector: discover it from the common ones
+        response = await _in_executor(DomainChecker.dkim_discovery.discover, domain, selectors)
+        state = DKIMState(response)
+
+        if as_json is True:
+            dkim = {'dkim': response.get_response()}
+            return json.dumps(dkim)
+
+        return state
+
+    async def spf(self, domain: str, as_json=False):
+        response = await _in_executor(DomainChecker.spf_evaluator.inspect_spf, domain)
+        state = SPFState(response)
+
+        if as_json is True:
+            spf = {'spf': response.get_response()}
+            return json.dumps(spf)
+
+        return state
+
+    async def dmarc(self, domain: str, as_json=False):
+        response = await _in_executor(DomainChecker.dmarc_resolver.inspect_dmarc, domain)
+        state = DMARCState(response)
+
+        if as_json is True:
+            dmarc = {'dmarc': response.get_response()}
+            return json.dumps(dmarc)
+
+        return state
+
+    async def dnssec_valid(self, domain: str, as_json=False):
+        response = await self.dns.dnssec_validate(domain=domain)
+        state = DNSSECValidatedState(response)
+
+        return state
+
+    async def dnssec(self, domain: str, as_json=False):
+        response = await self.dns.dnssec_comprehensive(domain=domain)
+        state = DNSSECState(response)
+
+        return state
+
+    async def ns_ipv6_exist(self, domain: str, as_json=False):
+        response = await self.dns.get_ipv6_mapping(domain=domain, associated_with="ns")
+        state = IPV6ExistState(response)
+
+        return state
+
+    async def ns_ipv6_reach(self, domain: str, as_json=False):
+        dns_host_map = await self.dns.get_ipv6_mapping(domain=domain, associated_with="ns")
+        response = await self.hosts.reach_dns_hosts(dns_host_map)
+        state = IPV6ReachState(response)
+
+        return state
+
+    async def ns_ipv4_exist(self, domain: str, as_json=False):
+        response = await self.dns.get_ipv4_mapping(domain=domain, associated_with="ns")
+        state = IPV4ExistState(response)
+
+        return state
+
+    async def ns_ipv4_reach(self, domain: str, as_json=False):
+        dns_host_map = await self.dns.get_ipv4_mapping(domain=domain, associated_with="ns")
+        response = await self.hosts.reach_dns_hosts(dns_host_map)
+        state = IPV4ReachState(response)
+
+        return state
+
+    async def mx_ipv6_exist(self, domain: str, as_json=False):
+        response = await self.dns.get_ipv6_mapping(domain=domain, associated_with="mx")
+        state = IPV6ExistState(response)
+
+        return state
+
+    async def mx_ipv6_reach(self, domain: str, as_json=False):
+        dns_host_map = await self.dns.get_ipv6_mapping(domain=domain, associated_with="mx")
+        response = await self.hosts.reach_dns_hosts(dns_host_map)
+        state = IPV6ReachState(response)
+
+        return state
+
+    async def mx_ipv4_exist(self, domain: str, as_json=False):
+        response = await self.dns.get_ipv4_mapping(domain=domain, associated_with="mx")
+        state = IPV4ExistState(response)
+
+        return state
+
+    async def mx_ipv4_reach(self, domain: str, as_json=False):
+        dns_host_map = await self.dns.get_ipv4_mapping(domain=domain, associated_with="mx")
+        response = await self.hosts.reach_dns_hosts(dns_host_map)
+        state = IPV4ReachState(response)
+
+        return state
+
+    async def check_all(self, domain: str, checks: list = None, as_json=False):
+        """Coroutine version of DomainChecker.check_all(). Shared steps (ex, the NS lookup behind every ns_* check)
+        run once, as a single task awaited by every step that depends on it; everything else runs concurrently."""
+        domain = normalize_domain(domain)
+        if checks is None:
+            checks = list(CHECKS.keys())
+        for check in checks:
+            if check not in CHECKS:
+                raise ValueError(f"Unknown check '{check}'. Choose from: {list(CHECKS.keys())}")
+
+        steps = _Steps(self._step_builders(domain))
+        results = await asyncio.gather(*[steps(CHECKS[check][0]) for check in checks], return_exceptions=True)
+
+        states = {}
+        for check, response in zip(checks, results):
+            state_class = CHECKS[check][1]
+            if isinstance(response, BaseException):  # a cancelled shared step comes back as CancelledError
+                states[check] = response if isinstance(response, Exception) else _step_error(check, response)
+            else:
+                states[check] = state_class(response)
+
+        if as_json is True:
+            return json.dumps({check: (state.formatted_answer.get_response() if not isinstance(state, Exception)
+                                       else _error_json(state))
+                               for check, state in states.items()})
+
+        return states
+
+    def _step_builders(self, domain: str):
+        """Private. Returns step name -> coroutine function for every lookup and probe a check may need, the
+        asyncio counterpart of DomainChecker._build_plan(). Steps await the steps they depend on through 'steps'."""
+        builders = {
+            'ns': lambda steps: self.dns.get_ns(domain),
+            'mx': lambda steps: self.dns.get_mx(domain),
+            'dnssec': lambda steps: self.dns.dnssec_comprehensive(domain=domain),
+            'spf': lambda steps: _in_executor(DomainChecker.spf_evaluator.inspect_spf, domain),
+            'dmarc': lambda steps: _in_executor(DomainChecker.dmarc_resolver.inspect_dmarc, domain),
+            'dkim': lambda steps: _in_executor(DomainChecker.dkim_discovery.discover, domain),
+        }
+        for host_type in ("ns", "mx"):
+            builders[f"{host_type}_ipv4_map"] = self._map_step(self.dns.get_ipv4_mapping, domain, host_type)
+            builders[f"{host_type}_ipv6_map"] = self._map_step(self.dns.get_ipv6_mapping, domain, host_type)
+            builders[f"{host_type}_ipv4_reach"] = self._reach_step(f"{host_type}_ipv4_map")
+            builders[f"{host_type}_ipv6_reach"] = self._reach_step(f"{host_type}_ipv6_map")
+        return builders
+
+    @staticmethod
+    def _map_step(mapping_method, domain: str, host_type: str):
+        async def step(steps):
+            names_response = await steps(host_type)
+            response = await mapping_method(domain=domain, associated_with=host_type,
+                                            host_names=_host_names(names_response))
+            return response.expire_with(names_response)
+        return step
+
+    def _reach_step(self, map_step: str):
+        async def step(steps):
+            return await self.hosts.reach_dns_hosts(await steps(map_step))
+        return step
+
+
+class _Steps(object):
+    """Starts each step of check_all() as a task the first time it is asked for and hands out that same task
+    afterwards."""
+
+    def __init__(self, builders: dict):
+        self.builders = builders
+        self.tasks = {}
+
+    def __call__(self, name: str):
+        if name not in self.tasks:
+            self.tasks[name] = asyncio.ensure_future(self.builders[name](self))
+        return self.tasks[name]
+
+
+def _step_error(check: str, error: BaseException):
+    """Private. The Exception stored for a check whose step ended in a BaseException that is not an Exception (a
+    cancelled task), so states hold exceptions the way DomainChecker.check_all() stores them."""
+    stored = RuntimeError(f"The {check} check was cancelled ({type(error).__name__}).")
+    stored.__cause__ = error
+    return stored
+
+
+def _in_executor(function, *args):
+    """Runs a synchronous function on the running loop's default executor. Returns an awaitable of its result."""
+    return asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+# end
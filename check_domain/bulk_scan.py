@@ -0,0 +1,283 @@
+# bulk scanning:
+# drives DomainChecker.check_all() over a stream of domains. Domains are read lazily, only a bounded number of them
+# are in flight at any time and every result is written out as one JSON line as soon as its domain finishes, so
+# memory stays flat no matter how long the input is.
+# usage: python -m check_domain.bulk_scan domains.txt -o results.jsonl --checks ns_ipv6_exist,dnssec [--workers 32]
+#        python -m check_domain.bulk_scan domains.txt -o results.jsonl --resume  (continue from results.jsonl.ckpt)
+#        python -m check_domain.bulk_scan domains.txt -o changes.jsonl --incremental scan_state.db
+#        python -m check_domain.bulk_scan domains.txt -o results.jsonl --deadline 10  (seconds per domain)
+#        python -m check_domain.bulk_scan domains.txt -o results.jsonl --columns results.cols  (see columnar.py)
+#        python -m check_domain.bulk_scan domains.txt -o results.jsonl --summary summary.json  (see aggregates.py)
+#        python -m check_domain.bulk_scan domains.txt -o results.db --format sqlite  (see sinks.py)
+#        python -m check_domain.bulk_scan domains.txt -o results.jsonl --group  (see normalize.py)
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .aggregates import FleetAggregate
+from .deadline import DeadlineExceeded
+from .domain_checker import DomainChecker, CHECKS
+from .checkpoint import ScanCheckpoint
+from .domain_list import DomainSet, MappedDomainReader, normalize_line
+from .normalize import group_domains
+from .serialization import SERIALIZERS
+from .sinks import SINKS, open_sink
+
+DEFAULT_CONCURRENCY = 32
+STEP_WORKERS_PER_DOMAIN = 4  # query plan steps that may run at once for a single domain
+
+
+def read_domains(source, dedupe: bool = True):
+    """Accepts a file path, '-' for stdin, or an open text file. Lazily yields one normalized domain per non blank
+    line (see domain_list.py); lines starting with '#' are skipped, and so are repeated domains with 'dedupe'.
+    A file path is read through a memory map."""
+    seen = DomainSet() if dedupe else None
+    if isinstance(source, str) and source != "-":
+        yield from MappedDomainReader(source, seen=seen)
+        return
+
+    for line in sys.stdin if source == "-" else source:
+        domain = normalize_line(line)
+        if domain is None or (seen is not None and not seen.add(domain)):
+            continue
+        yield domain
+
+
+def result_line(domain: str, states):
+    """Returns the JSON line written for one scanned domain. A check that failed is written as {'error': ...}, plus
+    'timed_out': True when it ran out of time. A domain that failed as a whole ('states' is its exception) is written
+    as {'domain': ..., 'error': ...}. See JSONSerializer in serialization.py, which reads it back."""
+    return SERIALIZERS['json'].dumps_result(domain, states)
+
+
+class ScanStats(object):
+    """Thread safe throughput and error counters of a scan.
+    domains_read: domains taken from the input. completed: domains scanned to the end.
+    skipped: domains already finished by a previous run (see ScanCheckpoint).
+    failed: domains that raised as a whole. check_errors: individual checks that raised.
+    timed_out: checks that ran out of time, as a whole or in part (see Deadline)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.domains_read = 0
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.check_errors = 0
+        self.timed_out = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def throughput(self):
+        """Completed domains per second."""
+        elapsed = self.elapsed()
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        with self.lock:
+            return {'domains_read': self.domains_read, 'completed': self.completed, 'skipped': self.skipped,
+                    'failed': self.failed,
+                    'check_errors': self.check_errors, 'timed_out': self.timed_out, 'elapsed': round(self.elapsed(), 3),
+                    'domains_per_second': round(self.throughput(), 3)}
+
+
+class BulkScanner(object):
+    """Runs the selected checks over a stream of domains with at most 'concurrency' domains in flight.
+    Results are written to 'sink' (anything with a write() method) in completion order, one JSON line per domain.
+    A sink with a write_result(domain, states) method (ex, BinarySink) is handed the states instead, so it encodes
+    them without going through JSON.
+    Every scanned domain is also counted in 'aggregate', a FleetAggregate whose summary() is ready when scan() ends.
+    With 'deadline' (seconds) every domain gets that long for all of its checks; see DomainChecker.check_all().
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, checks: list = None, concurrency: int = DEFAULT_CONCURRENCY, checker: DomainChecker = None,
+                 deadline: float = None):
+        self.checks = list(CHECKS.keys()) if checks is None else list(checks)
+        for check in self.checks:
+            if check not in CHECKS:
+                raise ValueError(f"Unknown check '{check}'. Choose from: {list(CHECKS.keys())}")
+        self.concurrency = concurrency
+        self.deadline = deadline
+        if checker is None:
+            checker = DomainChecker(executor=ThreadPoolExecutor(max_workers=concurrency * STEP_WORKERS_PER_DOMAIN,
+                                                                thread_name_prefix="bulk-scan-steps"))
+        self.checker = checker
+        self.stats = ScanStats()
+        self.aggregate = FleetAggregate()
+
+    def scan(self, domains, sink, checkpoint: ScanCheckpoint = None):
+        """Scans every domain of the 'domains' iterable and writes each result line to 'sink' as soon as it is ready.
+        With a started 'checkpoint', domains are identified by their position in 'domains': positions recorded as
+        finished are skipped and finished ones are recorded as the scan goes. Returns the ScanStats of the run."""
+        as_line = getattr(sink, 'write_result', None) is None
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk-scan") as pool:
+            in_flight = {}  # future -> position of the domain in the input
+            for index, domain in enumerate(domains):
+                self.stats.add(domains_read=1)
+                if checkpoint is not None and checkpoint.is_done(index):
+                    self.stats.add(skipped=1)
+                    continue
+                if not self.should_scan(domain):
+                    if checkpoint is not None:
+                        checkpoint.mark(index)
+                    continue
+                in_flight[pool.submit(self._scan_for, domain, as_line)] = index
+                if len(in_flight) >= self.concurrency:
+                    self._drain(in_flight, sink, checkpoint, FIRST_COMPLETED)
+            self._drain(in_flight, sink, checkpoint, None)
+        if checkpoint is not None:
+            checkpoint.commit(sink)
+        return self.stats
+
+    def should_scan(self, domain: str):
+        """Hook for subclasses to leave domains out of the scan. Every domain is scanned by default."""
+        return True
+
+    def scan_one(self, domain: str):
+        """Runs the checks on a single domain. Returns (domain, states) to write, where 'states' is the exception of
+        a domain that failed as a whole, or None when there is nothing to write."""
+        try:
+            states = self.checker.check_all(domain, checks=self.checks, deadline=self.deadline)
+        except Exception as e:
+            self.stats.add(failed=1)
+            self.aggregate.add_failed(domain)
+            return domain, e
+        errors = sum(1 for state in states.values() if isinstance(state, Exception))
+        timed_out = sum(1 for state in states.values()
+                        if isinstance(state, DeadlineExceeded) or len(getattr(state, 'timed_out', ())) > 0)
+        if errors > 0 or timed_out > 0:
+            self.stats.add(check_errors=errors, timed_out=timed_out)
+        self.aggregate.add(domain, states)
+        states = self.result_for(domain, states)
+        return None if states is None else (domain, states)
+
+    def result_for(self, domain: str, states: dict):
+        """Hook for subclasses to shape what is written for a domain: returns the states to write (every check by
+        default), or None to write nothing."""
+        return states
+
+    def _scan_for(self, domain: str, as_line: bool):
+        """Private. scan_one() on a pool thread, which also encodes the result line unless the sink takes states."""
+        result = self.scan_one(domain)
+        if result is None or not as_line:
+            return result
+        return result_line(*result)
+
+    def _drain(self, in_flight: dict, sink, checkpoint, return_when):
+        """Private. Waits for in flight domains (the first one or all of them), writes their results out and removes
+        them from 'in_flight'."""
+        if len(in_flight) == 0:
+            return
+        if return_when is None:
+            done, _ = wait(in_flight)
+        else:
+            done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            index = in_flight.pop(future)
+            result = future.result()
+            if isinstance(result, str):
+                sink.write(result + "\n")
+            elif result is not None:
+                sink.write_result(*result)
+            self.stats.add(completed=1)
+            if checkpoint is not None:
+                checkpoint.mark(index)
+        if checkpoint is not None:
+            checkpoint.maybe_commit(sink)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run domain checks over a list of domains, one result per line.")
+    parser.add_argument("input", help="file with one domain per line, or '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--format", default="jsonl", choices=list(SINKS.keys()),
+                        help="output format, see sinks.py (default: jsonl)")
+    parser.add_argument("--checks", default=",".join(CHECKS.keys()), help="comma separated checks to run")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="domains in flight at once (per worker process)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to shard the scan over")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.ckpt when writing to a file)")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    parser.add_argument("--deadline", type=float, help="seconds each domain gets for all of its checks")
+    parser.add_argument("--incremental", metavar="STATE_DB",
+                        help="skip fresh domains and only write changed checks, tracked in this sqlite file")
+    parser.add_argument("--columns", metavar="STORE",
+                        help="also keep the results in this columnar store file, written when the scan finishes")
+    parser.add_argument("--summary",
+                        help="write the fleet summary of the domains scanned by this run to this JSON file")
+    parser.add_argument("--group", action="store_true",
+                        help="scan the names of one registrable domain next to each other (see normalize.py)")
+    args = parser.parse_args(argv)
+
+    checks = args.checks.split(",")
+    checkpoint = None
+    if args.output == "-" and args.format != "jsonl":
+        parser.error(f"--format {args.format} needs an output file")
+    if args.output != "-" and args.workers <= 1 and args.format == "jsonl":
+        checkpoint_path = args.checkpoint if args.checkpoint is not None else args.output + ".ckpt"
+        checkpoint = ScanCheckpoint(checkpoint_path).start(output_path=args.output, resume=args.resume)
+    elif args.resume:
+        parser.error("--resume needs a jsonl output file and a single worker process")
+    if args.incremental is not None and args.workers > 1:
+        parser.error("--incremental runs in a single worker process")
+    if args.columns is not None and (args.workers > 1 or args.incremental is not None or args.resume):
+        parser.error("--columns runs in a single worker process, without --incremental or --resume")
+
+    domains = read_domains(args.input)
+    if args.group:
+        domains = group_domains(domains)
+    sink = sys.stdout if args.output == "-" else open_sink(args.output, args.format, append=args.resume)
+    try:
+        if args.workers > 1:
+            from .sharded_scan import ShardedScanner  # imported here: sharded_scan depends on this module
+            scanner = ShardedScanner(workers=args.workers, checks=checks, concurrency=args.concurrency,
+                                     deadline=args.deadline)
+            if args.input == "-" or args.group:
+                stats = scanner.scan(domains, sink)
+            else:
+                stats = scanner.scan_file(args.input, sink)
+        elif args.incremental is not None:
+            from .incremental import IncrementalScanner, IncrementalStore  # imported here: depends on this module
+            store = IncrementalStore(args.incremental)
+            try:
+                scanner = IncrementalScanner(store, checks=checks, concurrency=args.concurrency,
+                                             deadline=args.deadline)
+                stats = scanner.scan(domains, sink, checkpoint).as_dict()
+            finally:
+                store.close()
+        elif args.columns is not None:
+            from .columnar import ColumnarScanner, ColumnarStore  # imported here: depends on this module
+            store = ColumnarStore()
+            scanner = ColumnarScanner(store, checks=checks, concurrency=args.concurrency, deadline=args.deadline)
+            stats = scanner.scan(domains, sink, checkpoint).as_dict()
+            store.save(args.columns)
+        else:
+            scanner = BulkScanner(checks=checks, concurrency=args.concurrency, deadline=args.deadline)
+            stats = scanner.scan(domains, sink, checkpoint).as_dict()
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        if sink is not sys.stdout:
+            sink.close()
+    if args.summary is not None:
+        with open(args.summary, "w", encoding="utf-8") as summary:
+            json.dump(scanner.aggregate.summary(), summary, indent=2)
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+# end
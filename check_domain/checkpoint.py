@@ -0,0 +1,139 @@
+# checkpoints for bulk scans:
+# a long scan periodically appends a small record of the domains it finished (by their position in the input) and
+# the size of its flushed output. A scan restarted with --resume truncates the output back to the last recorded size
+# and skips every domain recorded as finished, so no work is redone and no result line is written twice.
+# record format, one per line: "<output size> <first>-<last>,<index>,..." ex, "18234 0-41,43,45-46"
+
+import os
+import time
+
+COMMIT_EVERY = 1000  # finished domains between checkpoint records
+COMMIT_SECONDS = 5.0  # or seconds, whichever comes first
+
+
+class CompletedSet(object):
+    """Compact set of finished input positions: a watermark below which every position is finished, plus the
+    scattered positions above it. Domains finish nearly in input order, so the scattered part stays small."""
+
+    def __init__(self):
+        self.watermark = 0
+        self.above = set()
+
+    def add(self, index: int):
+        if index < self.watermark:
+            return
+        self.above.add(index)
+        while self.watermark in self.above:
+            self.above.remove(self.watermark)
+            self.watermark += 1
+
+    def __contains__(self, index: int):
+        return index < self.watermark or index in self.above
+
+    def __len__(self):
+        return self.watermark + len(self.above)
+
+
+class ScanCheckpoint(object):
+    """Append-only checkpoint file of a bulk scan. mark() is called for every domain whose line was written to the
+    output; maybe_commit() writes a record at most every COMMIT_EVERY domains or COMMIT_SECONDS seconds. Each record
+    fsyncs the output first and the checkpoint file second, so a record never points past durable output.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, path: str, commit_every: int = COMMIT_EVERY, commit_seconds: float = COMMIT_SECONDS):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_seconds = commit_seconds
+        self.completed = CompletedSet()
+        self.output_size = 0
+        self.pending = []
+        self.last_commit = time.monotonic()
+        self.file = None
+
+    def load(self):
+        """Reads an existing checkpoint file. A partially written last record (from a crash) is ignored.
+        Returns self."""
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path, encoding="ascii") as records:
+            for line in records:
+                if not line.endswith("\n"):
+                    break
+                size, _, ranges = line.strip().partition(" ")
+                for index in _parse_ranges(ranges):
+                    self.completed.add(index)
+                self.output_size = int(size)
+        return self
+
+    def start(self, output_path: str = None, resume: bool = False):
+        """Opens the checkpoint for writing. With 'resume=True' the output file is truncated back to the size of the
+        last record and new records are appended; otherwise the checkpoint starts empty, and the output must be
+        replaced rather than appended to, so recorded sizes never count an earlier run's lines."""
+        if resume:
+            self.load()
+            if output_path is not None and os.path.exists(output_path):
+                os.truncate(output_path, self.output_size)
+            self.file = open(self.path, "a", encoding="ascii")
+        else:
+            self.file = open(self.path, "w", encoding="ascii")
+        return self
+
+    def is_done(self, index: int):
+        return index in self.completed
+
+    def mark(self, index: int):
+        self.completed.add(index)
+        self.pending.append(index)
+
+    def maybe_commit(self, sink):
+        if len(self.pending) >= self.commit_every or time.monotonic() - self.last_commit >= self.commit_seconds:
+            self.commit(sink)
+
+    def commit(self, sink):
+        """Makes the output durable, then appends one record covering every domain marked since the last one."""
+        self.last_commit = time.monotonic()
+        if len(self.pending) == 0:
+            return
+        sink.flush()
+        if hasattr(sink, "fileno"):
+            os.fsync(sink.fileno())
+            self.output_size = os.fstat(sink.fileno()).st_size
+        self.file.write(f"{self.output_size} {_format_ranges(self.pending)}\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = []
+
+    def close(self, sink=None):
+        if sink is not None:
+            self.commit(sink)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _format_ranges(indexes: list):
+    """[0, 1, 2, 5, 7, 8] -> '0-2,5,7-8'"""
+    indexes = sorted(indexes)
+    parts = []
+    start = previous = indexes[0]
+    for index in indexes[1:] + [None]:
+        if index is not None and index == previous + 1:
+            previous = index
+            continue
+        parts.append(str(start) if start == previous else f"{start}-{previous}")
+        start = previous = index
+    return ",".join(parts)
+
+
+def _parse_ranges(text: str):
+    """'0-2,5,7-8' -> 0, 1, 2, 5, 7, 8"""
+    for part in text.split(","):
+        if len(part) == 0:
+            continue
+        first, _, last = part.partition("-")
+        for index in range(int(first), int(last or first) + 1):
+            yield index
+
+# end
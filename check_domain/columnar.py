@@ -0,0 +1,273 @@
+# columnar results:
+# a fleet wide question ("on what share of our domains does every name server have an ipv6 address?") should not
+# mean walking millions of state objects or JSON lines. ColumnarStore keeps what such questions need from every
+# check as typed columns: one row per (domain, check) and one row per host of a host group check. Domains, host names
+# and addresses are coded as integers through string tables, outcomes and verdicts as small enum codes (see
+# aggregates.py), so a question is a few vectorized comparisons over arrays. Columns are array.array; queries run on
+# numpy when it is installed and fall back to plain loops over the same arrays when it is not.
+# usage: python -m check_domain.bulk_scan domains.txt -o results.jsonl --columns results.cols
+#        python -m check_domain.columnar results.cols  (summary per check)
+#        ColumnarStore.load("results.cols").all_hosts_share("ns_ipv6_exist")
+
+import argparse
+import array
+import json
+import os
+import struct
+import sys
+import threading
+from collections import Counter
+from .aggregates import OUTCOMES, ANSWERED, VERDICTS, HOST_OK, state_outcome, state_verdict, host_rows
+from .bulk_scan import BulkScanner
+from .domain_checker import CHECKS
+from .domain_state import DNSHostGroupState
+
+try:
+    import numpy
+except ImportError:  # optional: without numpy the queries loop over the arrays
+    numpy = None
+
+MAGIC = b"CDCOLS1\n"
+
+CHECK_COLUMNS = (('domain', 'I'), ('check', 'B'), ('outcome', 'B'), ('verdict', 'B'), ('hosts', 'H'),
+                 ('hosts_ok', 'H'))
+HOST_COLUMNS = (('row', 'I'), ('host', 'I'), ('address', 'I'), ('flags', 'B'))  # 'row': the (domain, check) row
+
+
+class StringTable(object):
+    """Codes strings as integers in order of first use. Code 0 stands for None.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, values=()):
+        self.values = [None]
+        self.codes = {None: 0}
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values) - 1
+
+    def to_bytes(self):
+        return "\n".join(self.values[1:]).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        return cls(data.decode("utf-8").split("\n") if len(data) > 0 else ())
+
+
+class ColumnarStore(object):
+    """Typed columns of check results. append() adds the states of one domain (as returned by check_all()); save()
+    and load() write and read the store as a single file: a JSON header, the string tables and the raw columns.
+    Safe to append to from the threads of a scan.
+    column() returns a column as a numpy array (a copy, cached until the next append) or, without numpy, the
+    array.array itself, which must not be changed.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: IncrementalStore."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.check_names = tuple(CHECKS.keys())
+        self.check_codes = {check: code for code, check in enumerate(self.check_names)}
+        self.domains = StringTable()
+        self.hosts = StringTable()  # host names and addresses
+        self.columns = {name: array.array(typecode) for name, typecode in CHECK_COLUMNS + HOST_COLUMNS}
+        self._views = {}
+
+    def __len__(self):
+        return len(self.columns['domain'])
+
+    def append(self, domain: str, states: dict):
+        """Adds a row per check of 'states' (check name -> state or raised exception) and a row per host of the host
+        group checks among them."""
+        with self.lock:
+            self._views.clear()
+            domain_code = self.domains.code(domain)
+            for check, state in states.items():
+                row = len(self.columns['domain'])
+                hosts, hosts_ok = 0, 0
+                if not isinstance(state, Exception) and isinstance(state, DNSHostGroupState):
+                    for host, address, flags in host_rows(state):
+                        self.columns['row'].append(row)
+                        self.columns['host'].append(self.hosts.code(host))
+                        self.columns['address'].append(self.hosts.code(address))
+                        self.columns['flags'].append(flags)
+                        hosts += 1
+                        hosts_ok += flags & HOST_OK
+                self.columns['domain'].append(domain_code)
+                self.columns['check'].append(self.check_codes[check])
+                self.columns['outcome'].append(state_outcome(state))
+                self.columns['verdict'].append(VERDICTS.index(state_verdict(state)))
+                self.columns['hosts'].append(min(hosts, 0xffff))
+                self.columns['hosts_ok'].append(min(hosts_ok, 0xffff))
+
+    def column(self, name: str):
+        if numpy is None:
+            return self.columns[name]
+        with self.lock:
+            view = self._views.get(name)
+            if view is None:
+                column = self.columns[name]
+                view = self._views[name] = numpy.frombuffer(column, dtype=column.typecode).copy() \
+                    if len(column) > 0 else numpy.zeros(0, dtype=column.typecode)
+            return view
+
+    def rows(self, check: str, outcomes=ANSWERED):
+        """Returns a mask over the (domain, check) rows: the rows of 'check' whose outcome is one of 'outcomes'."""
+        if check not in self.check_codes:
+            raise ValueError(f"Unknown check '{check}'. Choose from: {list(self.check_codes.keys())}")
+        check_code = self.check_codes[check]
+        checks, outcome = self.column('check'), self.column('outcome')
+        if numpy is not None:
+            return (checks == check_code) & numpy.isin(outcome, list(outcomes))
+        return [code == check_code and row_outcome in outcomes for code, row_outcome in zip(checks, outcome)]
+
+    def domains_where(self, mask):
+        """Returns the domains of the rows in 'mask'."""
+        domain = self.column('domain')
+        if numpy is not None:
+            return [self.domains.values[code] for code in domain[mask]]
+        return [self.domains.values[code] for code, selected in zip(domain, mask) if selected]
+
+    def all_hosts_share(self, check: str):
+        """Of the domains that have hosts in an answered host group check, the share (0 to 1) where every host is ok:
+        has an address for an exist check, was reached by ping or connect for a reach check. None if there are no
+        such domains. ex, all_hosts_share("ns_ipv6_exist"): the share of domains with ipv6 on every name server."""
+        hosts, hosts_ok = self.column('hosts'), self.column('hosts_ok')
+        mask = self.rows(check)
+        if numpy is not None:
+            with_hosts = mask & (hosts > 0)
+            total = int(numpy.count_nonzero(with_hosts))
+            complete = int(numpy.count_nonzero(with_hosts & (hosts_ok == hosts)))
+        else:
+            total, complete = 0, 0
+            for selected, count, count_ok in zip(mask, hosts, hosts_ok):
+                if selected and count > 0:
+                    total += 1
+                    complete += count == count_ok
+        return None if total == 0 else complete / total
+
+    def verdict_counts(self, check: str):
+        """Returns verdict -> number of answered rows of 'check'. Checks without a verdict count under None."""
+        verdict = self.column('verdict')
+        mask = self.rows(check)
+        if numpy is not None:
+            counts = numpy.bincount(verdict[mask], minlength=len(VERDICTS))
+            return {VERDICTS[code]: int(count) for code, count in enumerate(counts) if count > 0}
+        counts = Counter(code for code, selected in zip(verdict, mask) if selected)
+        return {VERDICTS[code]: count for code, count in sorted(counts.items())}
+
+    def outcome_counts(self, check: str):
+        """Returns outcome name -> number of rows of 'check'."""
+        outcome = self.column('outcome')
+        mask = self.rows(check, outcomes=range(len(OUTCOMES)))
+        if numpy is not None:
+            counts = numpy.bincount(outcome[mask], minlength=len(OUTCOMES))
+            return {OUTCOMES[code]: int(count) for code, count in enumerate(counts) if count > 0}
+        counts = Counter(code for code, selected in zip(outcome, mask) if selected)
+        return {OUTCOMES[code]: count for code, count in sorted(counts.items())}
+
+    def failing_hosts(self, check: str, top: int = 10):
+        """Returns the 'top' (host name, domains) pairs of hosts that were not ok in answered rows of 'check', most
+        domains first. ex, failing_hosts("ns_ipv6_exist"): the name servers without ipv6 behind most domains."""
+        row_mask = self.rows(check)
+        row, host, flags = self.column('row'), self.column('host'), self.column('flags')
+        if numpy is not None:
+            failing = row_mask[row] & ((flags & HOST_OK) == 0)
+            counts = Counter(dict(zip(*numpy.unique(host[failing], return_counts=True))))
+        else:
+            counts = Counter(code for code, host_row, host_flags in zip(host, row, flags)
+                             if row_mask[host_row] and not host_flags & HOST_OK)
+        return [(self.hosts.values[code], int(count)) for code, count in counts.most_common(top)]
+
+    def summary(self):
+        """Returns check -> outcome counts, verdict counts and, for host group checks, all_hosts_share()."""
+        summary = {}
+        for check in self.check_names:
+            outcomes = self.outcome_counts(check)
+            if len(outcomes) == 0:
+                continue
+            summary[check] = {'outcomes': outcomes, 'verdicts': self.verdict_counts(check)}
+            if issubclass(CHECKS[check][1], DNSHostGroupState):
+                summary[check]['all_hosts_share'] = self.all_hosts_share(check)
+        return summary
+
+    def save(self, path: str):
+        """Writes the store to 'path' (replaced atomically)."""
+        with self.lock:
+            tables = [self.domains.to_bytes(), self.hosts.to_bytes()]
+            header = {'byteorder': sys.byteorder, 'checks': list(self.check_names), 'tables': [len(t) for t in tables],
+                      'columns': [[name, column.typecode, len(column)] for name, column in self.columns.items()]}
+            header = json.dumps(header).encode("utf-8")
+            temporary = path + ".tmp"
+            with open(temporary, "wb") as file:
+                file.write(MAGIC)
+                file.write(struct.pack("<I", len(header)))
+                file.write(header)
+                for table in tables:
+                    file.write(table)
+                for column in self.columns.values():
+                    column.tofile(file)
+            os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Reads a store written by save(). Returns a ColumnarStore that can be queried and appended to."""
+        store = cls()
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a columnar result store.")
+            header = json.loads(file.read(struct.unpack("<I", file.read(4))[0]).decode("utf-8"))
+            store.check_names = tuple(header['checks'])
+            store.check_codes = {check: code for code, check in enumerate(store.check_names)}
+            store.domains = StringTable.from_bytes(file.read(header['tables'][0]))
+            store.hosts = StringTable.from_bytes(file.read(header['tables'][1]))
+            for name, typecode, length in header['columns']:
+                column = array.array(typecode)
+                column.fromfile(file, length)
+                if header['byteorder'] != sys.byteorder:
+                    column.byteswap()
+                store.columns[name] = column
+        for check in CHECKS:  # checks added since the file was written
+            if check not in store.check_codes:
+                store.check_codes[check] = len(store.check_names)
+                store.check_names += (check,)
+        return store
+
+
+class ColumnarScanner(BulkScanner):
+    """A BulkScanner that also appends every scanned domain's states to a ColumnarStore. The result lines are
+    written as usual.
+    Inherits from: BulkScanner.
+    Parent to: None.
+    Sibling to: IncrementalScanner, ShardedScanner."""
+
+    def __init__(self, store: ColumnarStore, **scanner_options):
+        super(ColumnarScanner, self).__init__(**scanner_options)
+        self.store = store
+
+    def result_for(self, domain: str, states: dict):
+        self.store.append(domain, states)
+        return super(ColumnarScanner, self).result_for(domain, states)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a columnar result store, per check.")
+    parser.add_argument("store", help="file written by bulk_scan --columns")
+    args = parser.parse_args(argv)
+    print(json.dumps(ColumnarStore.load(args.store).summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# end
@@ -4,3 +4,5 @@ class Config:
 
     RESOLV_CONF_LOCATION = "/etc/resolv.conf"
     ROOT_TRUST_ANCHOR = "/usr/local/etc/unbound"
+    PUBLIC_SUFFIX_LIST = "/usr/share/publicsuffix/public_suffix_list.dat"
+    RECHECK_SECONDS = 86400  # how long a scanned domain stays fresh when its records carry no ttl
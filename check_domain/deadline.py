@@ -0,0 +1,55 @@
+# deadlines for domain checks:
+# a Deadline is a point in time (time.monotonic()) by which a whole check has to be answered. It is created once, at
+# the top (DomainChecker method, check_all() or a bulk scan), and the same object is passed down to the Resolver,
+# Reacher and DmarcianClient, which size their own timeouts to the time that is left instead of fixed values.
+# Steps that are still unfinished when it runs out are abandoned: they raise DeadlineExceeded, or show up in the
+# 'timed_out' list of the formatted response (and state) they were part of.
+
+import time
+
+
+class Deadline(object):
+    """A monotonic point in time. Deadline() without seconds never runs out, so code can pass a Deadline around
+    unconditionally.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, seconds: float = None):
+        self.at = None if seconds is None else time.monotonic() + seconds
+
+    @staticmethod
+    def coerce(deadline):
+        """Accepts a Deadline, a number of seconds from now or None (no deadline). Returns a Deadline."""
+        if isinstance(deadline, Deadline):
+            return deadline
+        return Deadline(deadline)
+
+    def remaining(self):
+        """Seconds left, never below 0. None if there is no deadline."""
+        if self.at is None:
+            return None
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+    def timeout(self, cap: float = None):
+        """The timeout to use for a blocking call: the time left, but no more than 'cap'. None means block forever."""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        if cap is None:
+            return remaining
+        return min(remaining, cap)
+
+    def check(self, what: str = "the check"):
+        """Raises DeadlineExceeded if the deadline has passed."""
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded before {what} finished.")
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+# end
@@ -0,0 +1,541 @@
+# multi-node bulk scanning:
+# a ScanCoordinator reads the domain list and leases chunks of it to ScanWorker processes on any number of machines
+# over a small TCP protocol: one JSON object per line. Workers run a BulkScanner over each chunk and send the result
+# lines back; the coordinator writes them to one sink. Leases that are not renewed in time (a hung or lost worker) are
+# handed to the next worker that asks. Domains are assigned to workers with a consistent hash ring keyed by their
+# registrable domain, so the subdomains of one organization land on the same node and share its resolver caches, and
+# adding a node only moves the domains that hash to it.
+# The coordinator listens on 127.0.0.1 unless told otherwise, and only serves workers whose hello carries its shared
+# token. The token travels in the clear: on an untrusted network, tunnel the port (ex, ssh -L). Result lines are only
+# written when they are one JSON line per leased domain.
+# usage: python -m check_domain.distributed coordinate domains.txt -o results.jsonl --listen 0.0.0.0:7700 --token T
+#        python -m check_domain.distributed work coordinator-host:7700 --token T [--concurrency 32]  (on every node)
+#        (--token defaults to $CHECK_DOMAIN_TOKEN; a coordinator without one makes one up and prints it)
+#
+# protocol, worker -> coordinator           coordinator -> worker
+#   {"type": "hello", "worker": name,         {"type": "welcome", "worker": unique name}
+#    "token": shared token}                   {"type": "refused", "reason": ...}  (then the connection is closed)
+#   {"type": "lease"}                         {"type": "chunk", "lease": id, "domains": [...], "lease_seconds": s}
+#                                             {"type": "wait", "seconds": s}  (nothing to hand out yet)
+#                                             {"type": "done"}
+#   {"type": "renew", "lease": id}            (no reply)
+#   {"type": "results", "lease": id,          {"type": "ack", "accepted": bool}  (not accepted: a lease finished
+#    "lines": [...], "stats": {...},             by another worker, or lines that do not match its domains)
+#    "aggregate": {...}}  (FleetAggregate of the chunk, see aggregates.py)
+
+import argparse
+import bisect
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter, deque
+from .aggregates import FleetAggregate
+from .bulk_scan import BulkScanner, DEFAULT_CONCURRENCY, read_domains
+from .domain_checker import CHECKS
+from .normalize import group_key
+from .sinks import open_sink
+
+DEFAULT_PORT = 7700
+DEFAULT_CHUNK_SIZE = 256  # domains per lease
+DEFAULT_LEASE_SECONDS = 300.0  # a lease not renewed (or finished) within this long is handed to another worker
+MAX_BUFFERED_CHUNKS = 16  # chunks read ahead per connected worker while filling its bucket
+TOKEN_VARIABLE = "CHECK_DOMAIN_TOKEN"  # environment variable holding the shared token of the command line
+VIRTUAL_NODES = 64  # points each worker gets on the hash ring
+POLL_SECONDS = 1.0
+LINGER_SECONDS = 5.0  # how long a finished coordinator waits for connected workers to hear 'done'
+
+
+def locality_key(domain: str):
+    """The key a domain is placed on the hash ring by: its registrable domain, or the name itself for a public
+    suffix. ex, 'mail.example.co.uk' and 'www.example.co.uk' both map to 'example.co.uk'."""
+    try:
+        return group_key(domain)
+    except ValueError:  # not a valid name: placed by itself
+        return domain
+
+
+class HashRing(object):
+    """Consistent hash ring of node names. Every node is placed on the ring at 'replicas' points; a key belongs to the
+    first node point at or after the key's own hash. Adding or removing a node only moves the keys next to its points.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, replicas: int = VIRTUAL_NODES):
+        self.replicas = replicas
+        self.points = []  # sorted hashes
+        self.owners = {}  # hash -> node
+
+    def __len__(self):
+        return len(set(self.owners.values()))
+
+    def add(self, node: str):
+        for replica in range(self.replicas):
+            point = _ring_hash(f"{node}#{replica}")
+            if point not in self.owners:
+                bisect.insort(self.points, point)
+                self.owners[point] = node
+
+    def remove(self, node: str):
+        for replica in range(self.replicas):
+            point = _ring_hash(f"{node}#{replica}")
+            if self.owners.get(point) == node:
+                del self.owners[point]
+                self.points.remove(point)
+
+    def node_for(self, key: str):
+        """Returns the node owning 'key', or None if the ring is empty."""
+        if len(self.points) == 0:
+            return None
+        index = bisect.bisect_left(self.points, _ring_hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+def _ring_hash(key: str):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class _Lease(object):
+    """Private. A chunk of domains and the worker currently holding it. The id stays the same when the chunk is
+    handed to another worker, so whichever holder finishes first is the one whose results are kept."""
+
+    def __init__(self, lease_id: int, domains: list):
+        self.id = lease_id
+        self.domains = domains
+        self.worker = None
+        self.expires_at = None
+
+
+class ScanCoordinator(object):
+    """Leases chunks of a domain stream to ScanWorkers connecting over TCP and writes their result lines to 'sink',
+    each domain's line exactly once (results for a lease that was already finished by another worker are dropped).
+    The FleetAggregates of the accepted results are merged into 'aggregate', so it counts every domain once too.
+    The stream is read lazily into one bucket per worker, following the hash ring. A worker is given chunks from its
+    own bucket, then the chunks of expired leases, and takes from the fullest other bucket when its own is empty.
+    The leases of a worker that disconnects are handed out again at once; those of a silent worker when they expire.
+    Workers must send 'token' in their hello (a random one is made up when it is None). Results whose lines are not
+    exactly one JSON line per domain of the lease are refused and the lease is handed out again.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: ShardedScanner."""
+
+    def __init__(self, domains, sink, address: tuple = ("127.0.0.1", DEFAULT_PORT),
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, lease_seconds: float = DEFAULT_LEASE_SECONDS, token: str = None):
+        self.domains = iter(domains)
+        self.sink = sink
+        self.token = token if token is not None else secrets.token_urlsafe(16)
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()
+        self.ring = HashRing()
+        self.buckets = {}  # worker name -> deque of domains not leased yet
+        self.expired = deque()  # leases to hand out again
+        self.leases = {}  # lease id -> _Lease held by a worker
+        self.next_lease_id = 0
+        self.exhausted = False
+        self.connected = 0
+        self.counts = {'domains_read': 0, 'completed': 0, 'leases': 0, 'expired_leases': 0, 'duplicate_results': 0,
+                       'rejected_results': 0}
+        self.worker_stats = {}
+        self.aggregate = FleetAggregate()
+        self.finished = threading.Event()
+        self.server = _CoordinatorServer(address, _CoordinatorHandler)
+        self.server.coordinator = self
+
+    @property
+    def address(self):
+        """The (host, port) the coordinator listens on. Useful with port 0."""
+        return self.server.server_address[:2]
+
+    def serve(self):
+        """Serves workers until every domain has been scanned. Returns a dict with the coordinator's counters under
+        'total' and the counters each worker last reported under 'workers'."""
+        started = time.monotonic()
+        server_thread = threading.Thread(target=self.server.serve_forever, args=(POLL_SECONDS / 4,), daemon=True,
+                                         name="scan-coordinator")
+        server_thread.start()
+        try:
+            while not self.finished.wait(POLL_SECONDS / 4):
+                with self.lock:
+                    self._expire_leases()
+            linger_until = time.monotonic() + LINGER_SECONDS
+            while self.connected > 0 and time.monotonic() < linger_until:
+                time.sleep(POLL_SECONDS / 10)
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+
+        elapsed = time.monotonic() - started
+        with self.lock:
+            total = dict(self.counts)
+            total['elapsed'] = round(elapsed, 3)
+            total['domains_per_second'] = round(total['completed'] / elapsed, 3) if elapsed > 0 else 0.0
+            return {'total': total, 'workers': dict(self.worker_stats)}
+
+    def admits(self, token):
+        """True if 'token' (from a worker's hello) is the shared token."""
+        return isinstance(token, str) and hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8"))
+
+    def join(self, worker: str):
+        """Adds a worker to the hash ring. Returns its name, made unique among the connected workers."""
+        with self.lock:
+            name, suffix = worker, 1
+            while name in self.buckets:
+                suffix += 1
+                name = f"{worker}-{suffix}"
+            self.ring.add(name)
+            self.buckets[name] = deque()
+            self.connected += 1
+            self._rebalance()
+            return name
+
+    def leave(self, worker: str):
+        """Removes a disconnected worker. Its unleased domains are rehashed and its leases handed out again."""
+        with self.lock:
+            self.connected -= 1
+            if worker not in self.buckets:
+                return
+            self.ring.remove(worker)
+            orphans = self.buckets.pop(worker)
+            for lease in list(self.leases.values()):
+                if lease.worker == worker:
+                    self._requeue(lease)
+            if len(self.buckets) == 0:
+                while len(orphans) > 0:
+                    self.expired.append(self._new_lease([orphans.popleft() for _ in range(min(self.chunk_size,
+                                                                                              len(orphans)))]))
+            else:
+                for domain in orphans:
+                    self.buckets[self.ring.node_for(locality_key(domain))].append(domain)
+
+    def lease(self, worker: str):
+        """Returns the reply to a worker's lease request: a chunk, 'wait' or 'done'."""
+        with self.lock:
+            self._expire_leases()
+            lease = None
+            if len(self.expired) > 0:
+                lease = self.expired.popleft()
+            else:
+                domains = self._take(worker)
+                if len(domains) > 0:
+                    lease = self._new_lease(domains)
+            if lease is None:
+                if self._is_finished():
+                    self.finished.set()
+                    return {'type': "done"}
+                return {'type': "wait", 'seconds': POLL_SECONDS}
+
+            lease.worker = worker
+            lease.expires_at = time.monotonic() + self.lease_seconds
+            self.leases[lease.id] = lease
+            self.counts['leases'] += 1
+            return {'type': "chunk", 'lease': lease.id, 'domains': lease.domains, 'lease_seconds': self.lease_seconds}
+
+    def renew(self, worker: str, lease_id: int):
+        with self.lock:
+            lease = self.leases.get(lease_id)
+            if lease is not None and lease.worker == worker:
+                lease.expires_at = time.monotonic() + self.lease_seconds
+
+    def complete(self, worker: str, lease_id: int, lines: list, stats: dict, aggregate: dict = None):
+        """Records the results of a lease and merges the chunk's 'aggregate' (a FleetAggregate.as_dict()). Returns
+        False (and drops both) if another worker already finished it, or if 'lines' are not one JSON line per domain
+        of the lease, in which case the lease is handed out again."""
+        with self.lock:
+            if stats is not None:
+                self.worker_stats[worker] = stats
+            lease = self.leases.get(lease_id)
+            if lease is None:
+                lease = next((expired for expired in self.expired if expired.id == lease_id), None)
+                if lease is None:
+                    self.counts['duplicate_results'] += 1
+                    return False
+            domains = _result_domains(lines)
+            if domains is None or Counter(domains) != Counter(lease.domains):
+                self.counts['rejected_results'] += 1
+                if lease.id in self.leases:
+                    self._requeue(lease)
+                return False
+            if lease.id in self.leases:
+                del self.leases[lease.id]
+            else:
+                self.expired.remove(lease)
+            for line in lines:
+                self.sink.write(line + "\n")
+            if aggregate is not None:
+                self.aggregate.merge(aggregate)
+            self.counts['completed'] += len(lease.domains)
+            if self._is_finished():
+                self.finished.set()
+            return True
+
+    def _take(self, worker: str):
+        """Private. Takes up to a chunk of domains for 'worker': from its bucket, reading more of the stream into
+        the buckets as needed, or else from the fullest other bucket."""
+        bucket = self.buckets.get(worker)
+        if bucket is None:
+            return []
+        limit = MAX_BUFFERED_CHUNKS * self.chunk_size * len(self.buckets)
+        buffered = sum(len(other) for other in self.buckets.values())
+        while len(bucket) < self.chunk_size and not self.exhausted and buffered < limit:
+            try:
+                domain = next(self.domains)
+            except StopIteration:
+                self.exhausted = True
+                break
+            self.counts['domains_read'] += 1
+            self.buckets[self.ring.node_for(locality_key(domain))].append(domain)
+            buffered += 1
+        if len(bucket) == 0:
+            bucket = max(self.buckets.values(), key=len)
+        return [bucket.popleft() for _ in range(min(self.chunk_size, len(bucket)))]
+
+    def _new_lease(self, domains: list):
+        """Private."""
+        lease = _Lease(self.next_lease_id, domains)
+        self.next_lease_id += 1
+        return lease
+
+    def _requeue(self, lease: _Lease):
+        """Private. Takes a lease away from its worker so it is handed out again."""
+        del self.leases[lease.id]
+        lease.worker = None
+        lease.expires_at = None
+        self.expired.append(lease)
+
+    def _expire_leases(self):
+        """Private. Requeues every lease that has not been renewed in time. Call with the lock held."""
+        now = time.monotonic()
+        for lease in list(self.leases.values()):
+            if lease.expires_at <= now:
+                self._requeue(lease)
+                self.counts['expired_leases'] += 1
+
+    def _rebalance(self):
+        """Private. Moves unleased domains to the bucket of the node now owning them, after the ring changed."""
+        pending = [domain for bucket in self.buckets.values() for domain in bucket]
+        for bucket in self.buckets.values():
+            bucket.clear()
+        for domain in pending:
+            self.buckets[self.ring.node_for(locality_key(domain))].append(domain)
+
+    def _is_finished(self):
+        """Private. True once the stream is read to the end and every domain has been scanned."""
+        return (self.exhausted and len(self.leases) == 0 and len(self.expired) == 0
+                and all(len(bucket) == 0 for bucket in self.buckets.values()))
+
+
+class _CoordinatorServer(socketserver.ThreadingTCPServer):
+    """Private. One thread per connected worker."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    """Private. Serves the messages of one worker connection."""
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        channel = _Channel(self.connection, self.rfile)
+        hello = channel.receive()
+        if hello is None or hello.get('type') != "hello":
+            return
+        if not coordinator.admits(hello.get('token')):
+            channel.send({'type': "refused", 'reason': "wrong or missing token"})
+            return
+        worker = coordinator.join(str(hello.get('worker', "worker")))
+        try:
+            channel.send({'type': "welcome", 'worker': worker})
+            while True:
+                message = channel.receive()
+                if message is None:
+                    return
+                kind = message.get('type')
+                if kind == "lease":
+                    channel.send(coordinator.lease(worker))
+                elif kind == "renew":
+                    coordinator.renew(worker, message['lease'])
+                elif kind == "results":
+                    accepted = coordinator.complete(worker, message['lease'], message['lines'], message.get('stats'),
+                                                    message.get('aggregate'))
+                    channel.send({'type': "ack", 'accepted': accepted})
+                else:
+                    return
+        except (OSError, ValueError, KeyError):  # broken connection or malformed message: drop the worker
+            return
+        finally:
+            coordinator.leave(worker)
+
+
+def _result_domains(lines):
+    """Private. Returns the domain of every result line, or None unless each is a single JSON object with a
+    'domain' (no line breaks, which would add records to the output)."""
+    domains = []
+    for line in lines:
+        if not isinstance(line, str) or "\n" in line or "\r" in line:
+            return None
+        try:
+            result = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(result, dict) or not isinstance(result.get('domain'), str):
+            return None
+        domains.append(result['domain'])
+    return domains
+
+
+class _Channel(object):
+    """Private. JSON lines over a connected socket. send() may be called from several threads."""
+
+    def __init__(self, connection, reader=None):
+        self.connection = connection
+        self.reader = reader if reader is not None else connection.makefile("rb")
+        self.write_lock = threading.Lock()
+
+    def send(self, message: dict):
+        data = (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+        with self.write_lock:
+            self.connection.sendall(data)
+
+    def receive(self):
+        """Returns the next message, or None once the other side closed the connection."""
+        line = self.reader.readline()
+        if len(line) == 0:
+            return None
+        return json.loads(line)
+
+
+class _ListSink(object):
+    """Private. Collects the result lines of one chunk."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text: str):
+        self.lines.append(text.rstrip("\n"))
+
+
+class ScanWorker(object):
+    """Connects to a ScanCoordinator, scans the chunks it leases with one BulkScanner and sends back the result
+    lines, until the coordinator is done. Leases are renewed in the background while a chunk is being scanned.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, address: tuple, token: str, name: str = None, checks: list = None,
+                 concurrency: int = DEFAULT_CONCURRENCY, deadline: float = None, checker=None):
+        self.address = address
+        self.token = token
+        self.name = name if name is not None else f"{socket.gethostname()}-{os.getpid()}"
+        self.scanner = BulkScanner(checks=checks, concurrency=concurrency, checker=checker, deadline=deadline)
+
+    def run(self):
+        """Works until the coordinator says done or goes away. Returns this worker's ScanStats counters."""
+        with socket.create_connection(self.address) as connection:
+            channel = _Channel(connection)
+            channel.send({'type': "hello", 'worker': self.name, 'token': self.token})
+            welcome = channel.receive()
+            if welcome is None:
+                raise ConnectionError("The coordinator closed the connection.")
+            if welcome['type'] == "refused":
+                raise PermissionError(f"The coordinator refused this worker: {welcome.get('reason')}")
+            self.name = welcome['worker']
+            while True:
+                channel.send({'type': "lease"})
+                reply = channel.receive()
+                if reply is None or reply['type'] == "done":
+                    break
+                if reply['type'] == "wait":
+                    time.sleep(reply['seconds'])
+                    continue
+                sink = _ListSink()
+                self.scanner.aggregate = FleetAggregate()  # per chunk: the coordinator keeps only accepted chunks
+                stop_renewing = threading.Event()
+                renewer = threading.Thread(target=_renew_lease, daemon=True,
+                                           args=(channel, reply['lease'], reply['lease_seconds'] / 3, stop_renewing))
+                renewer.start()
+                try:
+                    self.scanner.scan(reply['domains'], sink)
+                finally:
+                    stop_renewing.set()
+                    renewer.join()
+                channel.send({'type': "results", 'lease': reply['lease'], 'lines': sink.lines,
+                              'stats': self.scanner.stats.as_dict(), 'aggregate': self.scanner.aggregate.as_dict()})
+                if channel.receive() is None:
+                    break
+        return self.scanner.stats.as_dict()
+
+
+def _renew_lease(channel: _Channel, lease_id: int, interval: float, stop):
+    """Runs on a thread next to a chunk's scan. Renews the lease every 'interval' seconds until 'stop' is set."""
+    while not stop.wait(interval):
+        try:
+            channel.send({'type': "renew", 'lease': lease_id})
+        except OSError:
+            return
+
+
+def _address(text: str, default_host: str):
+    """Parses 'host:port', ':port' or 'host' into (host, port)."""
+    host, _, port = text.rpartition(":") if ":" in text else (text, "", "")
+    return (host.strip("[]") or default_host), (int(port) if port else DEFAULT_PORT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spread a bulk scan over several machines.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    coordinate = commands.add_parser("coordinate", help="hand out the domain list and collect results")
+    coordinate.add_argument("input", help="file with one domain per line, or '-' for stdin")
+    coordinate.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    coordinate.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_PORT}",
+                            help="host:port to accept workers on (default: 127.0.0.1, this machine only)")
+    coordinate.add_argument("--token", default=os.environ.get(TOKEN_VARIABLE),
+                            help=f"shared token workers must present (default: ${TOKEN_VARIABLE}, or a new one)")
+    coordinate.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="domains per lease")
+    coordinate.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                            help="seconds before an unrenewed lease is handed to another worker")
+    coordinate.add_argument("--summary", help="write the fleet summary of the scan to this JSON file when it finishes")
+    work = commands.add_parser("work", help="scan the chunks leased by a coordinator")
+    work.add_argument("coordinator", help="host:port of the coordinator")
+    work.add_argument("--token", default=os.environ.get(TOKEN_VARIABLE),
+                      help=f"the coordinator's shared token (default: ${TOKEN_VARIABLE})")
+    work.add_argument("--name", help="worker name (default: hostname-pid)")
+    work.add_argument("--checks", default=",".join(CHECKS.keys()), help="comma separated checks to run")
+    work.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="domains in flight at once")
+    work.add_argument("--deadline", type=float, help="seconds each domain gets for all of its checks")
+    args = parser.parse_args(argv)
+
+    if args.command == "work":
+        if args.token is None:
+            parser.error(f"work needs --token or ${TOKEN_VARIABLE}")
+        stats = ScanWorker(_address(args.coordinator, "127.0.0.1"), args.token, name=args.name,
+                           checks=args.checks.split(","), concurrency=args.concurrency, deadline=args.deadline).run()
+    else:
+        sink = sys.stdout if args.output == "-" else open_sink(args.output, "jsonl", append=False)
+        try:
+            coordinator = ScanCoordinator(read_domains(args.input), sink, _address(args.listen, "127.0.0.1"),
+                                          chunk_size=args.chunk_size, lease_seconds=args.lease_seconds,
+                                          token=args.token)
+            if args.token is None:
+                print(f"worker token: {coordinator.token}", file=sys.stderr)
+            stats = coordinator.serve()
+        finally:
+            if sink is not sys.stdout:
+                sink.close()
+        if args.summary is not None:
+            with open(args.summary, "w", encoding="utf-8") as summary:
+                json.dump(coordinator.aggregate.summary(), summary, indent=2)
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+# end
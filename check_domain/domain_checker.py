@@ -1,112 +1,248 @@
 # top level service drivers for domain checking
 from .internet_fetch import *
 from .domain_state import *
+from .query_plan import QueryPlan
+from .deadline import Deadline, DeadlineExceeded
+from .normalize import normalize_domain
+from concurrent.futures import ThreadPoolExecutor
 import json
 
+# check name -> (query plan step producing the formatted response, state class wrapping it)
+CHECKS = {
+    'ns_ipv4_exist': ("ns_ipv4_map", IPV4ExistState),
+    'ns_ipv4_reach': ("ns_ipv4_reach", IPV4ReachState),
+    'ns_ipv6_exist': ("ns_ipv6_map", IPV6ExistState),
+    'ns_ipv6_reach': ("ns_ipv6_reach", IPV6ReachState),
+    'mx_ipv4_exist': ("mx_ipv4_map", IPV4ExistState),
+    'mx_ipv4_reach': ("mx_ipv4_reach", IPV4ReachState),
+    'mx_ipv6_exist': ("mx_ipv6_map", IPV6ExistState),
+    'mx_ipv6_reach': ("mx_ipv6_reach", IPV6ReachState),
+    'dnssec': ("dnssec", DNSSECState),
+    'spf': ("spf", SPFState),
+    'dmarc': ("dmarc", DMARCState),
+    'dkim': ("dkim", DKIMState),
+}
+
 
 class DomainChecker(object):
-    """Pieces together bottom level services to perform customized top level tasks (domain checking)."""
+    """Pieces together bottom level services to perform customized top level tasks (domain checking).
+    Every check takes an optional 'deadline': a Deadline (see deadline.py) or a number of seconds from now. It is
+    passed down to the Resolver, the Reacher and the SPF, DMARC and DKIM evaluators, which never wait past it, so a
+    check returns in time with the parts that ran out of time listed in its state's 'timed_out', or raises
+    DeadlineExceeded if nothing could be answered.
+    See AsyncDomainChecker for the asyncio version."""
 
     # dmarcian = DmarcianClient(BASE_URL, TOKEN)  # singletons for connecting underlying, decoupled code to top level requests
     dns = Resolver()
     hosts = Reacher()
+    spf_evaluator = SPFEvaluator(dns)
+    dmarc_resolver = DMARCResolver(dns)
+    dkim_discovery = DKIMSelectorDiscovery(dns)
+    executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="domain-checker")  # runs query plan steps
+
+    def __init__(self, executor=None):
+        if executor is not None:  # a dedicated executor, ex. sized for a bulk scan
+            self.executor = executor
+
+    def dkim(self, domain: str, selector: str = None, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        selectors = None if selector is None else [selector]  # no selector: discover it from the common ones
+        response = self.dkim_discovery.discover(domain, selectors, deadline=deadline)
+        state = DKIMState(response)
+
+        if as_json is True:
+            dkim = {'dkim': response.get_response()}
+            return json.dumps(dkim)
+
+        return state
+
+    def spf(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.spf_evaluator.inspect_spf(domain, deadline=deadline)
+        state = SPFState(response)
+
+        if as_json is True:
+            spf = {'spf': response.get_response()}
+            return json.dumps(spf)
+
+        return state
 
-    def __init__(self):
-        pass
-
-    # def dkim(self, domain: str, selector: str, as_json=False):
-    #     response = self.dmarcian.inspect_dkim(domain=domain, selector=selector)
-    #     state = DKIMState(response)
-    #
-    #     if as_json is True:
-    #         dkim = {'dkim': response.get_response()}
-    #         return json.dumps(dkim)
-    #
-    #     return state
-    #
-    # def spf(self, domain: str, as_json=False):
-    #     response = self.dmarcian.inspect_spf(domain=domain)
-    #     state = SPFState(response)
-    #
-    #     if as_json is True:
-    #         spf = {'spf': response.get_response()}
-    #         return json.dumps(spf)
-    #
-    #     return state
-    #
-    # def dmarc(self, domain: str, as_json=False):
-    #     response = self.dmarcian.inspect_dmarc(domain=domain)
-    #     state = DMARCState(response)
-    #
-    #     if as_json is True:
-    #         dmarc = {'dmarc': response.get_response()}
-    #         return json.dumps(dmarc)
-    #
-    #     return state
-
-    def dnssec_signatures(self, domain: str, as_json=False):
-        response = self.dns.get_dnssec_sigs(domain=domain)
+    def dmarc(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.dmarc_resolver.inspect_dmarc(domain, deadline=deadline)
+        state = DMARCState(response)
+
+        if as_json is True:
+            dmarc = {'dmarc': response.get_response()}
+            return json.dumps(dmarc)
+
+        return state
+
+    def dnssec_signatures(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.dns.get_dnssec_sigs(domain=domain, deadline=deadline)
         state = DNSSECSignaturesFormattedResponse(response)
 
         return state
 
-    def dnssec_valid(self, domain: str, as_json=False):
-        response = self.dns.dnssec_validate(domain=domain)
+    def dnssec_valid(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.dns.dnssec_validate(domain=domain, deadline=deadline)
         state = DNSSECValidatedState(response)
 
         return state
 
-    def dnssec(self, domain: str, as_json=False):
-        response = self.dns.dnssec_comprehensive(domain=domain)
+    def dnssec(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.dns.dnssec_comprehensive(domain=domain, deadline=deadline)
         state = DNSSECState(response)
 
         return state
 
-    def ns_ipv6_exist(self, domain: str, as_json=False):
-        response = self.dns.get_ipv6_mapping(domain=domain, associated_with="ns")
+    def ns_ipv6_exist(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.dns.get_ipv6_mapping(domain=domain, associated_with="ns", deadline=deadline)
         state = IPV6ExistState(response)
 
         return state
 
-    def ns_ipv6_reach(self, domain: str, as_json=False):
-        dns_host_map = self.dns.get_ipv6_mapping(domain=domain, associated_with="ns")
-        response = self.hosts.reach_dns_hosts(dns_host_map)
+    def ns_ipv6_reach(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        dns_host_map = self.dns.get_ipv6_mapping(domain=domain, associated_with="ns", deadline=deadline)
+        response = self.hosts.reach_dns_hosts(dns_host_map, deadline=deadline)
         state = IPV6ReachState(response)
 
         return state
 
-    def ns_ipv4_exist(self, domain: str, as_json=False):
-        return self.dns.get_ipv4_mapping(domain=domain, associated_with="ns")
+    def ns_ipv4_exist(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.dns.get_ipv4_mapping(domain=domain, associated_with="ns", deadline=deadline)
+        state = IPV4ExistState(response)
 
-    def ns_ipv4_reach(self, domain: str, as_json=False):
-        dns_host_map = self.dns.get_ipv4_mapping(domain=domain, associated_with="ns")
-        response = self.hosts.reach_dns_hosts(dns_host_map)
+        return state
+
+    def ns_ipv4_reach(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        dns_host_map = self.dns.get_ipv4_mapping(domain=domain, associated_with="ns", deadline=deadline)
+        response = self.hosts.reach_dns_hosts(dns_host_map, deadline=deadline)
         state = IPV4ReachState(response)
 
         return state
 
-    def mx_ipv6_exist(self, domain: str, as_json=False):
-        response = self.dns.get_ipv6_mapping(domain=domain, associated_with="mx")
+    def mx_ipv6_exist(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.dns.get_ipv6_mapping(domain=domain, associated_with="mx", deadline=deadline)
         state = IPV6ExistState(response)
 
         return state
 
-    def mx_ipv6_reach(self, domain: str, as_json=False):
-        dns_host_map = self.dns.get_ipv6_mapping(domain=domain, associated_with="mx")
-        response = self.hosts.reach_dns_hosts(dns_host_map)
+    def mx_ipv6_reach(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        dns_host_map = self.dns.get_ipv6_mapping(domain=domain, associated_with="mx", deadline=deadline)
+        response = self.hosts.reach_dns_hosts(dns_host_map, deadline=deadline)
         state = IPV6ReachState(response)
 
         return state
 
-    def mx_ipv4_exist(self, domain: str, as_json=False):
-        return self.dns.get_ipv4_mapping(domain=domain, associated_with="mx")
+    def mx_ipv4_exist(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        response = self.dns.get_ipv4_mapping(domain=domain, associated_with="mx", deadline=deadline)
+        state = IPV4ExistState(response)
+
+        return state
 
-    def mx_ipv4_reach(self, domain: str, as_json=False):
-        dns_host_map = self.dns.get_ipv4_mapping(domain=domain, associated_with="mx")
-        response = self.hosts.reach_dns_hosts(dns_host_map)
+    def mx_ipv4_reach(self, domain: str, as_json=False, deadline=None):
+        deadline = Deadline.coerce(deadline)
+        dns_host_map = self.dns.get_ipv4_mapping(domain=domain, associated_with="mx", deadline=deadline)
+        response = self.hosts.reach_dns_hosts(dns_host_map, deadline=deadline)
         state = IPV4ReachState(response)
 
         return state
 
+    def check_all(self, domain: str, checks: list = None, as_json=False, deadline=None):
+        """Runs several checks on one domain and returns a dict of check name -> state. 'checks' is a list of names
+        from CHECKS and defaults to all of them.
+        The lookups and probes behind the checks are built into a QueryPlan so that shared steps (ex, the NS lookup
+        behind every ns_* check) run once and independent branches run at the same time on the executor.
+        A check whose steps raised maps to the raised exception instead of a state. With a 'deadline' (a Deadline or
+        seconds from now) check_all() returns when it passes: checks that did not finish map to DeadlineExceeded and
+        checks that finished with parts missing have states with a non-empty 'timed_out'.
+        The domain is normalized first (see normalize.py), so every spelling of a name gets the same answers."""
+        deadline = Deadline.coerce(deadline)
+        domain = normalize_domain(domain)
+        if checks is None:
+            checks = list(CHECKS.keys())
+        for check in checks:
+            if check not in CHECKS:
+                raise ValueError(f"Unknown check '{check}'. Choose from: {list(CHECKS.keys())}")
+
+        plan = self._build_plan(domain, deadline)
+        results = plan.run([CHECKS[check][0] for check in checks], self.executor, deadline)
+
+        states = {}
+        for check in checks:
+            step, state_class = CHECKS[check]
+            response = results[step]
+            if isinstance(response, Exception):
+                states[check] = response
+            else:
+                states[check] = state_class(response)
+
+        if as_json is True:
+            return json.dumps({check: (state.formatted_answer.get_response() if not isinstance(state, Exception)
+                                       else _error_json(state))
+                               for check, state in states.items()})
+
+        return states
+
+    def _build_plan(self, domain: str, deadline: Deadline):
+        """Private. Builds the QueryPlan of every lookup and probe a check may need for one domain. The dns lookups
+        and probes get the deadline too, so that steps abandoned by the plan stop soon after it."""
+        plan = QueryPlan()
+        plan.add("ns", lambda: self.dns.get_ns(domain, deadline=deadline))
+        plan.add("mx", lambda: self.dns.get_mx(domain, deadline=deadline))
+
+        def reach(dns_host_map):
+            return self.hosts.reach_dns_hosts(dns_host_map, deadline=deadline)
+
+        for host_type in ("ns", "mx"):
+            plan.add(f"{host_type}_ipv4_map", _bind(self.dns.get_ipv4_mapping, domain, host_type, deadline),
+                     (host_type,))
+            plan.add(f"{host_type}_ipv6_map", _bind(self.dns.get_ipv6_mapping, domain, host_type, deadline),
+                     (host_type,))
+            plan.add(f"{host_type}_ipv4_reach", reach, (f"{host_type}_ipv4_map",))
+            plan.add(f"{host_type}_ipv6_reach", reach, (f"{host_type}_ipv6_map",))
+
+        plan.add("dnssec", lambda: self.dns.dnssec_comprehensive(domain=domain, deadline=deadline))
+        plan.add("spf", lambda: self.spf_evaluator.inspect_spf(domain=domain, deadline=deadline))
+        plan.add("dmarc", lambda: self.dmarc_resolver.inspect_dmarc(domain=domain, deadline=deadline))
+        plan.add("dkim", lambda: self.dkim_discovery.discover(domain=domain, deadline=deadline))
+        return plan
+
+
+def _host_names(formatted_response):
+    """Returns the host names in the answer of a get_ns()/get_mx() response as a list. Empty if there are none."""
+    answer = formatted_response.get_response()['answer']
+    if answer is None:
+        return []
+    return list(answer.values())
+
+
+def _error_json(error: Exception):
+    """The JSON stand-in for a check that raised. Checks that ran out of time are marked 'timed_out'."""
+    if isinstance(error, DeadlineExceeded):
+        return {'error': str(error), 'timed_out': True}
+    return {'error': str(error)}
+
+
+def _bind(mapping_method, domain: str, host_type: str, deadline: Deadline = None):
+    """Returns a query plan step that maps the host names of an already resolved get_ns()/get_mx() response to ip
+    addresses with 'mapping_method'. The mapping expires no later than the host names it was built from."""
+    def step(names_response):
+        response = mapping_method(domain=domain, associated_with=host_type, host_names=_host_names(names_response),
+                                  deadline=deadline)
+        return response.expire_with(names_response)
+    return step
+
 # end
 
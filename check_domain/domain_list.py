@@ -0,0 +1,171 @@
+# domain list files:
+# input lists run to gigabytes, so a scan should neither read them through a single parent process nor hold them in
+# memory. MappedDomainReader memory maps a list and yields the domains of one byte range of it, taking the file in
+# blocks of lines (bytes.split instead of a python loop per character). byte_ranges() cuts a file into ranges that
+# start and end on line boundaries, so the worker processes of a sharded scan each read their own ranges straight
+# from the page cache (see ShardedScanner.scan_file()).
+# Lines are normalized (surrounding white space, case and a trailing root dot removed, unicode names encoded to
+# punycode; see normalize.py) and blank lines and '#' comments skipped. Domains seen before are skipped through a
+# DomainSet: 64 bit hashes of the domains kept in one flat array('Q') open addressing table, 16 to 32 bytes per domain
+# instead of a str object and a set slot.
+# usage: for domain in MappedDomainReader("domains.txt"): ...
+#        for start, end in byte_ranges("domains.txt", 64): MappedDomainReader("domains.txt", start, end)
+
+import array
+import mmap
+import os
+from .normalize import normalize_domain
+
+BLOCK_BYTES = 1 << 20  # bytes of the map taken at a time
+MAX_LOAD = 0.5  # share of a DomainSet table in use before it doubles
+HASH_MASK = (1 << 64) - 1
+
+
+class DomainSet(object):
+    """Compact set of domains. Each domain is kept as its 64 bit str hash in an open addressing table of array('Q');
+    0 marks a free slot. Two different domains share a hash with a probability of about n / 2**64, so a false 'seen
+    before' is not a practical concern. Hashes differ between processes (PYTHONHASHSEED): a set is never shared.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, capacity: int = 1 << 16):
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.table = array.array('Q', [0]) * size
+        self.mask = size - 1
+        self.count = 0
+
+    def add(self, domain: str):
+        """Adds the (normalized) domain. Returns True if it was not in the set yet."""
+        key = hash(domain) & HASH_MASK or 1
+        table, mask = self.table, self.mask
+        slot = key & mask
+        while True:
+            current = table[slot]
+            if current == key:
+                return False
+            if current == 0:
+                break
+            slot = (slot + 1) & mask
+        table[slot] = key
+        self.count += 1
+        if self.count > len(table) * MAX_LOAD:
+            self._grow()
+        return True
+
+    def __contains__(self, domain: str):
+        key = hash(domain) & HASH_MASK or 1
+        table, mask = self.table, self.mask
+        slot = key & mask
+        while table[slot] != 0:
+            if table[slot] == key:
+                return True
+            slot = (slot + 1) & mask
+        return False
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        """Private. Doubles the table and places every hash again."""
+        old = self.table
+        self.table = array.array('Q', [0]) * (2 * len(old))
+        self.mask = len(self.table) - 1
+        table, mask = self.table, self.mask
+        for key in old:
+            if key != 0:
+                slot = key & mask
+                while table[slot] != 0:
+                    slot = (slot + 1) & mask
+                table[slot] = key
+
+
+class MappedDomainReader(object):
+    """Iterates the normalized domains of the byte range [start, end) of a domain list file, which must start on a
+    line boundary (see byte_ranges()). A line that begins before 'end' is read to its end. With 'seen' (a DomainSet,
+    which may be shared by the readers of several ranges) duplicates are skipped and counted in 'duplicates'.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, path: str, start: int = 0, end: int = None, seen: DomainSet = None):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.seen = seen
+        self.duplicates = 0
+
+    def __iter__(self):
+        with open(self.path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = size if self.end is None else min(self.end, size)
+                position = self.start
+                while position < end:
+                    block_end = min(position + BLOCK_BYTES, end)
+                    if block_end < size:  # take the block to the end of its last line
+                        newline = mapped.find(b"\n", block_end - 1)
+                        block_end = size if newline < 0 else newline + 1
+                    for domain in self._domains(mapped[position:block_end]):
+                        yield domain
+                    position = block_end
+
+    def _domains(self, block: bytes):
+        """Private. Yields the new, normalized domains of a block of whole lines."""
+        seen = self.seen
+        for line in block.decode("utf-8").split("\n"):
+            domain = normalize_line(line)
+            if domain is None:
+                continue
+            if seen is not None and not seen.add(domain):
+                self.duplicates += 1
+                continue
+            yield domain
+
+
+def normalize_line(line: str):
+    """Returns the domain of a line of a domain list (stripped, lower case, without a trailing root dot, punycode), or
+    None for a blank or '#' comment line, or a line left empty (a lone '.')."""
+    line = line.strip().lower()
+    if len(line) == 0 or line[0] == "#":
+        return None
+    line = line.rstrip(".")
+    if not line.isascii():
+        line = _to_ascii(line)
+    return line or None
+
+
+def _to_ascii(line: str):
+    """Private. The punycode form of a unicode domain (see normalize.py); a line that cannot be encoded is kept as it
+    is, for its scan to report."""
+    try:
+        return normalize_domain(line)
+    except ValueError:
+        return line
+
+
+def byte_ranges(path: str, parts: int):
+    """Cuts the file at 'path' into at most 'parts' byte ranges [start, end) of about equal size, each starting at
+    the beginning of a line. Returns a list of (start, end)."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    cuts = [0]
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for part in range(1, parts):
+            target = max(size * part // parts, cuts[-1])
+            newline = mapped.find(b"\n", max(target - 1, 0))
+            cut = size if newline < 0 else newline + 1
+            if cut >= size:
+                break
+            if cut > cuts[-1]:
+                cuts.append(cut)
+    cuts.append(size)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+# end
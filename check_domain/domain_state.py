@@ -9,13 +9,51 @@ from .formatted_response import *
 class BaseState(object):
     """Parent to all state objects. Contains core data structures and variables common to all states,
     like time stamping, the original response, and the domain that was queried. In summary, it provides the context for
-    any query on/to a domain, host, or Dmarcian API. All states inherit this state."""
+    any query on/to a domain, host, or Dmarcian API. All states inherit this state.
+    A state built from dns records expires with the first of those records ('expires_at', utc). Until then is_fresh()
+    is True and the state can be reused instead of running its check again.
+    A state built under a deadline may be partial: 'timed_out' lists the parts of its answer that ran out of time."""
+
+    __slots__ = ('formatted_answer', 'domain', 'state_timestamp')
 
     def __init__(self, formatted_answer):
         self.formatted_answer = formatted_answer
         self.domain = self.formatted_answer.get('domain')
         self.state_timestamp = datetime.utcnow()
 
+    @property
+    def expires_at(self):
+        expires_at = getattr(self.formatted_answer, 'expires_at', None)
+        return None if expires_at is None else datetime.utcfromtimestamp(expires_at)
+
+    @property
+    def timed_out(self):
+        return list(getattr(self.formatted_answer, 'timed_out', None) or [])
+
+    def is_fresh(self, now: datetime = None):
+        """True while none of the dns records behind the state has expired. A state whose answer carries no ttls
+        (ex, reachability probes or Dmarcian answers) is never fresh."""
+        expires_at = self.expires_at
+        if expires_at is None:
+            return False
+        return (datetime.utcnow() if now is None else now) < expires_at
+
+    def is_partial(self):
+        """True if part of the answer is missing because the deadline of the check passed."""
+        return len(getattr(self.formatted_answer, 'timed_out', None) or ()) > 0
+
+    def to_dict(self):
+        """Returns the state as a plain dict for serializing: the state and response types, domain, time stamps and raw
+        answer."""
+        answer = self.formatted_answer
+        if isinstance(answer, FormattedResponse):
+            answer = answer.get_response()
+        expires_at = self.expires_at
+        return {'state': type(self).__name__, 'response': type(self.formatted_answer).__name__, 'domain': self.domain,
+                'state_timestamp': self.state_timestamp.isoformat(),
+                'expires_at': None if expires_at is None else expires_at.isoformat(),
+                'timed_out': self.timed_out, 'answer': answer}
+
 
 class DomainAuthenticityState(BaseState):
     """Accepts any of the MailAntiphishingFormattedResponse type responses: DMARCInspectorFormattedResponse,
@@ -25,6 +63,8 @@ class DomainAuthenticityState(BaseState):
     Parent to: SPFState, DKIMState, & DMARCState.
     Sibling to: DNSHostGroupState, DNSSECSignaturesState, DNSSECValidatedState"""
 
+    __slots__ = ('records', 'records_count', 'valid', 'errors')
+
     def __init__(self, formatted_answer: DomainAuthenticityFormattedResponse or DmarcianFormattedResponse):
         if not isinstance(formatted_answer, DomainAuthenticityFormattedResponse) \
                 and not isinstance(formatted_answer, DmarcianFormattedResponse):
@@ -49,6 +89,8 @@ class DNSHostGroupState(BaseState):
     Parent to: IPV6ExistState, IPV6ReachState, IPV4ExistState, IPV4ReachState.
     Sibling to: DomainAuthenticityState, DNSSECSignaturesState, DNSSECValidatedState"""
 
+    __slots__ = ('host_type', 'report', '_views')
+
     def __init__(self, formatted_answer):
         # if not isinstance(formatted_answer, DNSHostMappingFormattedResponse) and not \
         #         isinstance(formatted_answer, HostFormattedResponse):
@@ -57,6 +99,37 @@ class DNSHostGroupState(BaseState):
         BaseState.__init__(self, formatted_answer)
         self.host_type = self.formatted_answer['rr_types'][0]
         self.report = None
+        self._views = None  # derived views of the answer, built on first use (see _elements() & _reach_views())
+
+    def _elements(self):
+        """Private helper to the exist states. Splits the answer into (present, missing) host dicts in one pass, on
+        first use. Either is None when it would be empty, both are None when there is no answer."""
+        if self._views is None:
+            answer = self.formatted_answer['answer']
+            if answer is None:
+                self._views = (None, None)
+            else:
+                present, missing = {}, {}
+                for host, address in answer.items():
+                    if address is not None:
+                        present[host] = address
+                    else:
+                        missing[host] = address
+                self._views = (present or None, missing or None)
+        return self._views
+
+    def _reach_views(self):
+        """Private helper to the reach states. Builds the reach_test() answers of both require_connect variants
+        in one pass over the hosts, on first use. Returns (reached by ping or connect, reached by connect)."""
+        if self._views is None:
+            by_either = {'reached': {}, 'unreached': {}}
+            by_connect = {'reached': {}, 'unreached': {}}
+            for host, result in (self.formatted_answer['hosts'] or {}).items():
+                can_connect = result['can_connect']
+                by_either['reached' if can_connect or result['pingable'] else 'unreached'][host] = result
+                by_connect['reached' if can_connect else 'unreached'][host] = result
+            self._views = (by_either, by_connect)
+        return self._views
 
 
 class IPV6ExistState(DNSHostGroupState):
@@ -67,20 +140,30 @@ class IPV6ExistState(DNSHostGroupState):
     Parent to: None.
     Sibling to: IPV4ExistState, IPV4ReachState, IPV6ReachState"""
 
+    __slots__ = ()
+
     def __init__(self, dns_formatted_answer: DNSHostMappingFormattedResponse):
         if not isinstance(dns_formatted_answer, DNSHostMappingFormattedResponse):
             raise TypeError("IPV6ExistState requires DNSHostMappingFormattedResponse "
                             "from reach_dns_hosts() method in Resolver class.")
         DNSHostGroupState.__init__(self, dns_formatted_answer)
-        if dns_formatted_answer.get_response()['rr_types'][1] != "aaaa":
+        if dns_formatted_answer['rr_types'][1] != "aaaa":
             raise ValueError(f"dns answer does not indicate ipv6 ('aaaa') according to the given rr_types: "
-                             f"{dns_formatted_answer.get_response()['rr_types']}")
-        self.elements_present = self._load_elements_present()
-        self.elements_missing = self._load_elements_missing()
+                             f"{dns_formatted_answer['rr_types']}")
 
     def __repr__(self):
         return f"<IPV6ExistsState: {self.domain}, {self.formatted_answer['rr_types']}>"
 
+    @property
+    def elements_present(self):
+        """Host name -> address of the hosts with an address, or None. Built on first use."""
+        return self._elements()[0]
+
+    @property
+    def elements_missing(self):
+        """Host name -> None for the hosts without an address, or None. Built on first use."""
+        return self._elements()[1]
+
     def with_ipv6(self):
         return self.elements_present
 
@@ -90,31 +173,6 @@ class IPV6ExistState(DNSHostGroupState):
     def all_elements(self):
         return self.formatted_answer['answer']
 
-    def _load_elements_present(self):
-        passed_dict = {}
-        keys = list(self.formatted_answer['answer'].keys())
-
-        for key in keys:
-            if self.formatted_answer['answer'][key] is not None:
-                passed_dict[key] = self.formatted_answer['answer'][key]
-
-        if len(passed_dict) == 0:
-            return None
-
-        return passed_dict
-
-    def _load_elements_missing(self):
-        failed_dict = {}
-        keys = list(self.formatted_answer['answer'].keys())
-
-        for key in keys:
-            if self.formatted_answer['answer'][key] is None:
-                failed_dict[key] = self.formatted_answer['answer'][key]
-
-        if len(failed_dict) == 0:
-            return None
-
-        return failed_dict
 
 
 class IPV4ExistState(DNSHostGroupState):
@@ -127,6 +185,8 @@ class IPV4ExistState(DNSHostGroupState):
     Parent to: None.
     Sibling to: IPV6ExistState, IPV4ReachState, IPV6ReachState"""
 
+    __slots__ = ()
+
     def __init__(self, formatted_answer):
         # if not isinstance(formatted_answer, DNSHostMappingFormattedResponse):
         #     raise TypeError("IPV4ExistState requires DNSHostMappingFormattedResponse "
@@ -135,12 +195,20 @@ class IPV4ExistState(DNSHostGroupState):
         if formatted_answer['rr_types'][1] != "a":
             raise ValueError(f"dns answer does not indicate ipv4 ('a') according to the given rr_types: "
                              f"{formatted_answer['rr_types']}")
-        self.elements_present = self._load_elements_present()
-        self.elements_missing = self._load_elements_missing()
 
     def __repr__(self):
         return f"<IPV4ExistsState: {self.domain}, {self.formatted_answer['rr_types']}>"
 
+    @property
+    def elements_present(self):
+        """Host name -> address of the hosts with an address, or None. Built on first use."""
+        return self._elements()[0]
+
+    @property
+    def elements_missing(self):
+        """Host name -> None for the hosts without an address, or None. Built on first use."""
+        return self._elements()[1]
+
     def with_ipv4(self):
         return self.elements_present
 
@@ -150,36 +218,6 @@ class IPV4ExistState(DNSHostGroupState):
     def all_elements(self):
         return self.formatted_answer['answer']
 
-    def _load_elements_present(self):
-        passed_dict = {}
-        if self.formatted_answer['answer'] is None:
-            return None
-        keys = list(self.formatted_answer['answer'].keys())
-
-        for key in keys:
-            if self.formatted_answer['answer'][key] is not None:
-                passed_dict[key] = self.formatted_answer['answer'][key]
-
-        if len(passed_dict) == 0:
-            return None
-
-        return passed_dict
-
-    def _load_elements_missing(self):
-        failed_dict = {}
-        if self.formatted_answer['answer'] is None:
-            return None
-
-        keys = list(self.formatted_answer['answer'].keys())
-
-        for key in keys:
-            if self.formatted_answer['answer'][key] is None:
-                failed_dict[key] = self.formatted_answer['answer'][key]
-
-        if len(failed_dict) == 0:
-            return None
-
-        return failed_dict
 
 
 class IPV6ReachState(DNSHostGroupState):
@@ -191,39 +229,24 @@ class IPV6ReachState(DNSHostGroupState):
     Parent to: None.
     Sibling to: IPV6ExistState, IPV4ExistState, IPV4ReachState"""
 
+    __slots__ = ()
+
     def __init__(self, dnshosts_formatted_response: HostFormattedResponse):
         if not isinstance(dnshosts_formatted_response, HostFormattedResponse):
             raise TypeError("IPV6ReachState requires HostFormattedResponse "
                             "from reach_dns_hosts() method in Reacher class.")
         DNSHostGroupState.__init__(self, dnshosts_formatted_response)
-        if dnshosts_formatted_response.get_response()['rr_types'][1] != "aaaa":
+        if dnshosts_formatted_response['rr_types'][1] != "aaaa":
             raise ValueError(f"dns answer does not indicate ipv6 ('aaaa') according to the given rr_types: "
-                             f"{dnshosts_formatted_response.get_response()['rr_types']}")
+                             f"{dnshosts_formatted_response['rr_types']}")
 
     def __repr__(self):
         return f"<IPV6ReachState: {self.domain}, {self.formatted_answer['rr_types']}>"
 
     def reach_test(self, require_connect=False):
-        hosts_keys = list(self.formatted_answer['hosts'].keys())
-        reached = {}
-        unreached = {}
-
-        for host in hosts_keys:
-            pingable = self.formatted_answer['hosts'][host]['pingable']
-            can_connect = self.formatted_answer['hosts'][host]['can_connect']
-
-            if require_connect:
-                if can_connect:
-                    reached[host] = self.formatted_answer['hosts'][host]
-                else:
-                    unreached[host] = self.formatted_answer['hosts'][host]
-            else:
-                if can_connect or pingable:
-                    reached[host] = self.formatted_answer['hosts'][host]
-                else:
-                    unreached[host] = self.formatted_answer['hosts'][host]
-
-        return {'reached': reached, 'unreached': unreached}
+        """Splits the hosts into 'reached' and 'unreached'. A host is reached if it answered a ping or accepted a
+        connection, or only by a connection with 'require_connect'. Built on first call and shared by later calls."""
+        return self._reach_views()[1 if require_connect else 0]
 
 
 class IPV4ReachState(DNSHostGroupState):
@@ -235,42 +258,28 @@ class IPV4ReachState(DNSHostGroupState):
         Parent to: None.
         Sibling to: IPV6ExistState, IPV4ExistState, IPV6ReachState"""
 
+    __slots__ = ()
+
     def __init__(self, dnshosts_formatted_response: HostFormattedResponse):
         if not isinstance(dnshosts_formatted_response, HostFormattedResponse):
             raise TypeError("IPV4ReachState requires HostFormattedResponse "
                             "from reach_dns_hosts() method in Reacher class.")
         DNSHostGroupState.__init__(self, dnshosts_formatted_response)
-        if dnshosts_formatted_response.get_response()['rr_types'][1] != "a":
+        if dnshosts_formatted_response['rr_types'][1] != "a":
             raise ValueError(f"dns answer does not indicate ipv4 ('a') according to the given rr_types: "
-                             f"{dnshosts_formatted_response.get_response()['rr_types']}")
+                             f"{dnshosts_formatted_response['rr_types']}")
 
     def __repr__(self):
         return f"<IPV4ReachState: {self.domain}, {self.formatted_answer['rr_types']}>"
 
     def reach_test(self, require_connect=False):
-        hosts_keys = list(self.formatted_answer['hosts'].keys())
-        reached = {}
-        unreached = {}
-
-        for host in hosts_keys:
-            pingable = self.formatted_answer['hosts'][host]['pingable']
-            can_connect = self.formatted_answer['hosts'][host]['can_connect']
-
-            if require_connect:
-                if can_connect:
-                    reached[host] = self.formatted_answer['hosts'][host]
-                else:
-                    unreached[host] = self.formatted_answer['hosts'][host]
-            else:
-                if can_connect or pingable:
-                    reached[host] = self.formatted_answer['hosts'][host]
-                else:
-                    unreached[host] = self.formatted_answer['hosts'][host]
-
-        return {'reached': reached, 'unreached': unreached}
+        """Splits the hosts into 'reached' and 'unreached'. A host is reached if it answered a ping or accepted a
+        connection, or only by a connection with 'require_connect'. Built on first call and shared by later calls."""
+        return self._reach_views()[1 if require_connect else 0]
 
 
 class DNSSECState(DomainAuthenticityState):
+    __slots__ = ()
 
     def __init__(self, formatted_response: DNSSECFormattedResponse):
         if not isinstance(formatted_response, DNSSECFormattedResponse):
@@ -279,10 +288,11 @@ class DNSSECState(DomainAuthenticityState):
         super(DNSSECState, self).__init__(formatted_response)
         self.valid = False
 
-        ips = list(formatted_response.get_response()['answer']['validation'].keys())
+        validation = formatted_response.get_response()['answer']['validation']
+        ips = list(validation.keys())
 
         for ip in ips:
-            if formatted_response.get_response()['answer']['validation'][ip] != "secure":
+            if validation[ip] != "secure":
                 self.valid = False
                 break
             self.valid = True
@@ -296,6 +306,8 @@ class DNSSECSignaturesState(DomainAuthenticityState):
     Parent to: None.
     Sibling to: DNSSECValidatedState"""
 
+    __slots__ = ('soa', 'dnskey', 'rrsig', 'nsec', 'ds')
+
     def __init__(self, dnssec_resolver_answer: DNSSECSignaturesFormattedResponse):
         if not isinstance(dnssec_resolver_answer, DNSSECSignaturesFormattedResponse):
             raise TypeError("DNSSECSignaturesState requires DNSSECSignaturesFormattedResponse "
@@ -333,6 +345,8 @@ class DNSSECValidatedState(DomainAuthenticityState):
         Parent to: None.
         Sibling to: DNSSECSignaturesState."""
 
+    __slots__ = ('secure', 'chain_of_trust_unbroken')
+
     def __init__(self, dnssec_resolver_answer: DNSSECValidatedFormattedResponse):
 
         """[BLANK]State requires [BLANK]FormattedResponse from [BLANK]() method in [BLANK] class.."""
@@ -342,7 +356,10 @@ class DNSSECValidatedState(DomainAuthenticityState):
         super(DNSSECValidatedState, self).__init__(dnssec_resolver_answer)
         self.secure = self._load_secure()
         self.chain_of_trust_unbroken = self._load_chain_of_trust_unbroken()
-        self.details = self.formatted_answer['answer']
+
+    @property
+    def details(self):
+        return self.formatted_answer['answer']
 
     def _load_chain_of_trust_unbroken(self):
         ip_keys = list(self.formatted_answer['answer'].keys())
@@ -374,32 +391,44 @@ class DNSSECValidatedState(DomainAuthenticityState):
 
 
 class DMARCState(DomainAuthenticityState):
-    """Accepts a DMARCInspectorFormattedResponse obtained from inspect_dmarc() in DmarcianClient class & throws a
-    TypeError exception otherwise.
+    """Accepts a DMARCInspectorFormattedResponse obtained from inspect_dmarc() in DmarcianClient class or a
+    DMARCFormattedResponse obtained from inspect_dmarc() in DMARCResolver class & throws a TypeError exception
+    otherwise.
     Inherits from: DomainAuthenticityState -> BaseState.
     Parent to: None.
     Sibling to: DKIMState, SPFState"""
 
-    def __init__(self, formatted_answer: DMARCInspectorFormattedResponse):
-        if not isinstance(formatted_answer, DMARCInspectorFormattedResponse):
+    __slots__ = ('dns_query', 'policy')
+
+    def __init__(self, formatted_answer: DMARCInspectorFormattedResponse or DMARCFormattedResponse):
+        if not isinstance(formatted_answer, DMARCInspectorFormattedResponse) \
+                and not isinstance(formatted_answer, DMARCFormattedResponse):
             raise TypeError("DMARCState requires DMARCInspectorFormattedResponse from inspect_dmarc() in "
-                            "DmarcianClient.")
+                            "DmarcianClient or DMARCFormattedResponse from inspect_dmarc() in DMARCResolver.")
         super(DMARCState, self).__init__(formatted_answer)
         self.valid = self.formatted_answer.get('valid')
         self.dns_query = self.formatted_answer.get('dns_query')
+        self.policy = None
+        if isinstance(formatted_answer, DMARCFormattedResponse) and self.formatted_answer.get('answer') is not None:
+            self.policy = self.formatted_answer.get('answer')['policy']
 
 
 class DKIMState(DomainAuthenticityState):
-    """Accepts a DKIMInspectorFormattedResponse obtained from inspect_dkim() in DmarcianClient class & throws a
-        TypeError exception otherwise.
+    """Accepts a DKIMInspectorFormattedResponse obtained from inspect_dkim() in DmarcianClient class or a
+        DKIMFormattedResponse obtained from discover() in DKIMSelectorDiscovery class & throws a TypeError exception
+        otherwise.
         Inherits from: DomainAuthenticityState -> BaseState.
         Parent to: None.
         Sibling to: DMARCState, SPFState"""
 
-    def __init__(self, formatted_answer: DKIMInspectorFormattedResponse):
+    __slots__ = ('selector', 'query')
 
-        if not isinstance(formatted_answer, DKIMInspectorFormattedResponse):
-            raise TypeError("DKIMState requires DKIMInspectorFormattedResponse from inspect_dkim() in DmarcianClient.")
+    def __init__(self, formatted_answer: DKIMInspectorFormattedResponse or DKIMFormattedResponse):
+
+        if not isinstance(formatted_answer, DKIMInspectorFormattedResponse) \
+                and not isinstance(formatted_answer, DKIMFormattedResponse):
+            raise TypeError("DKIMState requires DKIMInspectorFormattedResponse from inspect_dkim() in DmarcianClient "
+                            "or DKIMFormattedResponse from discover() in DKIMSelectorDiscovery.")
 
         super(DKIMState, self).__init__(formatted_answer)
         self.selector = self.formatted_answer.get('selector')
@@ -408,17 +437,21 @@ class DKIMState(DomainAuthenticityState):
 
 
 class SPFState(DomainAuthenticityState):
-    """Accepts a SPFInspectorFormattedResponse obtained from inspect_dmarc() in DmarcianClient class & throws a
-        TypeError exception otherwise.
+    """Accepts a SPFInspectorFormattedResponse obtained from inspect_spf() in DmarcianClient class or a
+        SPFFormattedResponse obtained from inspect_spf() in SPFEvaluator class & throws a TypeError exception otherwise.
         Inherits from: DomainAuthenticityState -> BaseState.
         Parent to: None.
         Sibling to: DKIMState, DMARCState"""
 
-    def __init__(self, formatted_answer: SPFInspectorFormattedResponse):
-        if not isinstance(formatted_answer, SPFInspectorFormattedResponse):
-            raise TypeError("SPFState requires SPFInspectorFormattedResponse from inspect_spf() in DmarcianClient.")
+    __slots__ = ('display_domain', 'lookup_count')
+
+    def __init__(self, formatted_answer: SPFInspectorFormattedResponse or SPFFormattedResponse):
+        if not isinstance(formatted_answer, SPFInspectorFormattedResponse) \
+                and not isinstance(formatted_answer, SPFFormattedResponse):
+            raise TypeError("SPFState requires SPFInspectorFormattedResponse from inspect_spf() in DmarcianClient "
+                            "or SPFFormattedResponse from inspect_spf() in SPFEvaluator.")
         super(SPFState, self).__init__(formatted_answer)
         self.display_domain = self.formatted_answer.get('display_domain')
-        self.valid = None
+        self.lookup_count = self.formatted_answer.get('lookup_count')
 
 # end
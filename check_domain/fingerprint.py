@@ -0,0 +1,61 @@
+# content fingerprints of formatted answers:
+# two answers with the same content get the same fingerprint, so a changed state can be detected by comparing
+# fingerprints instead of whole answers. Time stamps live on the states, not in the answers, and are never hashed.
+# Answers are normalized first: the order of records is not content (resolvers rotate round robin rrsets), so lists
+# and index keyed dictionaries ({0: ip, 1: ip}) are hashed as sorted collections. An answer read back from a JSON
+# result line (int keys turned to strings, tuples to lists, bytes to hex) gets the fingerprint it had when live.
+
+import hashlib
+import json
+from collections.abc import Mapping
+from datetime import datetime
+
+
+def answer_fingerprint(answer):
+    """Accepts a formatted answer (a FormattedResponse, its raw dict or the answer of a JSON result line). Returns a
+    hex digest of its normalized content."""
+    if hasattr(answer, "get_response"):
+        answer = answer.get_response()
+    canonical = _canonical(normalize_answer(answer))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def state_fingerprint(state):
+    """Accepts a state. Returns the fingerprint of the formatted answer it holds."""
+    return answer_fingerprint(state.formatted_answer)
+
+
+def normalize_answer(answer):
+    """Returns 'answer' as plain JSON values with its records in a canonical order: lists and dictionaries keyed by
+    record index are turned into lists sorted by content. Other dictionaries keep their keys. 'rr_types' keeps its
+    order: it tells what the answer holds."""
+    if isinstance(answer, Mapping):
+        if len(answer) > 0 and all(_is_index(key) for key in answer):
+            return _sorted_values(answer.values())
+        return {str(key): (list(value) if key == 'rr_types' and value is not None else normalize_answer(value))
+                for key, value in answer.items()}
+    if isinstance(answer, (list, tuple, set)):
+        return _sorted_values(answer)
+    if isinstance(answer, (bytes, bytearray)):
+        return answer.hex()
+    if isinstance(answer, datetime):
+        return answer.isoformat()
+    if answer is None or isinstance(answer, (str, int, float, bool)):
+        return answer
+    return str(answer)
+
+
+def _sorted_values(values):
+    normalized = [normalize_answer(value) for value in values]
+    pairs = ((_canonical(value), value) for value in normalized)
+    return [value for _, value in sorted(pairs, key=lambda pair: pair[0])]
+
+
+def _is_index(key):
+    return (isinstance(key, int) and not isinstance(key, bool)) or (isinstance(key, str) and key.isdigit())
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+# end
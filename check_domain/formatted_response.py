@@ -6,16 +6,60 @@
 
 # The alternative response for any method here should be JSON.
 
+# Responses built from dns lookups also carry the ttls of the records behind their answer and the time the first of
+# those records expires ('expires_at'). Neither is part of the raw dictionary, so the JSON responses are unchanged.
+# A response assembled under a deadline (see deadline.py) lists the parts that ran out of time in 'timed_out'.
+
+# Formatted responses and their answers are kept by the million in bulk scans, so every class here is slotted, and the
+# Resolver and Reacher wrap host mappings, reach results and DNSSEC results in compact answers (see the bottom of this
+# file): read-only mappings over tuples that build the familiar nested dictionaries only when they are asked for.
+# Their rr_types, like those of the Resolver's other answers, are shared tuples (see interning.py).
+
+import time
+from collections.abc import Mapping
+from .interning import intern_rr_types, intern_verdict
+
 
 # generic
 class FormattedResponse(object):
+    __slots__ = ('response', 'ttls', 'expires_at', 'timed_out')
 
     def __init__(self, dns_response):
         self.response = dns_response
+        self.ttls = None  # answer key -> ttl in seconds of the record behind it
+        self.expires_at = None  # epoch seconds at which the first record behind the answer expires
+        self.timed_out = ()  # parts of the answer left unfinished when the deadline passed (host names, rr types)
+
+    def set_ttls(self, ttls: dict, fetched_at: float = None):
+        """Records the ttls of the answer's records and sets 'expires_at' from the shortest one. Returns self."""
+        self.ttls = ttls
+        if ttls:
+            fetched_at = time.time() if fetched_at is None else fetched_at
+            self.expires_at = fetched_at + min(ttls.values())
+        return self
+
+    def expire_with(self, *responses):
+        """Brings 'expires_at' forward to the earliest expiry of the responses this answer was built from.
+        Returns self."""
+        for response in responses:
+            expires_at = getattr(response, "expires_at", None)
+            if expires_at is not None and (self.expires_at is None or expires_at < self.expires_at):
+                self.expires_at = expires_at
+        return self
 
     def get_response(self):
+        """Returns the raw answer. A compact answer is expanded into a new dictionary on every call."""
+        if isinstance(self.response, CompactAnswer):
+            return self.response.as_dict()
         return self.response
 
+    def get(self, key, default=None):
+        """Dictionary style access to the underlying response so states can read fields off of any FR."""
+        return self.response.get(key, default)
+
+    def __getitem__(self, key):
+        return self.response[key]
+
 
 # pure dns responses
 class DNSFormattedResponse(FormattedResponse):
@@ -26,6 +70,7 @@ class DNSFormattedResponse(FormattedResponse):
     Parent to: DNSSECFormattedResponse, DNSSECSignaturesFormattedResponse, DNSSECValidatedFormatteResponse.
     Sibling to: None.
     """
+    __slots__ = ()
 
     def __init__(self, formatted_response: dict):
         super(DNSFormattedResponse, self).__init__(formatted_response)
@@ -38,6 +83,7 @@ class DNSHostMappingFormattedResponse(DNSFormattedResponse):
     Parent to: None.
     Sibling to: DNSSECFormattedResponse
     """
+    __slots__ = ()
 
     def __init__(self, dns_host_mapping_response):
         super(DNSHostMappingFormattedResponse, self).__init__(dns_host_mapping_response)
@@ -46,6 +92,7 @@ class DNSHostMappingFormattedResponse(DNSFormattedResponse):
 # host responses
 class HostFormattedResponse(FormattedResponse):
     """Wrapper to encapsulate host response. This response comes from reach_dns_hosts() in Reacher class."""
+    __slots__ = ()
 
     def __init__(self, host_formatted_response: dict):
         super(HostFormattedResponse, self).__init__(host_formatted_response)
@@ -53,12 +100,14 @@ class HostFormattedResponse(FormattedResponse):
 
 # domain authenticity responses
 class DomainAuthenticityFormattedResponse(DNSFormattedResponse):
+    __slots__ = ()
 
     def __init__(self, formatted_response):
         super(DomainAuthenticityFormattedResponse, self).__init__(formatted_response)
 
 
 class DmarcianFormattedResponse(FormattedResponse):
+    __slots__ = ()
 
     def __init__(self, formatted_response: dict):
         super(DmarcianFormattedResponse, self).__init__(formatted_response)
@@ -71,29 +120,75 @@ class DNSSECFormattedResponse(DomainAuthenticityFormattedResponse):
     Parent to: DNSSECSignaturesFormattedResponse, DNSSECValidatedFormattedResponse.
     Sibling to: DNSHostMappingFormattedResponse.
     """
+    __slots__ = ()
 
     def __init__(self, dnssec_response):
         super(DNSSECFormattedResponse, self).__init__(dnssec_response)
 
 
 class DMARCInspectorFormattedResponse(DmarcianFormattedResponse):
+    __slots__ = ()
 
     def __init__(self, formatted_response: dict):
         super(DMARCInspectorFormattedResponse, self).__init__(formatted_response)
 
 
 class DKIMInspectorFormattedResponse(DmarcianFormattedResponse):
+    __slots__ = ()
 
     def __init__(self, formatted_response: dict):
         super(DKIMInspectorFormattedResponse, self).__init__(formatted_response)
 
 
 class SPFInspectorFormattedResponse(DmarcianFormattedResponse):
+    __slots__ = ()
 
     def __init__(self, formatted_response: dict):
         super(SPFInspectorFormattedResponse, self).__init__(formatted_response)
 
 
+class SPFFormattedResponse(DomainAuthenticityFormattedResponse):
+    """
+    A wrapper class for an SPF record evaluated locally from dns TXT records. Used in inspect_spf() in SPFEvaluator
+    class. Holds the expanded include/redirect tree in the 'answer'.
+    Inherits from: DomainAuthenticityFormattedResponse -> DNSFormattedResponse
+    Parent to: None.
+    Sibling to: DNSSECFormattedResponse.
+    """
+    __slots__ = ()
+
+    def __init__(self, formatted_response: dict):
+        super(SPFFormattedResponse, self).__init__(formatted_response)
+
+
+class DMARCFormattedResponse(DomainAuthenticityFormattedResponse):
+    """
+    A wrapper class for a DMARC record looked up locally from dns TXT records. Used in inspect_dmarc() in
+    DMARCResolver class.
+    Inherits from: DomainAuthenticityFormattedResponse -> DNSFormattedResponse
+    Parent to: None.
+    Sibling to: DNSSECFormattedResponse, SPFFormattedResponse.
+    """
+    __slots__ = ()
+
+    def __init__(self, formatted_response: dict):
+        super(DMARCFormattedResponse, self).__init__(formatted_response)
+
+
+class DKIMFormattedResponse(DomainAuthenticityFormattedResponse):
+    """
+    A wrapper class for DKIM keys found by probing selectors in dns TXT records. Used in discover() in
+    DKIMSelectorDiscovery class.
+    Inherits from: DomainAuthenticityFormattedResponse -> DNSFormattedResponse
+    Parent to: None.
+    Sibling to: DNSSECFormattedResponse, SPFFormattedResponse, DMARCFormattedResponse.
+    """
+    __slots__ = ()
+
+    def __init__(self, formatted_response: dict):
+        super(DKIMFormattedResponse, self).__init__(formatted_response)
+
+
 class DNSSECSignaturesFormattedResponse(DNSSECFormattedResponse):
     """
     A wrapper class for a DNSSEC Signature answers from dns. Used in get_all_dnssec() in Resolver class.
@@ -101,6 +196,7 @@ class DNSSECSignaturesFormattedResponse(DNSSECFormattedResponse):
     Parent to: None.
     Sibling to: DNSSECValidatedFormattedResponse.
     """
+    __slots__ = ()
 
     def __init__(self, dnssec_sigs):
         super(DNSSECSignaturesFormattedResponse, self).__init__(dnssec_sigs)
@@ -113,6 +209,138 @@ class DNSSECValidatedFormattedResponse(DNSSECFormattedResponse):
     Parent to: None.
     Sibling to: DNSSECSignaturesFormattedResponse.
     """
+    __slots__ = ()
 
     def __init__(self, dnssec_validation):
         super(DNSSECValidatedFormattedResponse, self).__init__(dnssec_validation)
+
+
+# compact answers
+class CompactAnswer(Mapping):
+    """Parent to the compact answers: read-only mappings with the keys of a formatted answer that hold its content in
+    tuples instead of nested dictionaries. Values that are dictionaries in the formatted answer are built when they
+    are read and as_dict() builds the whole answer. Nothing that is built is kept: changing it changes nothing here.
+    Inherits from: Mapping.
+    Parent to: HostMappingAnswer, HostReachAnswer, DNSSECValidationAnswer, DNSSECSignaturesAnswer, DNSSECAnswer.
+    Sibling to: None."""
+    __slots__ = ()
+    answer_keys = ()  # the keys of the formatted answer, in order
+
+    def __getitem__(self, key):
+        if key not in self.answer_keys:
+            raise KeyError(key)
+        return getattr(self, "_" + key)()
+
+    def __iter__(self):
+        return iter(self.answer_keys)
+
+    def __len__(self):
+        return len(self.answer_keys)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+    def as_dict(self):
+        return {key: self[key] for key in self.answer_keys}
+
+    def _domain(self):
+        return self.domain
+
+    def _rr_types(self):
+        return self.rr_types
+
+
+class HostMappingAnswer(CompactAnswer):
+    """The answer of get_ipv4_mapping()/get_ipv6_mapping() in Resolver class: the host names and their address (or
+    None) in two parallel tuples. 'names' is None when there are no hosts. As a formatted answer:
+    {'domain': ..., 'rr_types': [host type, 'a' or 'aaaa'], 'answer': {host name: address or None} or None}"""
+    __slots__ = ('domain', 'rr_types', 'names', 'addresses')
+    answer_keys = ('domain', 'rr_types', 'answer')
+
+    def __init__(self, domain: str, rr_types, names, addresses):
+        self.domain = domain
+        self.rr_types = intern_rr_types(rr_types)
+        self.names = None if names is None else tuple(names)
+        self.addresses = None if addresses is None else tuple(addresses)
+
+    def _answer(self):
+        if self.names is None:
+            return None
+        return dict(zip(self.names, self.addresses))
+
+
+class HostReachAnswer(CompactAnswer):
+    """The answer of reach_dns_hosts() in Reacher class: the host names and, in the same order, a
+    (pingable, ip, ports_succeeded, can_connect) tuple per host. 'names' is None when there were no hosts to reach.
+    As a formatted answer: {'domain': ..., 'rr_types': [...], 'hosts': {host name: {'pingable': ..., 'ip': ...,
+    'ports_succeeded': ..., 'can_connect': ...}} or None}"""
+    __slots__ = ('domain', 'rr_types', 'names', 'results')
+    answer_keys = ('domain', 'rr_types', 'hosts')
+    result_keys = ('pingable', 'ip', 'ports_succeeded', 'can_connect')
+
+    def __init__(self, domain: str, rr_types, names, results):
+        self.domain = domain
+        self.rr_types = intern_rr_types(rr_types)
+        self.names = None if names is None else tuple(names)
+        self.results = None if results is None else tuple(tuple(result) for result in results)
+
+    def _hosts(self):
+        if self.names is None:
+            return None
+        return {name: dict(zip(self.result_keys, result)) for name, result in zip(self.names, self.results)}
+
+
+class DNSSECValidationAnswer(CompactAnswer):
+    """The answer of dnssec_validate() in Resolver class. All addresses of the validated A rrset share one verdict
+    ('secure', 'bogus' or 'insecure'), so it is kept once. 'addresses' is None when there was no data.
+    As a formatted answer: {'domain': ..., 'rr_types': ['a', 'dnssec'], 'answer': {address: verdict} or None}"""
+    __slots__ = ('domain', 'addresses', 'verdict')
+    answer_keys = ('domain', 'rr_types', 'answer')
+    rr_types = intern_rr_types(('a', 'dnssec'))
+
+    def __init__(self, domain: str, addresses, verdict: str):
+        self.domain = domain
+        self.addresses = None if addresses is None else tuple(addresses)
+        self.verdict = intern_verdict(verdict)
+
+    def _answer(self):
+        if self.addresses is None:
+            return None
+        return {address: self.verdict for address in self.addresses}
+
+
+class DNSSECSignaturesAnswer(CompactAnswer):
+    """The answer of get_dnssec_sigs() in Resolver class: one record (or None) per dnssec record type, in 'rr_types'
+    order. As a formatted answer: {'domain': ..., 'rr_types': [...], 'answer': {'soa': [record] or None,
+    'dnskey': ..., 'rrsig': ..., 'nsec': ..., 'ds': ...}}"""
+    __slots__ = ('domain', 'records')
+    answer_keys = ('domain', 'rr_types', 'answer')
+    rr_types = intern_rr_types(('dnskey', 'rrsig', 'nsec', 'ds', 'soa'))
+    answer_order = ('soa', 'dnskey', 'rrsig', 'nsec', 'ds')
+
+    def __init__(self, domain: str, records):
+        self.domain = domain
+        self.records = tuple(records)
+
+    def _answer(self):
+        records = dict(zip(self.rr_types, self.records))
+        return {rr_type: (None if records[rr_type] is None else [records[rr_type]]) for rr_type in self.answer_order}
+
+
+class DNSSECAnswer(CompactAnswer):
+    """The answer of dnssec_comprehensive() in Resolver class. Shares the validation and signatures answers it is
+    built from instead of copying them. As a formatted answer: {'domain': ..., 'rr_types': [...],
+    'answer': {'validation': <validation answer>, 'signatures': <signatures answer>}}"""
+    __slots__ = ('domain', 'validation', 'signatures')
+    answer_keys = ('domain', 'rr_types', 'answer')
+    rr_types = intern_rr_types(('a', 'dnssec', 'dnskey', 'rrsig', 'nsec', 'ds', 'soa'))
+
+    def __init__(self, domain: str, validation, signatures):
+        self.domain = domain
+        self.validation = validation  # the raw (or compact) answers of dnssec_validate() and get_dnssec_sigs()
+        self.signatures = signatures
+
+    def _answer(self):
+        return {'validation': self.validation['answer'], 'signatures': self.signatures['answer']}
+
+# end
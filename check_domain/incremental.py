@@ -0,0 +1,130 @@
+# incremental re-scans:
+# most domains look the same from one scan to the next. IncrementalStore remembers, per domain, when the earliest
+# record behind its states expires and a fingerprint of every check's answer. IncrementalScanner skips domains that
+# are still fresh, re-checks the rest and only writes out the checks whose answers actually changed.
+# usage: python -m check_domain.bulk_scan domains.txt -o changes.jsonl --incremental scan_state.db
+
+import json
+import sqlite3
+import threading
+import time
+from .bulk_scan import BulkScanner, ScanStats
+from .config import Config
+from .fingerprint import state_fingerprint
+
+COMMIT_EVERY = 500  # updates between sqlite commits
+
+
+class IncrementalStore(object):
+    """SQLite backed table of domain -> (expires_at, {check: fingerprint}).
+    Safe to share between the threads of a scan. Call close() to commit the last updates.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS domains "
+                                "(domain TEXT PRIMARY KEY, expires_at REAL, fingerprints TEXT)")
+        self.uncommitted = 0
+
+    def is_fresh(self, domain: str, now: float = None):
+        """True while the earliest record behind the domain's last states has not expired."""
+        now = time.time() if now is None else now
+        with self.lock:
+            row = self.connection.execute("SELECT expires_at FROM domains WHERE domain = ?", (domain,)).fetchone()
+        return row is not None and row[0] > now
+
+    def fingerprints(self, domain: str):
+        with self.lock:
+            row = self.connection.execute("SELECT fingerprints FROM domains WHERE domain = ?", (domain,)).fetchone()
+        return {} if row is None else json.loads(row[0])
+
+    def update(self, domain: str, states: dict, now: float = None):
+        """Stores the fingerprints and expiry of freshly checked states. A check that raised or ran out of time keeps
+        its previous fingerprint and makes the domain due again on the next run. Returns the names of the checks whose
+        answers changed (checks seen for the first time count as changed)."""
+        now = time.time() if now is None else now
+        previous = self.fingerprints(domain)
+        current = dict(previous)
+        changed = []
+        expires_at = now + Config.RECHECK_SECONDS
+
+        for check, state in states.items():
+            if isinstance(state, Exception) or state.is_partial():
+                expires_at = now
+                continue
+            fingerprint = state_fingerprint(state)
+            if previous.get(check) != fingerprint:
+                changed.append(check)
+            current[check] = fingerprint
+            state_expiry = state_expires_at(state)
+            if state_expiry is not None and state_expiry < expires_at:
+                expires_at = state_expiry
+
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO domains (domain, expires_at, fingerprints) "
+                                    "VALUES (?, ?, ?)", (domain, expires_at, json.dumps(current, sort_keys=True)))
+            self.uncommitted += 1
+            if self.uncommitted >= COMMIT_EVERY:
+                self.connection.commit()
+                self.uncommitted = 0
+        return changed
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+
+def state_expires_at(state):
+    """Returns when the records behind a state expire (epoch seconds), or None if its answer carries no ttl."""
+    return getattr(state.formatted_answer, "expires_at", None)
+
+
+class IncrementalScanStats(ScanStats):
+    """ScanStats plus the incremental counters. fresh: domains skipped because their records had not expired.
+    unchanged: re-checked domains where no answer changed."""
+
+    def __init__(self):
+        super(IncrementalScanStats, self).__init__()
+        self.fresh = 0
+        self.unchanged = 0
+
+    def as_dict(self):
+        stats = super(IncrementalScanStats, self).as_dict()
+        with self.lock:
+            stats['fresh'] = self.fresh
+            stats['unchanged'] = self.unchanged
+        return stats
+
+
+class IncrementalScanner(BulkScanner):
+    """A BulkScanner that skips still fresh domains and writes out only the checks whose answers changed.
+    Domains with no changes produce no output line.
+    Inherits from: BulkScanner.
+    Parent to: None.
+    Sibling to: ShardedScanner."""
+
+    def __init__(self, store: IncrementalStore, **scanner_options):
+        super(IncrementalScanner, self).__init__(**scanner_options)
+        self.store = store
+        self.stats = IncrementalScanStats()
+
+    def should_scan(self, domain: str):
+        if self.store.is_fresh(domain):
+            self.stats.add(fresh=1)
+            return False
+        return True
+
+    def result_for(self, domain: str, states: dict):
+        changed = self.store.update(domain, states)
+        if len(changed) == 0:
+            self.stats.add(unchanged=1)
+            return None
+        return {check: states[check] for check in changed}
+
+# end
@@ -4,5 +4,10 @@
 from .dmarcian_api_client import DmarcianClient, BASE_URL, TOKEN
 from .ip_reachable import Reacher
 from .dns_resolvers import Resolver
+from .spf_evaluator import SPFEvaluator
+from .dmarc_resolver import DMARCResolver
+from .dkim_discovery import DKIMSelectorDiscovery
+from .async_resolver import AsyncResolver
+from .async_reachable import AsyncReacher
 
 # end
@@ -0,0 +1,140 @@
+# reach hosts from asyncio code:
+# AsyncReacher mirrors the Reacher methods as coroutines. Ports are tested with non-blocking sockets and pings run as
+# asyncio subprocesses, so a single event loop can probe many hosts at once. Every host of a group and every port of
+# a host is tested at the same time.
+
+import asyncio
+import json
+import socket as s
+from ..formatted_response import DNSHostMappingFormattedResponse, HostFormattedResponse
+from .ip_reachable import Reacher, with_common_ports, received_packets, check_port_test_args
+
+CONNECT_TIMEOUT = 2  # seconds, same as port_test()
+PING_TIMEOUT = 2  # seconds, same as ping()
+
+
+class AsyncReacher(object):
+    """Coroutine counterpart of the Reacher class: reach_dns_hosts(), reach(), reach_mail(), reach_web() and
+    reach_ns() take the same arguments and return the same HostFormattedResponse.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: Reacher, AsyncResolver"""
+
+    async def reach_dns_hosts(self, dns_answer: DNSHostMappingFormattedResponse, port_list: list = None,
+                              ping_it: bool = True, jsonic=False):
+        dns_answer, formatted_answer, ip_v, dns_host_type = Reacher._unpack_dns_answer(dns_answer)
+
+        if formatted_answer['hosts'] is not None:
+            host_names = list(dns_answer['answer'].keys())
+            probes = []
+            for key in host_names:
+                ip = dns_answer['answer'][key]
+                if dns_host_type == "ns":
+                    probes.append(self.reach_ns(ip, ip_v, key, dns_answer['domain'], port_list, ping_it))
+                elif dns_host_type == "mx":
+                    probes.append(self.reach_mail(ip, ip_v, key, dns_answer['domain'], port_list, ping_it))
+                else:
+                    probes.append(self.reach(ip, ip_v, key, dns_host_type, dns_answer['domain'], port_list, ping_it))
+
+            host_results = [(key, h.get_response()) for key, h in zip(host_names, await asyncio.gather(*probes))]
+        else:
+            host_results = []
+
+        return Reacher._hosts_response(formatted_answer, host_results, jsonic)
+
+    async def reach(self, address: str, ip_version: int, host_name: str = None, host_type: str = None,
+                    common_domain: str = None, port_list: list = None, ping_it: bool = True, as_json=False):
+        formatted_answer = {
+            'host_name': host_name, 'host_type': host_type, 'domain': common_domain,
+            'pingable': None, 'ip_v': ip_version, 'ip': address, 'ports_succeeded': None, 'can_connect': None
+        }
+
+        if address is not None:
+            probes = []
+            if ping_it:
+                probes.append(ping_async(address, ip_version))
+            if port_list is not None and len(port_list) > 0:
+                address_family = s.AF_INET6 if ip_version == 6 else s.AF_INET
+                probes.append(port_test_async(address, port_list, address_family))
+            results = list(await asyncio.gather(*probes))
+
+            if ping_it:
+                formatted_answer['pingable'] = results.pop(0)[1] >= 1  # packets received
+            if port_list is not None and len(port_list) > 0:
+                ports_successful = results.pop(0)
+                formatted_answer['ports_succeeded'] = ports_successful
+                formatted_answer['can_connect'] = ports_successful is not None and len(ports_successful) > 0
+        else:  # ip is None; do not ping or connect
+            formatted_answer['pingable'] = False
+            formatted_answer['can_connect'] = False
+
+        if as_json:
+            formatted_answer = json.dumps(formatted_answer)
+        return HostFormattedResponse(formatted_answer)
+
+    async def reach_mail(self, address: str, ip_version: int, host_name: str = None, common_domain: str = None,
+                         additional_ports: list = None, ping_it: bool = True, jsonic=False):
+        common_ports = with_common_ports([587, 465, 25], additional_ports)
+        return await self.reach(address, ip_version, host_name, "mx", common_domain, common_ports, ping_it, jsonic)
+
+    async def reach_web(self, address: str, ip_version: int, host_name: str = None, common_domain: str = None,
+                        additional_ports: list = None, ping_it: bool = True, jsonic=False):
+        common_ports = with_common_ports([80, 443], additional_ports)
+        return await self.reach(address, ip_version, host_name, "web", common_domain, common_ports, ping_it, jsonic)
+
+    async def reach_ns(self, address: str, ip_version: int, host_name: str = None, common_domain: str = None,
+                       additional_ports: list = None, ping_it: bool = True, jsonic=False):
+        common_ports = with_common_ports([53], additional_ports)
+        return await self.reach(address, ip_version, host_name, "ns", common_domain, common_ports, ping_it, jsonic)
+
+
+async def ping_async(address: str, ip_version: int = 4, packet_num: int = 1, maxtimeout: int = PING_TIMEOUT):
+    """Coroutine version of ping(). Returns (sent, received)."""
+    if packet_num < 1:
+        raise ValueError("You must send at least one packet.")
+    if ip_version == 4 and (len(address) > 15 or len(address) < 7):
+        raise ValueError(f"IPv4 Address has improper length {len(address)}.")
+
+    command = "ping6" if ip_version == 6 else "ping"
+    try:
+        process = await asyncio.create_subprocess_exec(command, "-c", str(packet_num), address,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+    except OSError:  # no ping binary
+        return packet_num, 0
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=maxtimeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return packet_num, 0
+    if process.returncode != 0:
+        return packet_num, 0
+    return packet_num, received_packets(stdout)
+
+
+async def port_test_async(ip_str: str, port_list: list, address_family, timeout: float = CONNECT_TIMEOUT):
+    """Coroutine version of port_test() for tcp. Connects to every port at once over non-blocking sockets.
+    Returns a list of the ports that accepted the connection, in 'port_list' order, or None."""
+    check_port_test_args(ip_str, port_list)
+    connected = await asyncio.gather(*[_connects(ip_str, port, address_family, timeout) for port in port_list])
+    ports_successful = [port for port, success in zip(port_list, connected) if success]
+    if len(ports_successful) == 0:
+        return None
+    return ports_successful
+
+
+async def _connects(ip_str: str, port: int, address_family, timeout: float):
+    """Private. True if a tcp connection to (ip_str, port) is accepted within 'timeout' seconds."""
+    loop = asyncio.get_running_loop()
+    sock = s.socket(address_family, s.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (ip_str, port)), timeout=timeout)
+        return True
+    except (asyncio.TimeoutError, OSError):
+        return False
+    finally:
+        sock.close()
+
+# end
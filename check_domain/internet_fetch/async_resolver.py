@@ -0,0 +1,160 @@
+# resolve dns records from asyncio code:
+# AsyncResolver mirrors the Resolver methods as coroutines. Queries are started with unbound's asynchronous api
+# (resolve_async) and each context's file descriptor is registered with the event loop, so answers are processed on
+# the loop thread as soon as they arrive instead of by a polling thread. The results are formatted by the Resolver's
+# own formatting methods: both classes return the same formatted responses.
+
+import asyncio
+import unbound as ub
+from ..config import Config
+from ..normalize import normalize_domain
+from .dns_resolvers import Resolver, DNSResolveError
+
+
+class AsyncResolver(object):
+    """
+    Coroutine counterpart of the Resolver class. Every public method of Resolver that queries dns has a coroutine of
+    the same name and arguments here, returning the same formatted response.
+    An AsyncResolver has its own unbound contexts and serves one event loop at a time: the contexts' file descriptors
+    are registered with the loop that first awaits a query. Call close() to unregister them.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: Resolver, AsyncReacher
+    """
+
+    def __init__(self):
+        self.ctx = _new_context()  # non dnssec context
+        self.ctx_dnssec = _new_context(trust_anchor=Config.ROOT_TRUST_ANCHOR)
+        self.loop = None
+
+    def close(self):
+        """Unregisters the contexts from the event loop. Queries still in flight are never answered."""
+        if self.loop is not None and not self.loop.is_closed():
+            for ctx in (self.ctx, self.ctx_dnssec):
+                self.loop.remove_reader(ctx.get_fd())
+        self.loop = None
+
+    async def get_a_records(self, domain: str, as_json: bool = False):
+        status, results = await self._resolve(self.ctx, domain, ub.RR_TYPE_A)
+        return Resolver._a_records_response(domain, status, results, as_json)
+
+    async def get_aaaa_records(self, domain: str, as_json: bool = False):
+        status, results = await self._resolve(self.ctx, domain, ub.RR_TYPE_AAAA)
+        return Resolver._aaaa_records_response(domain, status, results, as_json)
+
+    async def get_soa(self, domain: str, as_json: bool = False):
+        status, result = await self._resolve(self.ctx_dnssec, domain, ub.RR_TYPE_SOA)
+        return Resolver._soa_response(domain, status, result, as_json)
+
+    async def get_ns(self, domain: str, as_json: bool = False):
+        status, results = await self._resolve(self.ctx, domain, ub.RR_TYPE_NS)
+        return Resolver._ns_response(domain, status, results, as_json)
+
+    async def get_mx(self, domain: str, as_json: bool = False):
+        status, results = await self._resolve(self.ctx, domain, ub.RR_TYPE_MX)
+        return Resolver._mx_response(domain, status, results, as_json)
+
+    async def get_txt(self, domain: str, as_json: bool = False):
+        status, results = await self._resolve(self.ctx, domain, ub.RR_TYPE_TXT)
+        return Resolver._txt_response(domain, status, results, as_json)
+
+    # dns host mapping for use with reachability. The A/AAAA lookups of all host names run at the same time.
+    async def get_ipv6_mapping(self, domain: str, associated_with: str, as_json: bool = False,
+                               host_names: list = None):
+        name_list, names_response = await self._associated_host_names(domain, associated_with, host_names)
+        address_responses = await asyncio.gather(*[self.get_aaaa_records(name) for name in name_list or []])
+        return Resolver._mapping_response(domain, associated_with, "aaaa", name_list, names_response,
+                                          address_responses, as_json)
+
+    async def get_ipv4_mapping(self, domain: str, associated_with: str, as_json: bool = False,
+                               host_names: list = None):
+        name_list, names_response = await self._associated_host_names(domain, associated_with, host_names)
+        address_responses = await asyncio.gather(*[self.get_a_records(name) for name in name_list or []])
+        return Resolver._mapping_response(domain, associated_with, "a", name_list, names_response,
+                                          address_responses, as_json)
+
+    async def _associated_host_names(self, domain: str, associated_with: str, host_names: list = None):
+        """Private. Coroutine version of Resolver._associated_host_names()."""
+        if host_names is not None:
+            return Resolver._host_names(host_names), None
+        if associated_with == "ns":
+            response = await self.get_ns(domain)
+        elif associated_with == "mx":
+            response = await self.get_mx(domain)
+        else:
+            return None, None
+        return Resolver._answer_names(response), response
+
+    # dnssec
+    async def dnssec_comprehensive(self, domain: str, as_json: bool = False):
+        validation, dnssec_sigs = await asyncio.gather(self.dnssec_validate(domain), self.get_dnssec_sigs(domain))
+        return Resolver._dnssec_comprehensive_response(domain, validation, dnssec_sigs, as_json)
+
+    async def dnssec_validate(self, domain: str, as_json: bool = False):
+        status, result = await self._resolve(self.ctx_dnssec, domain, ub.RR_TYPE_A)
+        return Resolver._dnssec_validate_response(domain, status, result, as_json)
+
+    async def get_dnssec_sigs(self, domain: str, as_json: bool = False):
+        record_responses = await asyncio.gather(self.get_dnskeys(domain), self.get_rrsigs(domain),
+                                                self.get_nsec(domain), self.get_ds(domain), self.get_soa(domain))
+        return Resolver._dnssec_sigs_response(domain, list(record_responses), as_json)
+
+    async def get_dnskeys(self, domain: str, as_json: bool = False):
+        status, result = await self._resolve(self.ctx_dnssec, domain, ub.RR_TYPE_DNSKEY)
+        return Resolver._dnskeys_response(domain, status, result, as_json)
+
+    async def get_rrsigs(self, domain: str, as_json: bool = False):
+        status, result = await self._resolve(self.ctx_dnssec, domain, ub.RR_TYPE_RRSIG)
+        return Resolver._rrsigs_response(domain, status, result, as_json)
+
+    async def get_ds(self, domain: str, as_json: bool = False):
+        status, result = await self._resolve(self.ctx_dnssec, domain, ub.RR_TYPE_DS)
+        return Resolver._ds_response(domain, status, result, as_json)
+
+    async def get_nsec(self, domain: str, as_json: bool = False):
+        status, result = await self._resolve(self.ctx_dnssec, domain, ub.RR_TYPE_NSEC)
+        return Resolver._nsec_response(domain, status, result, as_json)
+
+    async def _resolve(self, ctx, name: str, rrtype: int, rrclass: int = ub.RR_CLASS_IN):
+        """Private. Starts an asynchronous query on 'ctx' and waits for its (status, result) without blocking the
+        event loop. A cancelled wait cancels the query in unbound too. 'name' is normalized first (see normalize.py)."""
+        name = normalize_domain(name)
+        loop = asyncio.get_running_loop()
+        self._attach(loop)
+        answer = loop.create_future()
+
+        def on_answer(_, status, result):  # called by ctx.process() on the loop thread
+            if not answer.done():
+                answer.set_result((status, result))
+
+        status, async_id = ctx.resolve_async(name, None, on_answer, rrtype, rrclass)
+        if status != 0:
+            raise DNSResolveError(f"Error starting the lookup of {name}: {ub.ub_strerror(status)}")
+        try:
+            return await answer
+        except asyncio.CancelledError:
+            ctx.cancel(async_id)
+            raise
+
+    def _attach(self, loop):
+        """Private. Has 'loop' call ctx.process() whenever a context's file descriptor has answers to deliver."""
+        if self.loop is loop:
+            return
+        if self.loop is not None and not self.loop.is_closed():
+            raise RuntimeError("An AsyncResolver serves one event loop at a time. close() it first.")
+        for ctx in (self.ctx, self.ctx_dnssec):
+            loop.add_reader(ctx.get_fd(), ctx.process)
+        self.loop = loop
+
+
+def _new_context(trust_anchor: str = None):
+    """Returns an unbound context for asynchronous queries. Answers are resolved on a thread inside unbound instead
+    of a forked process, and delivered through the context's file descriptor."""
+    ctx = ub.ub_ctx()
+    ctx.resolvconf(Config.RESOLV_CONF_LOCATION)
+    if trust_anchor is not None:
+        ctx.add_ta_file(trust_anchor)
+    ctx.set_async(True)
+    return ctx
+
+# end
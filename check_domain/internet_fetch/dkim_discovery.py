@@ -0,0 +1,183 @@
+# dkim selector discovery:
+# the selector of a dkim key is chosen by the sender and is not published anywhere, so it has to be guessed.
+# DKIMSelectorDiscovery probes a list of commonly used selectors as concurrent '<selector>._domainkey.<domain>' TXT
+# lookups through the Resolver class, stops at the first hit and remembers the selectors that had no record.
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .dns_resolvers import Resolver, DNSResolveError
+from ..deadline import Deadline
+from ..formatted_response import DKIMFormattedResponse
+
+COMMON_SELECTORS = ("google", "selector1", "selector2", "k1", "k2", "k3", "default", "dkim", "mail", "s1", "s2",
+                    "smtp", "key1", "key2", "sig1", "mx", "mandrill", "mxvault", "zoho", "protonmail", "fm1", "fm2",
+                    "fm3", "everlytickey1", "everlytickey2", "scph0920", "mailjet", "sendgrid", "amazonses")
+NEGATIVE_CACHE_SECONDS = 3600  # how long a selector without a record is skipped for a domain
+NEGATIVE_CACHE_DOMAINS = 1 << 16  # domains kept in the negative cache, least recently used dropped first
+MAX_WORKERS = 16
+
+
+class DKIMSelectorDiscovery(object):
+    """
+    Responsible for finding the dkim selectors of a domain without knowing them up front.
+    discover() probes every selector concurrently and returns a DKIMFormattedResponse that can be stored in a
+    DKIMState. Selectors that had no record are cached per domain (for NEGATIVE_CACHE_SECONDS) at the class level and
+    are not probed again in the meantime. The cache holds at most NEGATIVE_CACHE_DOMAINS domains, so a bulk scan or
+    the monitor does not grow it without end.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: Resolver, SPFEvaluator, DMARCResolver, DmarcianClient
+    """
+
+    _negative_cache = OrderedDict()  # domain -> {selector: time the negative answer expires}, least recent first
+    _cache_lock = threading.Lock()
+
+    def __init__(self, resolver: Resolver = None, selectors: tuple = COMMON_SELECTORS, max_workers: int = MAX_WORKERS):
+        self.dns = resolver if resolver is not None else Resolver()
+        self.selectors = tuple(selectors)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dkim-discovery")
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._negative_cache.clear()
+
+    def discover(self, domain: str, selectors: list = None, stop_early: bool = True, as_json: bool = False,
+                 deadline: Deadline = None):
+        """
+        Accepts domain: str. Probes 'selectors' (defaults to the configured list) concurrently. With 'stop_early=True'
+        the probes that have not started yet are cancelled as soon as one selector has a record. The probes take the
+        'deadline' and raise DeadlineExceeded once it passes.
+        Output is something like,
+        {'domain': 'x.com', 'rr_types': ['txt', 'dkim'], 'selector': 'google', 'query': 'google._domainkey.x.com',
+         'records': ['v=DKIM1; k=rsa; p=MIGf...'], 'valid': True, 'errors': [],
+         'answer': {'google': {'record': 'v=DKIM1; k=rsa; p=MIGf...', 'tags': {'v': 'DKIM1', 'k': 'rsa', 'p': ...}}}}
+        If no selector has a record, returns None in the answer section.
+        """
+        name = domain.lower().rstrip(".")
+        if selectors is None:
+            selectors = self.selectors
+        misses = DKIMSelectorDiscovery._cached_misses(name, time.time())
+        to_probe = [selector for selector in selectors if selector not in misses]
+
+        found = {}
+        errors = []
+        new_misses = []
+        futures = {self.executor.submit(self._probe, name, selector, deadline): selector for selector in to_probe}
+        try:
+            for future in as_completed(futures):
+                selector = futures[future]
+                try:
+                    record = future.result()
+                except DNSResolveError as dre:
+                    errors.append(f"temperror: {dre}")
+                    continue
+                if record is None:
+                    new_misses.append(selector)
+                    continue
+                found[selector] = record
+                if stop_early:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+        DKIMSelectorDiscovery._remember_misses(name, new_misses, time.time() + NEGATIVE_CACHE_SECONDS)
+
+        formatted_answer = {
+            'domain': domain,
+            'rr_types': ["txt", "dkim"],
+            'selector': None,
+            'query': None,
+            'records': [],
+            'valid': False,
+            'errors': errors,
+            'answer': None
+        }
+
+        if len(found) > 0:
+            formatted_answer['answer'] = {}
+            for selector in selectors:  # keep the configured selector order
+                if selector not in found:
+                    continue
+                tags, tag_errors = parse_dkim(found[selector])
+                formatted_answer['answer'][selector] = {'record': found[selector], 'tags': tags}
+                formatted_answer['records'].append(found[selector])
+                if formatted_answer['selector'] is None:
+                    formatted_answer['selector'] = selector
+                    formatted_answer['query'] = f"{selector}._domainkey.{name}"
+                    formatted_answer['valid'] = tags is not None and len(tag_errors) == 0
+                    formatted_answer['errors'].extend(tag_errors)
+
+        if as_json:
+            return json.dumps(formatted_answer)
+        return DKIMFormattedResponse(formatted_answer)
+
+    @classmethod
+    def _cached_misses(cls, domain: str, now: float):
+        """Private. Returns the selectors of 'domain' still cached as having no record, as {selector: expiry}.
+        Expired selectors are dropped, and so is the domain once none are left."""
+        with cls._cache_lock:
+            misses = cls._negative_cache.get(domain)
+            if misses is None:
+                return {}
+            live = {selector: expires for selector, expires in misses.items() if expires > now}
+            if len(live) == 0:
+                del cls._negative_cache[domain]
+                return live
+            cls._negative_cache[domain] = live
+            cls._negative_cache.move_to_end(domain)
+            return dict(live)
+
+    @classmethod
+    def _remember_misses(cls, domain: str, selectors: list, expires: float):
+        """Private. Caches 'selectors' of 'domain' as having no record until 'expires'. Nothing is stored when
+        there are none. Drops the least recently used domains beyond NEGATIVE_CACHE_DOMAINS."""
+        if len(selectors) == 0:
+            return
+        with cls._cache_lock:
+            misses = cls._negative_cache.pop(domain, {})
+            misses.update(dict.fromkeys(selectors, expires))
+            cls._negative_cache[domain] = misses
+            while len(cls._negative_cache) > NEGATIVE_CACHE_DOMAINS:
+                cls._negative_cache.popitem(last=False)
+
+    def _probe(self, domain: str, selector: str, deadline: Deadline = None):
+        """Private. Returns the dkim record published under a selector or None."""
+        answer = self.dns.get_txt(f"{selector}._domainkey.{domain}", deadline=deadline)['answer']
+        if answer is None:
+            return None
+        for record in answer.values():
+            if "p=" in record:
+                return record
+        return None
+
+
+def parse_dkim(record: str):
+    """Accepts a dkim key record str. Returns a (tags, errors) tuple (RFC 6376 section 3.6.1).
+    'tags' is None when the record is not a dkim key at all."""
+    tags = {}
+    errors = []
+    for part in record.split(";"):
+        part = part.strip()
+        if len(part) == 0:
+            continue
+        name, has_value, value = part.partition("=")
+        if not has_value:
+            errors.append(f"Malformed tag: {part}")
+            continue
+        tags[name.strip().lower()] = "".join(value.split())
+
+    if 'v' in tags and (list(tags.keys())[0] != "v" or tags['v'] != "DKIM1"):
+        return None, errors + ["The 'v=DKIM1' tag must come first."]
+    if 'p' not in tags:
+        return None, errors + ["Missing required 'p' tag."]
+    if tags['p'] == "":
+        errors.append("The key has been revoked (empty 'p' tag).")
+    tags.setdefault('k', "rsa")
+
+    return tags, errors
+
+# end
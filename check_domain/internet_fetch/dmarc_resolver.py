@@ -0,0 +1,200 @@
+# local dmarc lookup:
+# resolves '_dmarc.<domain>' TXT records through the Resolver class and parses their tags (RFC 7489). When a domain
+# has no record of its own, the record of its organizational domain applies. Organizational domains are found with
+# the PublicSuffixTrie and their records are cached (until their ttl runs out), so every subdomain of one organization
+# shares a single lookup.
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from .dns_resolvers import Resolver, DNSResolveError
+from .public_suffix import PublicSuffixTrie
+from ..deadline import Deadline
+from ..formatted_response import DMARCFormattedResponse
+
+DMARC_VERSION = "DMARC1"
+POLICIES = ("none", "quarantine", "reject")
+TAG_DEFAULTS = {'adkim': "r", 'aspf': "r", 'fo': "0", 'pct': "100", 'rf': "afrf", 'ri': "86400"}
+ORG_CACHE_SECONDS = 3600  # longest an organizational domain's record is used for its subdomains, whatever its ttl
+ORG_CACHE_DOMAINS = 1 << 16  # organizational domains kept in the cache, least recently used dropped first
+
+
+class DMARCResolver(object):
+    """
+    Responsible for looking up and parsing DMARC records locally through the Resolver class instead of making a
+    round trip to the Dmarcian API. inspect_dmarc() returns a DMARCFormattedResponse that can be stored in a
+    DMARCState.
+    The public suffix trie is compiled once when this class is loaded. The records of organizational domains that
+    subdomains fall back to (including the absence of one) are cached at the class level and shared by every
+    instance, until their ttl runs out (at most ORG_CACHE_SECONDS), for at most ORG_CACHE_DOMAINS domains. A domain
+    looked up for itself is always queried, so a changed policy is seen at once.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: Resolver, Reacher, SPFEvaluator, DmarcianClient
+    """
+
+    suffixes = PublicSuffixTrie.default()
+    _org_cache = OrderedDict()  # organizational domain -> (expiry, (records, tags, errors)), least recent first
+    _cache_lock = threading.Lock()
+
+    def __init__(self, resolver: Resolver = None):
+        self.dns = resolver if resolver is not None else Resolver()
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._org_cache.clear()
+
+    def inspect_dmarc(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """
+        Accepts domain: str. Looks up the dmarc record of the domain, falling back to the organizational domain when
+        the domain has none (RFC 7489 section 6.6.3). The lookups take the 'deadline' and raise DeadlineExceeded once
+        it passes. Output is something like,
+        {'domain': 'mail.x.com', 'rr_types': ['txt', 'dmarc'], 'dns_query': '_dmarc.x.com', 'records': ['v=DMARC1; ..'],
+         'valid': True, 'errors': [],
+         'answer': {'policy_domain': 'x.com', 'organizational_domain': 'x.com', 'inherited': True,
+                    'policy': 'reject', 'tags': {'v': 'DMARC1', 'p': 'reject', ...}}}
+        If no record is found, returns None in the answer section.
+        """
+        name = domain.lower().rstrip(".")
+        org_domain = self.suffixes.registrable_domain(name)
+        if org_domain is None:
+            org_domain = name
+
+        policy_domain = name
+        records, tags, errors, _ = self._lookup(name, deadline)
+        if name != org_domain and len(records) == 0 and len(errors) == 0:
+            policy_domain = org_domain
+            records, tags, errors = self._lookup_org(org_domain, deadline)
+
+        formatted_answer = {
+            'domain': domain,
+            'rr_types': ["txt", "dmarc"],
+            'dns_query': f"_dmarc.{policy_domain}",
+            'records': records,
+            'valid': tags is not None and len(errors) == 0,
+            'errors': errors,
+            'answer': None
+        }
+
+        if tags is not None:
+            inherited = policy_domain != name
+            formatted_answer['answer'] = {
+                'policy_domain': policy_domain,
+                'organizational_domain': org_domain,
+                'inherited': inherited,
+                'policy': tags['sp'] if inherited else tags['p'],
+                'tags': tags
+            }
+
+        if as_json:
+            return json.dumps(formatted_answer)
+        return DMARCFormattedResponse(formatted_answer)
+
+    def _lookup_org(self, org_domain: str, deadline: Deadline = None):
+        """Private. Cached _lookup() of the organizational domain a subdomain falls back to. Returns a (records, tags,
+        errors) tuple. Resolve errors are not cached."""
+        now = time.time()
+        cached = DMARCResolver._cached_org(org_domain, now)
+        if cached is not None:
+            return cached
+        records, tags, errors, expires_at = self._lookup(org_domain, deadline)
+        if not any(error.startswith("temperror") for error in errors):
+            expires_at = now + ORG_CACHE_SECONDS if expires_at is None else min(expires_at, now + ORG_CACHE_SECONDS)
+            DMARCResolver._remember_org(org_domain, (records, tags, errors), expires_at)
+        return records, tags, errors
+
+    @classmethod
+    def _cached_org(cls, org_domain: str, now: float):
+        """Private. Returns the (records, tags, errors) cached for 'org_domain', or None if there are none or they
+        expired."""
+        with cls._cache_lock:
+            cached = cls._org_cache.get(org_domain)
+            if cached is None:
+                return None
+            if cached[0] <= now:
+                del cls._org_cache[org_domain]
+                return None
+            cls._org_cache.move_to_end(org_domain)
+            return cached[1]
+
+    @classmethod
+    def _remember_org(cls, org_domain: str, lookup: tuple, expires: float):
+        """Private. Caches the (records, tags, errors) of 'org_domain' until 'expires'. Drops the least recently used
+        domains beyond ORG_CACHE_DOMAINS."""
+        with cls._cache_lock:
+            cls._org_cache.pop(org_domain, None)
+            cls._org_cache[org_domain] = (expires, lookup)
+            while len(cls._org_cache) > ORG_CACHE_DOMAINS:
+                cls._org_cache.popitem(last=False)
+
+    def _lookup(self, name: str, deadline: Deadline = None):
+        """Private. Queries '_dmarc.<name>'. Returns a (records, tags, errors, expires_at) tuple. tags is None if
+        there is no usable record; expires_at is when the answer's ttl runs out (None without ttls)."""
+        try:
+            response = self.dns.get_txt(f"_dmarc.{name}", deadline=deadline)
+        except DNSResolveError as dre:
+            return [], None, [f"temperror: {dre}"], None
+        answer = response['answer']
+        expires_at = getattr(response, 'expires_at', None)
+
+        records = []
+        if answer is not None:
+            records = [record for record in answer.values()
+                       if record.replace(" ", "").upper().startswith(f"V={DMARC_VERSION}")]
+        if len(records) == 0:
+            return [], None, [], expires_at
+        if len(records) > 1:
+            return records, None, [f"Multiple dmarc records found for _dmarc.{name}"], expires_at
+
+        tags, errors = parse_dmarc(records[0])
+        return records, tags, errors, expires_at
+
+
+def parse_dmarc(record: str):
+    """Accepts a dmarc record str. Returns a (tags, errors) tuple. 'tags' is a dict of tag -> value with the
+    RFC 7489 defaults filled in, or None if the record can not be used at all."""
+    tags = {}
+    errors = []
+    for part in record.split(";"):
+        part = part.strip()
+        if len(part) == 0:
+            continue
+        name, has_value, value = part.partition("=")
+        if not has_value:
+            errors.append(f"Malformed tag: {part}")
+            continue
+        name = name.strip().lower()
+        if name in tags:
+            errors.append(f"Duplicate tag: {name}")
+            continue
+        tags[name] = value.strip()
+
+    if list(tags.keys())[:1] != ["v"] or tags['v'] != DMARC_VERSION:
+        return None, errors + ["The 'v=DMARC1' tag must come first."]
+
+    if 'p' not in tags:
+        if 'rua' not in tags:
+            return None, errors + ["Missing required 'p' tag."]
+        tags['p'] = "none"  # a record with a valid 'rua' but no 'p' is treated as p=none
+    tags['p'] = tags['p'].lower()
+    if tags['p'] not in POLICIES:
+        return None, errors + [f"Invalid policy: p={tags['p']}"]
+
+    tags['sp'] = tags.get('sp', tags['p']).lower()
+    if tags['sp'] not in POLICIES:
+        errors.append(f"Invalid subdomain policy: sp={tags['sp']}")
+        tags['sp'] = tags['p']
+
+    for name, default in TAG_DEFAULTS.items():
+        tags.setdefault(name, default)
+    for name in ("adkim", "aspf"):
+        if tags[name] not in ("r", "s"):
+            errors.append(f"Invalid alignment mode: {name}={tags[name]}")
+    if not tags['pct'].isdigit() or int(tags['pct']) > 100:
+        errors.append(f"Invalid percentage: pct={tags['pct']}")
+
+    return tags, errors
+
+# end
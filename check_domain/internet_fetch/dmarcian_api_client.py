@@ -1,15 +1,18 @@
 import requests
+from ..deadline import Deadline
 from ..formatted_response import DMARCInspectorFormattedResponse, DKIMInspectorFormattedResponse  # client objects produce formatted response types
 from ..formatted_response import SPFInspectorFormattedResponse
 
 TOKEN = "some_token_hash"
 BASE_URL = "https://us.dmarcian.com/api/"
+REQUEST_TIMEOUT = 10  # seconds, for connecting and for each read; shortened to the time left under a deadline
 
 
 class RootClientBase(object):
     """
     Obtains the root endpoint for all subsequent, publicly exposed API endpoints for navigation. Contains generic methods for performing requests.
     Loads the api token, base url, constructs the base headers, and root routes/endpoints.
+    Requests time out after REQUEST_TIMEOUT seconds, or sooner when a 'deadline' (see deadline.py) is closer.
     """
 
     def __init__(self, base_url: str, token: str):
@@ -19,15 +22,28 @@ class RootClientBase(object):
         self.root = self._load_endpoints()
 
     def _load_endpoints(self):
-        response = requests.get("https://us.dmarcian.com/api/", headers=self.headers)
+        response = requests.get("https://us.dmarcian.com/api/", headers=self.headers, timeout=REQUEST_TIMEOUT)
         return response.json()
 
-    def get_request(self, url: str):
-        response = requests.get(url, headers=self.headers)
+    def get_request(self, url: str, deadline: Deadline = None):
+        deadline = Deadline.coerce(deadline)
+        deadline.check(f"GET {url}")
+        try:
+            response = requests.get(url, headers=self.headers, timeout=deadline.timeout(REQUEST_TIMEOUT))
+        except requests.Timeout:
+            deadline.check(f"GET {url}")  # report running out of time as such, other time outs as they are
+            raise
         return response.json()
 
-    def post_request(self, url: str, post_data: dict):
-        response = requests.post(url=url, headers=self.headers, json=post_data)
+    def post_request(self, url: str, post_data: dict, deadline: Deadline = None):
+        deadline = Deadline.coerce(deadline)
+        deadline.check(f"POST {url}")
+        try:
+            response = requests.post(url=url, headers=self.headers, json=post_data,
+                                     timeout=deadline.timeout(REQUEST_TIMEOUT))
+        except requests.Timeout:
+            deadline.check(f"POST {url}")
+            raise
         return response.json()
 
 
@@ -47,27 +63,27 @@ class DmarcianClient(RootClientBase):
         self.dkim = {'inspect': "https://us.dmarcian.com/api/dkim/inspect/",
                      'validate': "https://us.dmarcian.com/api/dkim/validate/"}
 
-    def inspect_dmarc(self, domain: str):
+    def inspect_dmarc(self, domain: str, deadline: Deadline = None):
         """
         Inspects a dmarc record on a domain via dmarcian API. A DMARCInspectorFormattedResponse is returned.
         """
         request_data = {'domain': domain}
-        response = self.post_request(self.dmarc['inspect'], request_data)
+        response = self.post_request(self.dmarc['inspect'], request_data, deadline)
         return DMARCInspectorFormattedResponse(response)
 
-    def inspect_dkim(self, domain: str, selector: str):
+    def inspect_dkim(self, domain: str, selector: str, deadline: Deadline = None):
         """
         Inspects a dkim record on a domain using a selector via dmarcian API.
         A DKIMInspectorFormattedResponse is returned.
         """
         request_data = {'domain': domain, 'selector': selector}
-        response = self.post_request(self.dkim['inspect'], request_data)
+        response = self.post_request(self.dkim['inspect'], request_data, deadline)
         return DKIMInspectorFormattedResponse(response)
 
-    def inspect_spf(self, domain):
+    def inspect_spf(self, domain, deadline: Deadline = None):
         """Inspects an spf record on a domain via dmarcian API. A SPFInspectorFormattedResponse is returned."""
         request_data = {'domain': domain}
-        response = self.post_request(self.spf['inspect'], request_data)
+        response = self.post_request(self.spf['inspect'], request_data, deadline)
         return SPFInspectorFormattedResponse(response)
 
 # end
@@ -1,11 +1,20 @@
 # resolve dns records
 
 import json
+import select
+import threading
 import unbound as ub
 from ..internet_fetch import ip_helper
 from ..config import Config
+from ..deadline import Deadline, DeadlineExceeded
 from ..formatted_response import DNSFormattedResponse, DNSHostMappingFormattedResponse
 from ..formatted_response import DNSSECSignaturesFormattedResponse, DNSSECValidatedFormattedResponse, DNSSECFormattedResponse
+from ..formatted_response import HostMappingAnswer, DNSSECValidationAnswer, DNSSECSignaturesAnswer, DNSSECAnswer
+from ..interning import intern_host, intern_rr_types, SECURE, BOGUS, INSECURE
+from ..normalize import normalize_domain
+
+
+POLL_SECONDS = 0.05  # longest wait on an unbound file descriptor before the deadline is checked again
 
 
 class Resolver(object):
@@ -13,75 +22,51 @@ class Resolver(object):
     Responsible for querying dns records and returning results of the query in a formatted response.
     The general format is: {'domain', 'rr_types', 'answer'}.
     This class does not attempt to reach any hosts. See 'Reacher" class for host connecting & reachability.
-    This class does not attempt to obtain DMARC, SPF, or DKIM records from DNS. For this, see DmarcianClient class.
+    This class only fetches raw TXT records for SPF, DMARC and DKIM. Evaluating them is done by the SPFEvaluator,
+    DMARCResolver and DKIMSelectorDiscovery classes.
     This class borrows functionality from the 'ip_helper.py' module to assist in constructing proper IPv6 addresses.
     This class has sibling FormattedResponse classes that wrap dictionaries that contain the response data.
+    Every lookup takes an optional 'deadline' (a Deadline, see deadline.py). A lookup still unanswered when it passes
+    raises DeadlineExceeded; composite answers (host mappings, dnssec signatures) leave the timed out parts empty and
+    list them in the response's 'timed_out'.
     Inherits from: object.
     Parent to: None.
-    Sibling to: Reacher, DmarcianClient
+    Sibling to: Reacher, DmarcianClient, AsyncResolver
     """
 
     ctx = ub.ub_ctx()  # non dnssec context
     ctx.resolvconf(Config.RESOLV_CONF_LOCATION)
+    ctx.set_async(True)  # queries under a deadline are resolved on a thread inside unbound (see _resolve())
 
     ctx_dnssec = ub.ub_ctx()
     ctx_dnssec.resolvconf(Config.RESOLV_CONF_LOCATION)
     ctx_dnssec.add_ta_file(Config.ROOT_TRUST_ANCHOR)
+    ctx_dnssec.set_async(True)
+
+    _process_lock = threading.Lock()  # one thread at a time delivers the answers of asynchronous queries
 
     def __init__(self):
         pass
 
-    def get_a_records(self, domain: str, as_json: bool = False):
+    def get_a_records(self, domain: str, as_json: bool = False, deadline: Deadline = None):
         """
         Accepts domain: str. Returns a formatted answer including dictionary of A records in the format:
         {'domain': 'example.com', 'rr_types':['a'], 'answer': ['1.1.1.1', '2.2.2.2', '3.3.3.3' ... etc]}.
         If no record is found, returns None in the answer section.
         Set 'as_json' to True to return a pure json response instead of the wrapped formatted response.
         """
+        status, results = Resolver._resolve(Resolver.ctx, domain, ub.RR_TYPE_A, deadline=deadline)
+        return Resolver._a_records_response(domain, status, results, as_json)
 
-        formatted_answer = {'domain': domain, 'rr_types': ["a"], 'answer': None}
-
-        status, results = Resolver.ctx.resolve(domain, rrtype=ub.RR_TYPE_A, rrclass=ub.RR_CLASS_IN)
-
-        if status != 0:
-            raise DNSResolveError(f"Error occurred while resolving IPv4 for {domain}")
-        elif results.havedata == 1 and len(results.data.address_list) > 0:
-            ipv4_addr_list = results.data.address_list
-            formatted_answer['answer'] = {}
-            i = 0
-            for ip in ipv4_addr_list:
-                formatted_answer['answer'][i] = ip
-                i += 1
-        if as_json:
-            return json.dumps(formatted_answer)
-        # return DNSFormattedResponse(formatted_answer)
-        return formatted_answer
-
-    def get_aaaa_records(self, domain: str, as_json: bool = False):
+    def get_aaaa_records(self, domain: str, as_json: bool = False, deadline: Deadline = None):
         """
         Accepts domain: str. Returns a formatted answer including dictionary of A records in the format:
         {'domain': 'example.com', 'rr_types':['aaaa'], 'answer': ['f::0', 'f::1', 'f::2' ... etc]}.
         If no record is found, returns None in the answer section.
         Set 'as_json' to True to return a pure json response instead of the wrapped formatted response.
         """
-        formatted_answer = {'domain': domain, 'rr_types': ["aaaa"], 'answer': None}
-
-        status, results = Resolver.ctx.resolve(domain, rrtype=ub.RR_TYPE_AAAA, rrclass=ub.RR_CLASS_IN)
-
-        if status != 0:
-            raise DNSResolveError(f"Error occurred while resolving IPv4 for {domain}")
-        elif results.havedata == 1 and len(results.data.address_list) > 0:
-            ipv6_addr_list = results.rawdata
-            formatted_answer['answer'] = {}
-            i = 0
-            for ip in ipv6_addr_list:
-                if ip_helper.V6.is_valid(ip):
-                    formatted_answer['answer'][i] = ip_helper.V6.bytes_to_hexadectet(ip)
-                i += 1
-        if as_json:
-            return json.dumps(formatted_answer)
-        # return DNSFormattedResponse(formatted_answer)
-        return formatted_answer
+        status, results = Resolver._resolve(Resolver.ctx, domain, ub.RR_TYPE_AAAA, deadline=deadline)
+        return Resolver._aaaa_records_response(domain, status, results, as_json)
 
     # no exposed json for this private method below
 
@@ -100,288 +85,330 @@ class Resolver(object):
 
         return ipv6_bytes
 
-    def get_soa(self, domain: str, as_json: bool = False):
+    def get_soa(self, domain: str, as_json: bool = False, deadline: Deadline = None):
         """
         Accepts domain: str. Returns a formatted answer containing 'Start Of Authority' records in the format:
         {'domain': 'example.com', 'rr_types':['soa'], 'answer': ['administrator info, other info, time info, etc]}.
         If no record is found, returns None in the answer section.
         Set 'as_json=True' to return a pure json response instead of the wrapped formatted response.
         """
-        formatted_answer = {'domain': domain, 'rr_types': ["soa"], 'answer': None}
+        status, result = Resolver._resolve(Resolver.ctx_dnssec, domain, ub.RR_TYPE_SOA, deadline=deadline)
+        return Resolver._soa_response(domain, status, result, as_json)
 
-        soa_list = None
-        status, result = Resolver.ctx_dnssec.resolve(domain, ub.RR_TYPE_SOA, ub.RR_CLASS_IN)
-        if status == 0 and result.havedata and result.secure == 1:
-            formatted_answer['answer'] = {}
-            soa_list = result.data.data
-            i = 0
-            for record in soa_list:
-                formatted_answer['answer'][i] = str(record)
-                i += 1
-        elif status != 0:  # throw/raise error
-            print("Resolve error: ", ub.ub_strerror(status))
-        elif result.havedata == 0:  # if no data in result
-            print("No data.")
-
-        if as_json:
-            return json.dumps(formatted_answer)
-        return DNSFormattedResponse(formatted_answer)
-
-    def get_ns(self, domain: str, as_json: bool = False):
+    def get_ns(self, domain: str, as_json: bool = False, deadline: Deadline = None):
         """
         Accepts domain: str. Returns a formatted answer containing 'NS' records in the format:
         {'domain': 'example.com', 'rr_types':['ns'], 'answer': ['ns1.com', 'ns2.com', ... etc]}.
         If no record is found, returns None in the answer section.
         Set 'as_json=True' to return a pure json response instead of the wrapped formatted response.
         """
-        formatted_answer = {'domain': domain, 'rr_types': ["ns"], 'answer': None}
+        status, results = Resolver._resolve(Resolver.ctx, domain, ub.RR_TYPE_NS, deadline=deadline)
+        return Resolver._ns_response(domain, status, results, as_json)
 
-        status, results = Resolver.ctx.resolve(domain, rrtype=ub.RR_TYPE_NS)
-
-        if status != 0:
-            raise DNSResolveError(f"Error occured while resolving IPv4 for {domain}")
-        elif results.havedata == 1 and len(results.data.address_list) > 0:
-            ns_list = list(results.data.as_domain_list())
-            formatted_answer['answer'] = {}
-            i = 0
-            for each in ns_list:
-                formatted_answer['answer'][i] = each
-                i += 1
-        if as_json:
-            return json.dumps(formatted_answer)
-        # return DNSFormattedResponse(formatted_answer)
-        return formatted_answer
-
-    def get_mx(self, domain: str, as_json: bool = False):
+    def get_mx(self, domain: str, as_json: bool = False, deadline: Deadline = None):
         """
         Accepts domain: str. Returns a formatted answer containing 'MX' records in the format:
         {'domain': 'example.com', 'rr_types':['mx'], 'answer': ['smtp1.com', 'smtp2.com', ... etc]}.
         If no record is found, returns None in the answer section.
         Set 'as_json=True' to return a pure json response instead of the wrapped formatted response.
         """
-        formatted_answer = {'domain': domain, 'rr_types': ["mx"], 'answer': None}
-
-        status, results = Resolver.ctx.resolve(domain, rrtype=ub.RR_TYPE_MX)
+        status, results = Resolver._resolve(Resolver.ctx, domain, ub.RR_TYPE_MX, deadline=deadline)
+        return Resolver._mx_response(domain, status, results, as_json)
 
-        if status != 0:
-            raise DNSResolveError(f"Error while fetching Mail Exchange list for {domain}")
-        elif results.havedata == 1 and len(results.data.as_mx_list()) > 0:
-            mx_list = list(results.data.as_mx_list())
-            formatted_answer['answer'] = {}
-            i = 0
-            for priority, name in mx_list:
-                formatted_answer['answer'][i] = name
-                i += 1
-        if as_json:
-            return json.dumps(formatted_answer)
-        # return DNSFormattedResponse(formatted_answer)
-        return formatted_answer
+    def get_txt(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """
+        Accepts domain: str. Returns a formatted answer containing 'TXT' records in the format:
+        {'domain': 'example.com', 'rr_types':['txt'], 'answer': {0: 'v=spf1 -all', 1: 'some-verification=abc'}}.
+        The character strings of a single record are joined together (RFC 7208 section 3.3).
+        If no record is found, returns None in the answer section.
+        Set 'as_json=True' to return a pure json response instead of the wrapped formatted response.
+        """
+        status, results = Resolver._resolve(Resolver.ctx, domain, ub.RR_TYPE_TXT, deadline=deadline)
+        return Resolver._txt_response(domain, status, results, as_json)
+
+    @staticmethod
+    def _txt_rdata_to_str(rdata: bytes):
+        """Private helper for get_txt(). TXT rdata is a series of length prefixed character strings.
+        Returns them concatenated into a single str."""
+        strings = []
+        index = 0
+        while index < len(rdata):
+            length = rdata[index]
+            strings.append(rdata[index + 1:index + 1 + length].decode("utf-8", errors="replace"))
+            index += length + 1
+        return "".join(strings)
 
     # methods below this line use unbound indirectly. They use methods in this class as their dependencies.
 
     # dns host mapping for use with reachability
-    def get_ipv6_mapping(self, domain: str, associated_with: str, as_json: bool = False):
+    def get_ipv6_mapping(self, domain: str, associated_with: str, as_json: bool = False, host_names: list = None,
+                         deadline: Deadline = None):
         """
         Accepts a domain, a type of host to associate an ip address with, and optionally 'as_json=True' to output json.
         This builds the DNSHostMappingFormattedResponse which can then be 'unpacked' by the Reacher class method
         reach_dns_hosts() or can be passed into a IPV6ExistsState directly.
+        'host_names' may be passed in when the ns/mx names were already resolved so they are not looked up again.
         Output is something like,
         {'domain': 'x.com', 'rr_types':['ns', 'aaaa'], 'answer': {'ns1.com':'f::1', 'ns2.com':'f::2' ... etc}
         """
-        formatted_answer = {'domain': domain, 'rr_types': [], 'answer': None}
-
-        name_list = None
-        if associated_with == "ns":
-            ns_list = None
-            if self.get_ns(domain).get_response()['answer'] is not None:
-                ns_list = list(self.get_ns(domain).get_response()['answer'].values())
-            name_list = ns_list
-            formatted_answer['rr_types'].append("ns")
-        elif associated_with == "mx":
-            mx_list = None
-            if self.get_mx(domain).get_response()['answer'] is not None:
-                mx_list = list(self.get_mx(domain).get_response()['answer'].values())
-            name_list = mx_list
-            formatted_answer['rr_types'].append("mx")
-
-        formatted_answer['rr_types'].append("aaaa")  # [rr_type, 4a] in that order indicates 'answer' content format.
-
-        if associated_with == "ns" and name_list is None:  # all domains have ns records, but not necessarily mx records
-            raise ValueError("Value of 'name_list' is None while querying for NS records. Should be non-empty list.")
-
-        if name_list:
-            i = 0
-            formatted_answer['answer'] = {}
-            for name in name_list:
-                ip6_dict = self.get_aaaa_records(name).get_response()  # None or valid ip6 address returned
-                if ip6_dict['answer'] is not None:
-                    formatted_answer['answer'][name] = ip6_dict['answer'].get(i)
-                else:
-                    formatted_answer['answer'][name] = ip6_dict['answer']
-                i += 1
-                if ip6_dict['answer'] and i + 1 > len(ip6_dict['answer']):  # i beyond the bounds of 'data' dict
-                    i = 0
-                    continue
-        if as_json:
-            return json.dumps(formatted_answer)
-        return DNSHostMappingFormattedResponse(formatted_answer)
-
-    def get_ipv4_mapping(self, domain: str, associated_with: str, as_json: bool = False):  # newly added for decoupling
+        name_list, names_response = self._associated_host_names(domain, associated_with, host_names, deadline)
+        address_responses = [_unless_timed_out(self.get_aaaa_records, name, deadline=deadline)
+                             for name in name_list or []]
+        return Resolver._mapping_response(domain, associated_with, "aaaa", name_list, names_response,
+                                          address_responses, as_json)
+
+    def get_ipv4_mapping(self, domain: str, associated_with: str, as_json: bool = False, host_names: list = None,
+                         deadline: Deadline = None):
         """
         Accepts a domain, a type of host to associate an ip address with, and optionally 'as_json=True' to output json.
         This builds the DNSHostMappingFormattedResponse which can then be 'unpacked' by the Reacher class method
         reach_dns_hosts() or can be passed into a IPV4ExistsState directly.
+        'host_names' may be passed in when the ns/mx names were already resolved so they are not looked up again.
         Output is something like,
         {'domain': 'x.com', 'rr_types':['ns', 'a'], 'answer': {'ns1.com':'1.1.1.1', 'ns2.com':'2.2.2.2' ... etc}
         """
-        formatted_answer = {'domain': domain, 'rr_types': [], 'answer': None}
-
-        name_list = None
+        name_list, names_response = self._associated_host_names(domain, associated_with, host_names, deadline)
+        address_responses = [_unless_timed_out(self.get_a_records, name, deadline=deadline)
+                             for name in name_list or []]
+        return Resolver._mapping_response(domain, associated_with, "a", name_list, names_response,
+                                          address_responses, as_json)
+
+    def _associated_host_names(self, domain: str, associated_with: str, host_names: list = None,
+                               deadline: Deadline = None):
+        """Private helper to the mapping methods. Returns the ns or mx host names of a domain, or None if there are
+        none, together with the response they were read from (None when no lookup was made). Already resolved
+        'host_names' are used as they are, less any root name."""
+        if host_names is not None:
+            return Resolver._host_names(host_names), None
         if associated_with == "ns":
-            ns_list = None
-            if self.get_ns(domain)['answer'] is not None:
-                ns_list = list(self.get_ns(domain)['answer'].values())
-            name_list = ns_list
-            formatted_answer['rr_types'].append("ns")
+            response = self.get_ns(domain, deadline=deadline)
         elif associated_with == "mx":
-            mx_list = None
-            if self.get_mx(domain)['answer'] is not None:
-                mx_list = list(self.get_mx(domain)['answer'].values())
-            name_list = mx_list
-            formatted_answer['rr_types'].append("mx")
+            response = self.get_mx(domain, deadline=deadline)
+        else:
+            return None, None
+        return Resolver._answer_names(response), response
+
+    @staticmethod
+    def _answer_names(response):
+        """Private. Returns the host names in the answer of a get_ns()/get_mx() response, or None if there are none."""
+        answer = response.get_response()['answer']
+        if answer is None:
+            return None
+        return Resolver._host_names(answer.values())
+
+    @staticmethod
+    def _host_names(names):
+        """Private. Returns the names that can have addresses, or None if there are none. The root name '.' is left
+        out: a null MX ('0 .', RFC 7505) says the domain accepts no mail, it is not a host to look up."""
+        hosts = [name for name in names if name.strip().rstrip(".")]
+        return hosts if len(hosts) > 0 else None
 
-        formatted_answer['rr_types'].append("a")  # [name_record, ipv6] in that order indicates 'data' response index contents.
+    # dnssec
+    def dnssec_comprehensive(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """Accepts a domain: str. Returns a formatted answer combining dnssec_validate() and get_dnssec_sigs()."""
+        validation = self.dnssec_validate(domain=domain, as_json=False, deadline=deadline)
+        dnssec_sigs = self.get_dnssec_sigs(domain=domain, as_json=False, deadline=deadline)
+        return Resolver._dnssec_comprehensive_response(domain, validation, dnssec_sigs, as_json)
 
-        if associated_with == "ns" and name_list is None:  # all domains have ns records, but not necessarily mx records
-            raise ValueError("Value of 'name_list' is None while querying for NS records. Should be non-empty list.")
+    def dnssec_validate(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """Accepts a domain: str.
+        Returns a formatted answer dictionary with dnssec validation results in the 'answer.'"""
+        status, result = Resolver._resolve(Resolver.ctx_dnssec, domain, ub.RR_TYPE_A, deadline=deadline)
+        return Resolver._dnssec_validate_response(domain, status, result, as_json)
 
-        if name_list:
-            i = 0
+    def get_dnssec_sigs(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """
+        Accepts a domain name and acquires all DNSSEC records according to RFC4034 and RFC4035: DNSKEY, RRSIG, NSEC, DS.
+        Additionally, it also gets the SOA record. This method does not validate DNSSEC. It only checks for proper
+        signatures.
+        """
+        record_responses = [_unless_timed_out(lookup, domain, deadline=deadline)
+                            for lookup in (self.get_dnskeys, self.get_rrsigs, self.get_nsec, self.get_ds, self.get_soa)]
+        return Resolver._dnssec_sigs_response(domain, record_responses, as_json)
+
+    def get_dnskeys(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """Accepts a domain: str. Returns a formatted answer dictionary, including dnskey records in the 'answer'."""
+        status, result = Resolver._resolve(Resolver.ctx_dnssec, domain, ub.RR_TYPE_DNSKEY, deadline=deadline)
+        return Resolver._dnskeys_response(domain, status, result, as_json)
+
+    def get_rrsigs(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """Accepts a domain: str. Returns a formatted answer dictionary, with rrsig records in the 'answer'."""
+        status, result = Resolver._resolve(Resolver.ctx_dnssec, domain, ub.RR_TYPE_RRSIG, deadline=deadline)
+        return Resolver._rrsigs_response(domain, status, result, as_json)
+
+    def get_ds(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """Accepts a domain. Returns a formatted answer dictionary with ds records in the 'answer'."""
+        status, result = Resolver._resolve(Resolver.ctx_dnssec, domain, ub.RR_TYPE_DS, deadline=deadline)
+        return Resolver._ds_response(domain, status, result, as_json)
+
+    def get_nsec(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """Accepts a domain: str. Returns a formatted answer dictionary with the nsec records inside the 'answer'."""
+        status, result = Resolver._resolve(Resolver.ctx_dnssec, domain, ub.RR_TYPE_NSEC, deadline=deadline)
+        return Resolver._nsec_response(domain, status, result, as_json)
+
+    @staticmethod
+    def _resolve(ctx, name: str, rrtype: int, rrclass: int = ub.RR_CLASS_IN, deadline: Deadline = None):
+        """Private. Resolves 'name' through 'ctx' and returns (status, result). Without a deadline this is a plain
+        blocking ctx.resolve(). Under a deadline the query is started asynchronously and the calling thread waits on
+        the context's file descriptor for at most the time left; when it runs out the query is cancelled in unbound
+        and DeadlineExceeded is raised. 'name' is normalized first (see normalize.py)."""
+        name = normalize_domain(name)
+        if deadline is None or deadline.at is None:
+            return ctx.resolve(name, rrtype=rrtype, rrclass=rrclass)
+        deadline.check(f"resolving {name}")
+
+        answer = {}
+        answered = threading.Event()
+
+        def on_answer(_, status, result):  # called by ctx.process(), in whichever thread delivers the answers
+            answer['status'], answer['result'] = status, result
+            answered.set()
+
+        status, async_id = ctx.resolve_async(name, None, on_answer, rrtype, rrclass)
+        if status != 0:
+            return status, None
+        while not answered.is_set():
+            remaining = deadline.remaining()
+            if remaining == 0:
+                ctx.cancel(async_id)
+                raise DeadlineExceeded(f"Deadline exceeded while resolving {name}.")
+            readable, _, _ = select.select([ctx.get_fd()], [], [], min(remaining, POLL_SECONDS))
+            if len(readable) == 0:
+                continue
+            if Resolver._process_lock.acquire(blocking=False):
+                try:
+                    ctx.process()
+                finally:
+                    Resolver._process_lock.release()
+            else:  # another thread is delivering answers, possibly this one's
+                answered.wait(min(deadline.timeout(), POLL_SECONDS))
+        return answer['status'], answer['result']
+
+    # formatting of unbound results into formatted responses. Shared with AsyncResolver, which only differs from this
+    # class in how it waits for the results.
+
+    @staticmethod
+    def _a_records_response(domain: str, status: int, results, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["a"]), 'answer': None}
+
+        if status != 0:
+            raise DNSResolveError(f"Error occurred while resolving IPv4 for {domain}")
+        elif results.havedata == 1 and len(results.data.address_list) > 0:
+            ipv4_addr_list = results.data.address_list
             formatted_answer['answer'] = {}
-            for name in name_list:
-                ip4_dict = self.get_a_records(name) # None or valid ip4 address returned
-                if ip4_dict['answer'] is not None:
-                    formatted_answer['answer'][name] = ip4_dict['answer'].get(i)
-                else:
-                    formatted_answer['answer'][name] = ip4_dict['answer']
+            i = 0
+            for ip in ipv4_addr_list:
+                formatted_answer['answer'][i] = intern_host(ip)
                 i += 1
-                if ip4_dict['answer'] and i + 1 > len(ip4_dict['answer']):  # i beyond the bounds of 'data' dict
-                    i = 0
-                    continue
         if as_json:
             return json.dumps(formatted_answer)
-        # return DNSHostMappingFormattedResponse(formatted_answer)
-        return formatted_answer
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, results))
 
-    # dnssec
-    def dnssec_comprehensive(self, domain: str, as_json: bool = False):
+    @staticmethod
+    def _aaaa_records_response(domain: str, status: int, results, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["aaaa"]), 'answer': None}
 
-        formatted_response = {
-            'domain': domain,
-            'rr_types': ['a', 'dnssec', 'dnskey', 'rrsig', 'nsec', 'ds', 'soa'],
-            'answer': {
-                'validation': {'a': None, 'dnssec': None},
-                'signatures': {'rrsig': None, 'nsec': None, 'ds': None, 'soa': None}
-            }
-        }
+        if status != 0:
+            raise DNSResolveError(f"Error occurred while resolving IPv4 for {domain}")
+        elif results.havedata == 1 and len(results.data.address_list) > 0:
+            valid = [(i, ip) for i, ip in enumerate(results.rawdata) if ip_helper.V6.is_valid(ip)]
+            addresses = ip_helper.V6.format_many([ip for _, ip in valid])
+            formatted_answer['answer'] = {i: intern_host(address) for (i, _), address in zip(valid, addresses)}
+        if as_json:
+            return json.dumps(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, results))
 
-        validation_response = self.dnssec_validate(domain=domain, as_json=False).get_response()
-        formatted_response['answer']['validation'] = validation_response['answer']
+    @staticmethod
+    def _soa_response(domain: str, status: int, result, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["soa"]), 'answer': None}
 
-        dnssec_sigs_response = self.get_dnssec_sigs(domain=domain, as_json=False).get_response()
-        formatted_response['answer']['signatures'] = dnssec_sigs_response['answer']
+        soa_list = None
+        if status == 0 and result.havedata and result.secure == 1:
+            formatted_answer['answer'] = {}
+            soa_list = result.data.data
+            i = 0
+            for record in soa_list:
+                formatted_answer['answer'][i] = str(record)
+                i += 1
+        elif status != 0:  # throw/raise error
+            print("Resolve error: ", ub.ub_strerror(status))
+        elif result.havedata == 0:  # if no data in result
+            print("No data.")
 
         if as_json:
-            return json.dumps(formatted_response)
-        return DNSSECFormattedResponse(formatted_response)
+            return json.dumps(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, result))
 
-    def dnssec_validate(self, domain: str, as_json: bool = False):
-        """Accepts a domain: str.
-        Returns a formatted answer dictionary with dnssec validation results in the 'answer.'"""
-        formatted_answer = {'domain': domain, 'rr_types': ["a", "dnssec"], 'answer': None}
+    @staticmethod
+    def _ns_response(domain: str, status: int, results, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["ns"]), 'answer': None}
 
-        status, result = Resolver.ctx_dnssec.resolve(domain, ub.RR_TYPE_A)
-        if status == 0 and result.havedata:
+        if status != 0:
+            raise DNSResolveError(f"Error occured while resolving IPv4 for {domain}")
+        elif results.havedata == 1 and len(results.data.address_list) > 0:
+            ns_list = list(results.data.as_domain_list())
             formatted_answer['answer'] = {}
-            ip_address_list = result.data.address_list
-            for ip in ip_address_list:
-                if result.secure:
-                    formatted_answer['answer'][ip] = "secure"
-                elif result.bogus:
-                    formatted_answer['answer'][ip] = "bogus"
-                else:
-                    formatted_answer['answer'][ip] = "insecure"
+            i = 0
+            for each in ns_list:
+                formatted_answer['answer'][i] = intern_host(each)
+                i += 1
         if as_json:
             return json.dumps(formatted_answer)
-        return DNSSECValidatedFormattedResponse(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, results))
 
-    def get_dnssec_sigs(self, domain: str, as_json: bool = False):
-        """
-        Accepts a domain name and acquires all DNSSEC records according to RFC4034 and RFC4035: DNSKEY, RRSIG, NSEC, DS.
-        Additionally, it also gets the SOA record. This method does not validate DNSSEC. It only checks for proper
-        signatures.
-        """
-
-        # fetch
-        formatted_answer = {'domain': domain, 'rr_types': ['dnskey', 'rrsig', 'nsec', 'ds', 'soa'], 'answer': None}
-        dnskey_fa = self.get_dnskeys(domain, as_json=False).get_response()
-        rrsig_fa = self.get_rrsigs(domain, as_json=False).get_response()
-        nsec_fa = self.get_nsec(domain, as_json=False).get_response()
-        ds_fa = self.get_ds(domain, as_json=False).get_response()
-        soa_fa = self.get_soa(domain, as_json=False).get_response()
-
-        # construct multi-resource record answer
-        formatted_answer['answer'] = {}
-
-        if soa_fa['answer'] is not None and len(soa_fa['answer']) > 0:
-            keys = list(soa_fa['answer'].keys())
-            for key in keys:
-                formatted_answer['answer']['soa'] = []
-                formatted_answer['answer']['soa'].append(soa_fa['answer'][key])
-        else:
-            formatted_answer['answer']['soa'] = None
-
-        if dnskey_fa['answer'] is not None and len(dnskey_fa['answer']) > 0:
-            keys = list(dnskey_fa['answer'].keys())
-            for key in keys:
-                formatted_answer['answer']['dnskey'] = []
-                formatted_answer['answer']['dnskey'].append(dnskey_fa['answer'][key])
-        else:
-            formatted_answer['answer']['dnskey'] = None
+    @staticmethod
+    def _mx_response(domain: str, status: int, results, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["mx"]), 'answer': None}
 
-        if rrsig_fa['answer'] is not None and len(rrsig_fa['answer']) > 0:
-            keys = list(rrsig_fa['answer'].keys())
-            for key in keys:
-                formatted_answer['answer']['rrsig'] = []
-                formatted_answer['answer']['rrsig'].append(rrsig_fa['answer'][key])
-        else:
-            formatted_answer['answer']['rrsig'] = None
-
-        if nsec_fa['answer'] is not None and len(nsec_fa['answer']) > 0:
-            keys = list(nsec_fa['answer'].keys())
-            for key in keys:
-                formatted_answer['answer']['nsec'] = []
-                formatted_answer['answer']['nsec'].append(nsec_fa['answer'][key])
-        else:
-            formatted_answer['answer']['nsec'] = None
+        if status != 0:
+            raise DNSResolveError(f"Error while fetching Mail Exchange list for {domain}")
+        elif results.havedata == 1 and len(results.data.as_mx_list()) > 0:
+            mx_list = list(results.data.as_mx_list())
+            formatted_answer['answer'] = {}
+            i = 0
+            for priority, name in mx_list:
+                formatted_answer['answer'][i] = intern_host(name)
+                i += 1
+        if as_json:
+            return json.dumps(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, results))
 
-        if ds_fa['answer'] is not None and len(ds_fa['answer']) > 0:
-            keys = list(ds_fa['answer'].keys())
-            for key in keys:
-                formatted_answer['answer']['ds'] = []
-                formatted_answer['answer']['ds'].append(ds_fa['answer'][key])
-        else:
-            formatted_answer['answer']['ds'] = None
+    @staticmethod
+    def _txt_response(domain: str, status: int, results, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["txt"]), 'answer': None}
 
+        if status != 0:
+            raise DNSResolveError(f"Error occurred while resolving TXT for {domain}: {ub.ub_strerror(status)}")
+        elif results.havedata == 1 and len(results.data.data) > 0:
+            formatted_answer['answer'] = {}
+            i = 0
+            for rdata in results.data.data:
+                formatted_answer['answer'][i] = Resolver._txt_rdata_to_str(rdata)
+                i += 1
         if as_json:
             return json.dumps(formatted_answer)
-        return DNSSECSignaturesFormattedResponse(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, results))
 
-    def get_dnskeys(self, domain: str, as_json: bool = False):
-        """Accepts a domain: str. Returns a formatted answer dictionary, including dnskey records in the 'answer'."""
-        formatted_answer = {'domain': domain, 'rr_types': ["dnskey"], 'answer': None}
+    @staticmethod
+    def _dnssec_validate_response(domain: str, status: int, result, as_json: bool = False):
+        addresses = None
+        verdict = None
+        if status == 0 and result.havedata:
+            addresses = result.data.address_list
+            if result.secure:
+                verdict = SECURE
+            elif result.bogus:
+                verdict = BOGUS
+            else:
+                verdict = INSECURE
+        answer = DNSSECValidationAnswer(domain, addresses, verdict)
+        if as_json:
+            return json.dumps(answer.as_dict())
+        return DNSSECValidatedFormattedResponse(answer).set_ttls(_record_ttls(answer, result))
 
-        status, result = Resolver.ctx_dnssec.resolve(domain, rrtype=ub.RR_TYPE_DNSKEY)
+    @staticmethod
+    def _dnskeys_response(domain: str, status: int, result, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["dnskey"]), 'answer': None}
 
         if status == 0 and result.havedata == 1:
             print("returned dnskeys.")
@@ -401,13 +428,12 @@ class Resolver(object):
 
         if as_json:
             return json.dumps(formatted_answer)
-        return DNSFormattedResponse(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, result))
 
-    def get_rrsigs(self, domain: str, as_json: bool = False):
-        """Accepts a domain: str. Returns a formatted answer dictionary, with rrsig records in the 'answer'."""
-        formatted_answer = {'domain': domain, 'rr_types': ["rrsig"], 'answer': None}
+    @staticmethod
+    def _rrsigs_response(domain: str, status: int, result, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["rrsig"]), 'answer': None}
 
-        status, result = Resolver.ctx_dnssec.resolve(domain, rrtype=ub.RR_TYPE_RRSIG)
         if status == 0 and result.havedata:
             print("rrsigs returned.")
             rrsig_list = result.data.data
@@ -429,13 +455,11 @@ class Resolver(object):
 
         if as_json:
             return json.dumps(formatted_answer)
-        return DNSFormattedResponse(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, result))
 
-    def get_ds(self, domain: str, as_json: bool = False):
-        """Accepts a domain. Returns a formatted answer dictionary with ds records in the 'answer'."""
-        formatted_answer = {'domain': domain, 'rr_types': ["ds"], 'answer': None}
-
-        status, result = Resolver.ctx_dnssec.resolve(domain, rrtype=ub.RR_TYPE_DS)
+    @staticmethod
+    def _ds_response(domain: str, status: int, result, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["ds"]), 'answer': None}
 
         if status == 0 and result.havedata:
             print("ds record returned.")
@@ -454,13 +478,12 @@ class Resolver(object):
             print("No data.")
         if as_json:
             return json.dumps(formatted_answer)
-        return DNSFormattedResponse(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, result))
 
-    def get_nsec(self, domain: str, as_json: bool = False):
-        """Accepts a domain: str. Returns a formatted answer dictionary with the nsec records inside the 'answer'."""
-        formatted_answer = {'domain': domain, 'rr_types': ["nsec"], 'answer': None}
+    @staticmethod
+    def _nsec_response(domain: str, status: int, result, as_json: bool = False):
+        formatted_answer = {'domain': domain, 'rr_types': intern_rr_types(["nsec"]), 'answer': None}
 
-        status, result = Resolver.ctx_dnssec.resolve(domain, rrtype=ub.RR_TYPE_NSEC)
         if status == 0 and result.havedata:
             nsec_list = result.data.data
             formatted_answer['answer'] = {}
@@ -478,7 +501,100 @@ class Resolver(object):
 
         if as_json:
             return json.dumps(formatted_answer)
-        return DNSFormattedResponse(formatted_answer)
+        return DNSFormattedResponse(formatted_answer).set_ttls(_record_ttls(formatted_answer, result))
+
+    @staticmethod
+    def _mapping_response(domain: str, associated_with: str, record_type: str, name_list: list, names_response,
+                          address_responses: list, as_json: bool = False):
+        """Private. Builds the DNSHostMappingFormattedResponse of get_ipv4_mapping()/get_ipv6_mapping() from the host
+        names and the A or AAAA responses looked up for them, in the same order. A None response is a lookup that ran
+        out of time: its host maps to None and is listed in 'timed_out'."""
+        rr_types = [associated_with] if associated_with in ("ns", "mx") else []
+        rr_types.append(record_type)  # [rr_type, a or aaaa] in that order indicates 'answer' content format.
+
+        if associated_with == "ns" and name_list is None:  # all domains have ns records, but not necessarily mx records
+            raise ValueError("Value of 'name_list' is None while querying for NS records. Should be non-empty list.")
+
+        ttls = {}
+        timed_out = []
+        names = None
+        addresses = None
+        if name_list:
+            i = 0
+            names = []
+            addresses = []
+            for name, ip_response in zip(name_list, address_responses):
+                names.append(intern_host(name))
+                if ip_response is None:
+                    addresses.append(None)
+                    timed_out.append(name)
+                    continue
+                ip_dict = ip_response.get_response()  # None or valid ip address returned
+                if ip_dict['answer'] is not None:
+                    addresses.append(intern_host(ip_dict['answer'].get(i)))
+                    if ip_response.ttls:
+                        ttls[name] = min(ip_response.ttls.values())  # one rrset: the records share their ttl
+                else:
+                    addresses.append(ip_dict['answer'])
+                i += 1
+                if ip_dict['answer'] and i + 1 > len(ip_dict['answer']):  # i beyond the bounds of 'data' dict
+                    i = 0
+                    continue
+        answer = HostMappingAnswer(domain, rr_types, names, addresses)
+        if as_json:
+            return json.dumps(answer.as_dict())
+        response = DNSHostMappingFormattedResponse(answer).set_ttls(ttls)\
+            .expire_with(names_response, *address_responses)
+        response.timed_out = timed_out
+        return response
+
+    @staticmethod
+    def _dnssec_comprehensive_response(domain: str, validation, dnssec_sigs, as_json: bool = False):
+        answer = DNSSECAnswer(domain, validation.response, dnssec_sigs.response)
+
+        if as_json:
+            return json.dumps(answer.as_dict())
+        response = DNSSECFormattedResponse(answer).expire_with(validation, dnssec_sigs)
+        response.timed_out = list(dnssec_sigs.timed_out)
+        return response
+
+    @staticmethod
+    def _dnssec_sigs_response(domain: str, record_responses: list, as_json: bool = False):
+        """Private. 'record_responses' are the dnskey, rrsig, nsec, ds and soa responses, in that order. A None
+        response is a lookup that ran out of time: its record is None and listed in 'timed_out'.
+        Only the last record of each type is kept."""
+        records = []
+        for response in record_responses:
+            record_answer = None if response is None else response.get_response()['answer']
+            if record_answer is not None and len(record_answer) > 0:
+                records.append(list(record_answer.values())[-1])
+            else:
+                records.append(None)
+        answer = DNSSECSignaturesAnswer(domain, records)
+
+        if as_json:
+            return json.dumps(answer.as_dict())
+        response = DNSSECSignaturesFormattedResponse(answer).expire_with(*record_responses)
+        response.timed_out = [rr_type for rr_type, record_response in zip(answer.rr_types, record_responses)
+                              if record_response is None]
+        return response
+
+
+def _unless_timed_out(lookup, *args, deadline: Deadline = None):
+    """Private helper to the Resolver's composite methods. Runs one lookup of a larger answer. Returns its response,
+    or None if it ran out of time, so the rest of the answer can still be returned."""
+    try:
+        return lookup(*args, deadline=deadline)
+    except DeadlineExceeded:
+        return None
+
+
+def _record_ttls(formatted_answer: dict, result):
+    """Private helper to the Resolver. unbound reports a single ttl for the rrset of a result, so every record in the
+    answer gets that ttl. Returns answer key -> ttl, or None when the answer is empty."""
+    if formatted_answer['answer'] is None or result is None or getattr(result, 'ttl', None) is None:
+        return None
+    return {key: result.ttl for key in formatted_answer['answer']}
 
 
 # errors
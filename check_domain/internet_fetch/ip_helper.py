@@ -1,5 +1,27 @@
 # ipv4 & ipv6 helper classes:
 # reponsible for validating ip4 and ip6 bytes responses & mutating ip6 bytes responses into traditional ip6 string format.
+# ipv6 strings are built with one C level format of the eight hextets, and the zero run to compress is found by
+# searching that text for the longest ':0:0..:' pattern of a precomputed table, so an address takes a handful of calls.
+
+import struct
+from functools import lru_cache
+
+V6_CACHE = 1 << 16  # formatted ipv6 addresses kept for repeated answers
+_WORDS = struct.Struct("!8H")
+_HEXTETS = ":%x:%x:%x:%x:%x:%x:%x:%x:"  # lower case, no leading zeros, colons on both ends
+_ZERO_RUNS = tuple(":" + ":".join(["0"] * length) + ":" for length in range(8, 1, -1))  # longest first
+
+
+@lru_cache(maxsize=V6_CACHE)
+def _format_v6(ipv6_bytes: bytes):
+    """Private. The RFC 5952 text of 16 ipv6 bytes. See V6.bytes_to_hexadectet()."""
+    text = _HEXTETS % _WORDS.unpack(ipv6_bytes)
+    if ":0:0:" in text:
+        for run in _ZERO_RUNS:
+            start = text.find(run)  # the first of the longest runs
+            if start >= 0:
+                return text[1:start] + "::" + text[start + len(run):-1]
+    return text[1:-1]
 
 
 class V6:
@@ -15,111 +37,25 @@ class V6:
 
     @staticmethod
     def bytes_to_hexadectet(ipv6_bytes):
-        """Accepts ipv6 bytes. Returns a compressed ipv6 bytes in a hexadecimal string."""
+        """Accepts ipv6 bytes. Returns the address as a compressed, RFC 5952 canonical hexadecimal string: lower case
+        hextets without leading zeros, the longest run of two or more zero hextets (the first one on a tie) replaced
+        by '::'. ex, the bytes of 2001:db8:0:0:0:0:0:1 -> '2001:db8::1'. Repeated addresses are memoized."""
         if not isinstance(ipv6_bytes, type(b's')):
             raise TypeError("Input type: " + str(type(ipv6_bytes)) + " Requires type: " + str(type(b'')))
-
-        result = ""
-
-        index = 0
-        for i in ipv6_bytes:
-
-            is_trailing = index % 2 == 1
-            is_leading = index % 2 == 0
-            at_end = index == 15
-            is_leading_zero = False
-            if is_trailing and index >= 1:
-                is_leading_zero = ipv6_bytes[index-1] == 0
-
-            if i == 0 and is_trailing and ipv6_bytes[index-1] != 0:  # if I am a trailing zero
-                result += "00"
-            elif i == 0 and is_trailing and ipv6_bytes[index-1] == 0:
-                result += "0"
-            elif i == 0:
-                result += ""
-            elif i < 16 and is_leading:  # even is front
-                result += str(hex(i)[2:])
-            elif i < 16 and is_trailing and at_end:
-                result += str(hex(i)[2:])
-            elif i < 16 and is_trailing and is_leading_zero:
-                result += str(hex(i)[2:])
-            elif i < 16 and is_trailing:
-                result += "0" + str(hex(i)[2:])
-            elif i >= 16:
-                result += str(hex(i)[2:])
-
-            if is_trailing and not at_end:
-                result += ":"
-            index += 1
-
-        return V6._compress_colon_span(result)
+        if len(ipv6_bytes) != 16:
+            raise ValueError(f"An ipv6 address is 16 bytes, not {len(ipv6_bytes)}.")
+        return _format_v6(ipv6_bytes)
 
     @staticmethod
-    def _compress_colon_span(string):  # helper for bytes_to_hexadectets
-        """Takes an ipv6 string in hexadecimal.
-        Attempts to cut all ':' between the span of zeros in a series. span = [beg, end, beg, end... etc].
-        Assumes list len is even. May need to throw an exception!!!!
-        returns a compressed ipv6 formatted string. Not intended for public use."""
-        colonspan_list_tuples = V6._colon_span_indices(string)
-
-        if colonspan_list_tuples is None:
-            return string  # unchanged
-
-        result = ""
-        for start, stop in colonspan_list_tuples:
-            result += string[:start + 1] + string[stop:]
-
-        return result
-
-    @staticmethod
-    def _colon_span_indices(string):  # helper to _compress_colon_span: "ff:::::::ff" to "ff::ff"
-        """Records indices of ipv6 colon spans that cover a series of implied zeros.
-        Should always return an even length list [beg, end, beg, end...].
-        Allows _compress_colon_span to parse and cut ipv6 colons in a series.
-        Not intended for public use."""
-        if string is None or len(string) < 3:
-            return None
-
-        colonspan_list_tuples = []
-
-        length = len(string)
-        beg, end, cur = 0, 0, 0
-
-        while (cur < length):  # traverse string across
-            # find beginning
-            have_distance = (length - 1) - cur >= 2  # keeps from out of bounds
-            three_colons = False
-            if have_distance:
-                three_colons = string[cur] == ":" and string[cur + 1] == ":" and string[cur + 2] == ":"
-            beg = cur  # beg must be first occurance
-
-            compressible = have_distance and three_colons  # remainder of string is potentially compressible
-
-            if compressible:
-                for i in range(cur + 2, length):  # dns_state_analysis subsequence of ":"
-                    if i == length - 1:  # stop at end of string
-                        if string[i] != ":":
-                            end = i - 1
-                        else:
-                            end = i
-                        cur = length
-                        colonspan_list_tuples.append((beg, end))
-                        break
-                    elif string[i] != ":":  # not at end and current char not ":"
-                        end = i - 1  # previous char is the ending ":" in the previous sequence
-                        colonspan_list_tuples.append((beg, end))  # record beg, end sequence
-                        # now we have [beg, end] sequence; pick up at i on next iteration
-                        cur = end  # will be incremented at bottom of while loop
-                        break
-                    else:
-                        continue
-
-            cur += 1
-
-        if len(colonspan_list_tuples) == 0:
-            colonspan_list_tuples = None
-
-        return colonspan_list_tuples
+    def format_many(addresses):
+        """Accepts many ipv6 addresses at once: a contiguous buffer (bytes, bytearray or memoryview) of 16 byte
+        addresses, or an iterable of 16 byte 'bytes'. Returns their strings (see bytes_to_hexadectet()) in order."""
+        if isinstance(addresses, (bytes, bytearray, memoryview)):
+            buffer = memoryview(addresses).cast("B")
+            if len(buffer) % 16 != 0:
+                raise ValueError(f"A buffer of ipv6 addresses is a multiple of 16 bytes, not {len(buffer)}.")
+            return [_format_v6(bytes(buffer[start:start + 16])) for start in range(0, len(buffer), 16)]
+        return [V6.bytes_to_hexadectet(address) for address in addresses]
 
 
 class V4:
@@ -2,7 +2,11 @@ import socket as s
 import subprocess as sp
 from subprocess import PIPE
 import json
-from ..formatted_response import DNSHostMappingFormattedResponse, HostFormattedResponse
+from ..deadline import Deadline
+from ..formatted_response import DNSHostMappingFormattedResponse, HostFormattedResponse, HostReachAnswer
+from ..interning import intern_host
+
+PROBE_TIMEOUT = 2  # seconds a ping or a single port connection may take at most
 
 
 class Reacher(object):
@@ -12,11 +16,15 @@ class Reacher(object):
     The workhorse method of this class is the reach() method. All other reachability checks derive from this one.
     reach_mail(), reach_web(), and reach_ns() are simple short cuts to not have to remember common ports for those
     services.
+    Every method takes an optional 'deadline' (see deadline.py). Probes are shortened to the time left and skipped
+    once it has passed; the parts that did not finish (hosts, 'ping', 'ports') are listed in the response's
+    'timed_out'.
     Inherits from: object.
     Parent to: None.
-    Sibling to: Resolver, DmarcianClient"""
+    Sibling to: Resolver, DmarcianClient, AsyncReacher"""
 
-    def reach_dns_hosts(self, dns_answer: DNSHostMappingFormattedResponse, port_list: list = None, ping_it: bool = True, jsonic=False):
+    def reach_dns_hosts(self, dns_answer: DNSHostMappingFormattedResponse, port_list: list = None, ping_it: bool = True,
+                        jsonic=False, deadline: Deadline = None):
         """This represents the testing of reachability on a group of hosts of the same dns_host_type: mx, ns, web.
         It encapsulates multiple units of work: one unit of work for each host.
         dns_answer: dict - a formatted answer from a dns resolver. see Resolver class and/or formatted_response.py.
@@ -27,6 +35,38 @@ class Reacher(object):
         in the formatted response.
         Returns a dict of results for each host as a HostFormattedResponse."""
 
+        deadline = Deadline.coerce(deadline)
+        dns_answer, formatted_answer, ip_v, dns_host_type = Reacher._unpack_dns_answer(dns_answer)
+        timed_out = []
+        host_results = []
+
+	# perform reach testing according to dns_host_type
+        if formatted_answer['hosts'] is not None:
+            host_names = list(dns_answer['answer'].keys())  # get host name keys
+
+            for key in host_names:
+                ip = dns_answer['answer'][key]
+                if dns_host_type == "ns":
+                    h = self.reach_ns(ip, ip_v, key, dns_answer['domain'], port_list, ping_it, deadline=deadline)
+                elif dns_host_type == "mx":
+                    h = self.reach_mail(ip, ip_v, key, dns_answer['domain'], port_list, ping_it, deadline=deadline)
+                else:
+                    h = self.reach(ip, ip_v, key, dns_host_type, dns_answer['domain'], port_list, ping_it,
+                                   deadline=deadline)
+                if len(h.timed_out) > 0:
+                    timed_out.append(key)
+
+                host_results.append((key, h.get_response()))
+
+	# return test results
+        response = Reacher._hosts_response(formatted_answer, host_results, jsonic)
+        response.timed_out = timed_out
+        return response
+
+    @staticmethod
+    def _unpack_dns_answer(dns_answer: DNSHostMappingFormattedResponse):
+        """Private helper to reach_dns_hosts(), shared with AsyncReacher. Returns the raw dns answer, the formatted
+        answer to fill in ('hosts' is None when there are no hosts to test), the ip version and the dns host type."""
         if not isinstance(dns_answer, DNSHostMappingFormattedResponse):  # protection
             raise TypeError(f"The dns_answer must be of type: DNSHostMappingFormattedResponse. Not {type(dns_answer)}")
 
@@ -50,127 +90,148 @@ class Reacher(object):
 
         if dns_answer['answer'] is None or len(dns_answer['answer']) == 0:  # check for no hosts
             formatted_answer['hosts'] = None  # the request hosts types (ns, mx servers) do not exist
-	
-	# perform reach testing according to dns_host_type
-        else:
-            host_names = list(dns_answer['answer'].keys())  # get host name keys
-
-            for key in host_names:
-                ip = dns_answer['answer'][key]
-                if dns_host_type == "ns":
-                    h = self.reach_ns(ip, ip_v, key, dns_answer['domain'], port_list, ping_it).get_response()
-                elif dns_host_type == "mx":
-                    h = self.reach_mail(ip, ip_v, key, dns_answer['domain'], port_list, ping_it).get_response()
-                else:
-                    h = self.reach(ip, ip_v, key, dns_host_type, dns_answer['domain'], port_list, ping_it).get_response()
 
-	# copy test results
-                formatted_answer['hosts'][key] = {}
-                formatted_answer['hosts'][key]['pingable'] = h['pingable']
-                formatted_answer['hosts'][key]['ip'] = h['ip']
-                formatted_answer['hosts'][key]['ports_succeeded'] = h['ports_succeeded']
-                formatted_answer['hosts'][key]['can_connect'] = h['can_connect']
+        return dns_answer, formatted_answer, ip_v, dns_host_type
 
+    @staticmethod
+    def _hosts_response(formatted_answer: dict, host_results: list, jsonic=False):
+        """Private helper to reach_dns_hosts(), shared with AsyncReacher. Accepts the formatted answer from
+        _unpack_dns_answer() and the (host name, reach() answer) of every host tested. Returns the group's
+        HostFormattedResponse, wrapping a compact HostReachAnswer (or JSON when 'jsonic')."""
         if jsonic:
-            formatted_answer = json.dumps(formatted_answer)
-	
-	# return test results
-        return HostFormattedResponse(formatted_answer)
+            for host_name, h in host_results:
+                Reacher._copy_host_result(formatted_answer, host_name, h)
+            return HostFormattedResponse(json.dumps(formatted_answer))
+
+        names, results = None, None
+        if formatted_answer['hosts'] is not None:
+            names = [intern_host(host_name) for host_name, _ in host_results]
+            results = [(h['pingable'], intern_host(h['ip']), h['ports_succeeded'], h['can_connect'])
+                       for _, h in host_results]
+        return HostFormattedResponse(HostReachAnswer(formatted_answer['domain'], formatted_answer['rr_types'],
+                                                     names, results))
+
+    @staticmethod
+    def _copy_host_result(formatted_answer: dict, host_name: str, h: dict):
+        """Private helper to _hosts_response(). Copies the test results of one host into the group answer."""
+        formatted_answer['hosts'][host_name] = {}
+        formatted_answer['hosts'][host_name]['pingable'] = h['pingable']
+        formatted_answer['hosts'][host_name]['ip'] = h['ip']
+        formatted_answer['hosts'][host_name]['ports_succeeded'] = h['ports_succeeded']
+        formatted_answer['hosts'][host_name]['can_connect'] = h['can_connect']
 
     def reach(self, address: str, ip_version: int, host_name: str = None, host_type: str = None,
-              common_domain: str = None, port_list: list = None, ping_it: bool = True, as_json=False):
+              common_domain: str = None, port_list: list = None, ping_it: bool = True, as_json=False,
+              deadline: Deadline = None):
         """This represents the testing of reachability on a singular host, a single unit of work.
         The optional context parameters are intended to be obtained from a previous query to DNS in a
         DNSHostMappingFormattedResponse, but this method can also be used in isolation. 'host_name', 'host_type',
         'common_domain', 'port_list' are all optional. Set 'ping_it=False' to disable ping.
         :return: 'as_json=True' to enables returning a json response. Otherwise, a HostFormattedResponse is returned."""
+        deadline = Deadline.coerce(deadline)
         formatted_answer = {
             'host_name': host_name, 'host_type': host_type, 'domain': common_domain,
             'pingable': None, 'ip_v': ip_version, 'ip': address, 'ports_succeeded': None, 'can_connect': None
         }
+        timed_out = []
 
         if address is not None:
-            if ping_it == True:
-                packets_sent_received = ping(address, ip_version)  # test for ping
+            if ping_it == True and deadline.expired():
+                timed_out.append("ping")
+            elif ping_it == True:
+                # test for ping
+                packets_sent_received = ping(address, ip_version, maxtimeout=deadline.timeout(PROBE_TIMEOUT))
                 if packets_sent_received[1] >= 1:  # packets received
                     formatted_answer['pingable'] = True
                 else:
                     formatted_answer['pingable'] = False
 
-            if port_list is not None and len(port_list) > 0:
+            if port_list is not None and len(port_list) > 0 and deadline.expired():
+                timed_out.append("ports")
+            elif port_list is not None and len(port_list) > 0:
                 ports_successful = None  # test ports
                 formatted_answer['can_connect'] = False
                 if ip_version == 4:
-                    ports_successful = port_test(address, port_list, s.AF_INET, s.SOCK_STREAM)
+                    ports_successful = port_test(address, port_list, s.AF_INET, s.SOCK_STREAM, deadline)
                 elif ip_version == 6:
-                    ports_successful = port_test(address, port_list, s.AF_INET6, s.SOCK_STREAM)
+                    ports_successful = port_test(address, port_list, s.AF_INET6, s.SOCK_STREAM, deadline)
                 formatted_answer['ports_succeeded'] = ports_successful
                 if ports_successful is not None and len(ports_successful) > 0:
                     formatted_answer['can_connect'] = True
+                if deadline.expired() and (ports_successful is None or len(ports_successful) < len(port_list)):
+                    timed_out.append("ports")  # the failed ports may have been cut short
         else:  # ip is None; do not ping or connect
             formatted_answer['pingable'] = False
             formatted_answer['can_connect'] = False
 
         if as_json:
             formatted_answer = json.dumps(formatted_answer)
-        return HostFormattedResponse(formatted_answer)
+        response = HostFormattedResponse(formatted_answer)
+        response.timed_out = timed_out
+        return response
 
     def reach_mail(self, address: str, ip_version: int, host_name: str = None, common_domain: str = None,
-                   additional_ports: list = None, ping_it: bool = True, jsonic=False):
+                   additional_ports: list = None, ping_it: bool = True, jsonic=False, deadline: Deadline = None):
         """Requires same input as reach() method: ip & ip_version. Additional ports may be passed in explicitly so they
         can be checked. Duplicate ports are removed and are only checked one time. Contains a list of common mail ports
         in order to remove the chore of remembering port numbers."""
-        common_ports = [587, 465, 25]
-        if additional_ports is not None:
-            for port in additional_ports:
-                common_ports.append(port)
-        common_ports = list(set(common_ports))  # get list of unique ports
-        formatted_answer = self.reach(address, ip_version, host_name, "mx", common_domain, common_ports, ping_it,
-                                      as_json=jsonic).get_response()
+        common_ports = with_common_ports([587, 465, 25], additional_ports)
+        response = self.reach(address, ip_version, host_name, "mx", common_domain, common_ports, ping_it,
+                              deadline=deadline)
+        formatted_answer = response.get_response()
 
         if jsonic:
             formatted_answer = json.dumps(formatted_answer)
-        return HostFormattedResponse(formatted_answer)
+        return _with_timed_out(HostFormattedResponse(formatted_answer), response)
 
     def reach_web(self, address: str, ip_version: int, host_name: str = None, common_domain: str = None,
-                  additional_ports: list = None, ping_it: bool = True, jsonic=False):
+                  additional_ports: list = None, ping_it: bool = True, jsonic=False, deadline: Deadline = None):
         """Requires same input as reach() method: ip & ip_version. Additional ports may be passed in explicitly so they
                 can be checked. Duplicate ports are removed and are only checked one time. Contains a list of common
                 web ports in order to remove the chore of remembering port numbers."""
-        common_ports = [80, 443]
-        if additional_ports is not None:
-            for port in additional_ports:
-                common_ports.append(port)
-        common_ports = list(set(common_ports))  # get list of unique ports
-        formatted_answer = self.reach(address, ip_version, host_name, "web", common_domain, common_ports,
-                                      ping_it).get_response()
+        common_ports = with_common_ports([80, 443], additional_ports)
+        response = self.reach(address, ip_version, host_name, "web", common_domain, common_ports, ping_it,
+                              deadline=deadline)
+        formatted_answer = response.get_response()
 
         if jsonic:
             formatted_answer = json.dumps(formatted_answer)
-        return HostFormattedResponse(formatted_answer)
+        return _with_timed_out(HostFormattedResponse(formatted_answer), response)
 
     def reach_ns(self, address: str, ip_version: int, host_name: str = None, common_domain: str = None,
-                 additional_ports: list = None, ping_it: bool = True, jsonic=False):
+                 additional_ports: list = None, ping_it: bool = True, jsonic=False, deadline: Deadline = None):
         """
         Requires same input as reach() method: ip & ip_version. Additional ports may be passed in explicitly so they
         can be checked. Duplicate ports are removed and are only checked one time. Contains port 53 as the default
         dns nameserver port.
         """
-        common_ports = [53]
-        if additional_ports is not None:
-            for port in additional_ports:
-                common_ports.append(port)
-        common_ports = list(set(common_ports))  # get list of unique ports
-        formatted_answer = self.reach(address, ip_version, host_name, "ns", common_domain, common_ports,
-                                      ping_it).get_response()
+        common_ports = with_common_ports([53], additional_ports)
+        response = self.reach(address, ip_version, host_name, "ns", common_domain, common_ports, ping_it,
+                              deadline=deadline)
+        formatted_answer = response.get_response()
 
         if jsonic:
             formatted_answer = json.dumps(formatted_answer)
-        return HostFormattedResponse(formatted_answer)
+        return _with_timed_out(HostFormattedResponse(formatted_answer), response)
+
+
+def _with_timed_out(response: HostFormattedResponse, probed: HostFormattedResponse):
+    """Private. Carries the 'timed_out' parts of a probe over to the response wrapping its answer."""
+    response.timed_out = list(probed.timed_out)
+    return response
+
+
+def with_common_ports(common_ports: list, additional_ports: list = None):
+    """Returns the unique ports of a host type's common ports plus any additional ones. Shared with AsyncReacher."""
+    common_ports = list(common_ports)
+    if additional_ports is not None:
+        for port in additional_ports:
+            common_ports.append(port)
+    return list(set(common_ports))  # get list of unique ports
 
 
 # ping for testing for general reachable status of hosts with no regard to port specific services
-def ping(address: str, ip_version: int = 4, packet_num: int = 1, maxtimeout: int = 2):
+def ping(address: str, ip_version: int = 4, packet_num: int = 1, maxtimeout: float = PROBE_TIMEOUT):
     """Sends 1 packet (default quantity) to a host. Records quantity of received packets. Returns [sent, received].
     This is done regardless of whether or not an exception is thrown. packet_num below 1 is disallowed.
     This is meant to test the basic reachability of a host. For service (web, mail, other) see port_test()."""
@@ -191,10 +252,7 @@ def ping(address: str, ip_version: int = 4, packet_num: int = 1, maxtimeout: int
         if not isinstance(x, sp.CompletedProcess):
             raise TypeError("Ping returned NoneType. Subprocess may have failed.")
 
-        word_elements = x.stdout.decode().split()  # commas are contained in list elements
-        received_index = word_elements.index("received,")
-        receive_packets = word_elements[received_index - 1]  # value of packets received is 1 before "received"
-        sent_received = (sent, int(receive_packets))
+        sent_received = (sent, received_packets(x.stdout))
 
     except sp.TimeoutExpired:
         print("ping subprocess timed out")
@@ -208,29 +266,34 @@ def ping(address: str, ip_version: int = 4, packet_num: int = 1, maxtimeout: int
     return sent_received  # tuple pair to compare what was sent and what was received
 
 
+def received_packets(ping_output: bytes):
+    """Returns the number of packets received according to the summary line of ping's output."""
+    word_elements = ping_output.decode().split()  # commas are contained in list elements
+    received_index = word_elements.index("received,")
+    return int(word_elements[received_index - 1])  # value of packets received is 1 before "received"
+
+
 # tests for specific services at a host. Ex, mail [25, 487, 587], web [80, 443]
-def port_test(ip_str, port_list, address_family, sock_type):  # a client socket used to test ipv6 port connection
+# a client socket used to test ipv6 port connection
+def port_test(ip_str, port_list, address_family, sock_type, deadline: Deadline = None):
     """
     Accepts 1 address + port_list + socket_context(AF_INET or AF_INET6 + sock_type).
     Checks each port for connectivity. Returns a list of successful ports or None.
     This test is intended to be used for the primary means of "reachability" checking. If all ports fail,
     ping can be used as a fall back.
     This is meant to test the reachability of a specific service (mail, web, other). For general, non-port specific,
-    host-only reachability, see ping()."""
-    if not isinstance(ip_str, str):
-        raise TypeError("ip must be in string format.")
-    if not isinstance(port_list, list):
-        raise TypeError(f"port_list must be type:list. Not {type(port_list)}")
-    if len(port_list) == 0:
-        raise Exception(f"port_list {port_list} cannot be empty.")
-    if not isinstance(port_list[0], int):  # test an element for proper type
-        raise TypeError("elements in arg 'port_list' must be of type:int")
+    host-only reachability, see ping(). Each connection waits at most PROBE_TIMEOUT seconds, less when 'deadline' is
+    closer; ports left when the deadline has passed are not tested."""
+    check_port_test_args(ip_str, port_list)
+    deadline = Deadline.coerce(deadline)
 
     ports_successful = []
 
     for port in port_list:
+        if deadline.expired():
+            break
         my_s = s.socket(address_family, sock_type)
-        my_s.settimeout(2)
+        my_s.settimeout(deadline.timeout(PROBE_TIMEOUT))
         dest = (ip_str, port)
         try:
             my_s.connect(dest)
@@ -253,4 +316,16 @@ def port_test(ip_str, port_list, address_family, sock_type):  # a client socket
     return ports_successful
 
 
+def check_port_test_args(ip_str, port_list):
+    """Raises if port_test() is given a non string address or anything but a non-empty list of int ports."""
+    if not isinstance(ip_str, str):
+        raise TypeError("ip must be in string format.")
+    if not isinstance(port_list, list):
+        raise TypeError(f"port_list must be type:list. Not {type(port_list)}")
+    if len(port_list) == 0:
+        raise Exception(f"port_list {port_list} cannot be empty.")
+    if not isinstance(port_list[0], int):  # test an element for proper type
+        raise TypeError("elements in arg 'port_list' must be of type:int")
+
+
 # end
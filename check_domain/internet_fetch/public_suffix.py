@@ -0,0 +1,109 @@
+# public suffix helper:
+# compiles the Public Suffix List (https://publicsuffix.org/list/) into a label trie so that the organizational
+# (registrable) domain of any name can be found with one walk over its labels, right to left.
+
+import os
+import warnings
+from ..config import Config
+from ..normalize import idna_encode
+
+_RULE = "\x00"  # marker key stored in a trie node that ends a normal rule
+_EXCEPTION = "\x01"  # marker key stored in a trie node that ends an exception ('!') rule
+
+
+class PublicSuffixTrie(object):
+    """A helper class that holds the public suffix rules as a trie of labels, stored right to left.
+    ex, the rule 'co.uk' is stored as root['uk']['co']. Wildcard rules keep a '*' label and exception rules are
+    marked separately so that the prevailing rule of RFC-like PSL matching can be picked in a single walk.
+    If no rule matches, the implicit '*' rule applies and the public suffix is the last label."""
+
+    _default = None
+
+    def __init__(self, rules=()):
+        self.root = {}
+        for rule in rules:
+            self.add_rule(rule)
+
+    @classmethod
+    def from_file(cls, path: str):
+        """Accepts the path of a public_suffix_list.dat file. Returns a compiled trie.
+        A missing file yields an empty trie, in which case only the implicit '*' rule applies: organizational domains
+        are then the last two labels ('_dmarc.co.uk'), so a RuntimeWarning is issued."""
+        trie = cls()
+        if not os.path.exists(path):
+            warnings.warn(f"Public suffix list {path} not found: organizational domains fall back to the last two "
+                          f"labels. Install the list (ex, the 'publicsuffix' package) or set "
+                          f"Config.PUBLIC_SUFFIX_LIST.", RuntimeWarning, stacklevel=2)
+            return trie
+        with open(path, encoding="utf-8") as psl:
+            for line in psl:
+                line = line.strip()
+                if len(line) == 0 or line.startswith("//"):
+                    continue
+                trie.add_rule(line.split()[0])
+        return trie
+
+    @classmethod
+    def default(cls):
+        """Returns the trie compiled from Config.PUBLIC_SUFFIX_LIST. It is only loaded once per process."""
+        if cls._default is None:
+            cls._default = cls.from_file(Config.PUBLIC_SUFFIX_LIST)
+        return cls._default
+
+    def add_rule(self, rule: str):
+        marker = _RULE
+        if rule.startswith("!"):
+            marker, rule = _EXCEPTION, rule[1:]
+        node = self.root
+        for label in reversed(_to_ascii(rule).split(".")):
+            node = node.setdefault(label, {})
+        node[marker] = True
+
+    def public_suffix(self, domain: str):
+        """Accepts a domain name. Returns its public suffix. ex, 'www.example.co.uk' -> 'co.uk'."""
+        labels = _to_ascii(domain.rstrip(".")).split(".")
+        length = self._suffix_length(list(reversed(labels)))
+        return ".".join(labels[-length:])
+
+    def registrable_domain(self, domain: str):
+        """Accepts a domain name. Returns its organizational domain: the public suffix plus one label.
+        ex, 'mail.example.co.uk' -> 'example.co.uk'. Returns None when the domain is itself a public suffix."""
+        labels = _to_ascii(domain.rstrip(".")).split(".")
+        length = self._suffix_length(list(reversed(labels)))
+        if length >= len(labels):
+            return None
+        return ".".join(labels[-(length + 1):])
+
+    def _suffix_length(self, reversed_labels: list):
+        """Private. Returns the number of labels of the prevailing rule. Exception rules win over every other
+        rule, otherwise the longest matching rule wins."""
+        longest = 1  # implicit '*' rule
+        exception = None
+        stack = [(self.root, 0)]
+        while len(stack) > 0:
+            node, depth = stack.pop()
+            if _EXCEPTION in node:
+                if exception is None or depth - 1 > exception:
+                    exception = depth - 1
+            elif _RULE in node and depth > longest:
+                longest = depth
+            if depth == len(reversed_labels):
+                continue
+            label = reversed_labels[depth]
+            if label in node:
+                stack.append((node[label], depth + 1))
+            if "*" in node:
+                stack.append((node["*"], depth + 1))
+        if exception is not None:
+            return exception
+        return longest
+
+
+def _to_ascii(name: str):
+    """Lower cases a name and encodes any unicode labels to their punycode ('xn--') form, the way normalize.py does."""
+    name = name.lower()
+    if name.isascii():
+        return name
+    return idna_encode(name)
+
+# end
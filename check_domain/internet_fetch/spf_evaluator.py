@@ -0,0 +1,456 @@
+# local spf evaluation:
+# parses spf records (RFC 7208) fetched as TXT records by the Resolver class, expands their include:/redirect= trees
+# and evaluates them against an ip address. Each include/redirect target's expanded subtree is memoized at the class
+# level so that a provider record like '_spf.google.com' is only fetched once for every domain that references it,
+# until the ttl of its TXT records runs out.
+
+import ipaddress
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from .dns_resolvers import Resolver, DNSResolveError, Error
+from ..deadline import Deadline
+from ..formatted_response import SPFFormattedResponse
+
+SPF_VERSION = "v=spf1"
+MAX_DNS_LOOKUPS = 10  # RFC 7208 section 4.6.4
+LOOKUP_MECHANISMS = ("include", "a", "mx", "ptr", "exists")  # the 'redirect' modifier also counts as a lookup
+MECHANISMS = ("all", "include", "a", "mx", "ptr", "ip4", "ip6", "exists")
+QUALIFIERS = {'+': "pass", '-': "fail", '~': "softfail", '?': "neutral"}
+MODIFIER_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9._-]*$")
+SUBTREE_CACHE_SECONDS = 3600  # longest a memoized subtree is used, whatever the ttls of its records
+SUBTREE_CACHE_TARGETS = 1 << 14  # include/redirect targets kept in the cache, least recently used dropped first
+
+
+class SPFEvaluator(object):
+    """
+    Responsible for fetching, parsing and evaluating SPF records locally through the Resolver class instead of
+    making a round trip to the Dmarcian API.
+    inspect_spf() returns an SPFFormattedResponse holding the expanded include/redirect tree, the dns lookup count
+    and any errors found. It can be stored in an SPFState.
+    check_host() evaluates the record against an ip address and returns an RFC 7208 result string:
+    'pass', 'fail', 'softfail', 'neutral', 'none', 'permerror' or 'temperror'.
+    The expanded subtree of an include/redirect target is cached at the class level until the shortest ttl of its
+    TXT records (at most SUBTREE_CACHE_SECONDS), for at most SUBTREE_CACHE_TARGETS targets. Subtrees with a failed
+    lookup, or whose errors depend on the include path they were reached by (a loop, a chain too deep), are not cached.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: Resolver, Reacher, DmarcianClient
+    """
+
+    _subtree_cache = OrderedDict()  # include/redirect target -> (expiry, expanded subtree), least recent first
+    _cache_lock = threading.Lock()
+
+    def __init__(self, resolver: Resolver = None):
+        self.dns = resolver if resolver is not None else Resolver()
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._subtree_cache.clear()
+
+    def inspect_spf(self, domain: str, as_json: bool = False, deadline: Deadline = None):
+        """
+        Accepts domain: str. Fetches and expands the spf record of the domain. Its TXT lookups take the 'deadline'
+        and raise DeadlineExceeded once it passes. Output is something like,
+        {'domain': 'x.com', 'rr_types': ['txt', 'spf'], 'display_domain': 'x.com', 'records': ['v=spf1 ...'],
+         'valid': True, 'errors': [], 'lookup_count': 3, 'answer': {expanded tree}}
+        The expanded tree of every include/redirect target is memoized and shared between domains.
+        """
+        tree, _, _ = self._expand(domain.lower().rstrip("."), (), deadline)
+
+        errors = self._collect_errors(tree)
+        if tree['lookups'] > MAX_DNS_LOOKUPS:
+            errors.append(f"Too many dns lookups: {tree['lookups']} (limit is {MAX_DNS_LOOKUPS})")
+
+        formatted_answer = {
+            'domain': domain,
+            'rr_types': ["txt", "spf"],
+            'display_domain': domain,
+            'records': tree['records'],
+            'valid': tree['record'] is not None and len(errors) == 0,
+            'errors': errors,
+            'lookup_count': tree['lookups'],
+            'answer': tree
+        }
+
+        if as_json:
+            return json.dumps(formatted_answer)
+        return SPFFormattedResponse(formatted_answer)
+
+    def check_host(self, ip: str, domain: str, sender: str = None, helo: str = None):
+        """
+        Evaluates the spf record of 'domain' for a message sent from 'ip' (RFC 7208 section 4).
+        'sender' is the MAIL FROM address and defaults to 'postmaster@<domain>'. Returns the result as a str.
+        Mechanisms that need dns (a, mx, exists, include, redirect) are counted against the 10 lookup limit.
+        """
+        if sender is None:
+            sender = f"postmaster@{domain}"
+        context = {
+            'ip': ipaddress.ip_address(ip),
+            'sender': sender,
+            'helo': helo if helo is not None else domain,
+            'lookups': 0
+        }
+
+        try:
+            return self._check_host(domain.lower().rstrip("."), context)
+        except SPFPermError:
+            return "permerror"
+        except DNSResolveError:
+            return "temperror"
+
+    # expansion
+
+    def _expand(self, domain: str, parents: tuple, deadline: Deadline = None):
+        """Private. Builds the expanded tree of a domain's spf record. include/redirect targets are memoized.
+        Returns (node, expires_at, reusable): the earliest expiry of the TXT answers the tree was built from (None if
+        none had a ttl), and False if the tree holds a failed lookup or an error of the path it was reached by."""
+        node = {'domain': domain, 'record': None, 'records': [], 'terms': [], 'redirect': None,
+                'children': {}, 'lookups': 0, 'errors': [], 'temperror': False}
+
+        try:
+            node['records'], expires_at = self._fetch_spf_records(domain, deadline)
+        except DNSResolveError as dre:
+            node['errors'].append(f"temperror: {dre}")
+            node['temperror'] = True
+            return node, None, False
+
+        if len(node['records']) == 0:
+            return node, expires_at, True
+        if len(node['records']) > 1:
+            node['errors'].append(f"Multiple spf records found for {domain}")
+            return node, expires_at, True
+
+        node['record'] = node['records'][0]
+        try:
+            node['terms'], node['redirect'] = parse_spf(node['record'])
+        except SPFPermError as pe:
+            node['errors'].append(str(pe))
+            return node, expires_at, True
+
+        targets = []
+        for term in node['terms']:
+            if term['mechanism'] in LOOKUP_MECHANISMS:
+                node['lookups'] += 1
+            if term['mechanism'] == "include":
+                targets.append(term['value'])
+        if node['redirect'] is not None:
+            node['lookups'] += 1
+            targets.append(node['redirect'])
+
+        if len(parents) >= MAX_DNS_LOOKUPS:  # any deeper and the lookup limit is exceeded anyway
+            node['errors'].append(f"include chain too deep at {domain}")
+            return node, expires_at, False
+
+        reusable = True
+        for target in targets:
+            if "%" in target:  # macro targets depend on the message and are only expanded by check_host()
+                continue
+            target = target.lower().rstrip(".")
+            if target in parents or target == domain:
+                node['errors'].append(f"include loop detected at {target}")
+                reusable = False
+                continue
+            child, child_expires_at, child_reusable = self._expand_cached(target, parents + (domain,), deadline)
+            node['children'][target] = child
+            node['lookups'] += child['lookups']
+            node['temperror'] = node['temperror'] or child['temperror']
+            expires_at = _earliest(expires_at, child_expires_at)
+            reusable = reusable and child_reusable
+
+        return node, expires_at, reusable
+
+    def _expand_cached(self, target: str, parents: tuple, deadline: Deadline = None):
+        """Private. Memoized _expand() for include/redirect targets. Subtrees that are not reusable are expanded
+        again on every reference."""
+        now = time.time()
+        cached = SPFEvaluator._cached_subtree(target, now)
+        if cached is not None:
+            return cached[1], cached[0], True
+        subtree, expires_at, reusable = self._expand(target, parents, deadline)
+        if reusable:
+            expires_at = _earliest(expires_at, now + SUBTREE_CACHE_SECONDS)
+            SPFEvaluator._remember_subtree(target, subtree, expires_at)
+        return subtree, expires_at, reusable
+
+    @classmethod
+    def _cached_subtree(cls, target: str, now: float):
+        """Private. Returns the (expiry, subtree) cached for 'target', or None if there is none or it expired."""
+        with cls._cache_lock:
+            cached = cls._subtree_cache.get(target)
+            if cached is None:
+                return None
+            if cached[0] <= now:
+                del cls._subtree_cache[target]
+                return None
+            cls._subtree_cache.move_to_end(target)
+            return cached
+
+    @classmethod
+    def _remember_subtree(cls, target: str, subtree: dict, expires: float):
+        """Private. Caches the subtree of 'target' until 'expires'. Drops the least recently used targets beyond
+        SUBTREE_CACHE_TARGETS."""
+        with cls._cache_lock:
+            cls._subtree_cache.pop(target, None)
+            cls._subtree_cache[target] = (expires, subtree)
+            while len(cls._subtree_cache) > SUBTREE_CACHE_TARGETS:
+                cls._subtree_cache.popitem(last=False)
+
+    def _fetch_spf_records(self, domain: str, deadline: Deadline = None):
+        """Private. Returns the list of TXT records of a domain that start with 'v=spf1', and the time the answer
+        expires (None without ttls)."""
+        response = self.dns.get_txt(domain, deadline=deadline)
+        answer = response['answer']
+        expires_at = getattr(response, 'expires_at', None)
+        if answer is None:
+            return [], expires_at
+        return [record for record in answer.values()
+                if record.lower() == SPF_VERSION or record.lower().startswith(SPF_VERSION + " ")], expires_at
+
+    def _collect_errors(self, node: dict):
+        errors = list(node['errors'])
+        for child in node['children'].values():
+            errors.extend(self._collect_errors(child))
+        return errors
+
+    # evaluation
+
+    def _check_host(self, domain: str, context: dict):
+        """Private. check_host() function of RFC 7208 section 4.6 on an already normalized domain."""
+        cached = SPFEvaluator._cached_subtree(domain, time.time())
+        if cached is not None:
+            records = cached[1]['records']
+        else:
+            records, _ = self._fetch_spf_records(domain)
+
+        if len(records) == 0:
+            return "none"
+        if len(records) > 1:
+            raise SPFPermError(f"Multiple spf records found for {domain}")
+
+        terms, redirect = parse_spf(records[0])
+
+        for term in terms:
+            if term['mechanism'] in LOOKUP_MECHANISMS:
+                self._count_lookup(context)
+            if self._matches(term, domain, context):
+                return QUALIFIERS[term['qualifier']]
+
+        if redirect is not None:
+            self._count_lookup(context)
+            target = _expand_macros(redirect, domain, context).lower().rstrip(".")
+            result = self._check_host(target, context)
+            return "permerror" if result == "none" else result
+
+        return "neutral"
+
+    def _matches(self, term: dict, domain: str, context: dict):
+        """Private. Returns True when a single mechanism matches the ip in the context."""
+        mechanism = term['mechanism']
+        ip = context['ip']
+
+        if mechanism == "all":
+            return True
+        if mechanism in ("ip4", "ip6"):
+            return ip in _network(term['value'], ip.version, None, None)
+        if mechanism == "include":
+            target = _expand_macros(term['value'], domain, context).lower().rstrip(".")
+            result = self._check_host(target, context)  # errors raised below the include propagate as-is
+            if result == "none":
+                raise SPFPermError(f"include target {target} has no spf record")
+            return result == "pass"
+
+        target, cidr4, cidr6 = _split_cidr(term['value'], domain)
+        target = _expand_macros(target, domain, context).lower().rstrip(".")
+
+        if mechanism == "a":
+            return self._any_address_in(target, ip, cidr4, cidr6)
+        if mechanism == "mx":
+            answer = self.dns.get_mx(target)['answer']
+            if answer is None:
+                return False
+            if len(answer) > MAX_DNS_LOOKUPS:
+                raise SPFPermError(f"Too many mx records for {target}")
+            return any(self._any_address_in(name.rstrip("."), ip, cidr4, cidr6) for name in answer.values())
+        if mechanism == "exists":
+            return self.dns.get_a_records(target)['answer'] is not None
+        return False  # ptr is deprecated (RFC 7208 section 5.5) and never matches here
+
+    def _any_address_in(self, name: str, ip, cidr4, cidr6):
+        """Private. Resolves the address records of 'name' that match the ip version and tests network membership."""
+        if ip.version == 4:
+            answer = self.dns.get_a_records(name)['answer']
+        else:
+            answer = self.dns.get_aaaa_records(name)['answer']
+        if answer is None:
+            return False
+        for address in answer.values():
+            if ip in _network(address, ip.version, cidr4, cidr6):
+                return True
+        return False
+
+    @staticmethod
+    def _count_lookup(context: dict):
+        context['lookups'] += 1
+        if context['lookups'] > MAX_DNS_LOOKUPS:
+            raise SPFPermError(f"Too many dns lookups (limit is {MAX_DNS_LOOKUPS})")
+
+
+# parsing
+
+def parse_spf(record: str):
+    """Accepts an spf record str. Returns a (terms, redirect) tuple where 'terms' is a list of
+    {'qualifier', 'mechanism', 'value'} dicts in record order and 'redirect' is the redirect target or None.
+    Raises an SPFPermError for unknown mechanisms or a malformed record."""
+    parts = record.split()
+    if len(parts) == 0 or parts[0].lower() != SPF_VERSION:
+        raise SPFPermError(f"Not an spf record: {record}")
+
+    terms = []
+    redirect = None
+    for part in parts[1:]:
+        name, is_modifier, value = part.partition("=")
+        if is_modifier and MODIFIER_NAME.match(name):
+            if name.lower() == "redirect":
+                if redirect is not None:
+                    raise SPFPermError("redirect modifier found more than once")
+                redirect = value
+            continue  # 'exp' and unknown modifiers are ignored (RFC 7208 section 6)
+
+        qualifier = "+"
+        if part[0] in QUALIFIERS:
+            qualifier, part = part[0], part[1:]
+
+        mechanism, value = part, None
+        separator = re.search(r"[:/]", part)
+        if separator is not None:
+            mechanism = part[:separator.start()]
+            value = part[separator.end():] if separator.group() == ":" else part[separator.start():]
+        mechanism = mechanism.lower()
+
+        if mechanism not in MECHANISMS:
+            raise SPFPermError(f"Unknown mechanism: {part}")
+        if mechanism in ("include", "exists", "ip4", "ip6") and not value:
+            raise SPFPermError(f"Mechanism requires a value: {part}")
+
+        terms.append({'qualifier': qualifier, 'mechanism': mechanism, 'value': value})
+
+    if redirect is not None and any(term['mechanism'] == "all" for term in terms):
+        redirect = None  # redirect is ignored when the record contains an 'all' mechanism
+
+    return terms, redirect
+
+
+def _split_cidr(value: str, domain: str):
+    """Splits an a/mx mechanism value ('example.com/24//64', '/24' or None) into (target, cidr4, cidr6). Raises
+    SPFPermError for a prefix length that is not a number in range (RFC 7208 section 5.6)."""
+    if value is None:
+        return domain, None, None
+    cidr4, cidr6 = None, None
+    if "//" in value:
+        value, cidr6 = value.split("//", 1)
+        cidr6 = _prefix_length(cidr6, 128)
+    if "/" in value:
+        value, cidr4 = value.split("/", 1)
+        cidr4 = _prefix_length(cidr4, 32)
+    return (value if value else domain), cidr4, cidr6
+
+
+def _prefix_length(text: str, longest: int):
+    """Private helper to _split_cidr(). Returns the prefix length in 'text' as an int, from 0 to 'longest'."""
+    if not text.isdigit() or int(text) > longest:
+        raise SPFPermError(f"Invalid cidr length: /{text}")
+    return int(text)
+
+
+def _earliest(*times):
+    """Private. The earliest of 'times', ignoring None. None if all of them are."""
+    known = [moment for moment in times if moment is not None]
+    return min(known) if len(known) > 0 else None
+
+
+def _network(address: str, version: int, cidr4, cidr6):
+    """Returns an ip_network for 'address' or an empty tuple if the address family does not match 'version'."""
+    if "/" not in address:
+        prefix = cidr4 if version == 4 else cidr6
+        if prefix is not None:
+            address = f"{address}/{prefix}"
+    try:
+        network = ipaddress.ip_network(address, strict=False)
+    except ValueError:
+        raise SPFPermError(f"Invalid ip network: {address}")
+    if network.version != version:
+        return ()
+    return network
+
+
+def _expand_macros(value: str, domain: str, context: dict):
+    """Expands the macro-string of RFC 7208 section 7 for the letters s, l, o, d, i, h and the
+    reverse/truncate/delimiter transformers."""
+    if "%" not in value:
+        return value
+
+    sender = context['sender']
+    local, _, sender_domain = sender.rpartition("@")
+    ip = context['ip']
+    if ip.version == 4:
+        ip_str = str(ip)
+    else:
+        ip_str = ".".join(ip.exploded.replace(":", ""))
+    letters = {'s': sender, 'l': local or "postmaster", 'o': sender_domain, 'd': domain, 'i': ip_str,
+               'h': context['helo'], 'v': "in-addr" if ip.version == 4 else "ip6"}
+
+    result = ""
+    index = 0
+    while index < len(value):
+        char = value[index]
+        if char != "%":
+            result += char
+            index += 1
+            continue
+        following = value[index + 1:index + 2]
+        if following == "%":
+            result += "%"
+            index += 2
+        elif following == "_":
+            result += " "
+            index += 2
+        elif following == "-":
+            result += "%20"
+            index += 2
+        elif following == "{":
+            end = value.find("}", index)
+            if end == -1:
+                raise SPFPermError(f"Unterminated macro in {value}")
+            macro = value[index + 2:end]
+            letter = macro[:1].lower()
+            if letter not in letters:
+                raise SPFPermError(f"Unknown macro letter in {value}")
+            transformers = macro[1:]
+            digits = ""
+            while transformers[:1].isdigit():
+                digits, transformers = digits + transformers[0], transformers[1:]
+            reverse = transformers[:1].lower() == "r"
+            delimiters = transformers[1:] if reverse else transformers
+            parts = [letters[letter]]
+            for delimiter in (delimiters or "."):
+                parts = [piece for part in parts for piece in part.split(delimiter)]
+            if reverse:
+                parts.reverse()
+            if digits:
+                parts = parts[-int(digits):]
+            result += ".".join(parts)
+            index = end + 1
+        else:
+            raise SPFPermError(f"Invalid macro in {value}")
+    return result
+
+
+# errors
+class SPFPermError(Error):
+    pass
+
+# end
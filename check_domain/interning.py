@@ -0,0 +1,76 @@
+# interning of values that repeat across bulk results:
+# a bulk scan builds millions of answers out of a small number of distinct values. The same name servers and mail
+# exchangers (and their addresses) answer for thousands of domains, every answer of a kind carries the same rr_types
+# and a dnssec verdict is one of three words. The Resolver and Reacher pass these values through here while they build
+# answers, so each distinct value is stored once and every answer holding it shares that one object.
+# rr_types are shared as tuples: an answer's rr_types is read-only, like the rest of a compact answer.
+
+import sys
+
+HOST_NAMES_LIMIT = 1000000  # distinct host names and addresses kept; later new ones are returned as they are
+
+
+class SymbolTable(object):
+    """A table of distinct, immutable values. intern() returns the stored value equal to the one given, storing it
+    first if it is new, so equal values interned here are one object. Once 'limit' values are stored, new values are
+    no longer stored but returned as they are, which keeps a long running monitor from growing without bound.
+    Safe to share between threads: a value is stored with a single dict.setdefault().
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, values=(), limit: int = None):
+        self.symbols = {}
+        self.limit = limit
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+        """Returns the stored value equal to 'value'. None is returned as it is."""
+        if value is None:
+            return None
+        symbol = self.symbols.get(value)
+        if symbol is not None:
+            return symbol
+        if self.limit is not None and len(self.symbols) >= self.limit:
+            return value
+        return self.symbols.setdefault(value, value)
+
+    def clear(self):
+        self.symbols.clear()
+
+    def __contains__(self, value):
+        return value in self.symbols
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+SECURE = "secure"
+BOGUS = "bogus"
+INSECURE = "insecure"
+
+HOST_NAMES = SymbolTable(limit=HOST_NAMES_LIMIT)  # ns and mx host names and the addresses they map to
+RR_TYPES = SymbolTable()  # rr_types tuples
+VERDICTS = SymbolTable((SECURE, BOGUS, INSECURE))
+
+
+def intern_host(name):
+    """Accepts a host name or an address (or None). Returns the shared, equal string."""
+    return HOST_NAMES.intern(name)
+
+
+def intern_rr_types(rr_types):
+    """Accepts the rr_types of an answer, any sequence of record type names. Returns the shared, equal tuple."""
+    rr_types = tuple(rr_types)
+    shared = RR_TYPES.symbols.get(rr_types)
+    if shared is None:
+        shared = RR_TYPES.intern(tuple(sys.intern(rr_type) for rr_type in rr_types))
+    return shared
+
+
+def intern_verdict(verdict):
+    """Accepts a dnssec verdict ('secure', 'bogus', 'insecure' or None). Returns the shared, equal string."""
+    return VERDICTS.intern(verdict)
+
+# end
@@ -0,0 +1,310 @@
+# continuous monitoring:
+# DomainMonitor keeps re-checking a large set of domains, each on its own interval or on the ttls of its records, and
+# emits an event only when the answer of a check changes. The schedule lives in a hierarchical TimerWheel: inserting,
+# rescheduling and expiring a domain are O(1), and a watched domain costs a list slot, two dict entries and a small
+# fingerprint record, so millions of domains fit in a few hundred MB. First checks are spread over the interval,
+# every delay gets some jitter and an optional rate cap smooths what is left, so checks never go out in bursts.
+# usage: python -m check_domain.monitor domains.txt -o events.jsonl --interval 3600 [--max-per-second 200]
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .bulk_scan import STEP_WORKERS_PER_DOMAIN, read_domains, result_line
+from .domain_checker import DomainChecker, CHECKS
+from .fingerprint import state_fingerprint
+from .incremental import state_expires_at
+
+SLOT_BITS = 8  # 256 slots per level
+LEVELS = 4  # with 1 second ticks: level 0 spans 4 minutes, level 3 about 136 years
+DEFAULT_INTERVAL = 3600.0
+MIN_INTERVAL = 60.0  # ttl derived delays are kept between these two
+MAX_INTERVAL = 86400.0
+DEFAULT_JITTER = 0.1  # delays are stretched or shrunk by up to this fraction
+DEFAULT_CONCURRENCY = 32
+FINGERPRINT_BYTES = 8  # per check, in the compact per-domain fingerprint record
+
+
+class TimerWheel(object):
+    """Hierarchical timer wheel of keys. Time is counted in ticks of 'tick_seconds'. Level 0 has one slot per tick;
+    every level above has slots that span a whole turn of the level below. A key is filed on the lowest level whose
+    span covers its due tick and moves down a level each time the wheel turns past its slot (cascading), until it
+    expires from level 0. schedule(), cancel() and the expiry of a key are O(1) (amortized over the cascades).
+    Rescheduling does not search the old slot: stale copies stay in place and are dropped when reached.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, tick_seconds: float = 1.0, now: float = None, slot_bits: int = SLOT_BITS, levels: int = LEVELS):
+        self.tick_seconds = tick_seconds
+        self.origin = time.monotonic() if now is None else now
+        self.slot_bits = slot_bits
+        self.mask = (1 << slot_bits) - 1
+        self.levels = [[None] * (1 << slot_bits) for _ in range(levels)]  # slot lists are created when first used
+        self.overflow = []  # keys due beyond the span of the top level
+        self.tick = 0  # the last tick that has expired
+        self.due = {}  # key -> due tick
+
+    def __len__(self):
+        return len(self.due)
+
+    def __contains__(self, key):
+        return key in self.due
+
+    def schedule(self, key, delay: float):
+        """Schedules 'key' to expire 'delay' seconds after the wheel's current time, replacing any earlier
+        schedule. Keys expire on the first tick at or after their due time, and never on the current one."""
+        self.schedule_tick(key, self.tick + max(1, int(-(-delay // self.tick_seconds))))
+
+    def schedule_tick(self, key, due: int):
+        due = max(due, self.tick + 1)
+        self.due[key] = due
+        self._file(key, due)
+
+    def cancel(self, key):
+        self.due.pop(key, None)
+
+    def advance(self, now: float = None):
+        """Turns the wheel to 'now' (time.monotonic() by default). Returns the keys that expired, in due order."""
+        now = time.monotonic() if now is None else now
+        target = int((now - self.origin) // self.tick_seconds)
+        expired = []
+        while self.tick < target:
+            self.tick += 1
+            self._cascade()
+            slot_index = self.tick & self.mask
+            slot = self.levels[0][slot_index]
+            if slot is None:
+                continue
+            self.levels[0][slot_index] = None
+            for key in slot:
+                if self.due.get(key) == self.tick:
+                    del self.due[key]
+                    expired.append(key)
+        return expired
+
+    def next_due(self):
+        """Seconds until the next tick, from the wheel's current time. Callers sleep this long between advances."""
+        return self.origin + (self.tick + 1) * self.tick_seconds - time.monotonic()
+
+    def _file(self, key, due: int):
+        """Private. Puts 'key' in the slot of 'due' on the lowest level that still shares all higher digits with
+        the current tick."""
+        level = max(0, (due ^ self.tick).bit_length() - 1) // self.slot_bits
+        if level >= len(self.levels):
+            self.overflow.append(key)
+            return
+        slots = self.levels[level]
+        index = (due >> (self.slot_bits * level)) & self.mask
+        if slots[index] is None:
+            slots[index] = []
+        slots[index].append(key)
+
+    def _cascade(self):
+        """Private. When the current tick starts a new turn of a level, refiles the keys of that level's next
+        slot on the levels below. Stale copies (rescheduled or cancelled keys) are dropped."""
+        for level in range(len(self.levels), 0, -1):
+            shift = self.slot_bits * level
+            if self.tick & ((1 << shift) - 1) != 0:
+                continue
+            if level == len(self.levels):
+                pending, self.overflow = self.overflow, []
+            else:
+                index = (self.tick >> shift) & self.mask
+                pending, self.levels[level][index] = self.levels[level][index] or [], None
+            for key in pending:
+                due = self.due.get(key)
+                if due is not None and due >> shift == self.tick >> shift:
+                    self._file(key, due)
+                elif due is not None and level == len(self.levels):
+                    self.overflow.append(key)  # still beyond the top level
+
+
+class DomainMonitor(object):
+    """Re-checks watched domains forever and calls on_change(domain, states) with only the checks whose answers
+    changed. The first check of a domain sets its baseline and emits nothing.
+    A domain is due again after its own interval or, when its answers carry ttls, when the first of its records
+    expires (kept between 'min_interval' and 'max_interval'), stretched or shrunk by up to 'jitter'. A check that
+    raised keeps its previous answer and is retried after 'min_interval'.
+    Per domain the monitor keeps one fingerprint record (8 bytes per check) and a custom interval if there is one.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: IncrementalScanner."""
+
+    def __init__(self, on_change, checks: list = None, checker: DomainChecker = None,
+                 interval: float = DEFAULT_INTERVAL, min_interval: float = MIN_INTERVAL,
+                 max_interval: float = MAX_INTERVAL, jitter: float = DEFAULT_JITTER,
+                 concurrency: int = DEFAULT_CONCURRENCY, max_per_second: int = None, deadline: float = None,
+                 tick_seconds: float = 1.0):
+        self.checks = list(CHECKS.keys()) if checks is None else list(checks)
+        for check in self.checks:
+            if check not in CHECKS:
+                raise ValueError(f"Unknown check '{check}'. Choose from: {list(CHECKS.keys())}")
+        self.on_change = on_change
+        if checker is None:
+            checker = DomainChecker(executor=ThreadPoolExecutor(max_workers=concurrency * STEP_WORKERS_PER_DOMAIN,
+                                                                thread_name_prefix="monitor-steps"))
+        self.checker = checker
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.max_per_second = max_per_second
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.wheel = TimerWheel(tick_seconds)
+        self.fingerprints = {}  # domain -> fingerprint record of its last answers, None before the first check
+        self.intervals = {}  # domain -> interval, only for domains not on the default one
+        self.ready = deque()  # domains that are due but not started yet
+        self.counts = {'checked': 0, 'changed': 0, 'errors': 0}
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def add(self, domain: str, interval: float = None):
+        """Starts watching a domain. Its first check falls at a random point of its interval."""
+        with self.lock:
+            if interval is not None:
+                self.intervals[domain] = interval
+            if domain not in self.fingerprints:
+                self.fingerprints[domain] = None
+                self.wheel.schedule(domain, random.uniform(0, self.intervals.get(domain, self.interval)))
+
+    def remove(self, domain: str):
+        with self.lock:
+            self.fingerprints.pop(domain, None)
+            self.intervals.pop(domain, None)
+            self.wheel.cancel(domain)
+
+    def run(self, stop: threading.Event = None):
+        """Checks due domains until 'stop' is set. Returns the monitor's counters."""
+        stop = threading.Event() if stop is None else stop
+        in_flight = {}  # future -> domain
+        second, started_this_second = None, 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="monitor") as pool:
+            while not stop.is_set():
+                with self.lock:
+                    self.ready.extend(self.wheel.advance())
+                    if int(time.monotonic()) != second:
+                        second, started_this_second = int(time.monotonic()), 0
+                    while len(self.ready) > 0 and len(in_flight) < self.concurrency \
+                            and (self.max_per_second is None or started_this_second < self.max_per_second):
+                        domain = self.ready.popleft()
+                        if domain in self.fingerprints and domain not in self.wheel:  # not removed or re-added
+                            in_flight[pool.submit(self._check, domain)] = domain
+                            started_this_second += 1
+
+                timeout = max(0.0, min(self.wheel.next_due(), 1.0 - (time.monotonic() % 1.0)))
+                if len(in_flight) == 0:
+                    stop.wait(timeout)
+                    continue
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._settle(in_flight.pop(future), future.result())
+            wait(in_flight)
+        return dict(self.counts)
+
+    def _check(self, domain: str):
+        """Private. Runs the checks of a domain. Returns its states, or the exception check_all() raised."""
+        try:
+            return self.checker.check_all(domain, checks=self.checks, deadline=self.deadline)
+        except Exception as e:
+            return e
+
+    def _settle(self, domain: str, states):
+        """Private. Compares fresh states with the domain's last answers, emits the changed ones and schedules the
+        domain's next check."""
+        changed = {}
+        with self.lock:
+            self.counts['checked'] += 1
+            if domain not in self.fingerprints:  # removed while being checked
+                return
+            previous = self.fingerprints[domain]
+            if isinstance(states, Exception):
+                self.counts['errors'] += 1
+                self.wheel.schedule(domain, self._jittered(self.min_interval))
+                return
+            record = bytearray(previous if previous is not None else bytes(FINGERPRINT_BYTES * len(self.checks)))
+            errors = False
+            for position, check in enumerate(self.checks):
+                state = states.get(check)
+                if state is None or isinstance(state, Exception) or state.is_partial():
+                    errors = True  # keeps the previous fingerprint
+                    continue
+                fingerprint = _short_fingerprint(state)
+                span = slice(position * FINGERPRINT_BYTES, (position + 1) * FINGERPRINT_BYTES)
+                if previous is not None and record[span] != fingerprint:
+                    changed[check] = state
+                record[span] = fingerprint
+            self.fingerprints[domain] = bytes(record)
+            if errors:
+                self.counts['errors'] += 1
+            if len(changed) > 0:
+                self.counts['changed'] += 1
+            delay = self.min_interval if errors else self._next_delay(domain, states)
+            self.wheel.schedule(domain, self._jittered(delay))
+        if len(changed) > 0:
+            self.on_change(domain, changed)
+
+    def _next_delay(self, domain: str, states: dict):
+        """Private. The domain's interval, or the time until its first record expires when its answers carry ttls."""
+        expiries = [state_expires_at(state) for state in states.values() if not isinstance(state, Exception)]
+        expiries = [expires_at for expires_at in expiries if expires_at is not None]
+        if len(expiries) == 0:
+            return self.intervals.get(domain, self.interval)
+        return min(self.max_interval, max(self.min_interval, min(expiries) - time.time()))
+
+    def _jittered(self, delay: float):
+        """Private."""
+        return delay * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+
+def _short_fingerprint(state):
+    """The first FINGERPRINT_BYTES of a state's fingerprint. Enough to tell a changed answer from the last one."""
+    return bytes.fromhex(state_fingerprint(state))[:FINGERPRINT_BYTES]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch domains and write an event line whenever a check changes.")
+    parser.add_argument("input", help="file with one domain per line, or '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL event file (default: stdout)")
+    parser.add_argument("--checks", default=",".join(CHECKS.keys()), help="comma separated checks to run")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between checks of a domain whose answers carry no ttl")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="domains in flight at once")
+    parser.add_argument("--max-per-second", type=int, help="cap on checks started per second")
+    parser.add_argument("--deadline", type=float, help="seconds each domain gets for all of its checks")
+    args = parser.parse_args(argv)
+
+    sink = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    sink_lock = threading.Lock()
+
+    def write_event(domain, states):
+        line = result_line(domain, states)
+        with sink_lock:
+            sink.write(line + "\n")
+            sink.flush()
+
+    monitor = DomainMonitor(write_event, checks=args.checks.split(","), interval=args.interval,
+                            concurrency=args.concurrency, max_per_second=args.max_per_second, deadline=args.deadline)
+    for domain in read_domains(args.input):
+        monitor.add(domain)
+    try:
+        stats = monitor.run()
+    except KeyboardInterrupt:
+        stats = dict(monitor.counts)
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+# end
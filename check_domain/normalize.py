@@ -0,0 +1,89 @@
+# domain name normalization:
+# names arrive as users typed them: mixed case, unicode, with or without the trailing root dot. normalize_domain()
+# turns every spelling of a name into one canonical ascii form (IDNA 2008 punycode labels, lower case, no trailing
+# dot) before it reaches the Resolver, so the same name is looked up, cached and deduplicated once. Results are
+# memoized: bulk inputs repeat names and IDNA encoding is slow.
+# Unicode labels are encoded with UTS #46 non-transitional processing through the 'idna' package, so 'faß.de' stays
+# 'xn--fa-hia.de' instead of becoming the different domain 'fass.de' (IDNA 2003). Without the package, Python's
+# IDNA 2003 codec is used and names with the characters the two standards encode differently are refused.
+# group_key() maps a name to its registrable domain through the compiled PublicSuffixTrie, and group_domains()
+# reorders a domain stream, a bounded window at a time, so names of one organization are scanned next to each other
+# and share the resolver and DMARC caches while they are warm.
+# usage: normalize_domain("WWW.Bücher.Example.") -> "www.xn--bcher-kva.example"
+#        group_key("mail.example.co.uk") -> "example.co.uk"
+#        for domain in group_domains(read_domains("domains.txt")): ...
+
+from functools import lru_cache
+
+try:
+    import idna
+except ImportError:  # optional: installed with requests. Without it, see DEVIATIONS
+    idna = None
+
+NORMALIZE_CACHE = 1 << 17  # names kept by the normalize_domain() and group_key() memos
+GROUP_WINDOW = 10000  # domains reordered at a time by group_domains()
+DEVIATIONS = frozenset("\u00df\u03c2\u200c\u200d")  # ß, final sigma, ZWNJ, ZWJ: IDNA 2003 maps them to other names
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE)
+def normalize_domain(domain: str):
+    """Returns the canonical form of a domain name: surrounding white space and the trailing root dot removed, lower
+    case, unicode labels encoded to punycode ('xn--', IDNA 2008). Raises ValueError for a name with an empty label or
+    one that cannot be encoded."""
+    name = domain.strip().rstrip(".")
+    if name.isascii():
+        name = name.lower()
+    else:
+        name = idna_encode(name).rstrip(".")
+    if len(name) == 0 or name.startswith(".") or ".." in name:
+        raise ValueError(f"Invalid domain name '{domain}': empty label")
+    return name
+
+
+def idna_encode(name: str):
+    """Returns a name with its unicode labels encoded to punycode, lower case: UTS #46 non-transitional mapping (which
+    also splits on ideographic full stops) and IDNA 2008 labels. Ascii labels, ex. '_dmarc', are kept as they are.
+    Raises ValueError for a name that cannot be encoded."""
+    try:
+        if idna is None:
+            if not DEVIATIONS.isdisjoint(name):
+                raise UnicodeError("it has characters IDNA 2003 maps to another name (install 'idna')")
+            return name.encode("idna").decode("ascii").lower()
+        mapped = idna.uts46_remap(name, std3_rules=False, transitional=False)
+        return ".".join(label if label.isascii() else idna.alabel(label).decode("ascii")
+                        for label in mapped.split("."))
+    except UnicodeError as e:  # idna.IDNAError is a UnicodeError
+        raise ValueError(f"Invalid domain name '{name}': {e}") from e
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE)
+def group_key(domain: str):
+    """Returns the registrable domain of a (normalized) name, or the name itself when it is a public suffix.
+    ex, 'mail.example.co.uk' and 'www.example.co.uk' both map to 'example.co.uk'."""
+    from .internet_fetch.public_suffix import PublicSuffixTrie  # imported here: the resolvers import this module
+    name = normalize_domain(domain)
+    registrable = PublicSuffixTrie.default().registrable_domain(name)
+    return name if registrable is None else registrable
+
+
+def group_domains(domains, window: int = GROUP_WINDOW):
+    """Lazily yields the domains of the 'domains' iterable grouped by registrable domain within every 'window'
+    domains: groups in order of their first name, names in input order. A name that does not normalize is its own
+    group. The same input always comes out in the same order, so scan checkpoints stay valid."""
+    groups = {}
+    held = 0
+    for domain in domains:
+        try:
+            key = group_key(domain)
+        except ValueError:
+            key = domain
+        groups.setdefault(key, []).append(domain)
+        held += 1
+        if held >= window:
+            for names in groups.values():
+                yield from names
+            groups, held = {}, 0
+    for names in groups.values():
+        yield from names
+
+# end
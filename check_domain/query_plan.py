@@ -0,0 +1,88 @@
+# query plans for domain checking:
+# a QueryPlan is a small dependency graph (DAG) of named steps. Every step runs exactly once, as soon as the steps it
+# depends on have finished, so independent branches (ex, the ns lookups and the dnssec lookups) run at the same time.
+
+from concurrent.futures import FIRST_COMPLETED, wait
+from .deadline import Deadline, DeadlineExceeded
+
+
+class QueryPlan(object):
+    """Holds named steps and the steps each of them depends on. A step is a callable that receives the results of its
+    dependencies as positional arguments, in the order the dependencies were given.
+    run() executes only the steps needed for the requested targets on an executor and returns every step result.
+    A step that raises does not stop the plan: its exception is stored as its result and every step depending on it
+    gets the same exception without being run.
+    Under a deadline, run() returns when it passes: steps still running or not yet started get a DeadlineExceeded
+    as their result. Running steps cannot be interrupted; their results are ignored.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self):
+        self.steps = {}  # name -> (callable, tuple of dependency names)
+
+    def add(self, name: str, step, dependencies: tuple = ()):
+        for dependency in dependencies:
+            if dependency not in self.steps:
+                raise ValueError(f"Step '{name}' depends on unknown step '{dependency}'. Add dependencies first.")
+        self.steps[name] = (step, tuple(dependencies))
+        return self
+
+    def required_steps(self, targets):
+        """Returns the set of step names needed to produce 'targets'."""
+        required = set()
+        pending = list(targets)
+        while len(pending) > 0:
+            name = pending.pop()
+            if name in required:
+                continue
+            if name not in self.steps:
+                raise ValueError(f"Unknown step '{name}'.")
+            required.add(name)
+            pending.extend(self.steps[name][1])
+        return required
+
+    def run(self, targets, executor, deadline: Deadline = None):
+        """Runs every step needed for 'targets' on 'executor' (a concurrent.futures.Executor), until 'deadline'.
+        Returns a dict of step name -> result (or the exception the step raised)."""
+        deadline = Deadline.coerce(deadline)
+        required = self.required_steps(targets)
+        results = {}
+        running = {}  # future -> step name
+
+        while len(results) < len(required):
+            for name in required:
+                if name in results or name in running.values():
+                    continue
+                step, dependencies = self.steps[name]
+                if any(dependency not in results for dependency in dependencies):
+                    continue
+                failed = [results[dependency] for dependency in dependencies
+                          if isinstance(results[dependency], Exception)]
+                if len(failed) > 0:
+                    results[name] = failed[0]
+                    continue
+                arguments = [results[dependency] for dependency in dependencies]
+                running[executor.submit(step, *arguments)] = name
+
+            if len(running) == 0:
+                continue  # steps were resolved from failed dependencies; schedule again
+
+            done, _ = wait(list(running.keys()), timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if len(done) == 0:  # the deadline passed
+                for future in running:
+                    future.cancel()
+                for name in required:
+                    if name not in results:
+                        results[name] = DeadlineExceeded(f"Deadline exceeded before step '{name}' finished.")
+                break
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = e
+
+        return results
+
+# end
@@ -0,0 +1,230 @@
+# scheduling mixed check workloads:
+# interactive checks (a user asking for a re-check) and batch work (bulk scans) share one pool of workers in front of
+# DomainChecker. Queued checks are served by weighted fair queuing between priority classes, and some workers are
+# reserved for interactive checks, so a long bulk scan can slow an on-demand check down but never starve it.
+# usage: scheduler = CheckScheduler(workers=16)
+#        future = scheduler.submit("example.com", priority="interactive", deadline=5)
+#        BulkScanner(checker=scheduler.checker_for("batch"), concurrency=8).scan(domains, sink)
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from .deadline import Deadline, DeadlineExceeded
+from .domain_checker import DomainChecker, CHECKS
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+DEFAULT_WEIGHTS = {INTERACTIVE: 8, BATCH: 1}  # share of the general workers each class gets while both are queued
+DEFAULT_RESERVED = {INTERACTIVE: 2}  # workers that only ever serve a class
+DEFAULT_WORKERS = 16
+LATENCY_WINDOW = 1000  # most recent checks per class kept for the latency percentiles
+
+
+class _Job(object):
+    """Private. One queued check_all() call."""
+
+    def __init__(self, domain: str, checks: list, deadline: Deadline, priority: str, finish_tag: float):
+        self.domain = domain
+        self.checks = checks
+        self.deadline = deadline
+        self.priority = priority
+        self.finish_tag = finish_tag  # virtual time at which fair queuing considers the job served
+        self.future = Future()
+        self.queued_at = time.monotonic()
+        self.started_at = None
+
+
+class PriorityClassMetrics(object):
+    """Counters and recent latencies of one priority class. Updated under the scheduler's lock.
+    wait: seconds between submit() and a worker starting the check. latency: submit() to result."""
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0  # ran out of time while still queued
+        self.running = 0
+        self.waits = deque(maxlen=LATENCY_WINDOW)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def as_dict(self, queued: int):
+        return {'queued': queued, 'running': self.running, 'submitted': self.submitted,
+                'completed': self.completed, 'failed': self.failed, 'expired': self.expired,
+                'wait_p50': _percentile(self.waits, 50), 'wait_p95': _percentile(self.waits, 95),
+                'latency_p50': _percentile(self.latencies, 50), 'latency_p95': _percentile(self.latencies, 95)}
+
+
+class CheckScheduler(object):
+    """Runs DomainChecker.check_all() for queued domains on a fixed set of worker threads.
+    Every check belongs to a priority class. Classes are served by weighted fair queuing: each queued check gets a
+    virtual finish time that grows by 1 / weight of its class, and free workers take the check with the earliest one,
+    so while several classes are queued each gets a share of the workers proportional to its weight, and an idle
+    class's unused share goes to the others. 'reserved' sets aside workers that only serve one class (by default 2
+    for interactive checks), so interactive checks start at once even while every general worker is busy with a
+    slow batch check.
+    A check's deadline starts counting at submit(), so queueing time is part of it; checks whose deadline passes
+    while queued are not run and fail with DeadlineExceeded.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: BulkScanner."""
+
+    def __init__(self, checker: DomainChecker = None, workers: int = DEFAULT_WORKERS, weights: dict = None,
+                 reserved: dict = None):
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.reserved = dict(DEFAULT_RESERVED if reserved is None else reserved)
+        for priority, weight in self.weights.items():
+            if weight <= 0:
+                raise ValueError(f"The weight of priority class '{priority}' must be positive.")
+        for priority in self.reserved:
+            if priority not in self.weights:
+                raise ValueError(f"Unknown priority class '{priority}'. Choose from: {list(self.weights.keys())}")
+        if workers <= sum(self.reserved.values()):
+            raise ValueError("Keep at least one worker that is not reserved for a single priority class.")
+
+        self.checker = checker if checker is not None else DomainChecker()
+        self.condition = threading.Condition()
+        self.queues = {priority: deque() for priority in self.weights}
+        self.last_finish = {priority: 0.0 for priority in self.weights}
+        self.virtual_time = 0.0
+        self.metrics_by_class = {priority: PriorityClassMetrics() for priority in self.weights}
+        self.closed = False
+
+        self.threads = []
+        for priority, count in self.reserved.items():
+            for _ in range(count):
+                self._start_worker((priority,))
+        for _ in range(workers - sum(self.reserved.values())):
+            self._start_worker(tuple(self.weights.keys()))
+
+    def submit(self, domain: str, checks: list = None, priority: str = BATCH, deadline=None):
+        """Queues check_all(domain, checks) in a priority class. Returns a concurrent.futures.Future of its states."""
+        if priority not in self.weights:
+            raise ValueError(f"Unknown priority class '{priority}'. Choose from: {list(self.weights.keys())}")
+        checks = list(CHECKS.keys()) if checks is None else list(checks)
+        for check in checks:
+            if check not in CHECKS:
+                raise ValueError(f"Unknown check '{check}'. Choose from: {list(CHECKS.keys())}")
+        deadline = Deadline.coerce(deadline)
+
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("The scheduler has been shut down.")
+            # an idle class starts at the current virtual time instead of spending credit saved up while idle
+            start = max(self.virtual_time, self.last_finish[priority])
+            self.last_finish[priority] = start + 1.0 / self.weights[priority]
+            job = _Job(domain, checks, deadline, priority, self.last_finish[priority])
+            self.queues[priority].append(job)
+            self.metrics_by_class[priority].submitted += 1
+            self.condition.notify_all()
+        return job.future
+
+    def check_all(self, domain: str, checks: list = None, priority: str = BATCH, deadline=None):
+        """Blocking submit(): waits for and returns the states, or raises what check_all() raised."""
+        return self.submit(domain, checks, priority, deadline).result()
+
+    def checker_for(self, priority: str):
+        """Returns a stand-in for DomainChecker whose check_all() goes through this scheduler in 'priority' class,
+        ex. to have a BulkScanner share the workers with interactive checks."""
+        if priority not in self.weights:
+            raise ValueError(f"Unknown priority class '{priority}'. Choose from: {list(self.weights.keys())}")
+        return _ScheduledChecker(self, priority)
+
+    def queue_depths(self):
+        with self.condition:
+            return {priority: len(queue) for priority, queue in self.queues.items()}
+
+    def metrics(self):
+        """Returns priority class -> queue depth, running and finished counts, and wait / latency percentiles
+        (seconds) over the most recent checks."""
+        with self.condition:
+            return {priority: metrics.as_dict(len(self.queues[priority]))
+                    for priority, metrics in self.metrics_by_class.items()}
+
+    def shutdown(self, wait: bool = True):
+        """Stops taking checks. Checks already queued still run. With 'wait', returns once they have."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def _start_worker(self, serves: tuple):
+        """Private. Starts a worker thread serving the priority classes in 'serves'."""
+        thread = threading.Thread(target=self._work, args=(serves,), daemon=True,
+                                  name=f"check-scheduler-{'-'.join(serves)}-{len(self.threads)}")
+        self.threads.append(thread)
+        thread.start()
+
+    def _work(self, serves: tuple):
+        """Private. Worker loop: takes the next job of the classes in 'serves' and runs it, until shut down."""
+        while True:
+            job = self._next_job(serves)
+            if job is None:
+                return
+            self._run(job)
+
+    def _next_job(self, serves: tuple):
+        """Private. Blocks until a job of one of the classes in 'serves' is queued and dequeues the one with the
+        earliest finish tag. Returns None once the scheduler is shut down and those queues are empty."""
+        with self.condition:
+            while True:
+                heads = [self.queues[priority][0] for priority in serves if len(self.queues[priority]) > 0]
+                if len(heads) > 0:
+                    job = min(heads, key=lambda head: head.finish_tag)
+                    self.queues[job.priority].popleft()
+                    self.virtual_time = max(self.virtual_time, job.finish_tag)
+                    job.started_at = time.monotonic()
+                    metrics = self.metrics_by_class[job.priority]
+                    metrics.waits.append(job.started_at - job.queued_at)
+                    metrics.running += 1
+                    return job
+                if self.closed:
+                    return None
+                self.condition.wait()
+
+    def _run(self, job: _Job):
+        """Private. Runs a dequeued job and settles its future."""
+        outcome = "completed"
+        if not job.future.set_running_or_notify_cancel():
+            outcome = None  # cancelled while queued
+        elif job.deadline.expired():
+            job.future.set_exception(DeadlineExceeded(f"Deadline exceeded while {job.domain} was queued."))
+            outcome = "expired"
+        else:
+            try:
+                job.future.set_result(self.checker.check_all(job.domain, checks=job.checks, deadline=job.deadline))
+            except Exception as e:
+                job.future.set_exception(e)
+                outcome = "failed"
+
+        with self.condition:
+            metrics = self.metrics_by_class[job.priority]
+            metrics.running -= 1
+            if outcome is not None:
+                setattr(metrics, outcome, getattr(metrics, outcome) + 1)
+                metrics.latencies.append(time.monotonic() - job.queued_at)
+
+
+class _ScheduledChecker(object):
+    """Private. What CheckScheduler.checker_for() returns: check_all() with DomainChecker's signature."""
+
+    def __init__(self, scheduler: CheckScheduler, priority: str):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def check_all(self, domain: str, checks: list = None, deadline=None):
+        return self.scheduler.check_all(domain, checks, self.priority, deadline)
+
+
+def _percentile(values, percent: int):
+    """Nearest rank percentile of 'values', rounded to the millisecond. None if there are none."""
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100.0 * len(ordered)))
+    return round(ordered[rank - 1], 3)
+
+# end
@@ -0,0 +1,283 @@
+# serializers for formatted responses and states:
+# bulk exports write millions of states, so how they are encoded matters. A serializer turns a FormattedResponse, a
+# state or a whole scan result (a domain and its states) into text or bytes and back into the same objects.
+# JSONSerializer writes the readable JSON of the result lines, through one reusable compact encoder.
+# BinarySerializer writes a fixed schema: each response is a tuple of its fields in a set order (no key names) and
+# compact answers (see formatted_response.py) keep their tuples instead of being expanded into nested dictionaries.
+# The tuples are framed with pickle's C implementation, which also writes every repeated string object (interned host
+# names, rr_types, verdicts; see interning.py) once per record. Decoding never imports or calls anything but the two
+# globals a record may name: 'str' and 'bytes' (a bytearray is written as bytes).
+# usage: serializer = get_serializer("binary")
+#        data = serializer.dumps_result(domain, states)
+#        domain, states = serializer.loads_result(data)
+
+import io
+import json
+import pickle
+import struct
+from datetime import datetime, timezone
+from . import domain_state, formatted_response
+from .deadline import DeadlineExceeded
+from .formatted_response import CompactAnswer, FormattedResponse
+
+BINARY_MAGIC = b"CDBIN1\n"  # first bytes of a file of framed binary records, see write_frame()
+SCHEMA_VERSION = 1
+
+
+class Serializer(object):
+    """Parent to the serializers. dumps_*() encode, loads_*() rebuild the same classes: a FormattedResponse subclass
+    with its expires_at and timed_out; a state with its time stamp; a scan result as (domain, {check: state}), where a
+    check that raised comes back as DeadlineExceeded (it ran out of time) or RuntimeError with its message, and so
+    does a domain that failed as a whole, in place of its {check: state}.
+    Inherits from: object.
+    Parent to: JSONSerializer, BinarySerializer.
+    Sibling to: None."""
+    name = None
+    binary = False  # True: dumps_*() return bytes. False: str
+
+    def dumps_response(self, response: FormattedResponse):
+        return self._dumps(self._pack_response(response))
+
+    def loads_response(self, data):
+        return self._unpack_response(self._loads(data))
+
+    def dumps_state(self, state):
+        return self._dumps(self._pack_state(state))
+
+    def loads_state(self, data):
+        return self._unpack_state(self._loads(data))
+
+    def dumps_result(self, domain: str, states):
+        """'states' is {check: state or exception}, or the exception of a domain that failed as a whole."""
+        if isinstance(states, Exception):
+            return self._dumps({'domain': domain, 'error': f"{type(states).__name__}: {states}"})
+        return self._dumps({'domain': domain, 'checks': {check: (_pack_error(state) if isinstance(state, Exception)
+                                                                 else self._pack_state(state))
+                                                         for check, state in states.items()}})
+
+    def loads_result(self, data):
+        result = self._loads(data)
+        if 'checks' not in result:
+            return result['domain'], RuntimeError(result['error'])
+        return result['domain'], {check: (_unpack_error(packed) if _is_error(packed) else self._unpack_state(packed))
+                                  for check, packed in result['checks'].items()}
+
+    def _pack_response(self, response: FormattedResponse):
+        raise NotImplementedError
+
+    def _unpack_response(self, packed):
+        raise NotImplementedError
+
+    def _pack_state(self, state):
+        raise NotImplementedError
+
+    def _unpack_state(self, packed):
+        raise NotImplementedError
+
+    def _dumps(self, packed):
+        raise NotImplementedError
+
+    def _loads(self, data):
+        raise NotImplementedError
+
+
+class JSONSerializer(Serializer):
+    """Readable JSON: a state is written as its to_dict() and a scan result is a result line of bulk_scan.py.
+    Answers are written as their raw dictionaries (compact answers expanded), bytes as hex and other values as
+    strings, so integer keys and raw record objects come back as strings. ttls are not written, expires_at is.
+    Inherits from: Serializer.
+    Parent to: None.
+    Sibling to: BinarySerializer."""
+    name = "json"
+    encoder = json.JSONEncoder(separators=(",", ":"), check_circular=False, default=lambda value: json_default(value))
+
+    def _pack_response(self, response: FormattedResponse):
+        return {'response': type(response).__name__, 'answer': response.response, 'expires_at': response.expires_at,
+                'timed_out': list(response.timed_out)}
+
+    def _unpack_response(self, packed):
+        response = _response_class(packed['response'])(packed['answer'])
+        response.expires_at = packed['expires_at']
+        response.timed_out = list(packed['timed_out'])
+        return response
+
+    def _pack_state(self, state):
+        return state.to_dict()
+
+    def _unpack_state(self, packed):
+        expires_at = packed['expires_at']
+        if expires_at is not None:
+            expires_at = datetime.fromisoformat(expires_at).replace(tzinfo=timezone.utc).timestamp()
+        response = self._unpack_response({'response': packed['response'], 'answer': packed['answer'],
+                                          'expires_at': expires_at, 'timed_out': packed['timed_out']})
+        return _new_state(packed['state'], response, datetime.fromisoformat(packed['state_timestamp']))
+
+    def _dumps(self, packed):
+        return self.encoder.encode(packed)
+
+    def _loads(self, data):
+        return json.loads(data)
+
+
+class BinarySerializer(Serializer):
+    """Fixed schema tuples framed with pickle (see the top of this file). Keeps ttls, integer keys, tuples, bytes and
+    compact answers; any other object is written as its string.
+    A response is (class name, answer, ttls, expires_at, timed_out), a state (class name, epoch time stamp, response)
+    and an answer (class name, slot values) if it is compact, (None, answer) if it is not.
+    Inherits from: Serializer.
+    Parent to: None.
+    Sibling to: JSONSerializer."""
+    name = "binary"
+    binary = True
+
+    def _pack_response(self, response: FormattedResponse):
+        return (type(response).__name__, _pack_answer(response.response), response.ttls, response.expires_at,
+                tuple(response.timed_out))
+
+    def _unpack_response(self, packed):
+        name, answer, ttls, expires_at, timed_out = packed
+        response = _response_class(name)(_unpack_answer(answer))
+        response.ttls = ttls
+        response.expires_at = expires_at
+        response.timed_out = list(timed_out)
+        return response
+
+    def _pack_state(self, state):
+        return (type(state).__name__, state.state_timestamp.replace(tzinfo=timezone.utc).timestamp(),
+                self._pack_response(state.formatted_answer))
+
+    def _unpack_state(self, packed):
+        name, timestamp, response = packed
+        return _new_state(name, self._unpack_response(response), datetime.utcfromtimestamp(timestamp))
+
+    def _dumps(self, packed):
+        buffer = io.BytesIO()
+        _RecordPickler(buffer, protocol=5).dump((SCHEMA_VERSION, packed))
+        return buffer.getvalue()
+
+    def _loads(self, data):
+        version, packed = _RecordUnpickler(io.BytesIO(data)).load()
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported binary schema version {version}. Expected {SCHEMA_VERSION}.")
+        return packed
+
+
+SERIALIZERS = {serializer.name: serializer for serializer in (JSONSerializer(), BinarySerializer())}
+
+
+def get_serializer(name: str):
+    """Returns the serializer registered under 'name': 'json' or 'binary'."""
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer '{name}'. Choose from: {list(SERIALIZERS.keys())}")
+    return SERIALIZERS[name]
+
+
+def write_frame(stream, record: bytes):
+    """Writes one binary record to 'stream', prefixed with its length."""
+    stream.write(struct.pack("<I", len(record)))
+    stream.write(record)
+
+
+def read_frames(stream):
+    """Yields the records written to 'stream' with write_frame(). A record cut short at the end (from a crash) is
+    ignored."""
+    while True:
+        header = stream.read(4)
+        if len(header) < 4:
+            return
+        record = stream.read(struct.unpack("<I", header)[0])
+        if len(record) < struct.unpack("<I", header)[0]:
+            return
+        yield record
+
+
+def json_default(value):
+    """json fallback for the raw values found in some answers (dnssec rdata bytes, time stamps), shared with the
+    result lines of bulk_scan.py."""
+    if isinstance(value, CompactAnswer):
+        return value.as_dict()
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class _RecordPickler(pickle.Pickler):
+    """Private. Writes objects other than the basic types (which pickle handles without asking) as their string."""
+
+    def reducer_override(self, value):
+        if isinstance(value, type):
+            return NotImplemented  # the 'str' named by the reductions below
+        if isinstance(value, bytearray):
+            return bytes, (bytes(value),)
+        if isinstance(value, datetime):
+            return str, (value.isoformat(),)
+        return str, (str(value),)
+
+
+_RECORD_GLOBALS = {'str': str, 'bytes': bytes}  # the only globals a binary record may name
+
+
+class _RecordUnpickler(pickle.Unpickler):
+    """Private. Refuses every global but 'str' and 'bytes', so a record can rebuild nothing but plain values."""
+
+    def find_class(self, module, name):
+        if module == "builtins" and name in _RECORD_GLOBALS:
+            return _RECORD_GLOBALS[name]
+        raise pickle.UnpicklingError(f"Binary records may not refer to {module}.{name}.")
+
+
+def _pack_answer(answer):
+    if isinstance(answer, CompactAnswer):
+        return type(answer).__name__, tuple(_pack_answer(getattr(answer, slot)) if isinstance(getattr(answer, slot),
+                                                                                              CompactAnswer)
+                                            else getattr(answer, slot) for slot in type(answer).__slots__)
+    return None, answer
+
+
+def _unpack_answer(packed):
+    name, payload = packed
+    if name is None:
+        return payload
+    answer_class = _response_class(name, CompactAnswer)
+    if answer_class is formatted_response.DNSSECAnswer:  # the one compact answer built from other answers
+        domain, validation, signatures = payload
+        return answer_class(domain, _unpack_answer(validation), _unpack_answer(signatures))
+    return answer_class(*payload)
+
+
+def _new_state(name: str, response: FormattedResponse, timestamp: datetime):
+    """Private. Builds the state class of domain_state.py named 'name' from a decoded response."""
+    state_class = getattr(domain_state, name, None)
+    if not isinstance(state_class, type) or not issubclass(state_class, domain_state.BaseState):
+        raise ValueError(f"Unknown state class '{name}'.")
+    state = state_class(response)
+    state.state_timestamp = timestamp
+    return state
+
+
+def _pack_error(error: Exception):
+    """Private. The entry of a check that raised: {'error': ...}, plus 'timed_out': True when it ran out of time."""
+    packed = {'error': f"{type(error).__name__}: {error}"}
+    if isinstance(error, DeadlineExceeded):
+        packed['timed_out'] = True
+    return packed
+
+
+def _is_error(packed):
+    return isinstance(packed, dict) and 'error' in packed
+
+
+def _unpack_error(packed):
+    return DeadlineExceeded(packed['error']) if packed.get('timed_out') else RuntimeError(packed['error'])
+
+
+def _response_class(name: str, parent: type = FormattedResponse):
+    """Private. The class of formatted_response.py named 'name', which must be a subclass of 'parent'."""
+    response_class = getattr(formatted_response, name, None)
+    if not isinstance(response_class, type) or not issubclass(response_class, parent):
+        raise ValueError(f"Unknown {parent.__name__} class '{name}'.")
+    return response_class
+
+# end
@@ -0,0 +1,202 @@
+# multi-core bulk scanning:
+# a single process only ever uses one core for the python side of a scan (building formatted responses, ipv6
+# formatting, states and json). ShardedScanner spreads the domain stream over worker processes, each running its own
+# BulkScanner with its own Resolver contexts and Reacher, and merges their output into one sink. A domain list file is
+# shared out as byte ranges that the workers read themselves (see domain_list.py).
+
+import multiprocessing
+import queue
+import threading
+import time
+from .aggregates import FleetAggregate
+from .bulk_scan import BulkScanner, DEFAULT_CONCURRENCY
+from .domain_list import DomainSet, MappedDomainReader, byte_ranges
+
+DEFAULT_CHUNK_SIZE = 256  # domains handed to a worker at a time
+RANGES_PER_WORKER = 16  # byte ranges a domain list file is cut into per worker (see scan_file())
+FLUSH_LINES = 512  # result lines a worker buffers before sending them to the parent
+POLL_SECONDS = 1.0
+
+
+class ShardedScanner(object):
+    """Shards a domain stream over 'workers' processes. Domains are handed out in chunks through a bounded queue:
+    a worker takes the next chunk whenever it runs low, so faster workers simply take more chunks and no worker sits
+    idle while another one has a backlog. Result lines are merged into one sink in the parent process, and the
+    workers' FleetAggregates into 'aggregate'.
+    Workers are started with the 'spawn' method so that every process builds its own unbound contexts when it imports
+    the Resolver class, instead of sharing a forked copy of the parent's. For the same reason a worker's checker is
+    built in the worker by 'checker_factory' (a picklable callable, ex, a class defined at module level), or is a new
+    DomainChecker when it is None.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: BulkScanner."""
+
+    def __init__(self, workers: int = None, checks: list = None, concurrency: int = DEFAULT_CONCURRENCY,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, deadline: float = None, checker_factory=None):
+        self.workers = workers if workers is not None else multiprocessing.cpu_count()
+        self.checks = checks
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.deadline = deadline
+        self.checker_factory = checker_factory
+        self.context = multiprocessing.get_context("spawn")
+        self.aggregate = FleetAggregate()
+
+    def scan(self, domains, sink):
+        """Scans every domain of the 'domains' iterable over the worker processes and writes each result line to
+        'sink'. Returns a dict with the merged counters under 'total' and each worker's counters under 'workers'."""
+        return self._scan(self._feed_domains, domains, sink)
+
+    def scan_file(self, path: str, sink, ranges_per_worker: int = RANGES_PER_WORKER):
+        """Like scan(), for a domain list file: the work queue carries byte ranges of the file instead of domains and
+        each worker reads its ranges itself (see domain_list.py), so the list never passes through this process.
+        Duplicates are skipped within each worker; a domain listed in ranges read by two workers is scanned twice."""
+        ranges = byte_ranges(path, self.workers * ranges_per_worker)
+        return self._scan(self._feed_ranges, (path, ranges), sink)
+
+    def _scan(self, feed, source, sink):
+        """Private. Starts the workers, runs 'feed' (source, work_queue, feeder_state) on a thread and merges the
+        results."""
+        work_queue = self.context.Queue(maxsize=self.workers * 2)  # bounds the domains held in memory
+        result_queue = self.context.Queue()
+        processes = []
+        for worker_id in range(self.workers):
+            process = self.context.Process(target=_worker_main, name=f"scan-worker-{worker_id}",
+                                           args=(worker_id, self.checks, self.concurrency, self.deadline, work_queue,
+                                                 result_queue, self.checker_factory))
+            process.start()
+            processes.append(process)
+
+        started = time.monotonic()
+        feeder_state = {'error': None}
+        feeder = threading.Thread(target=self._feed, args=(feed, source, work_queue, feeder_state), daemon=True)
+        feeder.start()
+
+        worker_stats = {}
+        try:
+            while len(worker_stats) < self.workers:
+                try:
+                    message = result_queue.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    self._check_workers(processes, worker_stats, result_queue, sink)
+                    continue
+                self._receive(message, sink, worker_stats)
+        finally:
+            feeder.join(timeout=POLL_SECONDS)
+            for process in processes:
+                process.join(timeout=POLL_SECONDS)
+                if process.is_alive():
+                    process.terminate()
+
+        if feeder_state['error'] is not None:
+            raise feeder_state['error']
+
+        elapsed = time.monotonic() - started
+        total = {'elapsed': round(elapsed, 3)}
+        for name in ("domains_read", "completed", "failed", "check_errors", "timed_out"):
+            total[name] = sum(stats[name] for stats in worker_stats.values())
+        total['domains_per_second'] = round(total['completed'] / elapsed, 3) if elapsed > 0 else 0.0
+        return {'total': total, 'workers': worker_stats}
+
+    def _feed(self, feed, source, work_queue, feeder_state):
+        """Private. Runs on a thread in the parent: 'feed' fills the work queue, then every worker is told to stop."""
+        try:
+            feed(source, work_queue)
+        except Exception as e:
+            feeder_state['error'] = e
+        finally:
+            for _ in range(self.workers):
+                work_queue.put(None)
+
+    def _feed_domains(self, domains, work_queue):
+        """Private. Chunks the domain stream into the work queue."""
+        chunk = []
+        for domain in domains:
+            chunk.append(domain)
+            if len(chunk) >= self.chunk_size:
+                work_queue.put(chunk)
+                chunk = []
+        if len(chunk) > 0:
+            work_queue.put(chunk)
+
+    @staticmethod
+    def _feed_ranges(source, work_queue):
+        """Private. Puts every (path, start, end) byte range of the file into the work queue."""
+        path, ranges = source
+        for start, end in ranges:
+            work_queue.put((path, start, end))
+
+    def _receive(self, message: tuple, sink, worker_stats: dict):
+        """Private. Merges one (kind, worker_id, payload) message of a worker: result lines, its aggregate or its
+        counters, which it sends last."""
+        kind, worker_id, payload = message
+        if kind == "lines":
+            for line in payload:
+                sink.write(line + "\n")
+        elif kind == "aggregate":
+            self.aggregate.merge(payload)
+        else:
+            worker_stats[worker_id] = payload
+
+    def _check_workers(self, processes: list, worker_stats: dict, result_queue, sink):
+        """Private. Raises if a worker died without reporting its counters. A worker that finished may have exited
+        before its last messages were taken off the queue, so the queue is drained before a worker is held dead."""
+        if all(worker_id in worker_stats or process.is_alive() for worker_id, process in enumerate(processes)):
+            return
+        while True:
+            try:
+                message = result_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._receive(message, sink, worker_stats)
+        for worker_id, process in enumerate(processes):
+            if worker_id not in worker_stats and not process.is_alive():
+                raise RuntimeError(f"Scan worker {worker_id} exited with code {process.exitcode}.")
+
+
+class _QueueSink(object):
+    """Buffers result lines inside a worker and sends them to the parent in batches."""
+
+    def __init__(self, worker_id: int, result_queue):
+        self.worker_id = worker_id
+        self.result_queue = result_queue
+        self.lines = []
+
+    def write(self, text: str):
+        self.lines.append(text.rstrip("\n"))
+        if len(self.lines) >= FLUSH_LINES:
+            self.flush()
+
+    def flush(self):
+        if len(self.lines) > 0:
+            self.result_queue.put(("lines", self.worker_id, self.lines))
+            self.lines = []
+
+
+def _queued_domains(work_queue):
+    """Yields the domains of every work item taken off the work queue until the stop marker (None) arrives. An item
+    is a chunk (list) of domains or a (path, start, end) byte range of a domain list file."""
+    seen = DomainSet()  # duplicates across the ranges read by this worker (chunks come deduplicated)
+    while True:
+        item = work_queue.get()
+        if item is None:
+            return
+        if isinstance(item, tuple):
+            item = MappedDomainReader(*item, seen=seen)
+        for domain in item:
+            yield domain
+
+
+def _worker_main(worker_id: int, checks: list, concurrency: int, deadline: float, work_queue, result_queue,
+                 checker_factory=None):
+    """Entry point of a worker process: one BulkScanner (with its own DomainChecker, or the checker made by
+    'checker_factory') over the queued domains."""
+    checker = None if checker_factory is None else checker_factory()
+    scanner = BulkScanner(checks=checks, concurrency=concurrency, checker=checker, deadline=deadline)
+    sink = _QueueSink(worker_id, result_queue)
+    stats = scanner.scan(_queued_domains(work_queue), sink)
+    sink.flush()
+    result_queue.put(("aggregate", worker_id, scanner.aggregate.as_dict()))
+    result_queue.put(("stats", worker_id, stats.as_dict()))
+
+# end
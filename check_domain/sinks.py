@@ -0,0 +1,334 @@
+# output sinks for bulk scans:
+# a scan writes its result lines to a sink, anything with write() and flush() (see BulkScanner). The sinks here write
+# those lines to JSONL, gzip or zstd compressed JSONL, a SQLite table or framed binary records (see serialization.py;
+# the binary sink also has write_result(), so a scan hands it states instead of JSON lines)
+# without holding results in memory: lines are gathered into batches and a background flusher thread writes each
+# batch (one compressor call, one SQLite transaction), so the scan loop never waits on the disk unless the flusher
+# falls a few batches behind.
+# usage: python -m check_domain.bulk_scan domains.txt -o results.db --format sqlite
+#        python -m check_domain.sinks bench [--lines 100000]   (throughput of every sink, on synthetic lines)
+#
+# sqlite table: results (domain TEXT, result TEXT), one row per result line
+# A sink replaces the output of an earlier run, unless opened with append=True (a resumed scan, see checkpoint.py).
+
+import argparse
+import gzip
+import json
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from json.decoder import scanstring
+from .serialization import BINARY_MAGIC, SERIALIZERS, write_frame
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for --format zstd
+    zstandard = None
+
+BATCH_LINES = 1000  # result lines per batch handed to the flusher
+QUEUED_BATCHES = 4  # batches waiting for the flusher before write() blocks
+FILE_BUFFER = 1 << 20  # bytes buffered by the open output file
+_SYNC = object()  # queued by flush() after the last batch
+
+
+class ResultSink(object):
+    """Parent to the output sinks. write() accepts result lines (text ending in newlines, as BulkScanner writes them)
+    and gathers them into batches of 'batch_lines'; a flusher thread passes every batch to _write_batch().
+    flush() returns once every line written so far is in the output. close() flushes and releases the output.
+    An error raised by the flusher is raised again by the next write(), flush() or close().
+    Inherits from: object.
+    Parent to: JSONLSink, GzipSink, ZstdSink, SQLiteSink, BinarySink.
+    Sibling to: None."""
+
+    def __init__(self, path: str, batch_lines: int = BATCH_LINES):
+        self.path = path
+        self.batch_lines = batch_lines
+        self.lines = []
+        self.partial = ""  # text after the last newline, completed by the next write()
+        self.lock = threading.Lock()
+        self.batches = queue.Queue(maxsize=QUEUED_BATCHES)
+        self.error = None
+        self.closed = False
+        self.flusher = threading.Thread(target=self._flush_batches, name=f"sink-{type(self).__name__}", daemon=True)
+        self.flusher.start()
+
+    def write(self, text: str):
+        self._raise_error()
+        if self.closed:
+            raise ValueError(f"Sink {self.path} is closed.")
+        with self.lock:
+            lines = (self.partial + text).split("\n")
+            self.partial = lines.pop()
+            batch = self._gather(line for line in lines if len(line) > 0)
+        if batch is not None:
+            self.batches.put(batch)
+
+    def flush(self):
+        if self.closed:
+            raise ValueError(f"Sink {self.path} is closed.")
+        with self.lock:
+            batch, self.lines = self.lines, []
+        if len(batch) > 0:
+            self.batches.put(batch)
+        self.batches.put(_SYNC)
+        self.batches.join()
+        self._raise_error()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if len(self.partial) > 0:
+                self.write("\n")
+            self.flush()
+        finally:
+            self.closed = True
+            self.batches.put(None)
+            self.flusher.join()
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _flush_batches(self):
+        """Private. The flusher thread: writes queued batches and syncs for flush(), until close() queues None."""
+        while True:
+            batch = self.batches.get()
+            try:
+                if batch is None:
+                    return
+                if self.error is None and batch is _SYNC:
+                    self._sync()
+                elif self.error is None:
+                    self._write_batch(batch)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.batches.task_done()
+
+    def _gather(self, items):
+        """Private. Adds 'items' to the batch being gathered. Returns the batch once it is full, else None. Call with
+        the lock held."""
+        self.lines.extend(items)
+        if len(self.lines) < self.batch_lines:
+            return None
+        batch, self.lines = self.lines, []
+        return batch
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError(f"Writing to {self.path} failed: {self.error}") from self.error
+
+    def _write_batch(self, lines: list):
+        """Writes a batch of result lines (without their newlines). Runs on the flusher thread."""
+        raise NotImplementedError
+
+    def _sync(self):
+        """Pushes written batches to the operating system. Runs on the flusher thread, for flush()."""
+
+    def _close(self):
+        """Releases the output. Runs once the flusher has stopped."""
+
+
+class JSONLSink(ResultSink):
+    """Writes result lines to a JSONL file. fileno() is the output file's, so a ScanCheckpoint can fsync and measure
+    it, and a resumed scan can truncate it.
+    Inherits from: ResultSink.
+    Parent to: None.
+    Sibling to: GzipSink, ZstdSink, SQLiteSink, BinarySink."""
+
+    def __init__(self, path: str, batch_lines: int = BATCH_LINES, append: bool = False):
+        self.file = open(path, "ab" if append else "wb", buffering=FILE_BUFFER)
+        super(JSONLSink, self).__init__(path, batch_lines)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def _write_batch(self, lines: list):
+        self.file.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def _sync(self):
+        self.file.flush()
+
+    def _close(self):
+        self.file.close()
+
+
+class GzipSink(ResultSink):
+    """Writes result lines to a gzip compressed JSONL file. An appending run adds a gzip member, which gzip readers
+    (zcat, gzip.open) read as one stream.
+    Inherits from: ResultSink.
+    Parent to: None.
+    Sibling to: JSONLSink, ZstdSink, SQLiteSink, BinarySink."""
+
+    def __init__(self, path: str, batch_lines: int = BATCH_LINES, append: bool = False, level: int = 6):
+        self.file = gzip.open(path, "ab" if append else "wb", compresslevel=level)
+        super(GzipSink, self).__init__(path, batch_lines)
+
+    def _write_batch(self, lines: list):
+        self.file.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def _sync(self):
+        self.file.flush()  # ends a deflate block: everything written so far can be decompressed
+
+    def _close(self):
+        self.file.close()
+
+
+class ZstdSink(ResultSink):
+    """Writes result lines to a zstd compressed JSONL file as one frame per run. Needs the 'zstandard' package.
+    Inherits from: ResultSink.
+    Parent to: None.
+    Sibling to: JSONLSink, GzipSink, SQLiteSink, BinarySink."""
+
+    def __init__(self, path: str, batch_lines: int = BATCH_LINES, append: bool = False, level: int = 3):
+        if zstandard is None:
+            raise ImportError("The zstd sink needs the 'zstandard' package: pip install zstandard")
+        self.raw = open(path, "ab" if append else "wb")
+        self.file = zstandard.ZstdCompressor(level=level).stream_writer(self.raw)
+        super(ZstdSink, self).__init__(path, batch_lines)
+
+    def _write_batch(self, lines: list):
+        self.file.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def _sync(self):
+        self.file.flush(zstandard.FLUSH_BLOCK)
+        self.raw.flush()
+
+    def _close(self):
+        self.file.close()  # ends the frame and closes the raw file
+
+
+class SQLiteSink(ResultSink):
+    """Inserts result lines into the 'results' table of a SQLite database, one transaction per batch. The database is
+    in WAL mode with synchronous=NORMAL, so readers can query it during the scan and a commit does not wait on fsync.
+    Inherits from: ResultSink.
+    Parent to: None.
+    Sibling to: JSONLSink, GzipSink, ZstdSink, BinarySink."""
+
+    def __init__(self, path: str, batch_lines: int = BATCH_LINES, append: bool = False):
+        self.connection = sqlite3.connect(path, check_same_thread=False)  # used by the flusher thread only
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (domain TEXT NOT NULL, result TEXT NOT NULL)")
+        if not append:
+            self.connection.execute("DELETE FROM results")
+        self.connection.commit()
+        super(SQLiteSink, self).__init__(path, batch_lines)
+
+    def _write_batch(self, lines: list):
+        with self.connection:
+            self.connection.executemany("INSERT INTO results (domain, result) VALUES (?, ?)",
+                                        ((_line_domain(line), line) for line in lines))
+
+    def _close(self):
+        self.connection.close()
+
+
+class BinarySink(ResultSink):
+    """Writes results as framed binary records (see BinarySerializer), after BINARY_MAGIC when the file is new.
+    A BulkScanner hands it the states of each domain through write_result(), encoded on the flusher thread. Lines given
+    to write() are decoded first; answers read back from JSON keep their JSON form (string keys, lists, no ttls).
+    Inherits from: ResultSink.
+    Parent to: None.
+    Sibling to: JSONLSink, GzipSink, ZstdSink, SQLiteSink."""
+
+    def __init__(self, path: str, batch_lines: int = BATCH_LINES, append: bool = False):
+        self.file = open(path, "ab" if append else "wb", buffering=FILE_BUFFER)
+        if self.file.tell() == 0:
+            self.file.write(BINARY_MAGIC)
+        super(BinarySink, self).__init__(path, batch_lines)
+
+    def write_result(self, domain: str, states):
+        """Writes the result of one domain: its states, or the exception of a domain that failed as a whole."""
+        self._raise_error()
+        if self.closed:
+            raise ValueError(f"Sink {self.path} is closed.")
+        with self.lock:
+            batch = self._gather([(domain, states)])
+        if batch is not None:
+            self.batches.put(batch)
+
+    def _write_batch(self, results: list):
+        text, binary = SERIALIZERS['json'], SERIALIZERS['binary']
+        for result in results:
+            domain, states = text.loads_result(result) if isinstance(result, str) else result
+            write_frame(self.file, binary.dumps_result(domain, states))
+
+    def _sync(self):
+        self.file.flush()
+
+    def _close(self):
+        self.file.close()
+
+
+SINKS = {'jsonl': JSONLSink, 'gzip': GzipSink, 'zstd': ZstdSink, 'sqlite': SQLiteSink, 'binary': BinarySink}
+
+
+def open_sink(path: str, sink_format: str = "jsonl", batch_lines: int = BATCH_LINES, append: bool = False):
+    """Returns a new sink of 'sink_format' writing to 'path'. The file is emptied first unless 'append' is True."""
+    if sink_format not in SINKS:
+        raise ValueError(f"Unknown sink format '{sink_format}'. Choose from: {list(SINKS.keys())}")
+    return SINKS[sink_format](path, batch_lines, append)
+
+
+def _line_domain(line: str):
+    """Private. The domain of a result line. Lines written by serialization.py start with {"domain":"...", so the
+    domain is read without decoding the rest of the line."""
+    prefix = '{"domain":"'
+    if line.startswith(prefix):
+        return scanstring(line, len(prefix))[0]
+    return json.loads(line)['domain']
+
+
+def bench(lines: int = 100000, formats: list = None):
+    """Writes 'lines' synthetic result lines to a sink of every format (skipping zstd without 'zstandard') in a
+    temporary directory. Returns {format: {'lines_per_second': ..., 'bytes': ...}}."""
+    text = SERIALIZERS['json']
+    sample = [text.dumps_result(f"domain-{i}.example", {'ns_ipv6_exist': _bench_state(f"domain-{i}.example")})
+              for i in range(1000)]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="sink-bench-") as directory:
+        for sink_format in (list(SINKS.keys()) if formats is None else formats):
+            if sink_format == "zstd" and zstandard is None:
+                continue
+            path = os.path.join(directory, f"results.{sink_format}")
+            started = time.perf_counter()
+            with open_sink(path, sink_format) as sink:
+                for i in range(lines):
+                    sink.write(sample[i % len(sample)] + "\n")
+            elapsed = time.perf_counter() - started
+            results[sink_format] = {'lines_per_second': round(lines / elapsed), 'bytes': os.path.getsize(path)}
+    return results
+
+
+def _bench_state(domain: str):
+    """Private. The state of one check of a typical result line, for bench()."""
+    from .domain_state import IPV6ExistState  # imported here: only the benchmark builds states
+    from .formatted_response import DNSHostMappingFormattedResponse, HostMappingAnswer
+    return IPV6ExistState(DNSHostMappingFormattedResponse(
+        HostMappingAnswer(domain, ["ns", "aaaa"], ["ns1." + domain, "ns2." + domain], ["2001:db8::53", None])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the throughput of the output sinks.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--lines", type=int, default=100000, help="result lines written to each sink")
+    parser.add_argument("--formats", help=f"comma separated formats (default: {','.join(SINKS.keys())})")
+    args = parser.parse_args(argv)
+    results = bench(args.lines, None if args.formats is None else args.formats.split(","))
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
+
+# end
@@ -0,0 +1,234 @@
+# diffs of scan snapshots:
+# compares two bulk scan result files (see bulk_scan.py) and writes out only the domains whose states changed, ex. an
+# NS that lost its ipv6 address or a zone that went from dnssec secure to bogus. Neither file is loaded: each is read
+# once into a small index line per domain (domain, a fingerprint per check, where the line starts in the file), the
+# index is sorted in bounded runs on disk and merged, and the two sorted indexes are walked side by side. Only the
+# lines of changed domains are read again, to write their before and after answers.
+# Answers are compared by fingerprint (see fingerprint.py), so time stamps and the order of records do not count as
+# changes.
+# usage: python -m check_domain.snapshot_diff before.jsonl after.jsonl -o changes.jsonl [--ignore-failures]
+#
+# output, one line per changed domain:
+#   {"domain": ..., "change": "added" | "removed" | "changed",
+#    "checks": {check: {"before": <check entry or null>, "after": <check entry or null>}}}  (changed checks only)
+
+import argparse
+import heapq
+import json
+import os
+import sys
+import tempfile
+from .fingerprint import answer_fingerprint
+
+SORT_RUN_LINES = 200000  # index lines sorted in memory at a time
+FAILED = "failed"  # fingerprint of a check that raised
+TIMED_OUT = "timed_out"  # fingerprint of a check that ran out of time
+EVERY_CHECK = "*"  # fingerprint key standing for every check of a domain that failed as a whole
+
+
+def line_fingerprints(result: dict):
+    """Accepts a decoded result line. Returns check -> fingerprint of its answer, or FAILED / TIMED_OUT. A domain
+    that failed as a whole has no checks: it returns {EVERY_CHECK: FAILED}, every check failed."""
+    if 'checks' not in result and 'error' in result:
+        return {EVERY_CHECK: FAILED}
+    fingerprints = {}
+    for check, entry in result.get('checks', {}).items():
+        if 'error' in entry:
+            fingerprints[check] = TIMED_OUT if entry.get('timed_out') else FAILED
+        else:
+            fingerprints[check] = answer_fingerprint(entry.get('answer'))
+    return fingerprints
+
+
+class SnapshotIndex(object):
+    """The sorted index of one result file: yields (domain, {check: fingerprint}, offset of its line) in domain
+    order, one entry per domain. A domain written more than once (ex, by a resumed scan) keeps its last line.
+    Lines are indexed into sorted runs of 'run_lines' in a temporary directory, which close() removes.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, path: str, run_lines: int = SORT_RUN_LINES):
+        self.path = path
+        self.run_lines = run_lines
+        self.directory = tempfile.TemporaryDirectory(prefix="snapshot-index-")
+        self.runs = []
+        self.domains = 0
+        self._build()
+
+    def _build(self):
+        """Private. Reads the result file once and writes its sorted runs."""
+        entries = []
+        with open(self.path, "rb") as results:
+            offset = 0
+            for line in results:
+                if len(line.strip()) > 0:
+                    result = json.loads(line)
+                    entries.append((result['domain'], offset, line_fingerprints(result)))
+                    if len(entries) >= self.run_lines:
+                        self._write_run(entries)
+                        entries = []
+                offset += len(line)
+        if len(entries) > 0 or len(self.runs) == 0:
+            self._write_run(entries)
+
+    def _write_run(self, entries: list):
+        """Private. Sorts 'entries' by (domain, offset) and writes them as a run, one tab separated line each."""
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+        path = os.path.join(self.directory.name, f"run-{len(self.runs)}")
+        with open(path, "w", encoding="utf-8") as run:
+            for domain, offset, fingerprints in entries:
+                run.write(f"{domain}\t{offset}\t{json.dumps(fingerprints, sort_keys=True)}\n")
+        self.runs.append(path)
+
+    def __iter__(self):
+        files = [open(path, encoding="utf-8") for path in self.runs]
+        try:
+            merged = heapq.merge(*(map(_parse_index_line, run) for run in files), key=lambda entry: entry[:2])
+            previous = None
+            for entry in merged:
+                if previous is not None and previous[0] != entry[0]:
+                    self.domains += 1
+                    yield previous[0], previous[2], previous[1]
+                previous = entry
+            if previous is not None:
+                self.domains += 1
+                yield previous[0], previous[2], previous[1]
+        finally:
+            for run in files:
+                run.close()
+
+    def close(self):
+        self.directory.cleanup()
+
+
+def _parse_index_line(line: str):
+    domain, offset, fingerprints = line.rstrip("\n").split("\t", 2)
+    return domain, int(offset), json.loads(fingerprints)
+
+
+class SnapshotDiff(object):
+    """Walks the sorted indexes of two result files side by side and writes a line per added, removed or changed
+    domain to 'sink'. With 'ignore_failures', checks that failed or timed out in the after scan are not reported as
+    changed (a flaky lookup is not an alert). 'checks' limits the comparison to those checks.
+    Inherits from: object.
+    Parent to: None.
+    Sibling to: None."""
+
+    def __init__(self, before_path: str, after_path: str, checks: list = None, ignore_failures: bool = False,
+                 run_lines: int = SORT_RUN_LINES):
+        self.before_path = before_path
+        self.after_path = after_path
+        self.checks = None if checks is None else set(checks)
+        self.ignore_failures = ignore_failures
+        self.run_lines = run_lines
+        self.counts = {'before': 0, 'after': 0, 'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+
+    def write(self, sink):
+        """Writes the diff to 'sink' (anything with a write() method). Returns the counts."""
+        before = SnapshotIndex(self.before_path, self.run_lines)
+        after = SnapshotIndex(self.after_path, self.run_lines)
+        try:
+            with open(self.before_path, "rb") as before_file, open(self.after_path, "rb") as after_file:
+                for domain, old, new in _merge_join(iter(before), iter(after)):
+                    change = self._change(domain, old, new, before_file, after_file)
+                    if change is not None:
+                        sink.write(json.dumps(change) + "\n")
+            self.counts['before'] = before.domains
+            self.counts['after'] = after.domains
+        finally:
+            before.close()
+            after.close()
+        return dict(self.counts)
+
+    def changed_checks(self, old: dict, new: dict):
+        """Returns the names of the checks whose fingerprints differ between two index entries."""
+        changed = []
+        for check in sorted((set(old) | set(new)) - {EVERY_CHECK}):
+            if self.checks is not None and check not in self.checks:
+                continue
+            old_fingerprint, new_fingerprint = _fingerprint(old, check), _fingerprint(new, check)
+            if self.ignore_failures and new_fingerprint in (FAILED, TIMED_OUT):
+                continue
+            if old_fingerprint != new_fingerprint:
+                changed.append(check)
+        return changed
+
+    def _change(self, domain: str, old, new, before_file, after_file):
+        """Private. Returns the output line of a domain, or None if it did not change."""
+        if old is None:
+            self.counts['added'] += 1
+            return {'domain': domain, 'change': "added", 'checks': {}}
+        if new is None:
+            self.counts['removed'] += 1
+            return {'domain': domain, 'change': "removed", 'checks': {}}
+        changed = self.changed_checks(old[0], new[0])
+        if len(changed) == 0:
+            self.counts['unchanged'] += 1
+            return None
+        self.counts['changed'] += 1
+        old_result, new_result = _read_line(before_file, old[1]), _read_line(after_file, new[1])
+        return {'domain': domain, 'change': "changed",
+                'checks': {check: {'before': _check_entry(old_result, check), 'after': _check_entry(new_result, check)}
+                           for check in changed}}
+
+
+def _fingerprint(fingerprints: dict, check: str):
+    """Private. The fingerprint of 'check' in an index entry: FAILED for every check of a domain that failed as a
+    whole, None for a check that did not run."""
+    return fingerprints.get(check, fingerprints.get(EVERY_CHECK))
+
+
+def _check_entry(result: dict, check: str):
+    """Private. The entry of 'check' in a decoded result line; the domain's error when it failed as a whole."""
+    if 'checks' not in result and 'error' in result:
+        return {'error': result['error']}
+    return result.get('checks', {}).get(check)
+
+
+def _merge_join(before, after):
+    """Private. Yields (domain, (fingerprints, offset) or None, (fingerprints, offset) or None) over two iterators of
+    index entries sorted by domain."""
+    old, new = next(before, None), next(after, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield old[0], (old[1], old[2]), None
+            old = next(before, None)
+        elif old is None or new[0] < old[0]:
+            yield new[0], None, (new[1], new[2])
+            new = next(after, None)
+        else:
+            yield old[0], (old[1], old[2]), (new[1], new[2])
+            old, new = next(before, None), next(after, None)
+
+
+def _read_line(results, offset: int):
+    """Private. Decodes the result line starting at 'offset'."""
+    results.seek(offset)
+    return json.loads(results.readline())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the domains whose states changed between two scans.")
+    parser.add_argument("before", help="result file of the earlier scan")
+    parser.add_argument("after", help="result file of the later scan")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--checks", help="comma separated checks to compare (default: all)")
+    parser.add_argument("--ignore-failures", action="store_true",
+                        help="do not report checks that failed or timed out in the later scan")
+    args = parser.parse_args(argv)
+
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        counts = SnapshotDiff(args.before, args.after, None if args.checks is None else args.checks.split(","),
+                              args.ignore_failures).write(sink)
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+    print(json.dumps(counts), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+# end
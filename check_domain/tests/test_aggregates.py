@@ -0,0 +1,68 @@
+import io
+import json
+import unittest
+
+from check_domain.aggregates import FleetAggregate
+from check_domain.bulk_scan import BulkScanner
+from check_domain.deadline import DeadlineExceeded
+from check_domain.domain_state import DNSSECValidatedState, IPV4ReachState
+from check_domain.formatted_response import DNSSECValidatedFormattedResponse, HostFormattedResponse, HostReachAnswer
+from check_domain.tests.test_bulk_scan import FakeChecker
+from check_domain.tests.test_columnar import ipv6_exist
+
+
+def dnssec(domain, verdict):
+    return DNSSECValidatedState(DNSSECValidatedFormattedResponse({'domain': domain, 'rr_types': ["a", "dnssec"],
+                                                                  'answer': {'192.0.2.1': verdict}}))
+
+
+class TestFleetAggregate(unittest.TestCase):
+
+    def test_counts_and_summary(self):
+        aggregate = FleetAggregate()
+        aggregate.add("a.com", {'ns_ipv6_exist': ipv6_exist("a.com", ["2001:db8::1", "2001:db8::2"]),
+                                'dnssec': dnssec("a.com", "secure")})
+        aggregate.add("b.com", {'ns_ipv6_exist': ipv6_exist("b.com", ["2001:db8::1", None]),
+                                'dnssec': dnssec("b.com", "bogus")})
+        aggregate.add("c.com", {'ns_ipv6_exist': DeadlineExceeded("out of time"), 'dnssec': dnssec("c.com", "secure")})
+        aggregate.add_failed("d.com")
+
+        summary = aggregate.summary()
+        self.assertEqual(4, summary['domains'])
+        self.assertEqual(1, summary['failed'])
+        ns = summary['checks']['ns_ipv6_exist']
+        self.assertEqual({'ok': 2, 'timed_out': 1}, ns['outcomes'])
+        self.assertEqual(0.5, ns['all_hosts_share'])
+        self.assertEqual(1.0, ns['any_host_share'])
+        self.assertEqual(0.75, ns['host_ok_share'])
+        self.assertEqual({'0': 1, '1': 1}, ns['missing_hosts'])
+        self.assertEqual({'secure': 0.6667, 'bogus': 0.3333}, summary['checks']['dnssec']['verdict_rates'])
+
+    def test_merged_workers_equal_one_aggregate(self):
+        domains = {f"d{i}.com": ["2001:db8::1"] if i % 3 else [None, "2001:db8::2"] for i in range(30)}
+        whole, first, second = FleetAggregate(), FleetAggregate(), FleetAggregate()
+        for i, (domain, addresses) in enumerate(domains.items()):
+            states = {'ns_ipv6_exist': ipv6_exist(domain, addresses)}
+            whole.add(domain, states)
+            (first if i % 2 else second).add(domain, states)
+        merged = FleetAggregate().merge(first).merge(json.loads(json.dumps(second.as_dict())))
+        self.assertEqual(whole.as_dict(), merged.as_dict())
+
+    def test_reach_and_scanner(self):
+        reach = HostReachAnswer("a.com", ["mx", "a"], ["mx1", "mx2"],
+                                [(False, "192.0.2.1", [25], True), (False, "192.0.2.2", None, False)])
+        aggregate = FleetAggregate()
+        aggregate.add("a.com", {'mx_ipv4_reach': IPV4ReachState(HostFormattedResponse(reach))})
+        self.assertEqual(0.5, aggregate.summary()['checks']['mx_ipv4_reach']['host_ok_share'])
+
+        scanner = BulkScanner(checks=["ns_ipv6_exist", "dnssec"], concurrency=4, checker=FakeChecker())
+        scanner.scan([f"d{i}.com" for i in range(10)] + ["broken.com"], io.StringIO())
+        summary = scanner.aggregate.summary()
+        self.assertEqual(11, summary['domains'])
+        self.assertEqual(1, summary['failed'])
+        self.assertEqual(1.0, summary['checks']['ns_ipv6_exist']['all_hosts_share'])
+        self.assertEqual({'error': 10}, summary['checks']['dnssec']['outcomes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
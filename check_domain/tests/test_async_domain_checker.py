@@ -0,0 +1,118 @@
+import asyncio
+import socket
+import unittest
+from unittest import mock
+
+from check_domain.async_domain_checker import AsyncDomainChecker
+from check_domain.domain_state import IPV4ExistState, IPV4ReachState
+from check_domain.internet_fetch.async_reachable import port_test_async
+from check_domain.internet_fetch.async_resolver import AsyncResolver
+
+RECORDS = {
+    'example.com': ["ns1.example.com", "ns2.example.com"],
+    'ns1.example.com': ["127.0.0.1"],
+    'ns2.example.com': [],
+}
+
+
+class FakeData(object):
+
+    def __init__(self, names: list):
+        self.address_list = names
+        self.data = names
+
+    def as_domain_list(self):
+        return self.address_list
+
+
+class FakeResult(object):
+
+    def __init__(self, names: list):
+        self.havedata = 1 if len(names) > 0 else 0
+        self.data = FakeData(names)
+        self.ttl = 300
+
+
+class FakeAsyncContext(object):
+    """Queues answers and signals them through a socket pair, like unbound signals finished queries on its fd."""
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.pending = []
+        self.queries = []
+
+    def get_fd(self):
+        return self.reader.fileno()
+
+    def resolve_async(self, name, data, callback, rrtype, rrclass):
+        self.queries.append(name)
+        self.pending.append((callback, data, FakeResult(RECORDS.get(name, []))))
+        self.writer.send(b"x")
+        return 0, len(self.queries)
+
+    def process(self):
+        self.reader.recv(4096)
+        pending, self.pending = self.pending, []
+        for callback, data, result in pending:
+            callback(data, 0, result)
+
+    def cancel(self, async_id):
+        return 0
+
+
+class TestAsyncDomainChecker(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = AsyncResolver()
+        self.resolver.ctx = FakeAsyncContext()
+        self.resolver.ctx_dnssec = FakeAsyncContext()
+        self.checker = AsyncDomainChecker(dns=self.resolver)
+
+    def tearDown(self):
+        self.checker.close()
+
+    def run_checks(self, checks):
+        async def run():
+            try:
+                return await self.checker.check_all("example.com", checks=checks)
+            finally:
+                self.checker.close()
+        return asyncio.run(run())
+
+    def test_shared_ns_lookup(self):
+        states = self.run_checks(["ns_ipv4_exist", "ns_ipv4_reach"])
+        self.assertIsInstance(states['ns_ipv4_exist'], IPV4ExistState)
+        self.assertIsInstance(states['ns_ipv4_reach'], IPV4ReachState)
+        self.assertEqual({'ns1.example.com': "127.0.0.1", 'ns2.example.com': None},
+                         states['ns_ipv4_exist'].all_elements())
+        self.assertEqual(1, self.resolver.ctx.queries.count("example.com"))
+
+    def test_cancelled_step(self):
+        builders = self.checker._step_builders("example.com")
+
+        async def cancelled(steps):
+            raise asyncio.CancelledError()
+
+        builders['dnssec'] = cancelled
+        with mock.patch.object(self.checker, "_step_builders", return_value=builders):
+            states = self.run_checks(["dnssec", "ns_ipv4_exist"])
+        self.assertIsInstance(states['dnssec'], RuntimeError)
+        self.assertIsInstance(states['dnssec'].__cause__, asyncio.CancelledError)
+        self.assertIsInstance(states['ns_ipv4_exist'], IPV4ExistState)
+
+    def test_port_test_async(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        open_port = listener.getsockname()[1]
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+        try:
+            ports = asyncio.run(port_test_async("127.0.0.1", [closed_port, open_port], socket.AF_INET))
+        finally:
+            listener.close()
+        self.assertEqual([open_port], ports)
+
+# end
@@ -0,0 +1,62 @@
+import io
+import json
+import threading
+import time
+import unittest
+
+from check_domain.bulk_scan import BulkScanner, read_domains
+from check_domain.domain_state import IPV6ExistState
+from check_domain.formatted_response import DNSHostMappingFormattedResponse
+
+
+class FakeChecker(object):
+    """Stands in for DomainChecker.check_all() and records how many domains were in flight at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def check_all(self, domain, checks=None, deadline=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.001)
+        with self.lock:
+            self.in_flight -= 1
+        if domain == "broken.com":
+            raise ValueError("no ns")
+        response = DNSHostMappingFormattedResponse({'domain': domain, 'rr_types': ["ns", "aaaa"],
+                                                    'answer': {'ns1.' + domain: "2001:db8::1"}})
+        return {'ns_ipv6_exist': IPV6ExistState(response), 'dnssec': KeyError("timeout")}
+
+
+class TestBulkScanner(unittest.TestCase):
+
+    def test_read_domains(self):
+        source = io.StringIO("a.com\n\n# comment\n  b.com  \n")
+        self.assertEqual(["a.com", "b.com"], list(read_domains(source)))
+
+    def test_scan(self):
+        checker = FakeChecker()
+        scanner = BulkScanner(checks=["ns_ipv6_exist", "dnssec"], concurrency=4, checker=checker)
+        domains = (f"d{i}.com" for i in range(50))
+        sink = io.StringIO()
+        stats = scanner.scan(domains, sink)
+
+        lines = [json.loads(line) for line in sink.getvalue().splitlines()]
+        self.assertEqual(50, len(lines))
+        self.assertEqual(50, stats.completed)
+        self.assertEqual(50, stats.check_errors)
+        self.assertLessEqual(checker.max_in_flight, 4)
+        self.assertEqual("IPV6ExistState", lines[0]['checks']['ns_ipv6_exist']['state'])
+        self.assertIn("error", lines[0]['checks']['dnssec'])
+
+    def test_failed_domain(self):
+        scanner = BulkScanner(checks=["ns_ipv6_exist"], concurrency=2, checker=FakeChecker())
+        sink = io.StringIO()
+        stats = scanner.scan(["broken.com"], sink)
+        self.assertEqual(1, stats.failed)
+        self.assertIn("error", json.loads(sink.getvalue()))
+
+# end
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from check_domain import bulk_scan
+from check_domain.bulk_scan import BulkScanner
+from check_domain.checkpoint import CompletedSet, ScanCheckpoint, _format_ranges, _parse_ranges
+from check_domain.domain_state import DNSSECValidatedState
+from check_domain.formatted_response import DNSSECValidatedFormattedResponse
+
+
+class FakeChecker(object):
+
+    def __init__(self, fail_after: int = None):
+        self.scanned = []
+        self.fail_after = fail_after
+
+    def check_all(self, domain, checks=None, deadline=None):
+        if self.fail_after is not None and len(self.scanned) >= self.fail_after:
+            raise KeyboardInterrupt  # not an Exception: it aborts the whole scan like a crash
+        self.scanned.append(domain)
+        response = DNSSECValidatedFormattedResponse({'domain': domain, 'rr_types': ["a", "dnssec"],
+                                                     'answer': {'192.0.2.1': "secure"}})
+        return {'dnssec': DNSSECValidatedState(response)}
+
+
+class TestCompletedSet(unittest.TestCase):
+
+    def test_watermark(self):
+        completed = CompletedSet()
+        for index in (1, 0, 2, 5):
+            completed.add(index)
+        self.assertEqual(3, completed.watermark)
+        self.assertEqual({5}, completed.above)
+        self.assertIn(1, completed)
+        self.assertNotIn(4, completed)
+
+    def test_ranges(self):
+        self.assertEqual("0-2,5,7-8", _format_ranges([8, 0, 1, 2, 5, 7]))
+        self.assertEqual([0, 1, 2, 5, 7, 8], list(_parse_ranges("0-2,5,7-8")))
+
+
+class TestScanCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, "out.jsonl")
+        self.checkpoint = self.output + ".ckpt"
+        self.domains = [f"d{i}.com" for i in range(40)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def scan(self, checker, resume):
+        checkpoint = ScanCheckpoint(self.checkpoint, commit_every=5).start(self.output, resume=resume)
+        scanner = BulkScanner(checks=["dnssec"], concurrency=1, checker=checker)
+        with open(self.output, "a" if resume else "w", encoding="utf-8") as sink:  # as bulk_scan.main() opens it
+            try:
+                scanner.scan(self.domains, sink, checkpoint)
+            except KeyboardInterrupt:
+                sink.write('{"domain": "half written')  # a crash mid line
+            finally:
+                checkpoint.close()
+        return scanner.stats
+
+    def test_resume(self):
+        self.scan(FakeChecker(fail_after=23), resume=False)
+        checker = FakeChecker()
+        stats = self.scan(checker, resume=True)
+
+        with open(self.output, encoding="utf-8") as output:
+            domains = [json.loads(line)['domain'] for line in output]
+        self.assertEqual(sorted(self.domains), sorted(domains))  # every domain exactly once
+        self.assertEqual(20, stats.skipped)
+        self.assertEqual(self.domains[20:], checker.scanned)
+
+    def test_rerun_replaces_output(self):
+        domain_file = os.path.join(self.directory.name, "domains.txt")
+        with open(domain_file, "w", encoding="utf-8") as domains:
+            domains.write("\n".join(self.domains))
+        for _ in range(2):  # the second run has no --resume
+            with mock.patch.object(bulk_scan, "DomainChecker", lambda **kwargs: FakeChecker()), \
+                    mock.patch("sys.stderr"):
+                bulk_scan.main([domain_file, "-o", self.output, "--checks", "dnssec"])
+        with open(self.output, encoding="utf-8") as output:
+            domains = [json.loads(line)['domain'] for line in output]
+        self.assertEqual(sorted(self.domains), sorted(domains))  # not appended to the first run's lines
+
+# end
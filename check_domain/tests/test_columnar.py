@@ -0,0 +1,72 @@
+import io
+import os
+import tempfile
+import unittest
+
+from check_domain.columnar import ColumnarScanner, ColumnarStore
+from check_domain.deadline import DeadlineExceeded
+from check_domain.domain_state import DNSSECValidatedState, IPV6ExistState, IPV4ReachState
+from check_domain.formatted_response import DNSHostMappingFormattedResponse, DNSSECValidatedFormattedResponse, \
+    HostFormattedResponse, HostMappingAnswer, HostReachAnswer
+
+
+def ipv6_exist(domain, addresses):
+    names = [f"ns{i}.{domain}" for i in range(len(addresses))]
+    return IPV6ExistState(DNSHostMappingFormattedResponse(HostMappingAnswer(domain, ["ns", "aaaa"], names, addresses)))
+
+
+class FakeChecker(object):
+
+    def __init__(self, answers: dict):
+        self.answers = answers
+
+    def check_all(self, domain, checks=None, deadline=None):
+        return self.answers[domain]
+
+
+class TestColumnarStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ColumnarStore()
+        self.store.append("a.com", {'ns_ipv6_exist': ipv6_exist("a.com", ["2001:db8::1", "2001:db8::2"])})
+        self.store.append("b.com", {'ns_ipv6_exist': ipv6_exist("b.com", ["2001:db8::1", None])})
+        self.store.append("c.com", {'ns_ipv6_exist': DeadlineExceeded("out of time")})
+        dnssec = DNSSECValidatedFormattedResponse({'domain': "a.com", 'rr_types': ["a", "dnssec"],
+                                                   'answer': {'192.0.2.1': "bogus"}})
+        reach = HostReachAnswer("a.com", ["ns", "a"], ["ns0.a.com", "ns1.a.com"],
+                                [(False, "192.0.2.1", [53], True), (False, "192.0.2.2", None, False)])
+        self.store.append("a.com", {'dnssec': DNSSECValidatedState(dnssec),
+                                    'ns_ipv4_reach': IPV4ReachState(HostFormattedResponse(reach))})
+
+    def test_queries(self):
+        self.assertEqual(5, len(self.store))
+        self.assertEqual(0.5, self.store.all_hosts_share("ns_ipv6_exist"))
+        self.assertEqual(0.0, self.store.all_hosts_share("ns_ipv4_reach"))
+        self.assertIsNone(self.store.all_hosts_share("mx_ipv6_exist"))
+        self.assertEqual({'ok': 2, 'timed_out': 1}, self.store.outcome_counts("ns_ipv6_exist"))
+        self.assertEqual({'bogus': 1}, self.store.verdict_counts("dnssec"))
+        self.assertEqual(["a.com", "b.com"], self.store.domains_where(self.store.rows("ns_ipv6_exist")))
+        self.assertEqual([("ns1.b.com", 1)], self.store.failing_hosts("ns_ipv6_exist"))
+        self.assertRaises(ValueError, self.store.rows, "nope")
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.cols")
+            self.store.save(path)
+            loaded = ColumnarStore.load(path)
+        self.assertEqual(self.store.summary(), loaded.summary())
+        self.assertEqual(list(self.store.columns['flags']), list(loaded.columns['flags']))
+        loaded.append("d.com", {'ns_ipv6_exist': ipv6_exist("d.com", ["2001:db8::3"])})
+        self.assertEqual(2 / 3, loaded.all_hosts_share("ns_ipv6_exist"))
+
+    def test_scanner(self):
+        checker = FakeChecker({'a.com': {'ns_ipv6_exist': ipv6_exist("a.com", [None])}})
+        sink = io.StringIO()
+        store = ColumnarStore()
+        ColumnarScanner(store, checks=["ns_ipv6_exist"], checker=checker).scan(["a.com"], sink)
+        self.assertEqual(1, len(sink.getvalue().splitlines()))
+        self.assertEqual(0.0, store.all_hosts_share("ns_ipv6_exist"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import unittest
+
+from check_domain.domain_state import DNSSECState, IPV4ExistState, IPV4ReachState, IPV6ReachState
+from check_domain.formatted_response import DNSHostMappingFormattedResponse, DNSSECFormattedResponse, \
+    HostFormattedResponse, HostMappingAnswer, HostReachAnswer, DNSSECAnswer, DNSSECSignaturesAnswer, \
+    DNSSECValidationAnswer
+from check_domain.internet_fetch.ip_reachable import Reacher
+
+
+class TestCompactAnswers(unittest.TestCase):
+
+    def test_host_mapping(self):
+        answer = HostMappingAnswer("example.com", ["ns", "a"], ["ns1.example.com", "ns2.example.com"],
+                                   ["192.0.2.1", None])
+        expected = {'domain': "example.com", 'rr_types': ("ns", "a"),
+                    'answer': {'ns1.example.com': "192.0.2.1", 'ns2.example.com': None}}
+        self.assertEqual(expected, answer.as_dict())
+        self.assertEqual(expected, dict(answer))
+        response = DNSHostMappingFormattedResponse(answer)
+        self.assertEqual(expected, response.get_response())
+        self.assertEqual("example.com", response['domain'])
+        self.assertRaises(KeyError, lambda: response['hosts'])
+        self.assertEqual({'ns1.example.com': "192.0.2.1"}, IPV4ExistState(response).with_ipv4())
+        self.assertIsNone(HostMappingAnswer("example.com", ["mx", "a"], None, None)['answer'])
+
+    def test_views_are_copies(self):
+        answer = HostMappingAnswer("example.com", ["ns", "a"], ["ns1"], ["192.0.2.1"])
+        response = DNSHostMappingFormattedResponse(answer)
+        response.get_response()['answer']['ns1'] = "changed"
+        self.assertEqual("192.0.2.1", response['answer']['ns1'])
+
+    def test_reach_group(self):
+        formatted_answer = {'domain': "example.com", 'rr_types': ["ns", "aaaa"], 'hosts': {}}
+        host = {'host_name': "ns1", 'pingable': True, 'ip': "2001:db8::1", 'ports_succeeded': [53],
+                'can_connect': True}
+        response = Reacher._hosts_response(formatted_answer, [("ns1", host)])
+        self.assertIsInstance(response.response, HostReachAnswer)
+        expected_hosts = {'ns1': {'pingable': True, 'ip': "2001:db8::1", 'ports_succeeded': [53], 'can_connect': True}}
+        self.assertEqual(expected_hosts, response['hosts'])
+        self.assertEqual(expected_hosts, json.loads(Reacher._hosts_response(dict(formatted_answer, hosts={}),
+                                                                            [("ns1", host)], jsonic=True)
+                                                    .get_response())['hosts'])
+        self.assertEqual(["ns1"], list(IPV6ReachState(response).reach_test()['reached']))
+
+    def test_dnssec(self):
+        validation = DNSSECValidationAnswer("example.com", ["192.0.2.1", "192.0.2.2"], "secure")
+        signatures = DNSSECSignaturesAnswer("example.com", ["key", None, None, "ds", "soa"])
+        self.assertEqual({'soa': ["soa"], 'dnskey': ["key"], 'rrsig': None, 'nsec': None, 'ds': ["ds"]},
+                         signatures['answer'])
+        state = DNSSECState(DNSSECFormattedResponse(DNSSECAnswer("example.com", validation, signatures)))
+        self.assertTrue(state.valid)
+        self.assertEqual({'192.0.2.1': "secure", '192.0.2.2': "secure"},
+                         state.to_dict()['answer']['answer']['validation'])
+
+    def test_views_are_built_once(self):
+        answer = HostReachAnswer("example.com", ["mx", "a"], ["mx1", "mx2", "mx3"],
+                                 [(True, "192.0.2.1", None, False), (False, "192.0.2.2", [25], True),
+                                  (False, "192.0.2.3", None, False)])
+        state = IPV4ReachState(HostFormattedResponse(answer))
+        self.assertEqual(["mx1", "mx2"], list(state.reach_test()['reached']))
+        self.assertEqual(["mx2"], list(state.reach_test(require_connect=True)['reached']))
+        self.assertIs(state.reach_test(), state.reach_test())
+        self.assertIs(state.reach_test()['reached']['mx2'], state.reach_test(True)['reached']['mx2'])
+
+        exist = IPV4ExistState(DNSHostMappingFormattedResponse(
+            HostMappingAnswer("example.com", ["ns", "a"], ["ns1", "ns2"], ["192.0.2.1", None])))
+        self.assertEqual({'ns2': None}, exist.without_ipv4())
+        self.assertIs(exist.with_ipv4(), exist.elements_present)
+
+    def test_slots(self):
+        response = HostFormattedResponse({'domain': "example.com"})
+        self.assertFalse(hasattr(response, "__dict__"))
+        state = IPV4ExistState(DNSHostMappingFormattedResponse(HostMappingAnswer("example.com", ["ns", "a"], None,
+                                                                                 None)))
+        self.assertFalse(hasattr(state, "__dict__"))
+        self.assertEqual([], state.timed_out)
+
+# end
@@ -0,0 +1,119 @@
+import socket
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from check_domain.deadline import Deadline, DeadlineExceeded
+from check_domain.domain_state import IPV4ExistState
+from check_domain.internet_fetch.dkim_discovery import DKIMSelectorDiscovery
+from check_domain.internet_fetch.dmarc_resolver import DMARCResolver
+from check_domain.internet_fetch.dns_resolvers import Resolver
+from check_domain.internet_fetch.spf_evaluator import SPFEvaluator
+from check_domain.query_plan import QueryPlan
+
+
+class FakeData(object):
+
+    def __init__(self, names: list):
+        self.address_list = names
+        self.data = names
+
+    def as_domain_list(self):
+        return self.address_list
+
+
+class FakeResult(object):
+
+    def __init__(self, names: list):
+        self.havedata = 1 if len(names) > 0 else 0
+        self.data = FakeData(names)
+        self.ttl = 300
+
+
+class SilentHostContext(object):
+    """Answers every query right away, except those of 'silent.example.com' and its subdomains, which are never
+    answered."""
+
+    records = {'example.com': ["ns1.example.com", "silent.example.com"], 'ns1.example.com': ["192.0.2.1"]}
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.pending = []
+        self.cancelled = []
+
+    def get_fd(self):
+        return self.reader.fileno()
+
+    def resolve_async(self, name, data, callback, rrtype, rrclass):
+        if not name.endswith("silent.example.com"):
+            self.pending.append((callback, data, FakeResult(self.records.get(name, []))))
+            self.writer.send(b"x")
+        return 0, name
+
+    def process(self):
+        self.reader.recv(4096)
+        pending, self.pending = self.pending, []
+        for callback, data, result in pending:
+            callback(data, 0, result)
+
+    def cancel(self, async_id):
+        self.cancelled.append(async_id)
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_timeout(self):
+        self.assertIsNone(Deadline().timeout())
+        self.assertEqual(2, Deadline().timeout(2))
+        self.assertLessEqual(Deadline(0.5).timeout(2), 0.5)
+        self.assertRaises(DeadlineExceeded, Deadline(0).check)
+
+    def test_partial_mapping(self):
+        context = Resolver.ctx
+        Resolver.ctx = SilentHostContext()
+        try:
+            started = time.monotonic()
+            response = Resolver().get_ipv4_mapping("example.com", "ns", deadline=Deadline(0.3))
+            elapsed = time.monotonic() - started
+            cancelled = Resolver.ctx.cancelled
+        finally:
+            Resolver.ctx = context
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual({'ns1.example.com': "192.0.2.1", 'silent.example.com': None}, response['answer'])
+        self.assertEqual(["silent.example.com"], cancelled)
+        state = IPV4ExistState(response)
+        self.assertTrue(state.is_partial())
+        self.assertEqual(["silent.example.com"], state.timed_out)
+
+    def test_evaluator_deadline(self):
+        context = Resolver.ctx
+        Resolver.ctx = SilentHostContext()
+        try:
+            evaluators = [SPFEvaluator(Resolver()).inspect_spf,
+                          DMARCResolver(Resolver()).inspect_dmarc,
+                          DKIMSelectorDiscovery(Resolver(), selectors=("s1",), max_workers=1).discover]
+            for evaluate in evaluators:
+                started = time.monotonic()
+                self.assertRaises(DeadlineExceeded, evaluate, "silent.example.com", deadline=Deadline(0.2))
+                self.assertLess(time.monotonic() - started, 1.0)
+            cancelled = Resolver.ctx.cancelled
+        finally:
+            Resolver.ctx = context
+        self.assertEqual(["silent.example.com", "_dmarc.silent.example.com", "s1._domainkey.silent.example.com"],
+                         cancelled)
+
+    def test_plan_deadline(self):
+        plan = QueryPlan()
+        plan.add("fast", lambda: "done")
+        plan.add("slow", lambda: time.sleep(1) or "late")
+        plan.add("after_slow", lambda slow: slow, ("slow",))
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            started = time.monotonic()
+            results = plan.run(["fast", "after_slow"], executor, Deadline(0.2))
+            self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual("done", results["fast"])
+        self.assertIsInstance(results["slow"], DeadlineExceeded)
+        self.assertIsInstance(results["after_slow"], DeadlineExceeded)
+
+# end
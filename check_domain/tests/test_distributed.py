@@ -0,0 +1,118 @@
+import io
+import json
+import socket
+import threading
+import unittest
+from unittest import mock
+
+from check_domain.distributed import HashRing, ScanCoordinator, ScanWorker, _Channel, locality_key
+from check_domain.tests.test_bulk_scan import FakeChecker
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_locality(self):
+        self.assertEqual(locality_key("mail.example.com"), locality_key("www.example.com"))
+        ring = HashRing()
+        for node in ("a", "b", "c"):
+            ring.add(node)
+        self.assertEqual(3, len(ring))
+        self.assertEqual(ring.node_for(locality_key("mail.example.com")),
+                         ring.node_for(locality_key("www.Example.com")))
+
+    def test_adding_a_node_only_moves_its_keys(self):
+        ring = HashRing()
+        for node in ("a", "b", "c"):
+            ring.add(node)
+        keys = [f"domain{i}.com" for i in range(1000)]
+        before = {key: ring.node_for(key) for key in keys}
+        ring.add("d")
+        moved = [key for key in keys if ring.node_for(key) != before[key]]
+        self.assertTrue(all(ring.node_for(key) == "d" for key in moved))
+        self.assertLess(len(moved), 500)
+        ring.remove("d")
+        self.assertEqual(before, {key: ring.node_for(key) for key in keys})
+
+
+class TestDistributedScan(unittest.TestCase):
+
+    def start_coordinator(self, domains, **options):
+        sink = io.StringIO()
+        coordinator = ScanCoordinator(domains, sink, ("127.0.0.1", 0), token="secret", **options)
+        outcome = {}
+        thread = threading.Thread(target=lambda: outcome.update(coordinator.serve()), daemon=True)
+        thread.start()
+        return coordinator, sink, thread, outcome
+
+    def start_worker(self, coordinator, name):
+        worker = ScanWorker(coordinator.address, "secret", name=name, checks=["ns_ipv6_exist"], concurrency=4,
+                            checker=FakeChecker())
+        thread = threading.Thread(target=worker.run, daemon=True)
+        thread.start()
+        return thread
+
+    def test_every_domain_once(self):
+        domains = [f"host{i}.domain{i % 7}.com" for i in range(200)]
+        coordinator, sink, thread, outcome = self.start_coordinator(domains, chunk_size=16)
+        workers = [self.start_worker(coordinator, "node") for _ in range(3)]
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        scanned = sorted(json.loads(line)['domain'] for line in sink.getvalue().splitlines())
+        self.assertEqual(sorted(domains), scanned)
+        self.assertEqual(200, outcome['total']['completed'])
+        self.assertEqual(200, coordinator.aggregate.domains)
+        self.assertEqual({"node", "node-2", "node-3"}, set(outcome['workers']))
+        for worker in workers:
+            worker.join(5)
+
+    @mock.patch("check_domain.distributed.LINGER_SECONDS", 0.2)  # the hung worker never disconnects
+    def test_expired_lease_is_reassigned(self):
+        domains = [f"d{i}.com" for i in range(10)]
+        coordinator, sink, thread, outcome = self.start_coordinator(domains, chunk_size=5, lease_seconds=0.3)
+        # a worker that takes a lease and then hangs without renewing it
+        hung = socket.create_connection(coordinator.address)
+        channel = _Channel(hung)
+        channel.send({'type': "hello", 'worker': "hung", 'token': "secret"})
+        channel.receive()
+        channel.send({'type': "lease"})
+        taken = channel.receive()
+        self.assertEqual(5, len(taken['domains']))
+
+        self.start_worker(coordinator, "healthy")
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(1, outcome['total']['expired_leases'])
+        self.assertEqual(sorted(domains),
+                         sorted(json.loads(line)['domain'] for line in sink.getvalue().splitlines()))
+
+        # the hung worker's late results are dropped
+        self.assertFalse(coordinator.complete("hung", taken['lease'], ["late"], None))
+        hung.close()
+
+    def test_wrong_token_is_refused(self):
+        coordinator, sink, thread, outcome = self.start_coordinator(["a.com"])
+        worker = ScanWorker(coordinator.address, "guess", checks=["ns_ipv6_exist"], checker=FakeChecker())
+        with self.assertRaises(PermissionError):
+            worker.run()
+        self.assertEqual(0, len(coordinator.ring))
+        self.start_worker(coordinator, "node")
+        thread.join(10)
+        self.assertEqual(["a.com"], [json.loads(line)['domain'] for line in sink.getvalue().splitlines()])
+
+    def test_lines_must_match_the_lease(self):
+        coordinator = ScanCoordinator(["a.com", "b.com"], io.StringIO(), ("127.0.0.1", 0), chunk_size=2)
+        worker = coordinator.join("node")
+        lease = coordinator.lease(worker)
+        self.assertEqual(["a.com", "b.com"], sorted(lease['domains']))
+        forged = ['{"domain": "a.com"}', '{"domain": "a.com"}\n{"domain": "evil.com"}']
+        for lines in (['{"domain": "a.com"}'], ['{"domain": "a.com"}', '{"domain": "evil.com"}'], forged,
+                      ['{"domain": "a.com"}', "not json"]):
+            self.assertFalse(coordinator.complete(worker, lease['lease'], lines, None))
+            self.assertEqual("", coordinator.sink.getvalue())
+            lease = coordinator.lease(worker)  # handed out again
+        self.assertEqual(4, coordinator.counts['rejected_results'])
+        lines = ['{"domain": "b.com"}', '{"domain": "a.com"}']
+        self.assertTrue(coordinator.complete(worker, lease['lease'], lines, None))
+        self.assertEqual(2, coordinator.counts['completed'])
+
+# end
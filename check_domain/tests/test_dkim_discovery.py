@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from check_domain.internet_fetch import dkim_discovery
+from check_domain.internet_fetch.dkim_discovery import DKIMSelectorDiscovery, parse_dkim
+from check_domain.formatted_response import DKIMFormattedResponse
+from check_domain.domain_state import DKIMState
+from check_domain.tests.test_spf_evaluator import FakeTXTResolver
+
+
+class TestParseDKIM(unittest.TestCase):
+
+    def test_parse(self):
+        tags, errors = parse_dkim("v=DKIM1; k=rsa; p=MIGfMA0G CSqGSIb3")
+        self.assertEqual({'v': "DKIM1", 'k': "rsa", 'p': "MIGfMA0GCSqGSIb3"}, tags)
+        self.assertEqual([], errors)
+
+    def test_parse_revoked(self):
+        tags, errors = parse_dkim("v=DKIM1; p=")
+        self.assertEqual("", tags['p'])
+        self.assertEqual(1, len(errors))
+        self.assertIsNone(parse_dkim("k=rsa; v=DKIM1; p=abc")[0])
+
+
+class TestDKIMSelectorDiscovery(unittest.TestCase):
+
+    records = {'selector2._domainkey.example.com': ["v=DKIM1; k=rsa; p=MIGfMA0GCSqGSIb3"]}
+
+    def setUp(self):
+        DKIMSelectorDiscovery.clear_cache()
+        self.dns = FakeTXTResolver(self.records)
+        self.dkim = DKIMSelectorDiscovery(self.dns, selectors=("google", "selector1", "selector2"), max_workers=2)
+
+    def test_discover(self):
+        response = self.dkim.discover("example.com")
+        self.assertIsInstance(response, DKIMFormattedResponse)
+        state = DKIMState(response)
+        self.assertEqual("selector2", state.selector)
+        self.assertEqual("selector2._domainkey.example.com", state.query)
+        self.assertTrue(state.valid)
+
+    def test_negative_cache(self):
+        self.assertIsNone(self.dkim.discover("nodkim.com")['answer'])
+        self.dkim.discover("nodkim.com")
+        self.assertEqual(3, len(self.dns.queried))
+
+    def test_negative_cache_is_bounded_and_expires(self):
+        DKIMSelectorDiscovery(self.dns, selectors=("selector2",), max_workers=1).discover("example.com")
+        self.assertEqual(0, len(DKIMSelectorDiscovery._negative_cache))  # nothing stored without a miss
+        with mock.patch.object(dkim_discovery, "NEGATIVE_CACHE_DOMAINS", 2):
+            for domain in ("a.com", "b.com", "c.com"):
+                self.dkim.discover(domain)
+        self.assertEqual(["b.com", "c.com"], list(DKIMSelectorDiscovery._negative_cache))
+
+        with mock.patch.object(dkim_discovery.time, "time", return_value=dkim_discovery.time.time() + 7200):
+            queried = len(self.dns.queried)
+            self.dkim.discover("b.com")
+        self.assertEqual(3, len(self.dns.queried) - queried)  # expired misses are probed again
+
+# end
@@ -0,0 +1,107 @@
+import time
+import unittest
+from unittest import mock
+
+from check_domain.internet_fetch import dmarc_resolver
+from check_domain.internet_fetch.dmarc_resolver import DMARCResolver, parse_dmarc
+from check_domain.internet_fetch.public_suffix import PublicSuffixTrie
+from check_domain.formatted_response import DMARCFormattedResponse
+from check_domain.domain_state import DMARCState
+from check_domain.tests.test_spf_evaluator import FakeTXTResolver
+
+
+class TestPublicSuffixTrie(unittest.TestCase):
+
+    trie = PublicSuffixTrie(["com", "uk", "co.uk", "*.kawasaki.jp", "!city.kawasaki.jp", "jp"])
+
+    def test_registrable_domain(self):
+        self.assertEqual("example.com", self.trie.registrable_domain("www.example.com"))
+        self.assertEqual("example.co.uk", self.trie.registrable_domain("mail.example.co.uk."))
+        self.assertEqual("a.b.kawasaki.jp", self.trie.registrable_domain("x.a.b.kawasaki.jp"))
+        self.assertEqual("city.kawasaki.jp", self.trie.registrable_domain("www.city.kawasaki.jp"))
+        self.assertEqual("example.test", self.trie.registrable_domain("example.test"))  # implicit '*' rule
+        self.assertIsNone(self.trie.registrable_domain("co.uk"))
+
+    def test_missing_list_warns(self):
+        with self.assertWarns(RuntimeWarning):
+            trie = PublicSuffixTrie.from_file("/nonexistent/public_suffix_list.dat")
+        self.assertEqual("co.uk", trie.registrable_domain("www.example.co.uk"))  # only the implicit '*' rule
+
+    def test_public_suffix(self):
+        self.assertEqual("co.uk", self.trie.public_suffix("www.Example.CO.uk"))
+        self.assertEqual("b.kawasaki.jp", self.trie.public_suffix("a.b.kawasaki.jp"))
+
+
+class TestParseDMARC(unittest.TestCase):
+
+    def test_parse_defaults(self):
+        tags, errors = parse_dmarc("v=DMARC1; p=reject; rua=mailto:d@example.com")
+        self.assertEqual([], errors)
+        self.assertEqual("reject", tags['sp'])
+        self.assertEqual("100", tags['pct'])
+        self.assertEqual("r", tags['adkim'])
+
+    def test_parse_errors(self):
+        self.assertIsNone(parse_dmarc("p=reject; v=DMARC1")[0])
+        self.assertIsNone(parse_dmarc("v=DMARC1; p=block")[0])
+        self.assertEqual("none", parse_dmarc("v=DMARC1; rua=mailto:d@example.com")[0]['p'])
+
+
+class TestDMARCResolver(unittest.TestCase):
+
+    records = {
+        '_dmarc.example.com': ["v=DMARC1; p=reject; sp=quarantine"],
+        '_dmarc.own.example.com': ["v=DMARC1; p=none"],
+    }
+
+    def setUp(self):
+        DMARCResolver.clear_cache()
+        DMARCResolver.suffixes = PublicSuffixTrie(["com"])
+        self.dns = FakeTXTResolver(self.records)
+        self.dmarc = DMARCResolver(self.dns)
+
+    def tearDown(self):
+        DMARCResolver.suffixes = PublicSuffixTrie.default()
+
+    def test_inspect_dmarc(self):
+        response = self.dmarc.inspect_dmarc("example.com")
+        self.assertIsInstance(response, DMARCFormattedResponse)
+        self.assertEqual("_dmarc.example.com", response['dns_query'])
+        self.assertEqual("reject", DMARCState(response).policy)
+
+    def test_organizational_fallback(self):
+        response = self.dmarc.inspect_dmarc("a.example.com")
+        self.assertTrue(response['answer']['inherited'])
+        self.assertEqual("quarantine", response['answer']['policy'])
+        self.assertEqual("none", self.dmarc.inspect_dmarc("own.example.com")['answer']['policy'])
+        self.dmarc.inspect_dmarc("b.example.com")
+        self.assertEqual(1, self.dns.queried.count("_dmarc.example.com"))
+
+    def test_cache_only_fallbacks_until_ttl(self):
+        records = dict(self.records)
+        dns = FakeTXTResolver(records)
+        ttl_dns = mock.Mock(wraps=dns)
+        ttl_dns.get_txt.side_effect = lambda name, deadline=None: dns.get_txt(name).set_ttls({0: 300})
+        dmarc = DMARCResolver(ttl_dns)
+        self.assertEqual("reject", dmarc.inspect_dmarc("example.com")['answer']['policy'])
+        self.assertEqual({}, dict(DMARCResolver._org_cache))  # a domain looked up for itself is not cached
+        self.assertEqual("quarantine", dmarc.inspect_dmarc("a.example.com")['answer']['policy'])
+
+        records['_dmarc.example.com'] = ["v=DMARC1; p=none"]
+        self.assertEqual("none", dmarc.inspect_dmarc("example.com")['answer']['policy'])
+        self.assertEqual("quarantine", dmarc.inspect_dmarc("b.example.com")['answer']['policy'])  # until the ttl
+        with mock.patch.object(dmarc_resolver.time, "time", return_value=time.time() + 301):
+            self.assertEqual("none", dmarc.inspect_dmarc("b.example.com")['answer']['policy'])
+
+    def test_cache_is_bounded(self):
+        with mock.patch.object(dmarc_resolver, "ORG_CACHE_DOMAINS", 3):
+            for i in range(10):
+                self.dmarc.inspect_dmarc(f"www.org{i}.com")
+        self.assertEqual(["org7.com", "org8.com", "org9.com"], list(DMARCResolver._org_cache))
+
+    def test_no_record(self):
+        response = self.dmarc.inspect_dmarc("www.nodmarc.com")
+        self.assertIsNone(response['answer'])
+        self.assertFalse(response['valid'])
+
+# end
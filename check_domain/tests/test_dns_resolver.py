@@ -11,7 +11,7 @@ class TestDNSResponseFormat(unittest.TestCase):
     def test_get_a_records(self):
         r = Resolver()
         expected = {
-            'domain': "google.com", 'rr_types': ["a"],
+            'domain': "google.com", 'rr_types': ("a",),
             'answer': {0: "74.125.196.101", 1: "74.125.196.139", 2: "74.125.196.138", 3: "74.125.196.102",
                        4: "74.125.196.100", 5: "74.125.196.113"}
         }
@@ -24,7 +24,7 @@ class TestDNSResponseFormat(unittest.TestCase):
         actual_val_type = type(list(r.get_a_records("google.com").get_response()['answer'].values())[0])
         self.assertEqual(expected_val_type, actual_val_type)  # correct val and type; google rotates ip addresses
         expected['domain'] = "ns-1394.awsdns-46.org."
-        expected['rr_types'] = ["a"]
+        expected['rr_types'] = ("a",)
         expected['answer'] = {0: "205.251.197.114"}
         self.assertEqual(expected, r.get_a_records("ns-1394.awsdns-46.org.").get_response())
         expected['domain'] = "kaljfnotexists.org"
@@ -33,13 +33,13 @@ class TestDNSResponseFormat(unittest.TestCase):
 
     def test_get_aaaa_records(self):
         r = Resolver()
-        expected = {'domain': "ns-439.awsdns-54.com.", 'rr_types': ["aaaa"],
-                    'answer': {0: "2600:9000:5301:b700:0:0:0:1"}}
+        expected = {'domain': "ns-439.awsdns-54.com.", 'rr_types': ("aaaa",),
+                    'answer': {0: "2600:9000:5301:b700::1"}}
         actual = r.get_aaaa_records("ns-439.awsdns-54.com.").get_response()
         self.assertEqual(expected['domain'], actual['domain'])  # has ipv6
         self.assertEqual(expected['rr_types'], actual['rr_types'])
         self.assertEqual(expected['answer'], actual['answer'])
-        expected = {'domain': "gvlswing.com", 'rr_types': ["aaaa"],
+        expected = {'domain': "gvlswing.com", 'rr_types': ("aaaa",),
                     'answer': None}
         self.assertEqual(expected, r.get_aaaa_records("gvlswing.com").get_response())  # no ipv6
         expected['domain'] = "ljlkjsafdnotexistskljsdl.com"
@@ -50,7 +50,7 @@ class TestDNSResponseFormat(unittest.TestCase):
 
     def test_get_soa(self):
         r = Resolver()
-        expected = {'domain': "interdc.nl.", 'rr_types': ["soa"],
+        expected = {'domain': "interdc.nl.", 'rr_types': ("soa",),
                     'answer':
                         {0: str(b'\x03ns1\nicehosting\x02nl\x00\nhostmaster\x07interdc\x02nl\x00xX\xbc\xba\x00\x008@'
                                 b'\x00\x00\x0e\x10\x00\x12u\x00\x00\x01Q\x80')}
@@ -62,14 +62,14 @@ class TestDNSResponseFormat(unittest.TestCase):
 
     def test_get_ns(self):
         r = Resolver()
-        expected = {'domain': "gvlswing.com", 'rr_types': ["ns"],
+        expected = {'domain': "gvlswing.com", 'rr_types': ("ns",),
                     'answer': {0: "ns-1394.awsdns-46.org.", 1: "ns-1582.awsdns-05.co.uk.", 2: "ns-439.awsdns-54.com.",
                                3: "ns-812.awsdns-37.net."}}
         self.assertEqual(expected, r.get_ns("gvlswing.com").get_response())
 
     def test_get_mx(self):
         r = Resolver()
-        expected = {'domain': "gmail.com", 'rr_types': ["mx"],
+        expected = {'domain': "gmail.com", 'rr_types': ("mx",),
                     'answer': {0: "alt1.gmail-smtp-in.l.google.com.", 1: "alt3.gmail-smtp-in.l.google.com.",
                                2: "alt2.gmail-smtp-in.l.google.com.", 3: "alt4.gmail-smtp-in.l.google.com.",
                                4: "gmail-smtp-in.l.google.com."}}
@@ -91,11 +91,11 @@ class TestDNSResponseFormat(unittest.TestCase):
 
     def test_get_ipv6(self):
         r = Resolver()
-        expected = {'domain': "gvlswing.com", 'rr_types': ["ns", "aaaa"],
-                    'answer': {'ns-812.awsdns-37.net.': "2600:9000:5303:2c00:0:0:0:1",
-                               'ns-439.awsdns-54.com.': "2600:9000:5301:b700:0:0:0:1",
-                               'ns-1582.awsdns-05.co.uk.': "2600:9000:5306:2e00:0:0:0:1",
-                               'ns-1394.awsdns-46.org.': "2600:9000:5305:7200:0:0:0:1"}}
+        expected = {'domain': "gvlswing.com", 'rr_types': ("ns", "aaaa"),
+                    'answer': {'ns-812.awsdns-37.net.': "2600:9000:5303:2c00::1",
+                               'ns-439.awsdns-54.com.': "2600:9000:5301:b700::1",
+                               'ns-1582.awsdns-05.co.uk.': "2600:9000:5306:2e00::1",
+                               'ns-1394.awsdns-46.org.': "2600:9000:5305:7200::1"}}
         self.assertEqual(expected, r.get_ipv6("gvlswing.com", "ns").get_response())
 
     def test_mx_list_to_ipv6bytes(self):  # may deprecate
@@ -104,7 +104,7 @@ class TestDNSResponseFormat(unittest.TestCase):
     # dnssec records types
     def test_get_dnskeys(self):
         r = Resolver()
-        expected = {'domain': "interdc.nl", 'rr_types': ["dnskey"],
+        expected = {'domain': "interdc.nl", 'rr_types': ("dnskey",),
                     'answer': {
                         0: b'\x01\x01\x03\x08\x03\x01\x00\x01\xc9\xeaL\x01\xc8\x16nQ\x9d\xb2\x94\xb1\xc1TH\x9cC\xf8[\xfa%^\xaen\x07C3\xb0\x8b\xd5i\\\xd4\x17\xa2\xfd\xd0\xe6d\xba\xb6\xb8P\xe9\xfe\x18\xcbm~\xa3\xd6\\\x1b\xa0HN5\xb9\x18\xf8\x1e\xdd\x08+\xe3W`P\x16B\x03\xed\xfes\xd0m\xae|\x90D0\\\x7fgU\x17B\x93\xc5\x85#\xbd\x87\x95\x1e\x96\x93\xc89\xc1\x82\xc6\x8di\x92\xd7\xd3E\x0e\xdd\x91H\x1a\xbf\x15L\xd4Wl\xed\xcb\x1e\x1a\x8c\x9a)\xec\xd5J\x8d\xc8\xcf\xcd\x8fC\x1f\xffb\xb4/\xc2Q\x9e\xaf\x1b\x0e\xc5\xf9/\x0f\xfcE\xd5\x01x\x19Q\xcd\xc2\xa2\xf4\xfd\xc8\x8b\xf9\x07\xaef=\xa5\xaeya\xf3z?c\x1fn\x8d\xa4f7\x0be\xac\x94\xee\x93\xf3\x86\xab\x93\xb5\xef\x88y{?\xfa\xe9\xf4\xb5M\xbe\xf3\x94\n\xa8\x03\x90\x1b*\xd7\x1e\xc5\x08=\x91\xe6\x13>#5\x7f\xfdY\xe0\x14\xe0\xc7\xd2\x95\x14C\xdcrv\x97M\xf8\xad\x8ef:(\xcb\x9d\xe5i}\x85\x1e\xa1\x15\x9f',
                         1: b'\x01\x00\x03\x08\x03\x01\x00\x01\xba\xfc\xb6\x00\xe9z\x83\xa7\xe0l\xd6\x06\xa5#c\xb4i\x12\n\x92\xc5\x88JD9\x89uV\xf7\xe8i\xfb\xa2V\x7f\x84N9\xf9k\x15g\xd4\xa8\xf3C\x84\x9f\xcc\xd9%8\x14\x07U\xd6\xd0\x08\xc2\xa5){>\xb7\xb5\xf4\xb8\x1f\tdE\x92U\x84h\xba\xac\xf5a\x97\xde\x0f\xa2\xccw\x1a\xf3TB;c:K\xb2b\xe2\xc0\xf3\xe3\x1d\xe6\x85T\xf6\xab\xae\xdeU\xe7\xbb\xc1\x8d\xdb?\x8aa\xb9K\xfb_\x1fgG\xed\x1e\xf7]g',}
@@ -118,7 +118,7 @@ class TestDNSResponseFormat(unittest.TestCase):
         r = Resolver()
         expected = {
             'domain': "interdc.nl",
-            'rr_types': ["rrsig"],
+            'rr_types': ("rrsig",),
             'answer': {
                 0: b'\x00\x06\x08\x02\x00\x008@]\x82%(]T\x00\xa84\xf8\x07interdc\x02nl\x001['
                        b'C\xd9_VlI\x00c\x0f\x04Mp\xdb\x06!\x96\x11bH\x1f\x88\xeb\xf2\x1c\x19_i\x85'
@@ -195,7 +195,7 @@ class TestDNSResponseFormat(unittest.TestCase):
 
     def test_get_ds(self):
         r = Resolver()
-        expected = {'domain': "interdc.nl", 'rr_types': ["ds"],
+        expected = {'domain': "interdc.nl", 'rr_types': ("ds",),
                     'answer': {0: b'\xb92\x08\x02\x97\x19\xc6\xfa\xae-}f\xc9\x80\x9b\\\xbdr\x9e8pm\x1f\xbd'
                                       b'\xd4\xa1\xf5\x97\xe7a\x08\xd18j\xc3\x8c'}}
         self.assertEqual(expected, r.get_ds("interdc.nl").get_response())  # has ds
@@ -205,7 +205,7 @@ class TestDNSResponseFormat(unittest.TestCase):
 
     def test_get_nsec(self):
         r = Resolver()
-        expected = {'domain': "interdc.nl", 'rr_types': ["nsec"],
+        expected = {'domain': "interdc.nl", 'rr_types': ("nsec",),
                     'answer': {0: b'\x06_dmarc\x07interdc\x02nl\x00\x00\x07b\x01\x80\x08\x00\x03\x80'}}
         self.assertEqual(expected, r.get_nsec("interdc.nl").get_response())
         expected['domain'] = "gvlswing.com"
@@ -214,7 +214,7 @@ class TestDNSResponseFormat(unittest.TestCase):
 
     def test_validate_dnssec(self):
         r = Resolver()
-        expected = {'domain': "interdc.nl", 'rr_types': ["a", "dnssec"], 'answer': {'195.22.100.12': "secure"}}
+        expected = {'domain': "interdc.nl", 'rr_types': ("a", "dnssec"), 'answer': {'195.22.100.12': "secure"}}
         self.assertEqual(expected, r.dnssec_validate("interdc.nl").get_response())
         expected['domain'] = "gvlswing.com"
         expected['answer'] = {'52.33.238.38': "insecure"}
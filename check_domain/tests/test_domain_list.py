@@ -0,0 +1,71 @@
+import io
+import os
+import queue
+import tempfile
+import unittest
+from unittest import mock
+
+from check_domain import domain_list
+from check_domain.bulk_scan import read_domains
+from check_domain.domain_list import DomainSet, MappedDomainReader, byte_ranges
+from check_domain.sharded_scan import _queued_domains
+
+
+class TestDomainList(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "domains.txt")
+        lines = [f"  D{i % 70}.Example.COM. " if i % 9 else "# comment" for i in range(300)] + ["", "last.com"]
+        with open(self.path, "w", encoding="utf-8") as domains:
+            domains.write("\n".join(lines))  # no newline after the last line
+        self.expected = list(dict.fromkeys(line.strip().lower().rstrip(".") for line in lines
+                                           if len(line) > 0 and not line.startswith("#")))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ranges_cover_the_file_once(self):
+        with mock.patch.object(domain_list, "BLOCK_BYTES", 50):
+            for parts in (1, 4, 37, 10000):
+                seen = DomainSet(capacity=4)
+                ranges = byte_ranges(self.path, parts)
+                self.assertEqual(0, ranges[0][0])
+                self.assertEqual(os.path.getsize(self.path), ranges[-1][1])
+                domains = [domain for start, end in ranges
+                           for domain in MappedDomainReader(self.path, start, end, seen)]
+                self.assertEqual(self.expected, domains)
+                self.assertEqual(len(self.expected), len(seen))
+        reader = MappedDomainReader(self.path, seen=DomainSet())
+        self.assertEqual(self.expected, list(reader))
+        self.assertEqual(267 - len(self.expected), reader.duplicates)
+
+    def test_domain_set(self):
+        seen = DomainSet(capacity=2)
+        self.assertTrue(all(seen.add(f"d{i}.com") for i in range(1000)))
+        self.assertFalse(seen.add("d7.com"))
+        self.assertIn("d999.com", seen)
+        self.assertNotIn("d1000.com", seen)
+        self.assertEqual(1000, len(seen))
+
+    def test_read_domains_and_worker_queue(self):
+        self.assertEqual(self.expected, list(read_domains(self.path)))
+        self.assertEqual(["a.com", "b.com"], list(read_domains(io.StringIO("A.com.\na.com\n b.com"))))
+        self.assertEqual(["a.com", "a.com"], list(read_domains(io.StringIO("a.com\na.com\n"), dedupe=False)))
+
+        work_queue = queue.Queue()
+        for start, end in byte_ranges(self.path, 3):
+            work_queue.put((self.path, start, end))
+        work_queue.put(["new.com", "last.com"])
+        work_queue.put(None)
+        self.assertEqual(self.expected + ["new.com", "last.com"], list(_queued_domains(work_queue)))  # chunks as given
+
+    def test_root_only_lines_are_skipped(self):
+        with open(self.path, "w", encoding="utf-8") as domains:
+            domains.write("example.com\n.\n  ..  \nfoo.org\n")
+        self.assertEqual(["example.com", "foo.org"], list(read_domains(self.path)))
+        self.assertEqual(["example.com", "foo.org"], list(read_domains(io.StringIO("example.com\n.\nfoo.org"))))
+
+
+if __name__ == '__main__':
+    unittest.main()
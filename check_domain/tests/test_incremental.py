@@ -0,0 +1,82 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from check_domain.domain_state import DNSSECValidatedState
+from check_domain.formatted_response import DNSSECValidatedFormattedResponse
+from check_domain.incremental import IncrementalScanner, IncrementalStore
+
+
+class FakeChecker(object):
+
+    def __init__(self, answers: dict):
+        self.answers = answers
+        self.scanned = []
+
+    def check_all(self, domain, checks=None, deadline=None):
+        self.scanned.append(domain)
+        answer = self.answers[domain]
+        if isinstance(answer, Exception):
+            return {'dnssec': answer}
+        response = DNSSECValidatedFormattedResponse({'domain': domain, 'rr_types': ["a", "dnssec"],
+                                                     'answer': {answer: "secure"}})
+        return {'dnssec': DNSSECValidatedState(response)}
+
+
+class TestIncrementalScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "state.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def scan(self, checker, domains):
+        store = IncrementalStore(self.path)
+        scanner = IncrementalScanner(store, checks=["dnssec"], concurrency=2, checker=checker)
+        sink = io.StringIO()
+        try:
+            scanner.scan(domains, sink)
+        finally:
+            store.close()
+        return [json.loads(line)['domain'] for line in sink.getvalue().splitlines()], scanner.stats
+
+    def expire(self, domain):
+        store = IncrementalStore(self.path)
+        store.connection.execute("UPDATE domains SET expires_at = 0 WHERE domain = ?", (domain,))
+        store.close()
+
+    def test_only_changes_are_written(self):
+        answers = {'a.com': "192.0.2.1", 'b.com': "192.0.2.2", 'c.com': ValueError("timeout")}
+        written, stats = self.scan(FakeChecker(answers), list(answers))
+        self.assertEqual(["a.com", "b.com"], sorted(written))
+
+        # fresh domains are skipped, the domain whose check raised is due again
+        checker = FakeChecker(answers)
+        written, stats = self.scan(checker, list(answers))
+        self.assertEqual(["c.com"], checker.scanned)
+        self.assertEqual(2, stats.fresh)
+        self.assertEqual([], written)
+
+        # an expired domain is checked again, but only written when its answer changed
+        self.expire("a.com")
+        self.expire("b.com")
+        answers['b.com'] = "192.0.2.3"
+        written, stats = self.scan(FakeChecker(answers), ["a.com", "b.com"])
+        self.assertEqual(["b.com"], written)
+        self.assertEqual(1, stats.unchanged)
+
+    def test_expiry_follows_answer(self):
+        store = IncrementalStore(self.path)
+        response = DNSSECValidatedFormattedResponse({'domain': "a.com", 'rr_types': ["a", "dnssec"],
+                                                     'answer': {"192.0.2.1": "secure"}})
+        response.expires_at = 1000.0
+        store.update("a.com", {'dnssec': DNSSECValidatedState(response)}, now=900.0)
+        self.assertTrue(store.is_fresh("a.com", now=999.0))
+        self.assertFalse(store.is_fresh("a.com", now=1000.0))
+        store.close()
+
+# end
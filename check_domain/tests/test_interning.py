@@ -0,0 +1,42 @@
+import unittest
+
+from check_domain.formatted_response import DNSFormattedResponse, HostMappingAnswer
+from check_domain.interning import SymbolTable, intern_rr_types
+from check_domain.internet_fetch.dns_resolvers import Resolver
+
+
+class TestInterning(unittest.TestCase):
+
+    def test_symbol_table(self):
+        table = SymbolTable(limit=2)
+        first = "".join(["ns1.", "example.com."])
+        self.assertIs(first, table.intern(first))
+        self.assertIs(first, table.intern("".join(["ns1.example", ".com."])))
+        self.assertIsNone(table.intern(None))
+        table.intern("ns2.example.com.")
+        late = "".join(["ns3.", "example.com."])
+        self.assertIs(late, table.intern(late))  # over the limit: returned, not stored
+        self.assertEqual(2, len(table))
+        self.assertNotIn(late, table)
+
+    def test_rr_types_are_shared(self):
+        self.assertIs(intern_rr_types(["ns", "a"]), intern_rr_types(("ns", "a")))
+        self.assertIs(HostMappingAnswer("a.com", ["ns", "a"], None, None).rr_types,
+                      HostMappingAnswer("b.com", ("ns", "a"), None, None).rr_types)
+
+    def test_mapping_shares_host_names(self):
+        def mapping(domain):
+            names = ["".join(["ns-1394.", "awsdns-46.org."])]
+            addresses = [DNSFormattedResponse({'domain': names[0], 'rr_types': ("a",),
+                                               'answer': {0: "".join(["205.251.", "197.114"])}})]
+            return Resolver._mapping_response(domain, "ns", "a", names, None, addresses)
+
+        first, second = mapping("a.com"), mapping("b.com")
+        self.assertEqual(("ns", "a"), first['rr_types'])
+        self.assertIs(first.response.names[0], second.response.names[0])
+        self.assertIs(first.response.addresses[0], second.response.addresses[0])
+        self.assertIs(first['rr_types'], second['rr_types'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import ipaddress
+import random
+import unittest
+from types import SimpleNamespace
+
+from check_domain.internet_fetch.dns_resolvers import Resolver
+from check_domain.internet_fetch.ip_helper import V4, V6
+
+
+class TestV6(unittest.TestCase):
+
+    def test_rfc_5952(self):
+        expected = {"2001:db8::1": "2001:0db8:0000:0000:0000:0000:0000:0001", "::": "::", "::1": "::1",
+                    "ff00::": "ff00::", "2001:db8:0:1:1:1:1:1": "2001:db8:0:1:1:1:1:1",  # a single 0 stays
+                    "1::2:0:0:3": "1:0:0:0:2:0:0:3",  # the longest run
+                    "1:0:0:2::3": "1:0:0:2:0:0:0:3",
+                    "1::3:0:0:4:5": "1:0:0:3:0:0:4:5"}  # the first of equal runs
+        for text, address in expected.items():
+            self.assertEqual(text, V6.bytes_to_hexadectet(ipaddress.IPv6Address(address).packed))
+
+        words = [0, 0, 1, 0xabcd, 0xffff]
+        for _ in range(2000):
+            packed = b"".join(random.choice(words).to_bytes(2, "big") for _ in range(8))
+            self.assertEqual(ipaddress.IPv6Address(packed).compressed, V6.bytes_to_hexadectet(packed))
+        self.assertRaises(TypeError, V6.bytes_to_hexadectet, "2001:db8::1")
+        self.assertRaises(ValueError, V6.bytes_to_hexadectet, bytes(4))
+        self.assertTrue(V6.is_valid(bytes(16)))
+        self.assertFalse(V4.is_valid(bytes(16)))
+
+    def test_format_many(self):
+        addresses = [ipaddress.IPv6Address(f"2001:db8::{i % 3}").packed for i in range(6)]
+        expected = ["2001:db8::", "2001:db8::1", "2001:db8::2"] * 2
+        self.assertEqual(expected, V6.format_many(b"".join(addresses)))
+        self.assertEqual(expected, V6.format_many(memoryview(bytearray(b"".join(addresses)))))
+        self.assertEqual(expected, V6.format_many(addresses))
+        self.assertRaises(ValueError, V6.format_many, bytes(20))
+
+        results = SimpleNamespace(havedata=1, data=SimpleNamespace(address_list=["", "", ""]), ttl=300,
+                                  rawdata=[addresses[1], b"\x00" * 4, addresses[2]])
+        response = Resolver._aaaa_records_response("a.com", 0, results)
+        self.assertEqual({0: "2001:db8::1", 2: "2001:db8::2"}, response['answer'])
+
+
+if __name__ == '__main__':
+    unittest.main()
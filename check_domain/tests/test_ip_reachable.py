@@ -50,7 +50,7 @@ class TestIPReachable(unittest.TestCase):
 
         expected = {
             'domain': "gvlswing.com",
-            'rr_types': ["ns", "a"],
+            'rr_types': ("ns", "a"),
             'hosts': {
                 'ns-1394.awsdns-46.org.': {
                     'pingable': None,
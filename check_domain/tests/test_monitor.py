@@ -0,0 +1,83 @@
+import threading
+import time
+import unittest
+
+from check_domain.domain_state import IPV6ExistState
+from check_domain.formatted_response import DNSHostMappingFormattedResponse
+from check_domain.monitor import DomainMonitor, TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def test_expiry_across_levels(self):
+        wheel = TimerWheel(tick_seconds=1.0, now=0.0, slot_bits=2, levels=3)  # 4 slots per level, 64 tick span
+        for due in (1, 3, 4, 17, 63, 64, 200):
+            wheel.schedule(f"k{due}", due)
+        expired = {}
+        for now in range(1, 260):
+            for key in wheel.advance(float(now)):
+                expired[key] = now
+        self.assertEqual({f"k{due}": due for due in (1, 3, 4, 17, 63, 64, 200)}, expired)
+        self.assertEqual(0, len(wheel))
+
+    def test_reschedule_and_cancel(self):
+        wheel = TimerWheel(tick_seconds=1.0, now=0.0, slot_bits=2, levels=3)
+        wheel.schedule("moved", 5)
+        wheel.schedule("moved", 40)
+        wheel.schedule("gone", 7)
+        wheel.cancel("gone")
+        self.assertEqual([], wheel.advance(39.0))
+        self.assertEqual(["moved"], wheel.advance(40.0))
+        self.assertEqual([], wheel.advance(100.0))
+
+    def test_large_jump(self):
+        wheel = TimerWheel(tick_seconds=0.5, now=10.0)
+        keys = [f"d{i}" for i in range(10000)]
+        for i, key in enumerate(keys):
+            wheel.schedule(key, i % 600)
+        self.assertEqual(len(keys), len(wheel.advance(10.0 + 601)))
+
+
+class ChangingChecker(object):
+    """Answers with a new address for 'changing.com' on its third check, the same answer otherwise."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def check_all(self, domain, checks=None, deadline=None):
+        with self.lock:
+            self.calls[domain] = self.calls.get(domain, 0) + 1
+            call = self.calls[domain]
+        address = "2001:db8::2" if domain == "changing.com" and call >= 3 else "2001:db8::1"
+        response = DNSHostMappingFormattedResponse({'domain': domain, 'rr_types': ["ns", "aaaa"],
+                                                    'answer': {'ns1.' + domain: address}})
+        return {'ns_ipv6_exist': IPV6ExistState(response)}
+
+
+class TestDomainMonitor(unittest.TestCase):
+
+    def test_emits_only_changes(self):
+        events = []
+        checker = ChangingChecker()
+        monitor = DomainMonitor(lambda domain, states: events.append((domain, sorted(states))),
+                                checks=["ns_ipv6_exist"], checker=checker, interval=0.05, jitter=0.2,
+                                concurrency=4, tick_seconds=0.01)
+        monitor.add("changing.com")
+        monitor.add("steady.com")
+        stop = threading.Event()
+        runner = threading.Thread(target=monitor.run, args=(stop,))
+        runner.start()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and min(checker.calls.get("changing.com", 0),
+                                                   checker.calls.get("steady.com", 0)) < 5:
+            time.sleep(0.01)
+        stop.set()
+        runner.join(5)
+        self.assertGreaterEqual(checker.calls["steady.com"], 5)
+        self.assertEqual([("changing.com", ["ns_ipv6_exist"])], events)
+
+        monitor.remove("steady.com")
+        self.assertEqual(1, len(monitor))
+
+# end
@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from check_domain.distributed import locality_key
+from check_domain.domain_list import normalize_line
+from check_domain.formatted_response import DNSFormattedResponse
+from check_domain.internet_fetch.dns_resolvers import Resolver
+from check_domain.internet_fetch.public_suffix import PublicSuffixTrie
+from check_domain import normalize
+from check_domain.normalize import group_domains, group_key, idna_encode, normalize_domain
+
+
+class TestNormalize(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(PublicSuffixTrie, "_default", PublicSuffixTrie(["com", "uk", "co.uk"]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        group_key.cache_clear()
+        self.addCleanup(group_key.cache_clear)
+
+    def test_normalize_domain(self):
+        self.assertEqual("example.com", normalize_domain(" Example.COM. "))
+        self.assertEqual("www.xn--bcher-kva.example", normalize_domain("WWW.Bücher.Example."))
+        self.assertEqual("xn--bcher-kva.example", normalize_domain("bücher。example"))  # ideographic full stop
+        self.assertEqual("xn--bcher-kva.example", normalize_line("  BÜCHER.example.\n"))
+        self.assertRaises(ValueError, normalize_domain, " . ")
+        self.assertRaises(ValueError, normalize_domain, "ü" * 64 + ".com")
+        self.assertIs(normalize_domain("Example.COM."), normalize_domain("Example.COM."))  # memoized
+
+    def test_idna_2008(self):
+        self.assertEqual("xn--fa-hia.de", normalize_domain("Faß.de"))  # not fass.de (IDNA 2003)
+        self.assertEqual("_dmarc.xn--bcher-kva.example", idna_encode("_dmarc.Bücher.example"))
+        self.assertRaises(ValueError, normalize_domain, "a\u200db.com")
+        with mock.patch.object(normalize, "idna", None):
+            self.assertRaises(ValueError, idna_encode, "faß.de")
+            self.assertEqual("xn--bcher-kva.example", idna_encode("Bücher.example"))
+
+    def test_grouping(self):
+        self.assertEqual("example.co.uk", group_key("Mail.Example.CO.UK."))
+        self.assertEqual("co.uk", group_key("co.uk"))
+        self.assertEqual("example.co.uk", locality_key("www.example.co.uk"))
+        domains = ["a.example.com", "x.other.com", "b.example.com", "bad..com", "other.com", "c.example.com"]
+        self.assertEqual(["a.example.com", "b.example.com", "x.other.com", "other.com", "bad..com", "c.example.com"],
+                         list(group_domains(domains, window=5)))
+        self.assertEqual(sorted(domains), sorted(group_domains(domains)))
+
+    def test_null_mx_is_not_resolved(self):
+        resolver = Resolver()
+        null_mx = DNSFormattedResponse({'domain': "example.com", 'rr_types': ["mx"], 'answer': {0: "."}})
+        with mock.patch.object(Resolver, "get_a_records", side_effect=AssertionError("looked up")), \
+                mock.patch.object(Resolver, "get_mx", return_value=null_mx):
+            for host_names in (["."], [""], None):
+                response = resolver.get_ipv4_mapping("example.com", "mx", host_names=host_names).get_response()
+                self.assertIsNone(response['answer'])
+        self.assertEqual(["mx.example.com"], Resolver._host_names([".", "mx.example.com"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from check_domain.query_plan import QueryPlan
+
+
+class TestQueryPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def step(self, name, value):
+        def run(*arguments):
+            with self.lock:
+                self.calls.append(name)
+            return (value,) + arguments
+        return run
+
+    def test_shared_steps_run_once(self):
+        plan = QueryPlan()
+        plan.add("ns", self.step("ns", "ns"))
+        plan.add("ns_a", self.step("ns_a", "a"), ("ns",))
+        plan.add("ns_aaaa", self.step("ns_aaaa", "aaaa"), ("ns",))
+        plan.add("unused", self.step("unused", "x"))
+        results = plan.run(["ns_a", "ns_aaaa"], self.executor)
+        self.assertEqual(1, self.calls.count("ns"))
+        self.assertNotIn("unused", self.calls)
+        self.assertEqual(("a", ("ns",)), results["ns_a"])
+
+    def test_failed_dependency(self):
+        def fail():
+            raise ValueError("no ns")
+        plan = QueryPlan()
+        plan.add("ns", fail)
+        plan.add("ns_a", self.step("ns_a", "a"), ("ns",))
+        results = plan.run(["ns_a"], self.executor)
+        self.assertIsInstance(results["ns_a"], ValueError)
+        self.assertEqual([], self.calls)
+
+    def test_unknown_dependency(self):
+        self.assertRaises(ValueError, QueryPlan().add, "ns_a", self.step("ns_a", "a"), ("ns",))
+
+# end
@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime
+
+from check_domain.domain_state import IPV4ExistState
+from check_domain.formatted_response import DNSFormattedResponse
+from check_domain.internet_fetch.dns_resolvers import Resolver
+
+
+class FakeData(object):
+
+    def __init__(self, names: list):
+        self.address_list = names
+        self.data = names
+
+    def as_domain_list(self):
+        return self.address_list
+
+
+class FakeResult(object):
+
+    def __init__(self, names: list, ttl: int):
+        self.havedata = 1 if len(names) > 0 else 0
+        self.data = FakeData(names)
+        self.ttl = ttl
+
+
+class FakeContext(object):
+    """Answers NS lookups with two name servers and A lookups with one address, each with its own ttl."""
+
+    def resolve(self, name, rrtype=None, rrclass=None):
+        if name == "example.com":
+            return 0, FakeResult(["ns1.example.com", "ns2.example.com"], 3600)
+        if name == "ns1.example.com":
+            return 0, FakeResult(["192.0.2.1"], 300)
+        return 0, FakeResult(["192.0.2.2"], 60)
+
+
+class TestRecordTTLs(unittest.TestCase):
+
+    def setUp(self):
+        self.context = Resolver.ctx
+        Resolver.ctx = FakeContext()
+
+    def tearDown(self):
+        Resolver.ctx = self.context
+
+    def test_set_ttls(self):
+        response = DNSFormattedResponse({'domain': "x.com", 'rr_types': ["a"], 'answer': {0: "192.0.2.1"}})
+        response.set_ttls({0: 300}, fetched_at=1000.0)
+        self.assertEqual(1300.0, response.expires_at)
+        self.assertEqual(1100.0, response.expire_with(DNSFormattedResponse({}).set_ttls({0: 100}, 1000.0)).expires_at)
+
+    def test_mapping_expires_with_first_record(self):
+        response = Resolver().get_ipv4_mapping("example.com", "ns")
+        self.assertEqual({'ns1.example.com': 300, 'ns2.example.com': 60}, response.ttls)
+
+        state = IPV4ExistState(response)
+        self.assertTrue(state.is_fresh())
+        self.assertAlmostEqual(60, (state.expires_at - datetime.utcnow()).total_seconds(), delta=5)
+        self.assertFalse(state.is_fresh(now=state.expires_at))
+
+    def test_no_ttl_is_never_fresh(self):
+        response = DNSFormattedResponse({'domain': "x.com", 'rr_types': ["ns", "a"], 'answer': None})
+        self.assertFalse(IPV4ExistState(response).is_fresh())
+
+# end
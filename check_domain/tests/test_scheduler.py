@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+
+from check_domain.deadline import DeadlineExceeded
+from check_domain.scheduler import CheckScheduler, BATCH, INTERACTIVE
+
+
+class RecordingChecker(object):
+    """Stands in for DomainChecker: records the order domains are checked in. Domains starting with 'slow' block
+    until released."""
+
+    def __init__(self):
+        self.order = []
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+
+    def check_all(self, domain, checks=None, deadline=None):
+        if domain.startswith("slow"):
+            self.release.wait(5)
+        with self.lock:
+            self.order.append(domain)
+        return {check: domain for check in checks}
+
+
+class TestCheckScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.checker = RecordingChecker()
+
+    def test_reserved_worker_serves_interactive_while_batch_is_stuck(self):
+        scheduler = CheckScheduler(self.checker, workers=2, reserved={INTERACTIVE: 1})
+        stuck = [scheduler.submit(f"slow{i}.example", ["spf"], BATCH) for i in range(3)]
+        time.sleep(0.05)
+        interactive = scheduler.submit("user.example", ["spf"], INTERACTIVE)
+        self.assertEqual({'spf': "user.example"}, interactive.result(timeout=1))
+        self.assertEqual(2, scheduler.metrics()[BATCH]['queued'])
+        self.assertEqual(1, scheduler.metrics()[INTERACTIVE]['completed'])
+        self.checker.release.set()
+        scheduler.shutdown()
+        self.assertTrue(all(future.done() for future in stuck))
+
+    def test_weighted_fair_share(self):
+        scheduler = CheckScheduler(self.checker, workers=1, weights={INTERACTIVE: 3, BATCH: 1}, reserved={})
+        blocker = scheduler.submit("slow.example", ["spf"], BATCH)
+        time.sleep(0.05)  # the only worker is busy, everything below queues up
+        for i in range(4):
+            scheduler.submit(f"b{i}", ["spf"], BATCH)
+        for i in range(6):
+            scheduler.submit(f"i{i}", ["spf"], INTERACTIVE)
+        self.checker.release.set()
+        scheduler.shutdown()
+        order = self.checker.order[1:]
+        # three interactive checks for every batch check while both classes are queued
+        self.assertEqual(["i", "i", "i", "b", "i", "i", "i", "b"], [domain[0] for domain in order[:8]])
+        self.assertTrue(blocker.done())
+
+    def test_deadline_expires_in_queue(self):
+        scheduler = CheckScheduler(self.checker, workers=1, reserved={})
+        scheduler.submit("slow.example", ["spf"], BATCH)
+        expired = scheduler.submit("late.example", ["spf"], BATCH, deadline=0.01)
+        time.sleep(0.05)
+        self.checker.release.set()
+        self.assertRaises(DeadlineExceeded, expired.result, 1)
+        scheduler.shutdown()
+        self.assertNotIn("late.example", self.checker.order)
+        self.assertEqual(1, scheduler.metrics()[BATCH]['expired'])
+
+    def test_checker_for(self):
+        scheduler = CheckScheduler(self.checker, workers=2, reserved={})
+        self.assertEqual({'dkim': "a.example"}, scheduler.checker_for(BATCH).check_all("a.example", ["dkim"]))
+        self.assertRaises(ValueError, scheduler.submit, "a.example", ["nope"])
+        self.assertRaises(ValueError, scheduler.checker_for, "urgent")
+        scheduler.shutdown()
+        self.assertRaises(RuntimeError, scheduler.submit, "a.example")
+
+# end
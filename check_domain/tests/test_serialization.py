@@ -0,0 +1,84 @@
+import io
+import json
+import pickle
+import unittest
+
+from check_domain.bulk_scan import result_line
+from check_domain.deadline import DeadlineExceeded
+from check_domain.domain_state import DNSSECState, DNSSECValidatedState, IPV6ExistState
+from check_domain.formatted_response import DNSHostMappingFormattedResponse, DNSSECAnswer, DNSSECFormattedResponse, \
+    DNSSECSignaturesAnswer, DNSSECValidatedFormattedResponse, DNSSECValidationAnswer, HostMappingAnswer
+from check_domain.serialization import BINARY_MAGIC, get_serializer, read_frames, write_frame
+
+
+def scan_result(domain):
+    mapping = HostMappingAnswer(domain, ["ns", "aaaa"], ["ns1." + domain, "ns2." + domain], ["2001:db8::1", None])
+    response = DNSHostMappingFormattedResponse(mapping)
+    response.ttls = {'ns': 3600, 'aaaa': 300}
+    response.expires_at = 1700000300.0
+    response.timed_out = ["ns2." + domain]
+    dnssec = DNSSECAnswer(domain, DNSSECValidationAnswer(domain, ["192.0.2.1"], "secure"),
+                          DNSSECSignaturesAnswer(domain, ["key", None, None, "ds", "soa"]))
+    return {'ns_ipv6_exist': IPV6ExistState(response), 'dnssec_chain': DNSSECState(DNSSECFormattedResponse(dnssec)),
+            'dnssec': DeadlineExceeded("out of time"), 'mx_ipv4_reach': ValueError("no mx")}
+
+
+class TestSerialization(unittest.TestCase):
+
+    def assertSameResult(self, expected, domain, states, text=False):
+        self.assertEqual("a.com", domain)
+        self.assertEqual(list(expected), list(states))
+        for check, state in expected.items():
+            read_back = states[check]
+            if isinstance(state, Exception):
+                self.assertIsInstance(read_back, DeadlineExceeded if isinstance(state, DeadlineExceeded)
+                                      else RuntimeError)
+                self.assertIn(str(state), str(read_back))
+                continue
+            self.assertIs(type(state), type(read_back))
+            self.assertIs(type(state.formatted_answer), type(read_back.formatted_answer))
+            answer = state.formatted_answer.get_response()
+            self.assertEqual(json.loads(json.dumps(answer)) if text else answer,
+                             read_back.formatted_answer.get_response())
+            self.assertEqual(state.state_timestamp, read_back.state_timestamp)
+            self.assertEqual(state.expires_at, read_back.expires_at)
+            self.assertEqual(state.timed_out, read_back.timed_out)
+            if not text:  # ttls are not written to JSON
+                self.assertEqual(state.formatted_answer.ttls, read_back.formatted_answer.ttls)
+
+    def test_round_trips(self):
+        states = scan_result("a.com")
+        binary, text = get_serializer("binary"), get_serializer("json")
+        self.assertSameResult(states, *binary.loads_result(binary.dumps_result("a.com", states)))
+        self.assertSameResult(states, *text.loads_result(text.dumps_result("a.com", states)), text=True)
+        self.assertEqual(json.loads(result_line("a.com", states)), json.loads(text.dumps_result("a.com", states)))
+        self.assertIsInstance(binary.loads_result(binary.dumps_result("a.com", states))[1]['ns_ipv6_exist']
+                              .formatted_answer.response, HostMappingAnswer)
+
+    def test_binary_keeps_raw_values(self):
+        raw = {'domain': "a.com", 'rr_types': ("a", "dnssec"), 'answer': {0: b"\x01\x02", 1: bytearray(b"\x03")},
+               'record': object()}
+        state = DNSSECValidatedState(DNSSECValidatedFormattedResponse(raw))
+        binary = get_serializer("binary")
+        answer = binary.loads_state(binary.dumps_state(state)).formatted_answer.get_response()
+        self.assertEqual({0: b"\x01\x02", 1: b"\x03"}, answer['answer'])
+        self.assertEqual(("a", "dnssec"), answer['rr_types'])
+        self.assertIsInstance(answer['record'], str)
+        self.assertLess(len(binary.dumps_result("a.com", scan_result("a.com"))),
+                        len(get_serializer("json").dumps_result("a.com", scan_result("a.com"))))
+
+    def test_frames_and_unsafe_records(self):
+        binary = get_serializer("binary")
+        stream = io.BytesIO()
+        stream.write(BINARY_MAGIC)
+        for domain in ("a.com", "b.com"):
+            write_frame(stream, binary.dumps_result(domain, scan_result(domain)))
+        stream.write(b"\x10\x00")  # a record cut short by a crash
+        stream.seek(len(BINARY_MAGIC))
+        self.assertEqual(["a.com", "b.com"], [binary.loads_result(record)[0] for record in read_frames(stream)])
+        self.assertRaises(pickle.UnpicklingError, binary.loads_result, pickle.dumps((1, io.BytesIO)))
+        self.assertRaises(ValueError, get_serializer, "xml")
+
+
+if __name__ == '__main__':
+    unittest.main()
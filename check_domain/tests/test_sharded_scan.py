@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import queue
+import tempfile
+import unittest
+
+from check_domain.sharded_scan import ShardedScanner
+from check_domain.tests.test_bulk_scan import FakeChecker
+
+
+class DeadProcess(object):
+
+    exitcode = 0
+
+    def is_alive(self):
+        return False
+
+
+class TestShardedScanner(unittest.TestCase):
+    """The workers are real 'spawn' processes, each building a FakeChecker."""
+
+    def scanner(self, **options):
+        return ShardedScanner(workers=2, checks=["ns_ipv6_exist", "dnssec"], concurrency=4, checker_factory=FakeChecker,
+                              **options)
+
+    def scanned(self, sink):
+        return sorted(json.loads(line)['domain'] for line in sink.getvalue().splitlines())
+
+    def test_scan(self):
+        domains = [f"d{i}.com" for i in range(50)] + ["broken.com"]
+        scanner, sink = self.scanner(chunk_size=4), io.StringIO()
+        stats = scanner.scan(iter(domains), sink)
+        self.assertEqual(sorted(domains), self.scanned(sink))
+        self.assertEqual({0, 1}, set(stats['workers']))
+        self.assertEqual(51, stats['total']['domains_read'])
+        self.assertEqual(51, stats['total']['completed'])
+        self.assertEqual(1, stats['total']['failed'])
+        self.assertEqual(50, stats['total']['check_errors'])  # dnssec raises for every domain that is not broken
+        self.assertEqual(51, sum(worker['completed'] for worker in stats['workers'].values()))
+        self.assertEqual(51, scanner.aggregate.domains)
+
+    def test_scan_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "domains.txt")
+            with open(path, "w", encoding="utf-8") as domains:
+                domains.write("# list\n" + "".join(f"D{i}.com.\n" for i in range(40)))
+            sink = io.StringIO()
+            stats = self.scanner().scan_file(path, sink, ranges_per_worker=3)
+        self.assertEqual(sorted(f"d{i}.com" for i in range(40)), self.scanned(sink))
+        self.assertEqual(40, stats['total']['completed'])
+
+    def test_feeder_error(self):
+        def domains():
+            yield "a.com"
+            raise OSError("list unreadable")
+
+        with self.assertRaisesRegex(OSError, "list unreadable"):
+            self.scanner().scan(domains(), io.StringIO())
+
+    def test_finished_worker_is_not_dead(self):
+        # both workers exited, but the parent has not taken their last messages off the queue yet
+        scanner, sink, worker_stats = self.scanner(), io.StringIO(), {}
+        result_queue = queue.Queue()
+        for worker_id in (0, 1):
+            result_queue.put(("lines", worker_id, [f'{{"domain":"w{worker_id}.com"}}']))
+            result_queue.put(("stats", worker_id, {'completed': 1}))
+        scanner._check_workers([DeadProcess(), DeadProcess()], worker_stats, result_queue, sink)
+        self.assertEqual({0, 1}, set(worker_stats))
+        self.assertEqual(["w0.com", "w1.com"], self.scanned(sink))
+
+        result_queue.put(("stats", 0, {'completed': 1}))  # worker 1 died without its counters
+        with self.assertRaisesRegex(RuntimeError, "worker 1 exited"):
+            scanner._check_workers([DeadProcess(), DeadProcess()], {}, result_queue, sink)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from check_domain.bulk_scan import BulkScanner
+from check_domain.checkpoint import ScanCheckpoint
+from check_domain.serialization import BINARY_MAGIC, JSONSerializer, get_serializer, read_frames
+from check_domain.sinks import JSONLSink, ResultSink, bench, open_sink, zstandard
+from check_domain.tests.test_bulk_scan import FakeChecker
+
+
+class FailingSink(ResultSink):
+
+    def _write_batch(self, lines: list):
+        raise OSError("disk full")
+
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.domains = [f"d{i}.com" for i in range(10)] + ["broken.com"]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def scan(self, sink_format):
+        path = os.path.join(self.directory.name, f"results.{sink_format}")
+        for _ in range(2):  # a second run replaces the output of the first
+            with open_sink(path, sink_format, batch_lines=3) as sink:
+                scanner = BulkScanner(checks=["ns_ipv6_exist", "dnssec"], concurrency=4, checker=FakeChecker())
+                scanner.scan(self.domains, sink)
+        return path
+
+    def assertDomains(self, lines):
+        self.assertEqual(sorted(self.domains), sorted(json.loads(line)['domain'] for line in lines))
+
+    def test_text_formats(self):
+        with open(self.scan("jsonl"), encoding="utf-8") as results:
+            self.assertDomains(results.read().splitlines())
+        with gzip.open(self.scan("gzip"), "rt", encoding="utf-8") as results:
+            self.assertDomains(results.read().splitlines())
+        if zstandard is not None:
+            with open(self.scan("zstd"), "rb") as results:
+                self.assertDomains(zstandard.ZstdDecompressor().stream_reader(results).read().decode().splitlines())
+
+    def test_sqlite_and_binary(self):
+        connection = sqlite3.connect(self.scan("sqlite"))
+        rows = connection.execute("SELECT domain, result FROM results").fetchall()
+        connection.close()
+        self.assertEqual(sorted(self.domains), sorted(domain for domain, _ in rows))
+        self.assertDomains(result for _, result in rows)
+
+        binary = get_serializer("binary")
+        with mock.patch.object(JSONSerializer, "loads_result", side_effect=AssertionError("decoded a line")):
+            path = self.scan("binary")  # the scanner hands states to write_result(): no JSON round trip
+        with open_sink(path, "binary", append=True) as sink:
+            sink.write('{"domain":"line.com","checks":{}}\n')  # lines are still accepted
+        self.domains.append("line.com")
+        with open(path, "rb") as results:
+            self.assertEqual(BINARY_MAGIC, results.read(len(BINARY_MAGIC)))
+            read_back = dict(binary.loads_result(record) for record in read_frames(results))
+        self.assertEqual(sorted(self.domains), sorted(read_back))
+        self.assertIsInstance(read_back['broken.com'], RuntimeError)
+        self.assertEqual({'ns1.d1.com': "2001:db8::1"},
+                         read_back['d1.com']['ns_ipv6_exist'].formatted_answer['answer'])
+
+    def test_partial_lines_checkpoint_and_errors(self):
+        path = os.path.join(self.directory.name, "results.jsonl")
+        sink = JSONLSink(path, batch_lines=2)
+        sink.write('{"domain":"a.com"')
+        sink.write(',"checks":{}}\n{"domain":"b.com","checks":{}}\n')
+        checkpoint = ScanCheckpoint(path + ".ckpt").start()
+        checkpoint.mark(0)
+        checkpoint.commit(sink)
+        self.assertEqual(os.path.getsize(path), checkpoint.output_size)
+        checkpoint.close()
+        sink.close()
+        self.assertRaises(ValueError, sink.write, "\n")
+
+        failing = FailingSink(path, batch_lines=1)
+        failing.write('{"domain":"a.com"}\n')
+        self.assertRaises(RuntimeError, failing.flush)
+        self.assertRaises(RuntimeError, failing.close)
+        self.assertRaises(ValueError, open_sink, path, "csv")
+
+    def test_bench(self):
+        self.assertEqual({'jsonl', 'sqlite'}, set(bench(lines=200, formats=["jsonl", "sqlite"])))
+
+
+if __name__ == '__main__':
+    unittest.main()
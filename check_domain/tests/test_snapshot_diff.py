@@ -0,0 +1,98 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from check_domain.bulk_scan import result_line
+from check_domain.deadline import DeadlineExceeded
+from check_domain.domain_state import DNSSECValidatedState, IPV6ExistState
+from check_domain.fingerprint import answer_fingerprint, state_fingerprint
+from check_domain.formatted_response import DNSFormattedResponse, DNSHostMappingFormattedResponse, \
+    DNSSECValidatedFormattedResponse, HostMappingAnswer
+from check_domain.snapshot_diff import SnapshotDiff
+
+
+def states(domain, ipv6, verdict="secure", reverse=False):
+    names, step = ["ns1." + domain, "ns2." + domain], -1 if reverse else 1
+    mapping = HostMappingAnswer(domain, ["ns", "aaaa"], names[::step], ipv6[::step])
+    dnssec = DNSSECValidatedFormattedResponse({'domain': domain, 'rr_types': ["a", "dnssec"],
+                                               'answer': {'192.0.2.1': verdict}})
+    return {'ns_ipv6_exist': IPV6ExistState(DNSHostMappingFormattedResponse(mapping)),
+            'dnssec': DNSSECValidatedState(dnssec)}
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_record_order_and_json_round_trip(self):
+        first = DNSFormattedResponse({'domain': "a.com", 'rr_types': ["a"], 'answer': {0: "192.0.2.1", 1: "192.0.2.2"}})
+        rotated = {'domain': "a.com", 'rr_types': ["a"], 'answer': {'0': "192.0.2.2", '1': "192.0.2.1"}}
+        self.assertEqual(answer_fingerprint(first), answer_fingerprint(rotated))
+        state = states("a.com", ["2001:db8::1", None])['ns_ipv6_exist']
+        read_back = json.loads(result_line("a.com", {'ns_ipv6_exist': state}))
+        self.assertEqual(state_fingerprint(state),
+                         answer_fingerprint(read_back['checks']['ns_ipv6_exist']['answer']))
+        self.assertNotEqual(state_fingerprint(state),
+                            state_fingerprint(states("a.com", ["2001:db8::1", "2001:db8::2"])['ns_ipv6_exist']))
+
+
+class TestSnapshotDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, results):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as output:
+            for domain, domain_states in results:
+                output.write(result_line(domain, domain_states) + "\n")
+        return path
+
+    def diff(self, before, after, **options):
+        sink = io.StringIO()
+        counts = SnapshotDiff(before, after, run_lines=2, **options).write(sink)
+        return counts, {change['domain']: change for change in map(json.loads, sink.getvalue().splitlines())}
+
+    def test_changes(self):
+        v6 = ["2001:db8::1", "2001:db8::2"]
+        domains = ("lost.com", "same.com", "bogus.com", "gone.com", "flaky.com")
+        before = self.write("before.jsonl", [(domain, states(domain, v6)) for domain in domains])
+        flaky = dict(states("flaky.com", v6), dnssec=DeadlineExceeded("out of time"))
+        after = self.write("after.jsonl", [("new.com", states("new.com", v6)), ("flaky.com", flaky),
+                                           ("bogus.com", states("bogus.com", v6, "bogus")),
+                                           ("same.com", states("same.com", v6, reverse=True)),
+                                           ("lost.com", states("lost.com", v6)),
+                                           ("lost.com", states("lost.com", ["2001:db8::1", None]))])
+
+        counts, changes = self.diff(before, after)
+        self.assertEqual({'before': 5, 'after': 5, 'added': 1, 'removed': 1, 'changed': 3, 'unchanged': 1}, counts)
+        self.assertEqual("added", changes['new.com']['change'])
+        self.assertEqual("removed", changes['gone.com']['change'])
+        self.assertEqual(["ns_ipv6_exist"], list(changes['lost.com']['checks']))
+        self.assertEqual({'192.0.2.1': "bogus"}, changes['bogus.com']['checks']['dnssec']['after']['answer']['answer'])
+        self.assertTrue(changes['flaky.com']['checks']['dnssec']['after']['timed_out'])
+
+        counts, changes = self.diff(before, after, ignore_failures=True, checks=["dnssec"])
+        self.assertEqual(["bogus.com", "gone.com", "new.com"], sorted(changes))
+
+    def test_domain_failed_as_a_whole(self):
+        v6 = ["2001:db8::1", "2001:db8::2"]
+        before = self.write("before.jsonl", [("down.com", states("down.com", v6))])
+        after = self.write("after.jsonl", [("down.com", RuntimeError("no route"))])
+
+        counts, changes = self.diff(before, after)
+        self.assertEqual(["dnssec", "ns_ipv6_exist"], sorted(changes['down.com']['checks']))
+        self.assertEqual({'error': "RuntimeError: no route"}, changes['down.com']['checks']['dnssec']['after'])
+
+        counts, changes = self.diff(before, after, ignore_failures=True)
+        self.assertEqual({}, changes)
+        self.assertEqual(1, counts['unchanged'])
+        counts, changes = self.diff(after, after)
+        self.assertEqual({}, changes)
+
+
+if __name__ == '__main__':
+    unittest.main()
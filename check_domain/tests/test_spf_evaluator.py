@@ -0,0 +1,124 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from check_domain.internet_fetch import spf_evaluator
+from check_domain.internet_fetch.spf_evaluator import SPFEvaluator, SPFPermError, parse_spf
+from check_domain.formatted_response import DNSFormattedResponse, SPFFormattedResponse
+from check_domain.domain_state import SPFState
+
+
+class FakeTXTResolver(object):
+    """Answers get_txt() from a dict and records every name that was queried. Shared by the dmarc and dkim tests."""
+
+    def __init__(self, records):
+        self.records = records
+        self.queried = []
+        self.lock = threading.Lock()  # dkim discovery queries from several threads
+
+    def get_txt(self, domain, deadline=None):
+        with self.lock:
+            self.queried.append(domain)
+        answer = self.records.get(domain)
+        if answer is not None:
+            answer = dict(enumerate(answer))
+        return DNSFormattedResponse({'domain': domain, 'rr_types': ["txt"], 'answer': answer})
+
+
+class TestParseSPF(unittest.TestCase):
+
+    def test_parse_terms(self):
+        terms, redirect = parse_spf("v=spf1 ip4:192.0.2.0/24 mx/24 -include:_spf.example.net ~all")
+        self.assertEqual([{'qualifier': "+", 'mechanism': "ip4", 'value': "192.0.2.0/24"},
+                          {'qualifier': "+", 'mechanism': "mx", 'value': "/24"},
+                          {'qualifier': "-", 'mechanism': "include", 'value': "_spf.example.net"},
+                          {'qualifier': "~", 'mechanism': "all", 'value': None}], terms)
+        self.assertIsNone(redirect)
+
+    def test_parse_redirect(self):
+        terms, redirect = parse_spf("v=spf1 a redirect=_spf.example.net")
+        self.assertEqual("_spf.example.net", redirect)
+        terms, redirect = parse_spf("v=spf1 a -all redirect=_spf.example.net")
+        self.assertIsNone(redirect)  # ignored when 'all' is present
+
+    def test_parse_errors(self):
+        self.assertRaises(SPFPermError, parse_spf, "v=spf2 -all")
+        self.assertRaises(SPFPermError, parse_spf, "v=spf1 foo:bar -all")
+
+
+class TestSPFEvaluator(unittest.TestCase):
+
+    records = {
+        'a.com': ["v=spf1 ip4:192.0.2.0/24 include:_spf.provider.net -all", "unrelated=1"],
+        'b.com': ["v=spf1 include:_spf.provider.net ~all"],
+        '_spf.provider.net': ["v=spf1 ip6:2001:db8::/32 ip4:198.51.100.0/24 ~all"],
+        'loop.com': ["v=spf1 include:loop.net -all"],
+        'loop.net': ["v=spf1 include:loop.com -all"],
+        'cidr4.com': ["v=spf1 a:mail.cidr4.com/xx -all"],
+        'cidr6.com': ["v=spf1 mx//yy -all"],
+        'wide.com': ["v=spf1 a//129 -all"],
+        'x.com': ["v=spf1 include:loop.net -all"],
+        'many.com': ["v=spf1 include:p1.net include:p2.net include:p3.net -all"],
+        'p1.net': ["v=spf1 -all"],
+        'p2.net': ["v=spf1 -all"],
+        'p3.net': ["v=spf1 -all"],
+    }
+
+    def setUp(self):
+        SPFEvaluator.clear_cache()
+        self.dns = FakeTXTResolver(self.records)
+        self.spf = SPFEvaluator(self.dns)
+
+    def test_inspect_spf(self):
+        response = self.spf.inspect_spf("a.com")
+        self.assertIsInstance(response, SPFFormattedResponse)
+        self.assertEqual(["v=spf1 ip4:192.0.2.0/24 include:_spf.provider.net -all"], response['records'])
+        self.assertEqual(1, response['lookup_count'])
+        self.assertTrue(response['valid'])
+        self.assertIn("_spf.provider.net", response['answer']['children'])
+        self.assertTrue(SPFState(response).valid)
+
+    def test_include_subtree_memoized(self):
+        self.spf.inspect_spf("a.com")
+        self.spf.inspect_spf("b.com")
+        self.assertEqual(1, self.dns.queried.count("_spf.provider.net"))
+
+    def test_check_host(self):
+        self.assertEqual("pass", self.spf.check_host("192.0.2.10", "a.com"))
+        self.assertEqual("pass", self.spf.check_host("2001:db8::1", "b.com"))
+        self.assertEqual("fail", self.spf.check_host("203.0.113.1", "a.com"))
+        self.assertEqual("softfail", self.spf.check_host("203.0.113.1", "b.com"))
+        self.assertEqual("none", self.spf.check_host("203.0.113.1", "nospf.com"))
+
+    def test_include_loop(self):
+        self.assertFalse(self.spf.inspect_spf("loop.com")['valid'])
+        self.assertEqual("permerror", self.spf.check_host("192.0.2.1", "loop.com"))
+
+    def test_path_errors_not_cached(self):
+        self.spf.inspect_spf("loop.com")  # loop.net is reached from loop.com and only sees the loop from there
+        self.assertNotIn("loop.net", SPFEvaluator._subtree_cache)
+        tree = self.spf.inspect_spf("x.com")['answer']
+        self.assertIn("loop.com", tree['children']['loop.net']['children'])
+        self.assertEqual(3, tree['lookups'])
+
+    def test_cache_expires_and_is_bounded(self):
+        ttl_dns = mock.Mock(wraps=self.dns)
+        ttl_dns.get_txt.side_effect = lambda domain, deadline=None: self.dns.get_txt(domain).set_ttls({0: 60})
+        spf = SPFEvaluator(ttl_dns)
+        spf.inspect_spf("a.com")
+        spf.inspect_spf("b.com")
+        self.assertEqual(1, self.dns.queried.count("_spf.provider.net"))
+        with mock.patch.object(spf_evaluator.time, "time", return_value=time.time() + 61):
+            spf.inspect_spf("b.com")
+        self.assertEqual(2, self.dns.queried.count("_spf.provider.net"))
+
+        with mock.patch.object(spf_evaluator, "SUBTREE_CACHE_TARGETS", 2):
+            self.spf.inspect_spf("many.com")
+        self.assertEqual(["p2.net", "p3.net"], list(SPFEvaluator._subtree_cache))
+
+    def test_malformed_cidr(self):
+        for domain in ("cidr4.com", "cidr6.com", "wide.com"):
+            self.assertEqual("permerror", self.spf.check_host("192.0.2.1", domain))
+
+# end